@@ -16,6 +16,21 @@ class Settings(BaseSettings):
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./zhixueban.db"
+    DB_ECHO: bool = False  # 是否打印每条SQL（仅调试时开启）
+    # 连接池（MySQL/SQL Server等，SQLite不使用）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800  # 秒，超过后重建连接，避免使用被服务端断开的连接
+    DB_POOL_TIMEOUT: int = 30  # 秒，等待空闲连接的最长时间
+    # SQLite连接参数（每个连接建立时通过 PRAGMA 设置）
+    SQLITE_WAL: bool = True  # WAL模式：读写互不阻塞
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 写锁被占用时的等待时间
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL下 NORMAL 即可保证一致性
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # 每个连接的页缓存
+    SQLITE_MMAP_SIZE_MB: int = 256  # 内存映射读取，0 表示关闭
+    # 异步会话（热点只读接口）：未设置 ASYNC_DATABASE_URL 时由 DATABASE_URL 换成异步驱动（aiosqlite/asyncmy）
+    DB_ASYNC_ENABLED: bool = True
+    ASYNC_DATABASE_URL: Optional[str] = None
     
     # JWT配置
     SECRET_KEY: str = "your-secret-key-change-in-production-please-use-strong-random-key"
@@ -29,15 +44,87 @@ class Settings(BaseSettings):
     DEFAULT_AI_PROVIDER: str = "deepseek"
     AI_TIMEOUT: int = 120  # 秒（试卷生成需要更长时间，33道题可能需要90秒以上）
     AI_MAX_RETRIES: int = 3
+    # 异步调用连接池（每个提供商一个长连接客户端）
+    AI_HTTP_MAX_CONNECTIONS: int = 200
+    AI_HTTP_MAX_KEEPALIVE: int = 50
+    AI_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    AI_HTTP2: bool = True  # 需安装 h2，未安装时自动退回 HTTP/1.1
+    # AI响应缓存（相同Prompt与参数直接复用结果，默认关闭）
+    AI_CACHE_ENABLED: bool = False
+    AI_CACHE_TTL: int = 24 * 3600  # 秒
+    AI_CACHE_MAX_ENTRIES: int = 512  # 内存LRU条目上限
+    AI_CACHE_DISK_PATH: Optional[str] = None  # SQLite磁盘缓存路径，如 cache/ai_responses.db，为空则只用内存
+    AI_CACHE_DISK_MAX_MB: int = 100
+    AI_CACHE_DISABLED_SOURCES: list[str] = ["user_chat"]  # 不走缓存的调用来源
+    # API调用计费日志（先进内存缓冲，按时间/条数批量写库）
+    API_CALL_LOG_BUFFERED: bool = True  # 关闭后每次调用同步写库
+    API_CALL_LOG_FLUSH_INTERVAL: float = 2.0  # 秒
+    API_CALL_LOG_BATCH_SIZE: int = 200  # 缓冲达到该条数时提前写库
+    API_CALL_LOG_MAX_BUFFER: int = 10000  # 写库持续失败时最多保留的条数，超出丢弃最旧的
+    STATS_UTC_OFFSET_HOURS: int = 8  # 统计图表按该时区分桶（数据库时间按UTC存储），默认北京时间
+    API_CALL_LOG_RETENTION_DAYS: int = 0  # 原始调用日志保留天数（更早的只保留汇总），0 表示不清理
+
+    # PDF学习报告（后台进程池生成，按数据指纹缓存）
+    REPORT_DIR: str = "reports"
+    REPORT_MAX_WORKERS: int = 2  # 生成报告的子进程数
+    REPORT_JOB_TTL: int = 3600  # 已结束的任务记录保留秒数
+    REPORT_WAIT_TIMEOUT: float = 60.0  # 兼容接口 GET /report/{user_id} 等待生成的最长秒数
+    REPORT_MAX_AGE_DAYS: int = 7  # 报告文件保留天数（按最后一次使用时间）
+    REPORT_MAX_TOTAL_MB: int = 200  # 报告目录总大小上限，超出时先删最久未用的
+    PDF_FONT_PATHS: list[str] = []  # 优先使用的中文字体文件（TTF/TTC），为空时自动查找系统字体
+
+    # 试卷导出的LaTeX公式渲染缓存
+    FORMULA_CACHE_DIR: Optional[str] = "cache/formulas"  # 公式图片磁盘缓存目录，为空则只用内存
+    FORMULA_CACHE_MAX_MB: int = 50
+    FORMULA_CACHE_MAX_ENTRIES: int = 1024  # 内存LRU条目上限
+    FORMULA_RENDER_WORKERS: int = 0  # 大于1时用进程池并行渲染未缓存的公式
+
+    # 试卷导出（独立进程池渲染，排队超过上限时返回429）
+    EXPORT_MAX_WORKERS: int = 2  # 导出子进程数
+    EXPORT_MAX_QUEUE: int = 8  # 进程都忙时最多排队的导出数
+    EXPORT_TIMEOUT: float = 120.0  # 单次导出最长等待秒数
+    EXPORT_CACHE_DIR: Optional[str] = "cache/exports"  # 导出文件缓存目录，为空则不缓存
+    EXPORT_CACHE_MAX_MB: int = 500  # 缓存目录总大小上限，超出时淘汰最久未用的
+
+    # 知识图谱响应缓存（进程内，已编码的JSON字节）
+    GRAPH_CACHE_MAX_MB: int = 64
+    GRAPH_CACHE_GZIP: bool = True  # 较大的图谱以gzip形式缓存，客户端支持时直接返回
+    GRAPH_GZIP_MIN_BYTES: int = 1024  # 小于该大小不压缩
+
+    # 组卷配置
+    PAPER_BATCH_CONCURRENCY: int = 3  # 分批生成时同时调用AI的批次数
+    PAPER_BATCH_TOPUP_ROUNDS: int = 1  # 批次题目不足时的补生成轮数
+    
+    # 知识图谱生成（长资料分块抽取后合并）
+    LEARNING_MAP_MAX_SOURCE_CHARS: int = 2_000_000  # 上传资料保存的最大文本长度（约300页以上的教材）
+    LEARNING_MAP_CHUNK_CHARS: int = 6000  # 每个分块的字符数
+    LEARNING_MAP_CHUNK_OVERLAP: int = 300  # 相邻分块重叠的字符数
+    LEARNING_MAP_MAX_CHUNKS: int = 60  # 分块数上限，超过时在全文范围内均匀抽样
+    LEARNING_MAP_CONCURRENCY: int = 4  # 同时调用AI抽取的分块数
+    LEARNING_MAP_MAX_NODES: int = 150  # 合并后保留的节点上限
+    LEARNING_MAP_MAX_JOBS: int = 2  # 同时运行的图谱生成任务数，其余排队
+    LEARNING_MAP_JOB_TTL: int = 3600  # 已结束的生成任务记录保留秒数
+    LEARNING_MAP_WAIT_TIMEOUT: float = 150.0  # 兼容接口 POST /generate 等待生成的最长秒数（需小于前端180秒超时）
+    
+    # 文件解析（逐页提取，读够所需字符数即停止）
+    FILE_PARSE_PDF_WORKERS: int = 0  # 大于1时大PDF按页段在进程池中并行提取
+    FILE_PARSE_PDF_PARALLEL_MIN_PAGES: int = 64  # 页数达到该值才并行
+    FILE_PARSE_PDF_PAGES_PER_TASK: int = 16  # 每个并行任务提取的页数
+    FILE_PARSE_ENCODING_SAMPLE_BYTES: int = 64 * 1024  # 文本文件检测编码时读取的字节数
     
     # 文件上传配置
     UPLOAD_DIR: str = "uploads"
+    UPLOAD_STORE_DIR: str = "uploads/store"  # 按内容哈希去重保存的上传文件及解析缓存
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: list[str] = [".pdf", ".docx", ".pptx", ".txt", ".md"]
     
     # 日志配置
     LOG_DIR: str = "logs"
     LOG_LEVEL: str = "INFO"
+    LOG_SINK: str = "both"  # 日志输出位置：stdout / file / both
+    LOG_FORMAT: str = "text"  # text 或 json（访问日志始终为JSON行）
+    LOG_ACCESS_SAMPLE_RATES: dict[str, float] = {"/health": 0.01}  # 路由前缀 -> 访问日志采样比例
+    LOG_SLOW_REQUEST_MS: int = 1000  # 超过该耗时的请求不参与采样，总是记录
     
     # CORS配置
     CORS_ORIGINS: list[str] = ["*"]
@@ -2,14 +2,21 @@
 日志模块
 作者：智学伴开发团队
 目的：统一日志配置和管理
-环境变量：LOG_DIR, LOG_LEVEL
-测试：直接运行查看日志输出
+     所有日志先进入内存队列（QueueHandler），由后台线程（QueueListener）写入控制台/文件，
+     请求处理与事件循环中不做任何文件I/O；访问日志为结构化JSON行，高频路由可按比例采样
+环境变量：LOG_DIR, LOG_LEVEL, LOG_SINK, LOG_FORMAT, LOG_ACCESS_SAMPLE_RATES
+测试：pytest backend/tests/test_logger.py
 """
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-import os
 from pathlib import Path
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 from core.config import settings
 
 # 确保日志目录存在
@@ -20,47 +27,150 @@ log_dir.mkdir(exist_ok=True)
 log_file = log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log"
 error_log_file = log_dir / f"error_{datetime.now().strftime('%Y%m%d')}.log"
 
+# 访问日志记录器（zhixueban 的子记录器，共用同一个队列和输出）
+ACCESS_LOGGER_NAME = "zhixueban.access"
+
+# 后台写日志的监听线程
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    输出格式化器
+    - 访问日志及 LOG_FORMAT=json 时输出单行JSON（附带 extra 传入的 fields）
+    - 其余情况沿用文本格式
+    """
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None)
+        if not self.json_lines and fields is None:
+            return super().format(record)
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _build_sink_handlers() -> List[logging.Handler]:
+    """根据 LOG_SINK 创建实际输出的handler（只在后台线程中被调用）"""
+    sink = settings.LOG_SINK.lower()
+    formatter = StructuredFormatter(json_lines=settings.LOG_FORMAT.lower() == "json")
+    handlers: List[logging.Handler] = []
+
+    if sink in ("stdout", "both"):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    if sink in ("file", "both"):
+        # 文件输出（所有日志）
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+        # 错误日志单独文件
+        error_handler = logging.FileHandler(error_log_file, encoding='utf-8')
+        error_handler.setLevel(logging.ERROR)
+        error_handler.setFormatter(formatter)
+        handlers.append(error_handler)
+
+    return handlers
+
 
 def setup_logger(name: str = "zhixueban") -> logging.Logger:
     """设置日志记录器"""
+    global _listener
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
-    
+
     # 避免重复添加handler
     if logger.handlers:
         return logger
-    
-    # 日志格式
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_build_sink_handlers(), respect_handler_level=True
     )
-    
-    # 控制台输出
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
-    # 文件输出（所有日志）
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    # 确保立即刷新到文件
-    file_handler.stream.reconfigure(line_buffering=True) if hasattr(file_handler.stream, 'reconfigure') else None
-    logger.addHandler(file_handler)
-    
-    # 错误日志单独文件
-    error_handler = logging.FileHandler(error_log_file, encoding='utf-8')
-    error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(formatter)
-    # 确保立即刷新到文件
-    error_handler.stream.reconfigure(line_buffering=True) if hasattr(error_handler.stream, 'reconfigure') else None
-    logger.addHandler(error_handler)
-    
+    _listener.start()
+    atexit.register(stop_logging)
+
     return logger
 
 
+def stop_logging():
+    """停止后台线程并写完队列中剩余的日志（应用关闭时调用）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def _sample_rate(path: str) -> float:
+    """按最长前缀匹配 LOG_ACCESS_SAMPLE_RATES，未配置的路由全部记录"""
+    best_prefix = ""
+    rate = 1.0
+    for prefix, prefix_rate in settings.LOG_ACCESS_SAMPLE_RATES.items():
+        if path.startswith(prefix) and len(prefix) > len(best_prefix):
+            best_prefix, rate = prefix, prefix_rate
+    return rate
+
+
+def log_access(
+    method: str,
+    path: str,
+    status: int,
+    latency_ms: float,
+    user_id: Optional[int] = None,
+    provider: Optional[str] = None,
+    client: Optional[str] = None,
+):
+    """
+    记录一条结构化访问日志
+
+    错误响应（>=500）和慢请求（>= LOG_SLOW_REQUEST_MS）总是记录，其余按路由采样
+    """
+    always = status >= 500 or latency_ms >= settings.LOG_SLOW_REQUEST_MS
+    if not always:
+        rate = _sample_rate(path)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return
+    level = logging.ERROR if status >= 500 else logging.INFO
+    access_logger.log(
+        level,
+        "%s %s %s",
+        method,
+        path,
+        status,
+        extra={"fields": {
+            "method": method,
+            "path": path,
+            "status": status,
+            "latency_ms": round(latency_ms, 2),
+            "user_id": user_id,
+            "provider": provider,
+            "client": client,
+        }},
+    )
+
+
 # 全局日志实例
 logger = setup_logger()
-
+access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from cryptography.fernet import Fernet
@@ -17,8 +17,9 @@ import base64
 import hashlib
 
 from core.config import settings
-from database import get_db
+from database import get_async_db, AsyncDBSession
 from models.users import User
+from repositories.user_repo import UserRepository
 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -93,8 +94,9 @@ def decrypt_api_key(encrypted_key: str) -> str:
 
 
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncDBSession = Depends(get_async_db)
 ) -> User:
     """获取当前登录用户（用于依赖注入）"""
     credentials_exception = HTTPException(
@@ -110,9 +112,11 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await UserRepository.aget_by_id(db, int(user_id))
     if user is None:
         raise credentials_exception
+    # 供访问日志记录用户ID
+    request.state.user_id = user.id
     return user
 
 
@@ -128,7 +132,6 @@ async def get_current_admin(
         # 如果不是admin，检查是否是第一个用户
         from sqlalchemy.orm import Session
         from database import SessionLocal
-        from repositories.user_repo import UserRepository
         db = SessionLocal()
         try:
             first_user = UserRepository.get_all(db, skip=0, limit=1)
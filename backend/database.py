@@ -1,36 +1,209 @@
 """
 数据库连接配置
 作者：智学伴开发团队
-目的：统一数据库连接配置，支持SQLite和MySQL
+目的：统一数据库连接配置，支持SQLite和MySQL/SQL Server；引擎参数（SQL日志、连接池、SQLite PRAGMA）由配置决定；
+     热点只读接口另有异步会话（aiosqlite/asyncmy），未安装异步驱动时退化为在线程池中执行同步会话
 默认使用SQLite（zhixueban.db）
+环境变量：DATABASE_URL, ASYNC_DATABASE_URL, DB_ASYNC_ENABLED, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT,
+         SQLITE_WAL, SQLITE_BUSY_TIMEOUT_MS, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE_MB
+测试：pytest backend/tests/test_database.py
 """
-from sqlalchemy import create_engine
+import importlib.util
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Optional, Union
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, Result, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from core.config import settings
+from core.logger import logger
+
+# 同步驱动 -> 异步驱动（URL中的 +driver 部分），以及异步驱动对应的Python模块
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "mysql": "asyncmy",
+    "mariadb": "asyncmy",
+    "postgresql": "asyncpg",
+    "mssql": "aioodbc",
+}
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    database = parsed.database or ""
+    return database in ("", ":memory:") or "mode=memory" in url
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """根据数据库类型生成 create_engine 参数"""
+    options: Dict[str, Any] = {"echo": settings.DB_ECHO}
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite需要check_same_thread=False（FastAPI多线程）；timeout 与 busy_timeout 一致（秒）
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    else:
+        # MySQL/SQL Server等：连接池大小与回收时间（避免使用被服务端断开的连接）
+        options.update(
+            pool_pre_ping=True,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def sqlite_pragmas(memory: bool = False) -> Dict[str, Any]:
+    """每个SQLite连接建立时执行的 PRAGMA（内存库不使用 WAL 和 mmap）"""
+    pragmas: Dict[str, Any] = {
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # 负数表示按KB计
+    }
+    if not memory:
+        if settings.SQLITE_WAL:
+            # WAL：读写互不阻塞，多个写请求排队等待而不是立即报 database is locked
+            pragmas["journal_mode"] = "WAL"
+        pragmas["mmap_size"] = settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024
+    return pragmas
+
+
+def _install_sqlite_pragmas(engine: Engine, pragmas: Dict[str, Any]) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: Optional[str] = None, **overrides: Any) -> Engine:
+    """
+    按配置创建数据库引擎
+
+    Args:
+        url: 数据库URL，默认使用 DATABASE_URL
+        overrides: 覆盖 create_engine 的参数（测试用，如 poolclass）
+    """
+    url = url or settings.DATABASE_URL
+    options = engine_options(url)
+    options.update(overrides)
+    engine = create_engine(url, **options)
+    if engine.dialect.name == "sqlite":
+        _install_sqlite_pragmas(engine, sqlite_pragmas(memory=_is_memory_sqlite(url)))
+    return engine
+
+
+def async_database_url(url: str) -> str:
+    """把同步数据库URL换成对应的异步驱动（已是异步驱动时原样返回）"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"不支持异步访问的数据库类型: {backend}")
+    if parsed.get_driver_name() == driver:
+        return url
+    return parsed.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+def async_driver_available(url: str) -> bool:
+    """异步URL所需的驱动是否已安装"""
+    driver = make_url(url).get_driver_name()
+    return importlib.util.find_spec(driver) is not None
+
+
+def create_async_db_engine(url: Optional[str] = None, **overrides: Any):
+    """
+    按配置创建异步数据库引擎（参数与同步引擎一致，SQLite 同样在建连时设置 PRAGMA）
+
+    Args:
+        url: 数据库URL（同步或异步写法均可），默认使用 ASYNC_DATABASE_URL / DATABASE_URL
+        overrides: 覆盖 create_async_engine 的参数
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_database_url(url or settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+    options = engine_options(url)
+    if "connect_args" in options:
+        # aiosqlite 在自己的线程里访问连接，不需要 check_same_thread
+        options["connect_args"] = {"timeout": options["connect_args"]["timeout"]}
+    options.update(overrides)
+    engine = create_async_engine(url, **options)
+    if engine.dialect.name == "sqlite":
+        _install_sqlite_pragmas(engine.sync_engine, sqlite_pragmas(memory=_is_memory_sqlite(url)))
+    return engine
+
+
+class ThreadedSession:
+    """
+    同步会话的异步外观：提供只读接口用到的 AsyncSession 方法子集，每次调用放到线程池执行
+
+    未安装异步驱动时由 get_async_db 返回，使异步仓储方法在两种会话上写法一致；
+    execute 返回已缓冲的结果，之后读取行不会再访问数据库
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def execute(self, statement: Any, params: Optional[Dict[str, Any]] = None) -> Result:
+        def _execute():
+            return self.sync_session.execute(statement, params).freeze()
+
+        frozen = await run_in_threadpool(_execute)
+        return frozen()
+
+    async def scalar(self, statement: Any, params: Optional[Dict[str, Any]] = None) -> Any:
+        return await run_in_threadpool(self.sync_session.scalar, statement, params)
+
+    async def get(self, entity: Any, ident: Any) -> Any:
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def run_sync(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
 
 # 从配置读取数据库URL（默认使用SQLite）
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-# SQLite特殊配置
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    # SQLite需要check_same_thread=False（FastAPI多线程）
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False},  # SQLite多线程支持
-        echo=True,  # 设置为 False 可关闭 SQL 日志
-    )
-else:
-    # MySQL/PostgreSQL等其他数据库
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        echo=True,  # 设置为 False 可关闭 SQL 日志
-        pool_pre_ping=True,  # 连接池预检查
-    )
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
 # 创建 SessionLocal 类
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎：配置开启且已安装异步驱动时创建，否则为 None（get_async_db 退化为线程池中的同步会话）
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC_ENABLED:
+    _async_url = async_database_url(settings.ASYNC_DATABASE_URL or SQLALCHEMY_DATABASE_URL)
+    if async_driver_available(_async_url):
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async_engine = create_async_db_engine(_async_url)
+        # expire_on_commit=False：提交后仍可读取已加载的属性，避免在异步会话中触发隐式IO
+        AsyncSessionLocal = async_sessionmaker(
+            bind=async_engine, autoflush=False, expire_on_commit=False
+        )
+    else:
+        logger.info(f"未安装异步数据库驱动（{make_url(_async_url).get_driver_name()}），异步会话使用线程池执行")
+
+# 异步仓储方法接受的会话类型
+AsyncDBSession = Union["AsyncSession", ThreadedSession]
+
 # 创建 Base 类，用于模型继承
 Base = declarative_base()
 
@@ -48,5 +221,24 @@ def get_db():
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncDBSession]:
+    """
+    获取异步数据库会话（热点只读接口使用）
+    有异步引擎时返回 AsyncSession，否则返回包装同步会话的 ThreadedSession
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+    db = ThreadedSession(SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
 # 导出常用对象
-__all__ = ["engine", "SessionLocal", "Base", "get_db"]
+__all__ = [
+    "engine", "SessionLocal", "Base", "get_db", "create_db_engine",
+    "async_engine", "AsyncSessionLocal", "get_async_db", "create_async_db_engine", "ThreadedSession",
+]
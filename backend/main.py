@@ -2,35 +2,22 @@
 智学伴 AI个性化学习平台 - 后端主程序
 FastAPI 应用入口
 """
-import logging
-import sys
+import asyncio
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
 from routers import auth, ai, files, plan, quiz, analytics, admin, learning_map, chat
-from core.logger import logger, log_file, error_log_file
+from core.config import settings
+from core.logger import logger, log_file, error_log_file, log_access, stop_logging
 from core.security_middleware import SecurityMiddleware
 
-# 配置日志系统
-# 注意：core.logger 已经在导入时配置好了，直接使用即可
-# 确保根logger也使用相同的配置（这样所有子logger都会继承文件输出）
-root_logger = logging.getLogger()
-# 不设置propagate=False，让子logger的日志传播到根logger
-# 这样core.logger.logger的日志会同时写入自己的handlers和根logger的handlers
-
-# 启动时写入测试日志（使用core.logger.logger，它已经有文件handler）
+# 启动信息（日志经队列由后台线程写出，输出位置由 LOG_SINK 配置）
 logger.info("="*60)
 logger.info("后端服务启动")
-logger.info(f"日志文件: {log_file}")
+logger.info(f"日志输出: {settings.LOG_SINK}，日志文件: {log_file}")
 logger.info(f"错误日志文件: {error_log_file}")
-logger.info(f"Logger handlers数量: {len(logger.handlers)}")
-for i, handler in enumerate(logger.handlers):
-    logger.info(f"Handler {i+1}: {type(handler).__name__} - Level: {handler.level}")
 logger.info("="*60)
-sys.stdout.write(f"\n[启动] 日志文件路径: {log_file}\n")
-sys.stdout.write(f"[启动] 错误日志文件路径: {error_log_file}\n")
-sys.stdout.write(f"[启动] Logger handlers数量: {len(logger.handlers)}\n")
-sys.stdout.flush()
 
 # 创建 FastAPI 应用实例
 app = FastAPI(
@@ -54,110 +41,24 @@ app.add_middleware(
 # 添加请求日志中间件
 @app.middleware("http")
 async def log_requests(request, call_next):
-    """记录所有HTTP请求"""
-    import time
-    import sys
-    
-    # 使用项目logger（包含文件输出）
-    # 注意：在函数内部导入，确保logger已经初始化
-    from core.logger import logger as app_logger, log_file
-    
-    start_time = time.time()
-    path = request.url.path
-    method = request.method
-    client = request.client.host if request.client else 'unknown'
-    
-    # 多种方式输出，确保能看到
-    try:
-        # 方式1: sys.stdout.write（控制台输出）
-        sys.stdout.write(f"\n{'='*60}\n")
-        sys.stdout.write(f"[REQUEST] {method} {path}\n")
-        sys.stdout.write(f"[REQUEST] 客户端: {client}\n")
-        sys.stdout.write(f"{'='*60}\n\n")
-        sys.stdout.flush()
-        
-        # 方式2: print with flush（备用控制台输出）
-        print(f"[REQUEST-PRINT] {method} {path} - 客户端: {client}", flush=True)
-        
-        # 方式3: logger（写入文件和控制台）
-        # 确保logger有handlers
-        if app_logger.handlers:
-            app_logger.info(f"[REQUEST-LOG] {method} {path} - 客户端: {client}")
-        else:
-            # 如果logger没有handlers，直接写入文件
-            import logging
-            root_logger = logging.getLogger()
-            if root_logger.handlers:
-                root_logger.info(f"[REQUEST-LOG] {method} {path} - 客户端: {client}")
-        
-        # 方式4: 直接写入文件（备用方案）
-        try:
-            from datetime import datetime
-            log_entry = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - zhixueban - INFO - [REQUEST-LOG] {method} {path} - 客户端: {client}\n"
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(log_entry)
-                f.flush()
-        except Exception as direct_write_err:
-            sys.stdout.write(f"[WARNING] 直接写入日志文件失败: {direct_write_err}\n")
-            sys.stdout.flush()
-    except Exception as e:
-        # 如果输出失败，至少记录错误
-        try:
-            app_logger.error(f"日志输出失败: {e}")
-        except:
-            pass
-    
+    """记录请求访问日志（结构化JSON行，经日志队列由后台线程写出）"""
+    start_time = time.perf_counter()
+    status_code = 500
     try:
         response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        # 控制台输出
-        sys.stdout.write(f"[RESPONSE] {method} {path} - 状态码: {response.status_code} - 耗时: {process_time:.3f}s\n")
-        sys.stdout.flush()
-        print(f"[RESPONSE-PRINT] {method} {path} - 状态码: {response.status_code} - 耗时: {process_time:.3f}s", flush=True)
-        
-        # 文件日志
-        if app_logger.handlers:
-            app_logger.info(f"[RESPONSE-LOG] {method} {path} - 状态码: {response.status_code} - 耗时: {process_time:.3f}s")
-        else:
-            import logging
-            root_logger = logging.getLogger()
-            if root_logger.handlers:
-                root_logger.info(f"[RESPONSE-LOG] {method} {path} - 状态码: {response.status_code} - 耗时: {process_time:.3f}s")
-        
-        # 直接写入文件（备用方案）
-        try:
-            from datetime import datetime
-            log_entry = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - zhixueban - INFO - [RESPONSE-LOG] {method} {path} - 状态码: {response.status_code} - 耗时: {process_time:.3f}s\n"
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(log_entry)
-                f.flush()
-        except Exception as direct_write_err:
-            pass
-        
+        status_code = response.status_code
         return response
-    except Exception as e:
-        process_time = time.time() - start_time
-        error_msg = f"[ERROR] {method} {path} - 错误: {str(e)} - 耗时: {process_time:.3f}s"
-        
-        # 控制台输出
-        sys.stdout.write(error_msg + "\n")
-        sys.stdout.flush()
-        print(error_msg, flush=True)
-        
-        # 文件日志
-        try:
-            if app_logger.handlers:
-                app_logger.error(error_msg)
-            else:
-                import logging
-                root_logger = logging.getLogger()
-                if root_logger.handlers:
-                    root_logger.error(error_msg)
-        except:
-            pass
-        
-        raise
+    finally:
+        path_params = request.scope.get("path_params") or {}
+        log_access(
+            method=request.method,
+            path=request.url.path,
+            status=status_code,
+            latency_ms=(time.perf_counter() - start_time) * 1000,
+            user_id=getattr(request.state, "user_id", None) or path_params.get("user_id"),
+            provider=getattr(request.state, "ai_provider", None),
+            client=request.client.host if request.client else None,
+        )
 
 # 自动创建数据库表
 @app.on_event("startup")
@@ -176,6 +77,9 @@ async def startup_event():
         try:
             from services.schema_migration_service import SchemaMigrationService
             SchemaMigrationService.ensure_learning_map_history_schema()
+            SchemaMigrationService.ensure_api_call_log_schema()
+            SchemaMigrationService.ensure_chat_schema()
+            SchemaMigrationService.ensure_quiz_indexes()
         except Exception as migration_exc:  # pylint: disable=broad-except
             logger.error("自动迁移知识图谱 schema 失败: %s", migration_exc, exc_info=True)
         
@@ -205,6 +109,28 @@ async def startup_event():
         finally:
             db.close()
         
+        # 首次升级时从原始日志回填API调用汇总，并按保留天数清理原始日志
+        db = SessionLocal()
+        try:
+            from services.api_call_rollup_service import APICallRollupService
+            APICallRollupService.ensure_backfilled(db)
+            APICallRollupService.compact(db)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"API调用汇总维护失败: {e}", exc_info=True)
+        finally:
+            db.close()
+        
+        # 后台预加载PDF中文字体，首次导出不再等待字体解析
+        from utils.font_registry import font_registry
+        asyncio.get_running_loop().run_in_executor(None, font_registry.warmup)
+        
+        # 清理过期/超量的PDF报告文件
+        try:
+            from utils.report_jobs import report_job_manager
+            report_job_manager.collect_garbage()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"清理PDF报告文件失败: {e}", exc_info=True)
+        
         # 检查是否有管理员用户
         from database import SessionLocal
         from repositories.user_repo import UserRepository
@@ -222,6 +148,28 @@ async def startup_event():
         print("⚠️  请确保 SQL Server 已启动，或跳过数据库功能测试 AI 功能")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """关闭时释放AI提供商的长连接，取消未完成的知识图谱生成任务，停止报告/公式渲染/导出/PDF解析进程池，写完缓冲的API调用日志和日志队列"""
+    from utils.model_registry import registry
+    from utils.openai_client import aclose_clients
+    from utils.api_call_recorder import api_call_recorder
+    from utils.report_jobs import report_job_manager
+    from utils.learning_map_jobs import learning_map_job_manager
+    from utils.formula_renderer import formula_renderer
+    from utils.export_pool import export_pool
+    from utils.file_parser import pdf_page_pool
+    await registry.aclose()
+    await aclose_clients()
+    report_job_manager.shutdown()
+    learning_map_job_manager.shutdown()
+    formula_renderer.shutdown()
+    export_pool.shutdown()
+    pdf_page_pool.shutdown()
+    api_call_recorder.stop()
+    stop_logging()
+
+
 # 注册路由
 app.include_router(auth.router)
 app.include_router(ai.router)
@@ -242,9 +190,6 @@ async def root():
     
     返回基本信息
     """
-    import sys
-    sys.stdout.write("[TEST] 根路由被访问\n")
-    sys.stdout.flush()
     return {
         "message": "欢迎使用智学伴 AI个性化学习平台！",
         "version": "1.0.0",
@@ -259,11 +204,6 @@ async def root():
 @app.get("/test")
 async def test_endpoint():
     """测试端点，验证请求是否到达后端"""
-    import sys
-    sys.stdout.write("\n" + "="*60 + "\n")
-    sys.stdout.write("[TEST] 测试端点被访问\n")
-    sys.stdout.write("="*60 + "\n\n")
-    sys.stdout.flush()
     return {"status": "ok", "message": "后端正常工作"}
 
 
@@ -274,6 +214,13 @@ async def health_check():
     return {"status": "ok", "message": "服务运行正常"}
 
 
+@app.get("/health/fonts")
+async def font_health_check():
+    """PDF中文字体健康检查"""
+    from utils.font_registry import font_registry
+    return font_registry.health()
+
+
 # 运行程序
 if __name__ == "__main__":
     import uvicorn
@@ -7,6 +7,8 @@ from .quizzes import Quiz
 from .prompt import Prompt
 from .model_config import ModelConfig
 from .api_call_log import APICallLog
+from .api_call_rollup import APICallRollup
+from .learner_stats import UserQuizStats, UserTopicStats, UserMonthlyStats
 from .learning_map import LearningMapFile, LearningNode, LearningEdge
 
 __all__ = [
@@ -16,6 +18,10 @@ __all__ = [
     "Prompt",
     "ModelConfig",
     "APICallLog",
+    "APICallRollup",
+    "UserQuizStats",
+    "UserTopicStats",
+    "UserMonthlyStats",
     "LearningMapFile",
     "LearningNode",
     "LearningEdge",
@@ -15,6 +15,13 @@ class APICallLog(Base):
     provider = Column(String(64), nullable=True)
     source = Column(String(32), nullable=False, default="user")  # user/admin_test等
     success = Column(Boolean, default=True)
+    cache_hit = Column(Boolean, default=False, nullable=False, server_default="0")  # 命中响应缓存（未产生付费调用）
+    user_id = Column(Integer, nullable=True, index=True)  # 发起调用的用户（后台任务/匿名调用为空）
+    model = Column(String(128), nullable=True)  # 实际使用的模型名
+    latency_ms = Column(Integer, nullable=True)  # 调用耗时（毫秒）
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    total_tokens = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
@@ -0,0 +1,39 @@
+"""
+API调用汇总模型
+作者：智学伴开发团队
+目的：按小时/按天预聚合的API调用统计，管理后台看板只读这张小表，不再扫描原始日志
+"""
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, UniqueConstraint
+from database import Base
+
+
+class APICallRollup(Base):
+    """
+    API调用汇总表
+
+    每行是一个时间桶内某个 (provider, source, success, cache_hit) 组合的累计值：
+    - period = "hour"：bucket_start 为该小时起点（UTC）
+    - period = "day"：bucket_start 为统计时区当天零点对应的UTC时间（见 STATS_UTC_OFFSET_HOURS）
+    """
+    __tablename__ = "api_call_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(8), nullable=False)  # hour / day
+    bucket_start = Column(DateTime, nullable=False)
+    provider = Column(String(64), nullable=False, default="")  # 原始日志 provider 为空时记为空串
+    source = Column(String(32), nullable=False, default="user")
+    success = Column(Boolean, nullable=False, default=True)
+    cache_hit = Column(Boolean, nullable=False, default=False)
+    call_count = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_sum = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "period", "bucket_start", "provider", "source", "success", "cache_hit",
+            name="uq_api_call_rollups_bucket",
+        ),
+    )
+
+
+__all__ = ["APICallRollup"]
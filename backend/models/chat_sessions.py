@@ -3,7 +3,7 @@
 作者：智学伴开发团队
 目的：存储用户的AI对话记录，支持跨设备同步
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -25,6 +25,11 @@ class ChatSession(Base):
     # 关联消息
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan", order_by="ChatMessage.created_at")
     
+    # 会话列表按用户过滤并按更新时间倒序分页
+    __table_args__ = (
+        Index("ix_chat_sessions_user_updated", "user_id", "updated_at"),
+    )
+    
     def __repr__(self):
         return f"<ChatSession(id={self.id}, user_id={self.user_id}, title={self.title[:30]}...)>"
 
@@ -41,11 +46,17 @@ class ChatMessage(Base):
     role = Column(String(20), nullable=False, comment="消息角色：user 或 ai")
     content = Column(Text, nullable=False, comment="消息内容")
     provider = Column(String(50), nullable=True, comment="使用的AI模型提供商（仅AI消息）")
+    seq = Column(Integer, nullable=True, comment="客户端序号（会话内唯一，追加消息时用于幂等去重）")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="创建时间")
     
     # 关联会话
     session = relationship("ChatSession", back_populates="messages")
     
+    # SQL Server 的唯一索引只允许一个 NULL，旧版消息（seq 为空）需用筛选索引排除
+    __table_args__ = (
+        Index("uq_chat_messages_session_seq", "session_id", "seq", unique=True, mssql_where=seq.isnot(None)),
+    )
+    
     def __repr__(self):
         return f"<ChatMessage(id={self.id}, session_id={self.session_id}, role={self.role})>"
 
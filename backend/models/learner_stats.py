@@ -0,0 +1,53 @@
+"""
+学习统计汇总模型
+作者：智学伴开发团队
+目的：按用户增量维护测评统计（总体、按主题、按月），学习分析页直接读取，不再遍历全部测评记录
+"""
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+
+
+class UserQuizStats(Base):
+    """用户测评总体统计（每个用户一行）"""
+    __tablename__ = "user_quiz_stats"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False, comment="用户ID")
+    quiz_count = Column(Integer, nullable=False, default=0, comment="测评次数")
+    score_sum = Column(Integer, nullable=False, default=0, comment="得分总和")
+    max_score = Column(Integer, nullable=True, comment="最高分")
+    min_score = Column(Integer, nullable=True, comment="最低分")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class UserTopicStats(Base):
+    """用户按主题的测评统计"""
+    __tablename__ = "user_topic_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True, comment="用户ID")
+    topic = Column(String(255), nullable=False, default="", comment="测验主题（未填写为空串）")
+    quiz_count = Column(Integer, nullable=False, default=0, comment="测评次数")
+    score_sum = Column(Integer, nullable=False, default=0, comment="得分总和")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "topic", name="uq_user_topic_stats"),
+    )
+
+
+class UserMonthlyStats(Base):
+    """用户按月的测评统计"""
+    __tablename__ = "user_monthly_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True, comment="用户ID")
+    month = Column(String(7), nullable=False, comment="月份（YYYY-MM）")
+    quiz_count = Column(Integer, nullable=False, default=0, comment="测评次数")
+    score_sum = Column(Integer, nullable=False, default=0, comment="得分总和")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", name="uq_user_monthly_stats"),
+    )
+
+
+__all__ = ["UserQuizStats", "UserTopicStats", "UserMonthlyStats"]
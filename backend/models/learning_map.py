@@ -11,9 +11,13 @@ from sqlalchemy import (
     DateTime,
     func,
 )
+from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.orm import relationship
 from database import Base
 
+# 整本教材的文本（最多 LEARNING_MAP_MAX_SOURCE_CHARS 字符），MySQL 的 TEXT 只有 64KB，需要 LONGTEXT
+LongText = Text().with_variant(LONGTEXT(), "mysql", "mariadb")
+
 
 class LearningMapFile(Base):
     """学习资料原始文本"""
@@ -23,7 +27,7 @@ class LearningMapFile(Base):
     user_id = Column(Integer, index=True, nullable=False)
     file_path = Column(String(255), nullable=False)
     original_name = Column(String(255), nullable=True)
-    raw_text = Column(Text, nullable=True)
+    raw_text = Column(LongText, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     nodes = relationship("LearningNode", back_populates="source_file")
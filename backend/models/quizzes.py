@@ -1,7 +1,7 @@
 """
 测评数据模型
 """
-from sqlalchemy import Column, Integer, Text, DateTime
+from sqlalchemy import Column, Integer, Text, DateTime, Index
 from sqlalchemy.sql import func
 from database import Base
 
@@ -19,6 +19,11 @@ class Quiz(Base):
     explanations = Column(Text, nullable=False, comment="讲解内容（JSON字符串）")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     
+    # 学习分析按用户取最近几次得分
+    __table_args__ = (
+        Index("ix_quizzes_user_created", "user_id", "created_at"),
+    )
+    
     def __repr__(self):
         return f"<Quiz(id={self.id}, user_id={self.user_id}, topic={self.topic}, score={self.score})>"
 
@@ -3,11 +3,15 @@ API调用日志仓储
 作者：智学伴开发团队
 目的：封装API调用日志的数据库操作
 """
-from datetime import datetime, time, timedelta
+from datetime import datetime, time, timedelta, timezone
+from types import SimpleNamespace
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import func, cast, Date, extract
+from sqlalchemy import func, cast, Date, extract, insert
+from core.config import settings
 from models.api_call_log import APICallLog
+from utils.sql_time import time_bucket
+from repositories.api_call_rollup_repo import APICallRollupRepository, PERIOD_DAY, PERIOD_HOUR
 
 
 class APICallRepository:
@@ -18,40 +22,100 @@ class APICallRepository:
         db: Session,
         provider: Optional[str],
         source: str = "user",
-        success: bool = True
+        success: bool = True,
+        cache_hit: bool = False,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+        latency_ms: Optional[int] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        total_tokens: Optional[int] = None,
     ) -> APICallLog:
+        """立即写入一条调用日志（请求路径中请改用 utils.api_call_recorder 缓冲写入）"""
         log = APICallLog(
             provider=provider,
             source=source,
-            success=success
+            success=success,
+            cache_hit=cache_hit,
+            user_id=user_id,
+            model=model,
+            latency_ms=latency_ms,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=total_tokens,
         )
         db.add(log)
-        db.commit()
+        db.flush()
         db.refresh(log)
+        APICallRollupRepository.apply(
+            db,
+            [{"created_at": log.created_at, "provider": provider, "source": source, "success": success,
+              "cache_hit": cache_hit, "latency_ms": latency_ms, "total_tokens": total_tokens}],
+            settings.STATS_UTC_OFFSET_HOURS,
+        )
+        db.commit()
         return log
 
     @staticmethod
-    def count_total(db: Session) -> int:
-        """统计总调用次数"""
-        return db.query(func.count(APICallLog.id)).scalar() or 0
+    def bulk_insert(db: Session, rows: List[Dict[str, Any]]) -> int:
+        """
+        批量写入调用日志（一条 executemany INSERT + 一次提交），返回写入条数
+
+        同一事务内累加小时/天汇总表；rows 需带 created_at
+        """
+        if not rows:
+            return 0
+        db.execute(insert(APICallLog), rows)
+        APICallRollupRepository.apply(db, rows, settings.STATS_UTC_OFFSET_HOURS)
+        db.commit()
+        return len(rows)
 
     @staticmethod
-    def count_today(db: Session) -> int:
-        """统计当天调用次数（按系统本地时区）"""
-        now = datetime.now()
-        today = now.date()
-        start = datetime.combine(today, time.min)
-        end = datetime.combine(today, time.max)
-        return (
+    def count_total(db: Session, cache_hit: Optional[bool] = None, use_rollups: bool = False) -> int:
+        """
+        统计总调用次数（cache_hit 为 True/False 时只统计缓存命中/实际调用）
+
+        use_rollups 为 True 时读取汇总表（管理后台看板使用）
+        """
+        if use_rollups:
+            return APICallRollupRepository.count_calls(db, cache_hit=cache_hit)
+        query = db.query(func.count(APICallLog.id))
+        if cache_hit is not None:
+            query = query.filter(APICallLog.cache_hit == cache_hit)
+        return query.scalar() or 0
+
+    @staticmethod
+    def _today_start_utc() -> datetime:
+        """统计时区（STATS_UTC_OFFSET_HOURS）当天零点对应的UTC时间（naive，与库中按UTC存储的时间比较）"""
+        offset = timedelta(hours=settings.STATS_UTC_OFFSET_HOURS)
+        local_midnight = (datetime.now(timezone.utc) + offset).replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=None
+        )
+        return local_midnight - offset
+
+    @staticmethod
+    def count_today(db: Session, cache_hit: Optional[bool] = None, use_rollups: bool = False) -> int:
+        """统计当天调用次数（按统计时区划分当天；use_rollups 时读取小时汇总）"""
+        start = APICallRepository._today_start_utc()
+        if use_rollups:
+            return APICallRollupRepository.count_calls(db, since=start, cache_hit=cache_hit)
+        query = (
             db.query(func.count(APICallLog.id))
-            .filter(APICallLog.created_at >= start, APICallLog.created_at <= end)
-            .scalar()
-            or 0
+            .filter(APICallLog.created_at >= start, APICallLog.created_at < start + timedelta(days=1))
         )
+        if cache_hit is not None:
+            query = query.filter(APICallLog.cache_hit == cache_hit)
+        return query.scalar() or 0
 
     @staticmethod
-    def get_provider_stats(db: Session) -> List[Dict[str, Any]]:
+    def get_provider_stats(db: Session, use_rollups: bool = False) -> List[Dict[str, Any]]:
         """获取各模型API调用比例统计"""
+        if use_rollups:
+            return [
+                {"name": provider, "value": count}
+                for provider, count in APICallRollupRepository.group_counts(db, "provider")
+                if provider
+            ]
         results = (
             db.query(
                 APICallLog.provider,
@@ -68,22 +132,29 @@ class APICallRepository:
         ]
 
     @staticmethod
-    def get_source_stats(db: Session) -> List[Dict[str, Any]]:
+    def get_source_stats(db: Session, use_rollups: bool = False) -> List[Dict[str, Any]]:
         """获取各功能调用占比统计"""
-        results = (
-            db.query(
-                APICallLog.source,
-                func.count(APICallLog.id).label('count')
+        if use_rollups:
+            results = [
+                SimpleNamespace(source=source, count=count)
+                for source, count in APICallRollupRepository.group_counts(db, "source")
+            ]
+        else:
+            results = (
+                db.query(
+                    APICallLog.source,
+                    func.count(APICallLog.id).label('count')
+                )
+                .group_by(APICallLog.source)
+                .order_by(func.count(APICallLog.id).desc())
+                .all()
             )
-            .group_by(APICallLog.source)
-            .order_by(func.count(APICallLog.id).desc())
-            .all()
-        )
         # 映射 source 到中文名称
         source_names = {
             "user": "用户对话",
             "admin_test": "管理员测试",
             "quiz": "AI测评",
+            "quiz_paper": "智能组卷",
             "learning_map": "知识图谱",
             "study_plan": "学习计划",
         }
@@ -96,107 +167,154 @@ class APICallRepository:
         ]
 
     @staticmethod
-    def get_daily_stats(db: Session, days: int = 7) -> List[Dict[str, Any]]:
-        """获取最近几日的API调用情况（按日期分组，使用系统本地时区）"""
-        now = datetime.now()
-        end_date = now.date()
-        start_date = end_date - timedelta(days=days - 1)
-        
-        # 计算本地时区的开始和结束时间
-        start_datetime = datetime.combine(start_date, time.min)
-        end_datetime = datetime.combine(end_date, time.max)
-        
-        # 获取时间范围内的所有记录
-        logs = (
-            db.query(APICallLog)
-            .filter(
-                APICallLog.created_at >= start_datetime,
-                APICallLog.created_at <= end_datetime
+    def _bucket_expr(db: Session, hourly: bool, offset_hours: int):
+        """按统计时区把 created_at 格式化为分桶键（按天 YYYY-MM-DD / 按小时 YYYY-MM-DD HH）"""
+        return time_bucket(db, APICallLog.created_at, "hour" if hourly else "day", offset_hours)
+
+    @staticmethod
+    def _bucket_counts(
+        db: Session, start_utc: datetime, hourly: bool, offset_hours: int
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        单条 GROUP BY 查询统计各时间桶的调用数、成功/失败数和各模型调用数
+
+        返回 {分桶键: {"count", "success", "failed", "providers": {provider: count}}}，
+        结果行数只与桶数×模型数有关，与日志行数无关
+        """
+        bucket = APICallRepository._bucket_expr(db, hourly, offset_hours).label("bucket")
+        rows = (
+            db.query(
+                bucket,
+                APICallLog.provider,
+                APICallLog.success,
+                func.count(APICallLog.id).label("count"),
             )
+            .filter(APICallLog.created_at >= start_utc)
+            .group_by(bucket, APICallLog.provider, APICallLog.success)
             .all()
         )
-        
-        # 在Python中按本地时区的日期分组统计
-        date_dict = {}
-        for log in logs:
-            # 使用本地时区获取日期
-            if log.created_at.tzinfo is None:
-                # 如果没有时区信息，直接使用（假设是本地时区）
-                log_date = log.created_at.date()
-            else:
-                # 如果有时区信息，转换为本地时区后获取日期
-                log_date = log.created_at.astimezone().replace(tzinfo=None).date()
-            
-            if start_date <= log_date <= end_date:
-                date_dict[log_date] = date_dict.get(log_date, 0) + 1
-        
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            entry = buckets.setdefault(row.bucket, {"count": 0, "success": 0, "failed": 0, "providers": {}})
+            entry["count"] += row.count
+            entry["success" if row.success else "failed"] += row.count
+            provider = row.provider or "未知"
+            entry["providers"][provider] = entry["providers"].get(provider, 0) + row.count
+        return buckets
+
+    @staticmethod
+    def _empty_bucket() -> Dict[str, Any]:
+        return {"count": 0, "success": 0, "failed": 0, "providers": {}}
+
+    @staticmethod
+    def get_daily_stats(db: Session, days: int = 7, use_rollups: bool = False) -> List[Dict[str, Any]]:
+        """获取最近几日的API调用情况（数据库内按统计时区的日期分组；use_rollups 时读取天汇总）"""
+        offset_hours = settings.STATS_UTC_OFFSET_HOURS
+        offset = timedelta(hours=offset_hours)
+        end_date = (datetime.now(timezone.utc) + offset).date()
+        start_date = end_date - timedelta(days=days - 1)
+        # 统计时区当天零点对应的UTC时间，作为范围过滤条件（可走 created_at 索引）
+        start_utc = datetime.combine(start_date, time.min) - offset
+
+        if use_rollups:
+            buckets = APICallRollupRepository.bucket_counts(db, PERIOD_DAY, start_utc, offset_hours)
+        else:
+            buckets = APICallRepository._bucket_counts(db, start_utc, hourly=False, offset_hours=offset_hours)
+
         # 创建完整的日期范围，填充缺失的日期为0
         stats = []
         current_date = start_date
         while current_date <= end_date:
-            stats.append({
-                "date": current_date.strftime("%m-%d"),
-                "count": date_dict.get(current_date, 0)
-            })
+            entry = buckets.get(current_date.strftime("%Y-%m-%d")) or APICallRepository._empty_bucket()
+            stats.append({"date": current_date.strftime("%m-%d"), **entry})
             current_date += timedelta(days=1)
-        
+
         return stats
 
     @staticmethod
-    def get_hourly_stats(db: Session) -> List[Dict[str, Any]]:
-        """获取最近24小时的API调用情况（按小时分组，使用系统本地时区）"""
-        now = datetime.now()
-        # 获取最近24小时的数据（从24小时前到当前时间）
-        start_time = now - timedelta(hours=23, minutes=59, seconds=59)
-        
-        # 获取时间范围内的所有记录
-        logs = (
-            db.query(APICallLog)
-            .filter(APICallLog.created_at >= start_time)
-            .all()
-        )
-        
-        # 在Python中按本地时区的小时分组统计
-        hour_dict = {}
-        for log in logs:
-            # 使用本地时区
-            if log.created_at.tzinfo is None:
-                # 如果没有时区信息，直接使用（假设是本地时区）
-                log_datetime = log.created_at
-            else:
-                # 如果有时区信息，转换为本地时区
-                log_datetime = log.created_at.astimezone().replace(tzinfo=None)
-            
-            # 获取日期和小时
-            date_key = log_datetime.date()
-            hour_key = log_datetime.hour
-            key = (date_key, hour_key)
-            hour_dict[key] = hour_dict.get(key, 0) + 1
-        
+    def get_hourly_stats(db: Session, use_rollups: bool = False) -> List[Dict[str, Any]]:
+        """获取最近24小时的API调用情况（数据库内按统计时区的小时分组；use_rollups 时读取小时汇总）"""
+        offset_hours = settings.STATS_UTC_OFFSET_HOURS
+        offset = timedelta(hours=offset_hours)
+        now = (datetime.now(timezone.utc) + offset).replace(tzinfo=None)
+        end_time = now.replace(minute=0, second=0, microsecond=0)
+        start_time = end_time - timedelta(hours=23)
+
+        if use_rollups:
+            buckets = APICallRollupRepository.bucket_counts(db, PERIOD_HOUR, start_time - offset, offset_hours)
+        else:
+            buckets = APICallRepository._bucket_counts(
+                db, start_time - offset, hourly=True, offset_hours=offset_hours
+            )
+
         # 生成完整的24小时数据点（从24小时前到现在）
         stats = []
-        current_time = start_time.replace(minute=0, second=0, microsecond=0)
-        end_time = now.replace(minute=0, second=0, microsecond=0)
-        
+        current_time = start_time
         while current_time <= end_time:
-            date_key = current_time.date()
-            hour_key = current_time.hour
-            count = hour_dict.get((date_key, hour_key), 0)
-            
+            entry = buckets.get(current_time.strftime("%Y-%m-%d %H")) or APICallRepository._empty_bucket()
+
             # 格式化显示：如果是今天，只显示小时；如果是昨天，显示"昨天 HH:00"
             if current_time.date() == now.date():
-                time_label = f"{hour_key:02d}:00"
+                time_label = f"{current_time.hour:02d}:00"
             else:
-                time_label = f"昨天 {hour_key:02d}:00"
-            
-            stats.append({
-                "date": time_label,
-                "count": count
-            })
+                time_label = f"昨天 {current_time.hour:02d}:00"
+
+            stats.append({"date": time_label, **entry})
             current_time += timedelta(hours=1)
-        
+
         return stats
 
+    @staticmethod
+    def hourly_aggregates(db: Session, start: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        从原始日志按UTC小时及 (provider, source, success, cache_hit) 分组汇总（用于重建汇总表）
+
+        返回的行可直接传给 APICallRollupRepository.aggregate
+        """
+        hour = APICallRepository._bucket_expr(db, hourly=True, offset_hours=0).label("hour")
+        query = db.query(
+            hour,
+            APICallLog.provider,
+            APICallLog.source,
+            APICallLog.success,
+            APICallLog.cache_hit,
+            func.count(APICallLog.id).label("call_count"),
+            func.coalesce(func.sum(APICallLog.total_tokens), 0).label("total_tokens"),
+            func.coalesce(func.sum(APICallLog.latency_ms), 0).label("latency_ms_sum"),
+        )
+        if start is not None:
+            query = query.filter(APICallLog.created_at >= start)
+        rows = query.group_by(
+            hour, APICallLog.provider, APICallLog.source, APICallLog.success, APICallLog.cache_hit
+        ).all()
+        return [
+            {
+                "created_at": datetime.strptime(row.hour, "%Y-%m-%d %H"),
+                "provider": row.provider,
+                "source": row.source,
+                "success": row.success,
+                "cache_hit": row.cache_hit,
+                "call_count": row.call_count,
+                "total_tokens": int(row.total_tokens or 0),
+                "latency_ms_sum": int(row.latency_ms_sum or 0),
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def oldest_created_at(db: Session) -> Optional[datetime]:
+        """最早一条原始日志的时间（UTC），没有日志时返回 None"""
+        return db.query(func.min(APICallLog.created_at)).scalar()
+
+    @staticmethod
+    def delete_before(db: Session, before: datetime) -> int:
+        """删除 before（UTC）之前的原始日志，返回删除条数，调用方负责提交"""
+        return (
+            db.query(APICallLog)
+            .filter(APICallLog.created_at < before)
+            .delete(synchronize_session=False)
+        )
+
     @staticmethod
     def get_logs(
         db: Session,
@@ -0,0 +1,172 @@
+"""
+API调用汇总仓储
+作者：智学伴开发团队
+目的：维护按小时/按天预聚合的API调用统计（随调用日志写入增量累加），并为管理后台看板提供查询
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from models.api_call_rollup import APICallRollup
+from utils.sql_upsert import add, upsert
+
+PERIOD_HOUR = "hour"
+PERIOD_DAY = "day"
+
+# 汇总键：(period, bucket_start, provider, source, success, cache_hit)
+RollupKey = Tuple[str, datetime, str, str, bool, bool]
+ROLLUP_KEY_COLUMNS = ("period", "bucket_start", "provider", "source", "success", "cache_hit")
+
+
+class APICallRollupRepository:
+    """API调用汇总仓储类"""
+
+    @staticmethod
+    def bucket_starts(created_at: datetime, offset_hours: int) -> Tuple[datetime, datetime]:
+        """
+        计算一条调用日志所属的小时桶和天桶起点（均为UTC时间）
+
+        天桶按统计时区（UTC+offset_hours）的自然日划分
+        """
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        hour_start = created_at.replace(minute=0, second=0, microsecond=0)
+        offset = timedelta(hours=offset_hours)
+        day_start = (hour_start + offset).replace(hour=0) - offset
+        return hour_start, day_start
+
+    @staticmethod
+    def aggregate(rows: List[Dict[str, Any]], offset_hours: int) -> Dict[RollupKey, Dict[str, int]]:
+        """
+        把调用日志行（APICallLog 列名的字典）聚合为小时/天两级汇总值
+
+        rows 也可以是已按小时聚合的行（带 call_count 字段），用于从原始日志重建
+        """
+        totals: Dict[RollupKey, Dict[str, int]] = {}
+        for row in rows:
+            hour_start, day_start = APICallRollupRepository.bucket_starts(row["created_at"], offset_hours)
+            combo = (row.get("provider") or "", row.get("source") or "user",
+                     bool(row.get("success", True)), bool(row.get("cache_hit", False)))
+            for key in ((PERIOD_HOUR, hour_start) + combo, (PERIOD_DAY, day_start) + combo):
+                entry = totals.setdefault(key, {"call_count": 0, "total_tokens": 0, "latency_ms_sum": 0})
+                entry["call_count"] += row.get("call_count", 1)
+                entry["total_tokens"] += row.get("total_tokens") or 0
+                entry["latency_ms_sum"] += row.get("latency_ms_sum", row.get("latency_ms")) or 0
+        return totals
+
+    @staticmethod
+    def apply(db: Session, rows: List[Dict[str, Any]], offset_hours: int) -> int:
+        """
+        把新写入的调用日志累加到汇总表（与原始日志在同一事务中，调用方负责提交）
+
+        在数据库端“有则累加、无则插入”（upsert），多个进程同时创建同一个新桶时不会因唯一约束冲突
+        回滚整批原始日志；返回涉及的汇总行数
+        """
+        totals = APICallRollupRepository.aggregate(rows, offset_hours)
+        upsert(
+            db,
+            APICallRollup,
+            [APICallRollupRepository._row(key, values) for key, values in totals.items()],
+            keys=ROLLUP_KEY_COLUMNS,
+            merge={"call_count": add, "total_tokens": add, "latency_ms_sum": add},
+        )
+        return len(totals)
+
+    @staticmethod
+    def replace_since(
+        db: Session, totals: Dict[RollupKey, Dict[str, int]], start: Optional[datetime] = None
+    ) -> int:
+        """删除 start（为空时全部）之后的汇总并写入重建结果，调用方负责提交"""
+        query = db.query(APICallRollup)
+        if start is not None:
+            query = query.filter(APICallRollup.bucket_start >= start)
+        query.delete(synchronize_session=False)
+        rows = [APICallRollupRepository._row(key, values) for key, values in totals.items()]
+        if rows:
+            db.execute(insert(APICallRollup), rows)
+        return len(rows)
+
+    @staticmethod
+    def _row(key: RollupKey, values: Dict[str, int]) -> Dict[str, Any]:
+        period, bucket_start, provider, source, success, cache_hit = key
+        return {
+            "period": period,
+            "bucket_start": bucket_start,
+            "provider": provider,
+            "source": source,
+            "success": success,
+            "cache_hit": cache_hit,
+            **values,
+        }
+
+    @staticmethod
+    def has_rows(db: Session, before: Optional[datetime] = None) -> bool:
+        """汇总表是否有数据；给定 before 时只看该时间之前的桶"""
+        query = db.query(APICallRollup.id)
+        if before is not None:
+            query = query.filter(APICallRollup.bucket_start < before)
+        return query.first() is not None
+
+    @staticmethod
+    def count_calls(
+        db: Session, since: Optional[datetime] = None, cache_hit: Optional[bool] = None
+    ) -> int:
+        """统计调用次数；给定 since（整点，UTC）时按小时汇总统计，否则按天汇总统计全部"""
+        query = db.query(func.sum(APICallRollup.call_count))
+        if since is None:
+            query = query.filter(APICallRollup.period == PERIOD_DAY)
+        else:
+            query = query.filter(APICallRollup.period == PERIOD_HOUR, APICallRollup.bucket_start >= since)
+        if cache_hit is not None:
+            query = query.filter(APICallRollup.cache_hit == cache_hit)
+        return int(query.scalar() or 0)
+
+    @staticmethod
+    def group_counts(db: Session, column_name: str) -> List[Tuple[str, int]]:
+        """按 provider 或 source 汇总全部调用次数，按次数倒序"""
+        column = getattr(APICallRollup, column_name)
+        total = func.sum(APICallRollup.call_count)
+        return [
+            (value, int(count))
+            for value, count in (
+                db.query(column, total)
+                .filter(APICallRollup.period == PERIOD_DAY)
+                .group_by(column)
+                .order_by(total.desc())
+                .all()
+            )
+        ]
+
+    @staticmethod
+    def bucket_counts(
+        db: Session, period: str, start: datetime, offset_hours: int
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        读取 start（UTC）之后各时间桶的调用数、成功/失败数和各模型调用数
+
+        返回结构与 APICallRepository._bucket_counts 一致，键为统计时区下的
+        YYYY-MM-DD（按天）或 YYYY-MM-DD HH（按小时）
+        """
+        rows = (
+            db.query(
+                APICallRollup.bucket_start,
+                APICallRollup.provider,
+                APICallRollup.success,
+                func.sum(APICallRollup.call_count).label("count"),
+            )
+            .filter(APICallRollup.period == period, APICallRollup.bucket_start >= start)
+            .group_by(APICallRollup.bucket_start, APICallRollup.provider, APICallRollup.success)
+            .all()
+        )
+        key_format = "%Y-%m-%d %H" if period == PERIOD_HOUR else "%Y-%m-%d"
+        offset = timedelta(hours=offset_hours)
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            key = (row.bucket_start + offset).strftime(key_format)
+            entry = buckets.setdefault(key, {"count": 0, "success": 0, "failed": 0, "providers": {}})
+            count = int(row.count or 0)
+            entry["count"] += count
+            entry["success" if row.success else "failed"] += count
+            provider = row.provider or "未知"
+            entry["providers"][provider] = entry["providers"].get(provider, 0) + count
+        return buckets
@@ -0,0 +1,300 @@
+"""
+聊天记录仓储
+作者：智学伴开发团队
+目的：封装聊天会话与消息的数据库操作
+"""
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, Any
+from sqlalchemy import Select, and_, or_, func, literal, select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from database import AsyncDBSession
+from models.chat_sessions import ChatSession, ChatMessage
+from utils.sql_text import text_prefix
+from utils.sql_time import comparable_time
+
+# 会话列表行：(会话, 消息数, 最后一条消息角色, 最后一条消息预览)
+SessionListRow = Tuple[ChatSession, int, Optional[str], Optional[str]]
+# 会话列表游标：上一页最后一个会话的 (updated_at, id)
+SessionCursor = Tuple[datetime, int]
+
+
+class ChatRepository:
+    """聊天记录仓储类"""
+
+    @staticmethod
+    def _list_sessions_stmt(
+        user_id: int,
+        limit: int,
+        before: Optional[SessionCursor],
+        include_messages: bool,
+        preview_length: int,
+    ) -> Select:
+        """会话列表查询（同步/异步会话共用），多取一行用于判断是否还有下一页"""
+        # 每个会话的消息数 + 最后一条消息（窗口函数，只扫描当前用户的消息）
+        ranked = (
+            select(
+                ChatMessage.session_id.label("session_id"),
+                ChatMessage.role.label("role"),
+                text_prefix(ChatMessage.content, preview_length).label("preview"),
+                func.count(ChatMessage.id).over(partition_by=ChatMessage.session_id).label("message_count"),
+                func.row_number().over(
+                    partition_by=ChatMessage.session_id,
+                    order_by=(ChatMessage.created_at.desc(), ChatMessage.id.desc()),
+                ).label("rn"),
+            )
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+            .where(ChatSession.user_id == user_id)
+            .subquery()
+        )
+
+        stmt = (
+            select(
+                ChatSession,
+                func.coalesce(ranked.c.message_count, 0),
+                ranked.c.role,
+                ranked.c.preview,
+            )
+            .outerjoin(ranked, and_(ranked.c.session_id == ChatSession.id, ranked.c.rn == 1))
+            .where(ChatSession.user_id == user_id)
+        )
+
+        # 排序与游标条件使用同一个可比较的时间表达式（SQLite 上统一文本格式）
+        updated_at = comparable_time(ChatSession.updated_at)
+        if before is not None:
+            # 游标自带上一页最后一行的 (updated_at, id)，该会话之后被删除或更新都不影响翻页
+            before_updated_at, before_id = before
+            cursor_updated_at = comparable_time(literal(before_updated_at, ChatSession.updated_at.type))
+            stmt = stmt.where(
+                or_(
+                    updated_at < cursor_updated_at,
+                    and_(updated_at == cursor_updated_at, ChatSession.id < before_id),
+                )
+            )
+
+        if include_messages:
+            stmt = stmt.options(selectinload(ChatSession.messages))
+
+        return stmt.order_by(updated_at.desc(), ChatSession.id.desc()).limit(limit + 1)
+
+    @staticmethod
+    def list_sessions(
+        db: Session,
+        user_id: int,
+        limit: int = 20,
+        before: Optional[SessionCursor] = None,
+        include_messages: bool = False,
+        preview_length: int = 80,
+    ) -> Tuple[List[SessionListRow], bool]:
+        """
+        按 updated_at 倒序分页获取会话（单条SQL带出消息数和最后一条消息预览）
+
+        Args:
+            before: 游标，上一页最后一个会话的 (updated_at, id)；按 (updated_at, id) 做 keyset 分页
+            include_messages: 是否用 selectinload 一并加载全部消息（额外一条 IN 查询）
+
+        Returns:
+            (当前页行列表, 是否还有下一页)
+        """
+        stmt = ChatRepository._list_sessions_stmt(user_id, limit, before, include_messages, preview_length)
+        rows = db.execute(stmt).all()
+        has_more = len(rows) > limit
+        return [tuple(row) for row in rows[:limit]], has_more
+
+    @staticmethod
+    async def alist_sessions(
+        db: AsyncDBSession,
+        user_id: int,
+        limit: int = 20,
+        before: Optional[SessionCursor] = None,
+        include_messages: bool = False,
+        preview_length: int = 80,
+    ) -> Tuple[List[SessionListRow], bool]:
+        """list_sessions 的异步会话版本"""
+        stmt = ChatRepository._list_sessions_stmt(user_id, limit, before, include_messages, preview_length)
+        rows = (await db.execute(stmt)).all()
+        has_more = len(rows) > limit
+        return [tuple(row) for row in rows[:limit]], has_more
+
+    @staticmethod
+    def get_session(db: Session, session_id: int, user_id: int) -> Optional[ChatSession]:
+        """获取用户的指定会话"""
+        return (
+            db.query(ChatSession)
+            .filter(ChatSession.id == session_id, ChatSession.user_id == user_id)
+            .first()
+        )
+
+    @staticmethod
+    async def aget_session(db: AsyncDBSession, session_id: int, user_id: int) -> Optional[ChatSession]:
+        """获取用户的指定会话（异步会话）"""
+        stmt = select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == user_id)
+        return (await db.execute(stmt)).scalars().first()
+
+    @staticmethod
+    def get_messages(db: Session, session_id: int, since: Optional[int] = None) -> List[ChatMessage]:
+        """
+        获取会话消息
+
+        Args:
+            since: 只返回 seq 大于该值的消息（增量拉取）；为空时按时间顺序返回全部
+        """
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+        if since is not None:
+            return query.filter(ChatMessage.seq > since).order_by(ChatMessage.seq).all()
+        messages = query.order_by(ChatMessage.created_at, ChatMessage.id).all()
+        if any(msg.seq is None for msg in messages):
+            ChatRepository._backfill_seq(db, session_id)
+            db.commit()
+            messages = query.order_by(ChatMessage.created_at, ChatMessage.id).all()
+        return messages
+
+    @staticmethod
+    async def aget_messages(
+        db: AsyncDBSession, session_id: int, since: Optional[int] = None
+    ) -> List[ChatMessage]:
+        """get_messages 的异步会话版本（旧数据补写 seq 时在会话的同步上下文中执行）"""
+        stmt = select(ChatMessage).where(ChatMessage.session_id == session_id)
+        if since is not None:
+            stmt = stmt.where(ChatMessage.seq > since).order_by(ChatMessage.seq)
+            return list((await db.execute(stmt)).scalars().all())
+        stmt = stmt.order_by(ChatMessage.created_at, ChatMessage.id)
+        messages = list((await db.execute(stmt)).scalars().all())
+        if any(msg.seq is None for msg in messages):
+            await db.run_sync(ChatRepository._backfill_seq, session_id)
+            await db.commit()
+            stmt = stmt.execution_options(populate_existing=True)
+            messages = list((await db.execute(stmt)).scalars().all())
+        return messages
+
+    @staticmethod
+    def last_seq(db: Session, session_id: int) -> Optional[int]:
+        """会话当前最大序号，没有消息时为空"""
+        return db.query(func.max(ChatMessage.seq)).filter(ChatMessage.session_id == session_id).scalar()
+
+    @staticmethod
+    def _backfill_seq(db: Session, session_id: int) -> None:
+        """为旧版（整表重写时）没有 seq 的消息按时间顺序补写序号"""
+        missing = (
+            db.query(ChatMessage.id)
+            .filter(ChatMessage.session_id == session_id, ChatMessage.seq.is_(None))
+            .order_by(ChatMessage.created_at, ChatMessage.id)
+            .all()
+        )
+        if not missing:
+            return
+        start = (ChatRepository.last_seq(db, session_id) or -1) + 1
+        db.execute(
+            update(ChatMessage),
+            [{"id": row.id, "seq": start + offset} for offset, row in enumerate(missing)],
+        )
+
+    @staticmethod
+    def append_messages(
+        db: Session,
+        session: ChatSession,
+        messages: List[Dict[str, Any]],
+        title: Optional[str] = None,
+    ) -> List[ChatMessage]:
+        """
+        幂等追加消息：已存在的 seq 直接跳过（包括并发重试刚插入的），其余一次批量插入，并刷新会话 updated_at
+
+        Args:
+            messages: [{"seq", "role", "content", "provider"}]
+
+        Returns:
+            本次新插入的消息（按 seq 升序）
+        """
+        if db.query(ChatMessage.id).filter(
+            ChatMessage.session_id == session.id, ChatMessage.seq.is_(None)
+        ).first():
+            try:
+                with db.begin_nested():
+                    ChatRepository._backfill_seq(db, session.id)
+            except IntegrityError:
+                # 并发请求已为同一会话补写了序号
+                pass
+
+        incoming: Dict[int, Dict[str, Any]] = {}
+        for message in messages:
+            incoming.setdefault(message["seq"], message)
+        existing = {
+            seq for (seq,) in db.query(ChatMessage.seq).filter(
+                ChatMessage.session_id == session.id,
+                ChatMessage.seq.in_(list(incoming)),
+            )
+        } if incoming else set()
+        rows = [
+            {
+                "session_id": session.id,
+                "seq": seq,
+                "role": incoming[seq]["role"],
+                "content": incoming[seq]["content"],
+                "provider": incoming[seq].get("provider"),
+            }
+            for seq in sorted(seq for seq in incoming if seq not in existing)
+        ]
+        new_seqs = ChatRepository._insert_messages(db, rows)
+
+        values: Dict[str, Any] = {"updated_at": func.now()}
+        if title is not None:
+            values["title"] = title
+        if new_seqs or title is not None:
+            db.query(ChatSession).filter(ChatSession.id == session.id).update(
+                values, synchronize_session=False
+            )
+        db.commit()
+
+        if not new_seqs:
+            return []
+        return (
+            db.query(ChatMessage)
+            .filter(ChatMessage.session_id == session.id, ChatMessage.seq.in_(new_seqs))
+            .order_by(ChatMessage.seq)
+            .all()
+        )
+
+    @staticmethod
+    def _insert_messages(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        插入消息并返回实际插入的 seq
+
+        先在保存点中整批插入；同一批消息的并发重试抢先插入了部分 seq（违反 uq_chat_messages_session_seq）时，
+        回滚保存点后逐条插入，跳过已存在的 seq
+        """
+        if not rows:
+            return []
+        try:
+            with db.begin_nested():
+                db.execute(insert(ChatMessage), rows)
+            return [row["seq"] for row in rows]
+        except IntegrityError:
+            pass
+        inserted = []
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(ChatMessage), [row])
+            except IntegrityError:
+                continue
+            inserted.append(row["seq"])
+        return inserted
+
+    @staticmethod
+    def replace_messages(db: Session, session: ChatSession, messages: List[Dict[str, Any]]) -> None:
+        """整体替换会话消息（按列表顺序重新编号 seq），调用方负责提交"""
+        db.query(ChatMessage).filter(ChatMessage.session_id == session.id).delete()
+        if messages:
+            db.execute(
+                insert(ChatMessage),
+                [
+                    {
+                        "session_id": session.id,
+                        "seq": seq,
+                        "role": message["role"],
+                        "content": message["content"],
+                        "provider": message.get("provider"),
+                    }
+                    for seq, message in enumerate(messages)
+                ],
+            )
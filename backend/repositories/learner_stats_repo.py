@@ -0,0 +1,185 @@
+"""
+学习统计仓储
+作者：智学伴开发团队
+目的：封装测评统计汇总表的增量维护与读取；从原始测评重建时只查询 score/topic/created_at 列，
+     不加载题目、答案、讲解等大字段
+"""
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.quizzes import Quiz
+from models.study_plans import StudyPlan
+from models.learner_stats import UserQuizStats, UserTopicStats, UserMonthlyStats
+from utils.sql_time import time_bucket
+from utils.sql_upsert import add, greatest, least, merge_update, upsert
+
+TOPIC_MAX_LENGTH = 255
+COUNTER_MERGE = {"quiz_count": add, "score_sum": add}
+
+
+def _topic_key(topic: Optional[str]) -> str:
+    return (topic or "")[:TOPIC_MAX_LENGTH]
+
+
+def _month_key(created_at: Optional[datetime]) -> Optional[str]:
+    if created_at is None:
+        return None
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.strftime("%Y-%m")
+
+
+class LearnerStatsRepository:
+    """学习统计仓储类"""
+
+    @staticmethod
+    def get_summary(db: Session, user_id: int) -> Optional[UserQuizStats]:
+        return db.query(UserQuizStats).filter(UserQuizStats.user_id == user_id).first()
+
+    @staticmethod
+    def rebuild_user(db: Session, user_id: int) -> UserQuizStats:
+        """
+        用聚合SQL从原始测评重建某个用户的全部统计（调用方负责提交）
+
+        三条 GROUP BY 查询分别得到总体、按主题、按月统计
+        """
+        db.query(UserTopicStats).filter(UserTopicStats.user_id == user_id).delete(synchronize_session=False)
+        db.query(UserMonthlyStats).filter(UserMonthlyStats.user_id == user_id).delete(synchronize_session=False)
+
+        count, score_sum, max_score, min_score = (
+            db.query(
+                func.count(Quiz.id),
+                func.coalesce(func.sum(Quiz.score), 0),
+                func.max(Quiz.score),
+                func.min(Quiz.score),
+            )
+            .filter(Quiz.user_id == user_id)
+            .one()
+        )
+        summary = LearnerStatsRepository.get_summary(db, user_id)
+        if summary is None:
+            summary = UserQuizStats(user_id=user_id)
+            db.add(summary)
+        summary.quiz_count = count
+        summary.score_sum = int(score_sum or 0)
+        summary.max_score = max_score
+        summary.min_score = min_score
+
+        topic_totals: Dict[str, List[int]] = {}
+        for topic, topic_count, topic_sum in (
+            db.query(Quiz.topic, func.count(Quiz.id), func.coalesce(func.sum(Quiz.score), 0))
+            .filter(Quiz.user_id == user_id)
+            .group_by(Quiz.topic)
+        ):
+            # 超长主题截断后可能合并为同一个键
+            totals = topic_totals.setdefault(_topic_key(topic), [0, 0])
+            totals[0] += topic_count
+            totals[1] += int(topic_sum or 0)
+        db.add_all(
+            UserTopicStats(user_id=user_id, topic=topic, quiz_count=totals[0], score_sum=totals[1])
+            for topic, totals in topic_totals.items()
+        )
+
+        month = time_bucket(db, Quiz.created_at, "month").label("month")
+        db.add_all(
+            UserMonthlyStats(user_id=user_id, month=month_value, quiz_count=month_count, score_sum=int(month_sum or 0))
+            for month_value, month_count, month_sum in (
+                db.query(month, func.count(Quiz.id), func.coalesce(func.sum(Quiz.score), 0))
+                .filter(Quiz.user_id == user_id, Quiz.created_at.isnot(None))
+                .group_by(month)
+            )
+        )
+        db.flush()
+        return summary
+
+    @staticmethod
+    def record_quiz(
+        db: Session, user_id: int, topic: Optional[str], score: int, created_at: Optional[datetime]
+    ) -> None:
+        """
+        把一次新提交的测评累加到已有统计（调用方负责提交）
+
+        计数在数据库端累加（UPDATE ... SET quiz_count = quiz_count + 1），主题/月份行不存在时插入，
+        并发提交不会丢失增量或因唯一约束冲突失败；用户尚无统计行时不做处理，首次读取时会完整重建（包含这次测评）
+        """
+        summary_merged = merge_update(
+            db,
+            UserQuizStats,
+            {"user_id": user_id, "quiz_count": 1, "score_sum": score, "max_score": score, "min_score": score},
+            ["user_id"],
+            {"quiz_count": add, "score_sum": add, "max_score": greatest, "min_score": least},
+        )
+        if not summary_merged:
+            return
+
+        upsert(
+            db,
+            UserTopicStats,
+            [{"user_id": user_id, "topic": _topic_key(topic), "quiz_count": 1, "score_sum": score}],
+            ["user_id", "topic"],
+            COUNTER_MERGE,
+        )
+        month_key = _month_key(created_at)
+        if month_key is not None:
+            upsert(
+                db,
+                UserMonthlyStats,
+                [{"user_id": user_id, "month": month_key, "quiz_count": 1, "score_sum": score}],
+                ["user_id", "month"],
+                COUNTER_MERGE,
+            )
+
+    @staticmethod
+    def get_topic_stats(db: Session, user_id: int) -> List[UserTopicStats]:
+        return (
+            db.query(UserTopicStats)
+            .filter(UserTopicStats.user_id == user_id)
+            .order_by(UserTopicStats.quiz_count.desc(), UserTopicStats.topic)
+            .all()
+        )
+
+    @staticmethod
+    def get_monthly_stats(db: Session, user_id: int) -> List[UserMonthlyStats]:
+        return (
+            db.query(UserMonthlyStats)
+            .filter(UserMonthlyStats.user_id == user_id)
+            .order_by(UserMonthlyStats.month)
+            .all()
+        )
+
+    @staticmethod
+    def get_recent_scores(db: Session, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """最近几次测评的得分（只查询 score/created_at 列，按时间倒序）"""
+        rows = (
+            db.query(Quiz.score, Quiz.created_at)
+            .filter(Quiz.user_id == user_id)
+            .order_by(Quiz.created_at.desc(), Quiz.id.desc())
+            .limit(limit)
+            .all()
+        )
+        return [{"score": row.score, "created_at": row.created_at} for row in rows]
+
+    @staticmethod
+    def count_plans(db: Session, user_id: int) -> int:
+        return db.query(func.count(StudyPlan.id)).filter(StudyPlan.user_id == user_id).scalar() or 0
+
+    @staticmethod
+    def get_report_fingerprint(db: Session, user_id: int) -> Dict[str, int]:
+        """
+        报告数据指纹：测评/学习计划的条数与最新ID（两条只走索引的聚合查询）
+
+        测评和学习计划只追加不修改，指纹不变即报告内容不变
+        """
+        quiz_count, last_quiz_id = (
+            db.query(func.count(Quiz.id), func.max(Quiz.id)).filter(Quiz.user_id == user_id).one()
+        )
+        plan_count, last_plan_id = (
+            db.query(func.count(StudyPlan.id), func.max(StudyPlan.id)).filter(StudyPlan.user_id == user_id).one()
+        )
+        return {
+            "quiz_count": quiz_count or 0,
+            "last_quiz_id": last_quiz_id or 0,
+            "plan_count": plan_count or 0,
+            "last_plan_id": last_plan_id or 0,
+        }
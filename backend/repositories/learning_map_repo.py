@@ -4,7 +4,8 @@
 """
 from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, insert, select
+from database import AsyncDBSession
 from models.learning_map import (
     LearningMapFile,
     LearningMapSession,
@@ -116,6 +117,69 @@ class LearningMapRepository:
         db.commit()
         return True
 
+    @staticmethod
+    def _node_rows(
+        user_id: int, session_id: int, nodes_data: List[Dict], file_id: Optional[int]
+    ) -> List[Dict]:
+        return [
+            {
+                "user_id": user_id,
+                "session_id": session_id,
+                "file_id": file_id,
+                "title": node_data.get("title"),
+                "description": node_data.get("description"),
+                "level": node_data.get("level"),
+                "mastery": node_data.get("mastery"),
+                "example": node_data.get("example"),
+                "resources": node_data.get("resources"),
+            }
+            for node_data in nodes_data
+        ]
+
+    @staticmethod
+    def _edge_rows(
+        user_id: int,
+        session_id: int,
+        edges_payload: List[Dict],
+        title_to_id: Dict[str, int],
+    ) -> List[Dict]:
+        rows = []
+        for edge in edges_payload:
+            src = title_to_id.get(edge.get("from"))
+            tgt = title_to_id.get(edge.get("to"))
+            if not src or not tgt:
+                continue
+            relation = edge.get("relation") or "depends_on"
+            rows.append(
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "from_node_id": src,
+                    "to_node_id": tgt,
+                    "relation": relation[:255],
+                }
+            )
+        return rows
+
+    @staticmethod
+    def _bulk_insert(db: Session, model, rows: List[Dict]) -> List:
+        """
+        批量插入并按主键顺序返回ORM对象（不提交）
+
+        支持批量 RETURNING 的数据库（SQLite 3.35+/PostgreSQL/MariaDB/SQL Server）一条语句完成；
+        其他数据库（MySQL）退化为 add_all + flush，仍不需要逐行 refresh。
+        不要求 RETURNING 按参数顺序（SQLite 下会退化为逐行插入），调用方按主键排序即可
+        """
+        if not rows:
+            return []
+        if db.get_bind().dialect.insert_executemany_returning:
+            records = db.scalars(insert(model).returning(model), rows)
+            return sorted(records, key=lambda record: record.id)
+        records = [model(**row) for row in rows]
+        db.add_all(records)
+        db.flush()
+        return records
+
     @staticmethod
     def create_nodes(
         db: Session,
@@ -124,24 +188,9 @@ class LearningMapRepository:
         nodes_data: List[Dict],
         file_id: Optional[int],
     ) -> List[LearningNode]:
-        nodes = []
-        for node_data in nodes_data:
-            node = LearningNode(
-                user_id=user_id,
-                session_id=session_id,
-                file_id=file_id,
-                title=node_data.get("title"),
-                description=node_data.get("description"),
-                level=node_data.get("level"),
-                mastery=node_data.get("mastery"),
-                example=node_data.get("example"),
-                resources=node_data.get("resources"),
-            )
-            db.add(node)
-            nodes.append(node)
+        rows = LearningMapRepository._node_rows(user_id, session_id, nodes_data, file_id)
+        nodes = LearningMapRepository._bulk_insert(db, LearningNode, rows)
         db.commit()
-        for node in nodes:
-            db.refresh(node)
         return nodes
 
     @staticmethod
@@ -152,27 +201,61 @@ class LearningMapRepository:
         edges_payload: List[Dict],
         title_to_id: Dict[str, int],
     ) -> List[LearningEdge]:
-        edges: List[LearningEdge] = []
-        for edge in edges_payload:
-            src = title_to_id.get(edge.get("from"))
-            tgt = title_to_id.get(edge.get("to"))
-            if not src or not tgt:
-                continue
-            relation = edge.get("relation") or "depends_on"
-            record = LearningEdge(
-                user_id=user_id,
-                session_id=session_id,
-                from_node_id=src,
-                to_node_id=tgt,
-                relation=relation[:255],
-            )
-            db.add(record)
-            edges.append(record)
+        rows = LearningMapRepository._edge_rows(user_id, session_id, edges_payload, title_to_id)
+        edges = LearningMapRepository._bulk_insert(db, LearningEdge, rows)
         db.commit()
-        for edge in edges:
-            db.refresh(edge)
         return edges
 
+    @staticmethod
+    def create_graph(
+        db: Session,
+        user_id: int,
+        topic: Optional[str],
+        provider: Optional[str],
+        file_id: Optional[int],
+        source_preview: Optional[str],
+        nodes_data: List[Dict],
+        edges_payload: List[Dict],
+    ) -> Tuple[LearningMapSession, int, int]:
+        """
+        在一个事务内写入会话、节点和边：节点批量插入并 RETURNING 主键，标题到ID的映射在内存中完成，
+        边用 executemany 一次写入；任一步失败整体回滚
+
+        Returns:
+            (会话, 节点数, 边数)
+        """
+        try:
+            session = LearningMapSession(
+                user_id=user_id,
+                topic=topic,
+                provider=provider,
+                file_id=file_id,
+                source_preview=source_preview,
+            )
+            db.add(session)
+            db.flush()
+
+            node_rows = LearningMapRepository._node_rows(user_id, session.id, nodes_data, file_id)
+            title_to_id: Dict[str, int] = {}
+            if db.get_bind().dialect.insert_executemany_returning:
+                stmt = insert(LearningNode).returning(LearningNode.id, LearningNode.title)
+                pairs = db.execute(stmt, node_rows).all()
+            else:
+                nodes = LearningMapRepository._bulk_insert(db, LearningNode, node_rows)
+                pairs = [(node.id, node.title) for node in nodes]
+            # 标题重复时保留最后插入的（主键最大），与逐个创建时的映射一致
+            for node_id, title in sorted(pairs):
+                title_to_id[title] = node_id
+
+            edge_rows = LearningMapRepository._edge_rows(user_id, session.id, edges_payload, title_to_id)
+            if edge_rows:
+                db.execute(insert(LearningEdge), edge_rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return session, len(node_rows), len(edge_rows)
+
     @staticmethod
     def get_graph_by_session(
         db: Session, user_id: int, session: LearningMapSession
@@ -197,3 +280,58 @@ class LearningMapRepository:
         )
         return nodes, edges
 
+    @staticmethod
+    async def aget_session(
+        db: AsyncDBSession, user_id: int, session_id: int
+    ) -> Optional[LearningMapSession]:
+        stmt = select(LearningMapSession).where(
+            LearningMapSession.user_id == user_id,
+            LearningMapSession.id == session_id,
+        )
+        return (await db.execute(stmt)).scalars().first()
+
+    @staticmethod
+    async def aget_latest_session(
+        db: AsyncDBSession, user_id: int
+    ) -> Optional[LearningMapSession]:
+        stmt = (
+            select(LearningMapSession)
+            .where(LearningMapSession.user_id == user_id)
+            .order_by(desc(LearningMapSession.created_at))
+            .limit(1)
+        )
+        return (await db.execute(stmt)).scalars().first()
+
+    @staticmethod
+    async def aget_latest_session_id(db: AsyncDBSession, user_id: int) -> Optional[int]:
+        stmt = (
+            select(LearningMapSession.id)
+            .where(LearningMapSession.user_id == user_id)
+            .order_by(desc(LearningMapSession.created_at))
+            .limit(1)
+        )
+        return await db.scalar(stmt)
+
+    @staticmethod
+    async def aget_graph_by_session(
+        db: AsyncDBSession, user_id: int, session: LearningMapSession
+    ) -> Tuple[List[LearningNode], List[LearningEdge]]:
+        nodes_stmt = (
+            select(LearningNode)
+            .where(
+                LearningNode.user_id == user_id,
+                LearningNode.session_id == session.id,
+            )
+            .order_by(LearningNode.created_at.asc())
+        )
+        edges_stmt = (
+            select(LearningEdge)
+            .where(
+                LearningEdge.user_id == user_id,
+                LearningEdge.session_id == session.id,
+            )
+            .order_by(LearningEdge.created_at.asc())
+        )
+        nodes = list((await db.execute(nodes_stmt)).scalars().all())
+        edges = list((await db.execute(edges_stmt)).scalars().all())
+        return nodes, edges
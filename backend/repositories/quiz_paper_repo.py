@@ -4,7 +4,9 @@
 目的：试卷数据访问层
 """
 from typing import Optional, List
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from database import AsyncDBSession
 from models.quiz_paper import QuizPaper
 
 
@@ -43,6 +45,31 @@ class QuizPaperRepository:
             .limit(limit)\
             .all()
     
+    @staticmethod
+    async def aget_by_id(db: AsyncDBSession, paper_id: int, user_id: Optional[int] = None) -> Optional[QuizPaper]:
+        """根据ID获取试卷（异步会话）"""
+        stmt = select(QuizPaper).where(QuizPaper.id == paper_id)
+        if user_id:
+            stmt = stmt.where(QuizPaper.user_id == user_id)
+        return (await db.execute(stmt)).scalars().first()
+    
+    @staticmethod
+    async def alist_by_user(
+        db: AsyncDBSession,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 20
+    ) -> List[QuizPaper]:
+        """获取用户的试卷列表（异步会话）"""
+        stmt = (
+            select(QuizPaper)
+            .where(QuizPaper.user_id == user_id)
+            .order_by(QuizPaper.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return list((await db.execute(stmt)).scalars().all())
+    
     @staticmethod
     def delete(db: Session, paper_id: int, user_id: int) -> bool:
         """删除试卷"""
@@ -0,0 +1,19 @@
+"""
+测评记录仓储
+作者：智学伴开发团队
+目的：测评记录的数据访问层（测评历史等热点只读查询）
+"""
+from typing import List
+from sqlalchemy import select
+from database import AsyncDBSession
+from models.quizzes import Quiz
+
+
+class QuizRepository:
+    """测评记录仓储类"""
+
+    @staticmethod
+    async def alist_by_user(db: AsyncDBSession, user_id: int) -> List[Quiz]:
+        """按创建时间倒序获取用户的测评记录（异步会话）"""
+        stmt = select(Quiz).where(Quiz.user_id == user_id).order_by(Quiz.created_at.desc())
+        return list((await db.execute(stmt)).scalars().all())
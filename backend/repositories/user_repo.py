@@ -5,6 +5,7 @@
 """
 from typing import Optional
 from sqlalchemy.orm import Session
+from database import AsyncDBSession
 from models.users import User
 
 
@@ -16,6 +17,11 @@ class UserRepository:
         """根据ID获取用户"""
         return db.query(User).filter(User.id == user_id).first()
     
+    @staticmethod
+    async def aget_by_id(db: AsyncDBSession, user_id: int) -> Optional[User]:
+        """根据ID获取用户（异步会话）"""
+        return await db.get(User, user_id)
+    
     @staticmethod
     def get_by_email(db: Session, email: str) -> Optional[User]:
         """根据邮箱获取用户"""
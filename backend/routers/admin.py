@@ -26,6 +26,7 @@ from repositories.api_call_repo import APICallRepository
 from services.admin_service import AdminService
 from core.security import encrypt_api_key, decrypt_api_key
 from utils.model_registry import registry
+from utils.export_pool import export_pool
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -280,6 +281,14 @@ async def update_system_config(
     return AdminService.update_system_config(db, config_dict)
 
 
+@router.get("/export-stats")
+async def get_export_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """试卷导出进程池状态与各格式导出耗时"""
+    return export_pool.stats()
+
+
 # 用户管理
 @router.get("/users", response_model=UserListResponse)
 async def get_users(
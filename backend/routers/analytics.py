@@ -6,12 +6,9 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from database import get_db
-from models.quizzes import Quiz
-from models.study_plans import StudyPlan
-from utils.report_generator import generate_pdf_report
-import os
-import json
-from typing import List, Dict
+from services.analytics_service import AnalyticsService
+from core.config import settings
+from utils.report_jobs import report_job_manager, STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING
 
 router = APIRouter(prefix="/api/v1/analytics", tags=["数据分析"])
 
@@ -32,77 +29,7 @@ async def get_progress(
         dict: 包含完成率、平均分、弱项等统计信息
     """
     try:
-        # 获取测评数据
-        quizzes = db.query(Quiz).filter(Quiz.user_id == user_id).order_by(Quiz.created_at.desc()).all()
-        
-        # 获取学习计划数据
-        study_plans = db.query(StudyPlan).filter(StudyPlan.user_id == user_id).all()
-        
-        # 如果没有数据，返回默认值
-        if not quizzes and not study_plans:
-            return {
-                "completion_rate": 0,
-                "average_score": 0,
-                "total_tests": 0,
-                "total_plans": 0,
-                "weak_topics": [],
-                "recent_scores": [],
-                "score_trend": []
-            }
-        
-        # 计算测评统计
-        scores = [q.score for q in quizzes if q.score is not None]
-        avg_score = sum(scores) / len(scores) if scores else 0
-        
-        # 计算完成率（基于平均分）
-        completion_rate = min(100, int(avg_score)) if scores else 0
-        
-        # 分析弱项（如果平均分低于80，标记为需要加强）
-        weak_topics = []
-        if avg_score < 80 and scores:
-            # 分析错题较多的主题
-            topic_scores = {}
-            for quiz in quizzes:
-                if quiz.topic:
-                    if quiz.topic not in topic_scores:
-                        topic_scores[quiz.topic] = []
-                    topic_scores[quiz.topic].append(quiz.score)
-            
-            # 找出平均分较低的主题
-            for topic, topic_score_list in topic_scores.items():
-                topic_avg = sum(topic_score_list) / len(topic_score_list)
-                if topic_avg < 70:
-                    weak_topics.append(topic)
-        
-        # 如果没有明确的弱项，但平均分较低，给出通用建议
-        if not weak_topics and avg_score < 80:
-            weak_topics = ["基础知识", "综合应用"]
-        
-        # 最近5次得分（用于折线图）
-        recent_scores = [q.score for q in quizzes[:5] if q.score is not None]
-        recent_scores.reverse()  # 按时间正序
-        
-        # 得分趋势数据（用于图表）
-        score_trend = []
-        for i, quiz in enumerate(quizzes[:10][::-1]):  # 最近10次，按时间正序
-            if quiz.score is not None:
-                score_trend.append({
-                    "index": i + 1,
-                    "score": quiz.score,
-                    "date": quiz.created_at.strftime('%m-%d') if quiz.created_at else ""
-                })
-        
-        return {
-            "completion_rate": completion_rate,
-            "average_score": round(avg_score, 1),
-            "total_tests": len(quizzes),
-            "total_plans": len(study_plans),
-            "weak_topics": weak_topics[:5],  # 最多返回5个弱项
-            "recent_scores": recent_scores,
-            "score_trend": score_trend,
-            "max_score": max(scores) if scores else 0,
-            "min_score": min(scores) if scores else 0
-        }
+        return AnalyticsService.get_progress(db, user_id)
         
     except Exception as e:
         raise HTTPException(
@@ -111,65 +38,114 @@ async def get_progress(
         )
 
 
-@router.get("/report/{user_id}")
-async def download_report(
+def _report_response(job_id: str, user_id: int) -> FileResponse:
+    report_path = report_job_manager.get_file(job_id)
+    if report_path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="报告文件不存在，请重新生成"
+        )
+    return FileResponse(
+        path=report_path,
+        filename=f"智学伴_学习报告_{user_id}.pdf",
+        media_type="application/pdf"
+    )
+
+
+@router.post("/report/{user_id}", status_code=status.HTTP_202_ACCEPTED)
+async def submit_report(
     user_id: int,
     db: Session = Depends(get_db)
 ):
     """
-    生成并下载PDF学习报告
+    提交PDF学习报告生成任务
+    
+    数据未变化时直接返回已生成报告（status=done, cached=true）
     
     Args:
         user_id: 用户ID
         db: 数据库会话
         
     Returns:
-        FileResponse: PDF文件
+        dict: 任务ID、状态和进度
     """
-    import logging
-    import sys
-    logger = logging.getLogger(__name__)
-    
-    # 使用多种方式确保日志输出
-    print("\n" + "="*80, flush=True)
-    print(f"📄 [PDF报告] 开始生成PDF报告，用户ID: {user_id}", flush=True)
-    print("="*80 + "\n", flush=True)
-    logger.info(f"📄 开始生成PDF报告，用户ID: {user_id}")
-    sys.stdout.flush()
-    
     try:
-        # 生成PDF报告
-        print("🔄 [PDF报告] 调用generate_pdf_report函数...", flush=True)
-        sys.stdout.flush()
-        logger.info("🔄 调用generate_pdf_report函数...")
-        report_path = generate_pdf_report(user_id)
-        print(f"✅ [PDF报告] PDF报告生成成功: {report_path}", flush=True)
-        sys.stdout.flush()
-        logger.info(f"✅ PDF报告生成成功: {report_path}")
-        
-        if not os.path.exists(report_path):
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="PDF报告生成失败"
-            )
-        
-        # 返回文件
-        return FileResponse(
-            path=report_path,
-            filename=os.path.basename(report_path),
-            media_type="application/pdf"
+        return report_job_manager.submit(db, user_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"提交报告任务失败: {str(e)}"
         )
-        
-    except ValueError as e:
+
+
+@router.get("/report/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    """查询报告任务状态与进度"""
+    job = report_job_manager.get(job_id)
+    if job is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="报告任务不存在或已过期"
+        )
+    return job
+
+
+@router.get("/report/jobs/{job_id}/download")
+async def download_report_job(job_id: str):
+    """下载已完成任务的PDF报告"""
+    job = report_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="报告任务不存在或已过期"
         )
+    if job["status"] == STATUS_FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"生成PDF报告失败: {job['error']}"
+        )
+    if job["status"] != STATUS_DONE:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="报告仍在生成中"
+        )
+    return _report_response(job_id, job["user_id"])
+
+
+@router.get("/report/{user_id}")
+async def download_report(
+    user_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    生成并下载PDF学习报告（兼容接口：提交任务并等待完成）
+    
+    Args:
+        user_id: 用户ID
+        db: 数据库会话
+        
+    Returns:
+        FileResponse: PDF文件
+    """
+    try:
+        job = report_job_manager.submit(db, user_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"下载报告失败: {str(e)}"
         )
+    job = await report_job_manager.wait(job["job_id"], settings.REPORT_WAIT_TIMEOUT)
+    if job is None or job["status"] in (STATUS_QUEUED, STATUS_RUNNING):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="报告生成超时，请稍后重试"
+        )
+    if job["status"] == STATUS_FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=job["error"]
+        )
+    return _report_response(job["job_id"], user_id)
 
 
 @router.get("/stats/{user_id}")
@@ -188,55 +164,7 @@ async def get_detailed_stats(
         dict: 详细统计数据
     """
     try:
-        quizzes = db.query(Quiz).filter(Quiz.user_id == user_id).order_by(Quiz.created_at.asc()).all()
-        study_plans = db.query(StudyPlan).filter(StudyPlan.user_id == user_id).all()
-        
-        # 按主题统计
-        topic_stats = {}
-        for quiz in quizzes:
-            topic = quiz.topic or "未分类"
-            if topic not in topic_stats:
-                topic_stats[topic] = {"count": 0, "total_score": 0, "scores": []}
-            topic_stats[topic]["count"] += 1
-            topic_stats[topic]["total_score"] += quiz.score
-            topic_stats[topic]["scores"].append(quiz.score)
-        
-        # 计算每个主题的平均分
-        topic_averages = []
-        for topic, stats in topic_stats.items():
-            avg = stats["total_score"] / stats["count"] if stats["count"] > 0 else 0
-            topic_averages.append({
-                "topic": topic,
-                "average_score": round(avg, 1),
-                "count": stats["count"]
-            })
-        
-        # 按月份统计
-        monthly_stats = {}
-        for quiz in quizzes:
-            if quiz.created_at:
-                month_key = quiz.created_at.strftime('%Y-%m')
-                if month_key not in monthly_stats:
-                    monthly_stats[month_key] = {"count": 0, "total_score": 0}
-                monthly_stats[month_key]["count"] += 1
-                monthly_stats[month_key]["total_score"] += quiz.score
-        
-        monthly_data = []
-        for month, stats in sorted(monthly_stats.items()):
-            avg = stats["total_score"] / stats["count"] if stats["count"] > 0 else 0
-            monthly_data.append({
-                "month": month,
-                "average_score": round(avg, 1),
-                "count": stats["count"]
-            })
-        
-        return {
-            "success": True,
-            "topic_statistics": topic_averages,
-            "monthly_statistics": monthly_data,
-            "total_quizzes": len(quizzes),
-            "total_plans": len(study_plans)
-        }
+        return AnalyticsService.get_detailed_stats(db, user_id)
         
     except Exception as e:
         raise HTTPException(
@@ -2,16 +2,18 @@
 聊天记录相关路由
 支持保存和加载用户的AI对话历史
 """
-from fastapi import APIRouter, HTTPException, status, Depends
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from database import get_db
+from database import get_db, get_async_db, AsyncDBSession
 from core.security import get_current_user
 from models.users import User
 from models.chat_sessions import ChatSession, ChatMessage
+from repositories.chat_repo import ChatRepository
 from datetime import datetime
+import base64
 
 router = APIRouter(prefix="/api/v1/chat", tags=["聊天记录"])
 
@@ -22,6 +24,7 @@ class MessageSchema(BaseModel):
     role: str  # "user" 或 "ai"
     content: str
     provider: Optional[str] = None  # AI模型提供商（仅AI消息）
+    seq: Optional[int] = None  # 会话内序号（追加/增量同步使用）
 
     class Config:
         from_attributes = True
@@ -32,7 +35,12 @@ class ChatSessionSchema(BaseModel):
     id: Optional[int] = None
     title: str
     createdAt: str
+    updatedAt: Optional[str] = None
     messages: List[MessageSchema] = []
+    # 列表接口返回的摘要信息（不加载消息时用于渲染侧边栏）
+    messageCount: Optional[int] = None
+    lastMessageRole: Optional[str] = None
+    lastMessagePreview: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -41,11 +49,37 @@ class ChatSessionSchema(BaseModel):
 class ChatSessionListResponse(BaseModel):
     """会话列表响应"""
     sessions: List[ChatSessionSchema]
+    next_cursor: Optional[str] = None  # 下一页游标（编码了本页最后一个会话的更新时间和ID），没有更多时为空
+    has_more: bool = False
 
 
 class ChatSessionResponse(BaseModel):
     """单个会话响应"""
     session: ChatSessionSchema
+    last_seq: Optional[int] = None  # 会话当前最大消息序号，作为下次增量拉取的 since
+
+
+class AppendMessageSchema(BaseModel):
+    """追加的消息（seq 由客户端分配，会话内唯一，重复提交会被忽略）"""
+    seq: int = Field(..., ge=0)
+    role: str
+    content: str
+    provider: Optional[str] = None
+
+
+class AppendMessagesRequest(BaseModel):
+    """追加消息请求"""
+    messages: List[AppendMessageSchema] = Field(default_factory=list, max_length=200)
+    title: Optional[str] = None
+
+
+class AppendMessagesResponse(BaseModel):
+    """追加消息响应（只返回本次新增的消息）"""
+    session_id: int
+    title: str
+    messages: List[MessageSchema]
+    skipped: int  # 因 seq 已存在而忽略的条数
+    last_seq: Optional[int] = None
 
 
 class CreateSessionRequest(BaseModel):
@@ -59,65 +93,92 @@ class UpdateSessionRequest(BaseModel):
     messages: Optional[List[MessageSchema]] = None
 
 
+def _message_schema(msg: ChatMessage) -> MessageSchema:
+    return MessageSchema(
+        role=msg.role,
+        content=msg.content,
+        provider=msg.provider,
+        seq=msg.seq
+    )
+
+
+def _encode_cursor(session: ChatSession) -> str:
+    """会话列表游标：最后一个会话的 (updated_at, id)，URL 安全的 base64"""
+    raw = f"{session.updated_at.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        updated_at, session_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(session_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
 @router.get("/sessions", response_model=ChatSessionListResponse)
 async def get_sessions(
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    include_messages: bool = Query(False, description="是否返回每个会话的全部消息"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncDBSession = Depends(get_async_db)
 ):
     """
-    获取当前用户的所有聊天会话
-    返回最近的会话列表
+    获取当前用户的聊天会话列表
+    按最近更新时间倒序，游标分页；默认只返回消息数和最后一条消息预览
     """
-    sessions = (
-        db.query(ChatSession)
-        .filter(ChatSession.user_id == current_user.id)
-        .order_by(desc(ChatSession.updated_at))
-        .limit(limit)
-        .all()
+    rows, has_more = await ChatRepository.alist_sessions(
+        db,
+        current_user.id,
+        limit=limit,
+        before=_decode_cursor(cursor) if cursor else None,
+        include_messages=include_messages,
     )
     
     result = []
-    for session in sessions:
-        # 加载消息
-        messages = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.session_id == session.id)
-            .order_by(ChatMessage.created_at)
-            .all()
-        )
-        
+    for session, message_count, last_role, last_preview in rows:
         result.append(ChatSessionSchema(
             id=session.id,
             title=session.title,
             createdAt=session.created_at.isoformat(),
+            updatedAt=session.updated_at.isoformat() if session.updated_at else None,
             messages=[
                 MessageSchema(
                     role=msg.role,
                     content=msg.content,
                     provider=msg.provider
                 )
-                for msg in messages
-            ]
+                for msg in session.messages
+            ] if include_messages else [],
+            messageCount=message_count,
+            lastMessageRole=last_role,
+            lastMessagePreview=last_preview,
         ))
     
-    return ChatSessionListResponse(sessions=result)
+    return ChatSessionListResponse(
+        sessions=result,
+        next_cursor=_encode_cursor(rows[-1][0]) if has_more and rows else None,
+        has_more=has_more,
+    )
 
 
 @router.get("/sessions/{session_id}", response_model=ChatSessionResponse)
 async def get_session(
     session_id: int,
+    since: Optional[int] = Query(None, ge=-1, description="只返回 seq 大于该值的消息（增量拉取）"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncDBSession = Depends(get_async_db)
 ):
     """
     获取指定会话的详细信息
+    传入 since 时只返回之后新增的消息
     """
-    session = (
-        db.query(ChatSession)
-        .filter(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
-        .first()
-    )
+    session = await ChatRepository.aget_session(db, session_id, current_user.id)
     
     if not session:
         raise HTTPException(
@@ -126,27 +187,53 @@ async def get_session(
         )
     
     # 加载消息
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session.id)
-        .order_by(ChatMessage.created_at)
-        .all()
-    )
+    messages = await ChatRepository.aget_messages(db, session.id, since=since)
+    last_seq = messages[-1].seq if messages else (since if since is not None else None)
     
     return ChatSessionResponse(
         session=ChatSessionSchema(
             id=session.id,
             title=session.title,
             createdAt=session.created_at.isoformat(),
-            messages=[
-                MessageSchema(
-                    role=msg.role,
-                    content=msg.content,
-                    provider=msg.provider
-                )
-                for msg in messages
-            ]
+            updatedAt=session.updated_at.isoformat() if session.updated_at else None,
+            messages=[_message_schema(msg) for msg in messages]
+        ),
+        last_seq=last_seq
+    )
+
+
+@router.post("/sessions/{session_id}/messages", response_model=AppendMessagesResponse)
+async def append_messages(
+    session_id: int,
+    request: AppendMessagesRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    追加消息（只提交新消息，不重写整个会话）
+    按 seq 幂等：重复提交的消息会被跳过；同时可更新标题
+    """
+    session = ChatRepository.get_session(db, session_id, current_user.id)
+    
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="会话不存在"
         )
+    
+    inserted = ChatRepository.append_messages(
+        db,
+        session,
+        [msg.model_dump() for msg in request.messages],
+        title=request.title,
+    )
+    
+    return AppendMessagesResponse(
+        session_id=session.id,
+        title=request.title if request.title is not None else session.title,
+        messages=[_message_schema(msg) for msg in inserted],
+        skipped=len({msg.seq for msg in request.messages}) - len(inserted),
+        last_seq=ChatRepository.last_seq(db, session.id),
     )
 
 
@@ -203,46 +290,29 @@ async def update_session(
     if request.title is not None:
         session.title = request.title
     
-    # 更新消息
+    # 更新消息（整体替换，按顺序重新编号）
     if request.messages is not None:
-        # 删除旧消息
-        db.query(ChatMessage).filter(ChatMessage.session_id == session.id).delete()
-        
-        # 添加新消息
-        for msg_data in request.messages:
-            message = ChatMessage(
-                session_id=session.id,
-                role=msg_data.role,
-                content=msg_data.content,
-                provider=msg_data.provider
-            )
-            db.add(message)
+        ChatRepository.replace_messages(
+            db,
+            session,
+            [msg.model_dump(exclude={"seq"}) for msg in request.messages]
+        )
     
     db.commit()
     db.refresh(session)
     
     # 重新加载消息
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session.id)
-        .order_by(ChatMessage.created_at)
-        .all()
-    )
+    messages = ChatRepository.get_messages(db, session.id)
     
     return ChatSessionResponse(
         session=ChatSessionSchema(
             id=session.id,
             title=session.title,
             createdAt=session.created_at.isoformat(),
-            messages=[
-                MessageSchema(
-                    role=msg.role,
-                    content=msg.content,
-                    provider=msg.provider
-                )
-                for msg in messages
-            ]
-        )
+            updatedAt=session.updated_at.isoformat() if session.updated_at else None,
+            messages=[_message_schema(msg) for msg in messages]
+        ),
+        last_seq=messages[-1].seq if messages else None
     )
 
 
@@ -5,9 +5,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, status
 from fastapi.responses import JSONResponse
 import os
-import shutil
 from typing import Optional
-from utils.file_parser import parse_file, get_file_info
+from utils.file_parser import get_file_info
+from utils.upload_store import UploadTooLarge, upload_store
 
 router = APIRouter(prefix="/api/v1/files", tags=["文件上传"])
 
@@ -40,44 +40,29 @@ async def upload_file(file: UploadFile = File(...)):
                 detail=f"不支持的文件类型: {file_ext}。支持的类型: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
-        # 保存文件
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        
-        # 如果文件已存在，添加时间戳
-        if os.path.exists(file_path):
-            import time
-            name, ext = os.path.splitext(file.filename)
-            file_path = os.path.join(UPLOAD_DIR, f"{name}_{int(time.time())}{ext}")
-        
-        # 读取并保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 检查文件大小
-        file_size = os.path.getsize(file_path)
-        if file_size > MAX_FILE_SIZE:
-            os.remove(file_path)
+        # 流式保存（按内容哈希去重），超过大小上限时立即停止
+        try:
+            stored = await upload_store.save(file, file_ext, max_bytes=MAX_FILE_SIZE)
+        except UploadTooLarge:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"文件过大: {file_size / 1024 / 1024:.2f}MB，最大允许: {MAX_FILE_SIZE / 1024 / 1024}MB"
+                detail=f"文件过大，最大允许: {MAX_FILE_SIZE / 1024 / 1024}MB"
             )
+        file_path = stored.path
+        file_size = stored.size
         
-        # 解析文件内容
+        # 解析文件内容（相同内容之前解析过时直接返回缓存结果）
         try:
-            text_content, text_length = parse_file(file_path)
-            print(f"[INFO] 文件解析成功: {file.filename}, 提取文本长度: {text_length} 字符")
+            text_content, text_length, cached = upload_store.parse(stored)
+            print(f"[INFO] 文件解析成功: {file.filename}, 提取文本长度: {text_length} 字符{'（缓存）' if cached else ''}")
         except ValueError as e:
-            # 如果解析失败（不支持的类型或内容为空），删除文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # 如果解析失败（不支持的类型或内容为空），新上传的文件已被删除
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"文件解析失败: {str(e)}"
             )
         except Exception as e:
             # 其他解析错误
-            if os.path.exists(file_path):
-                os.remove(file_path)
             print(f"[ERROR] 文件解析异常: {file.filename}, 错误: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -89,9 +74,13 @@ async def upload_file(file: UploadFile = File(...)):
             "success": True,
             "file_name": file.filename,
             "file_path": file_path,
+            "stored_name": stored.name,
+            "content_hash": stored.sha256,
+            "deduplicated": stored.existed,
             "file_size": file_size,
             "text_length": text_length,
             "text_preview": text_content[:200] + "..." if len(text_content) > 200 else text_content,
+            "parse_cached": cached,
             "message": "文件上传并解析成功"
         })
         
@@ -110,14 +99,16 @@ async def get_file_info_endpoint(file_name: str):
     获取文件信息
     
     Args:
-        file_name: 文件名
+        file_name: 文件名（旧版上传目录中的文件名，或上传接口返回的 stored_name）
         
     Returns:
         dict: 文件信息
     """
     file_path = os.path.join(UPLOAD_DIR, file_name)
-    
     if not os.path.exists(file_path):
+        file_path = upload_store.resolve(file_name)
+    
+    if not file_path:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="文件不存在"
@@ -2,10 +2,14 @@
 知识图谱路由
 作者：智学伴开发团队
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Header, Query, Response, status
 from sqlalchemy.orm import Session
-from database import get_db
+from core.config import settings
+from database import get_db, get_async_db, AsyncDBSession
 from services.learning_map_service import LearningMapService
+from utils.learning_map_jobs import learning_map_job_manager, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING
+from utils.etag import etag_matches, make_etag
+from utils.graph_cache import graph_cache
 from typing import Optional
 from schemas.learning_map import (
     LearningMapUploadResponse,
@@ -40,49 +44,103 @@ async def upload_learning_file(
         )
 
 
+@router.post("/generate/jobs")
+async def submit_learning_map_job(request: LearningMapGenerateRequest):
+    """
+    提交知识图谱生成任务
+
+    长资料分块抽取可能需要数分钟，客户端轮询 GET /generate/jobs/{job_id}，
+    status=done 时 result 与 POST /generate 的返回相同
+    """
+    return learning_map_job_manager.submit(
+        user_id=request.user_id,
+        file_id=request.file_id,
+        course_topic=request.course_topic,
+        provider=request.provider,
+    )
+
+
+@router.get("/generate/jobs/{job_id}")
+async def get_learning_map_job(job_id: str):
+    """查询知识图谱生成任务的状态与进度"""
+    job = learning_map_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="生成任务不存在或已过期",
+        )
+    return job
+
+
 @router.post("/generate", response_model=LearningMapGenerateResponse)
-async def generate_learning_map(
-    request: LearningMapGenerateRequest,
-    db: Session = Depends(get_db),
-):
+async def generate_learning_map(request: LearningMapGenerateRequest):
     """
-    根据文件或课程主题生成知识图谱
+    根据文件或课程主题生成知识图谱（兼容接口：提交任务并等待完成）
+
+    超过 LEARNING_MAP_WAIT_TIMEOUT 秒仍未完成时返回 503，生成继续在后台进行
     """
-    try:
-        result = LearningMapService.generate_graph(
-            db,
-            user_id=request.user_id,
-            file_id=request.file_id,
-            course_topic=request.course_topic,
-            provider=request.provider,
+    job = learning_map_job_manager.submit(
+        user_id=request.user_id,
+        file_id=request.file_id,
+        course_topic=request.course_topic,
+        provider=request.provider,
+    )
+    job = await learning_map_job_manager.wait(job["job_id"], settings.LEARNING_MAP_WAIT_TIMEOUT)
+    if job is None or job["status"] in (STATUS_QUEUED, STATUS_RUNNING):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="知识图谱仍在生成中，请稍后在历史记录中查看",
         )
-        return result
-    except ValueError as exc:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
-    except Exception as exc:
+    if job["status"] == STATUS_FAILED:
+        if job["error_code"] == status.HTTP_400_BAD_REQUEST:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=job["error"])
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"生成知识图谱失败: {exc}",
+            detail=f"生成知识图谱失败: {job['error']}",
         )
+    return job["result"]
 
 
 @router.get("/{user_id}/graph", response_model=LearningGraphResponse)
 async def get_learning_graph(
     user_id: int,
     session_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    format: str = Query("full", regex="^(full|compact)$"),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncDBSession = Depends(get_async_db),
 ):
     """
     获取用户知识图谱数据
+
+    直接返回缓存的已编码JSON（客户端支持时为gzip）；图谱不可变，ETag 未变化时返回 304。
+    format=compact 时节点按列返回、边为按节点下标的邻接表
     """
     try:
-        graph = LearningMapService.get_graph(db, user_id, session_id=session_id)
-        return graph
+        cached = await LearningMapService.aget_graph_cached(
+            db, user_id, session_id=session_id, fmt=format
+        )
     except Exception as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"查询知识图谱失败: {exc}",
         )
+    if cached is None:
+        return Response(content=graph_cache.empty(format), media_type="application/json")
+
+    body, gzipped = cached.content(accept_gzip="gzip" in (accept_encoding or "").lower())
+    # gzip 与未压缩是同一资源的不同表示，使用不同的强 ETag
+    etag_key = f"{cached.key}-gz" if gzipped else cached.key
+    headers = {
+        "ETag": make_etag(etag_key),
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(if_none_match, etag_key):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/{user_id}/history", response_model=LearningMapHistoryResponse)
@@ -114,9 +172,7 @@ async def delete_learning_map_session(
     删除知识图谱会话
     """
     try:
-        from repositories.learning_map_repo import LearningMapRepository
-        
-        success = LearningMapRepository.delete_session(db, user_id, session_id)
+        success = LearningMapService.delete_session(db, user_id, session_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
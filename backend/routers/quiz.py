@@ -2,21 +2,24 @@
 测评路由
 处理AI出题、答题提交和批改、智能组卷、试卷导出
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Body, Query, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Query, Response, Header
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db, AsyncDBSession
 from models.quizzes import Quiz
+from repositories.quiz_repo import QuizRepository
 from utils.quiz_generator import generate_quiz, evaluate_quiz
 from services.quiz_paper_service import QuizPaperService
-from utils.paper_exporter import PaperExporter
+from services.analytics_service import AnalyticsService
+from utils.export_pool import export_pool, ExportBusyError, ExportUnavailableError
+from utils.export_cache import export_cache
 from core.logger import logger
 from datetime import datetime
 import json
 import os
-import tempfile
+from urllib.parse import quote
 
 router = APIRouter(prefix="/api/v1/quiz", tags=["AI测评"])
 
@@ -139,8 +142,11 @@ async def quiz_submit(
         )
         
         db.add(quiz)
-        db.commit()
+        db.flush()
         db.refresh(quiz)
+        # 同一事务内累加学习统计
+        AnalyticsService.record_quiz(db, quiz)
+        db.commit()
         
         # 返回结果
         return {
@@ -170,7 +176,7 @@ async def quiz_submit(
 @router.get("/history/{user_id}")
 async def get_quiz_history(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncDBSession = Depends(get_async_db)
 ):
     """
     获取用户的测评历史记录
@@ -183,7 +189,7 @@ async def get_quiz_history(
         List[QuizResponse]: 测评记录列表
     """
     try:
-        quizzes = db.query(Quiz).filter(Quiz.user_id == user_id).order_by(Quiz.created_at.desc()).all()
+        quizzes = await QuizRepository.alist_by_user(db, user_id)
         
         result = []
         for quiz in quizzes:
@@ -300,7 +306,7 @@ async def generate_paper(
             "total_score": request.total_score
         }
         
-        result = QuizPaperService.generate_custom_paper(db, request.user_id, config)
+        result = await QuizPaperService.generate_custom_paper(db, request.user_id, config)
         return result
         
     except ValueError as e:
@@ -315,15 +321,64 @@ async def generate_paper(
         )
 
 
+@router.post("/paper/generate/stream")
+async def generate_paper_stream(
+    request: PaperGenerateRequest,
+    stream_format: str = Query("sse", pattern="^(sse|ndjson)$", description="输出格式：sse 或 ndjson"),
+    db: Session = Depends(get_db)
+):
+    """
+    流式生成自定义试卷
+    
+    每解析出一道题立即推送，全部生成后保存试卷并推送 done 事件（含 paper_id）
+    
+    Args:
+        request: 组卷配置
+        stream_format: sse（text/event-stream，以 [DONE] 结束）或 ndjson（每行一个JSON事件）
+        db: 数据库会话
+        
+    Returns:
+        StreamingResponse: 事件类型 start / question / done / error
+    """
+    config = {
+        "title": request.title,
+        "subject": request.subject,
+        "grade_level": request.grade_level,
+        "total_questions": request.total_questions,
+        "difficulty_distribution": request.difficulty_distribution or {"easy": 30, "medium": 50, "hard": 20},
+        "question_type_distribution": request.question_type_distribution or {"choice": 15, "fill": 5},
+        "knowledge_points": request.knowledge_points,
+        "time_limit": request.time_limit,
+        "total_score": request.total_score
+    }
+    
+    async def generate():
+        async for event in QuizPaperService.generate_custom_paper_stream(db, request.user_id, config):
+            payload = json.dumps(event, ensure_ascii=False)
+            if stream_format == "ndjson":
+                yield payload + "\n"
+            else:
+                yield f"data: {payload}\n\n"
+        if stream_format == "sse":
+            yield "data: [DONE]\n\n"
+    
+    media_type = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/paper/{paper_id}")
 async def get_paper(
     paper_id: int,
     user_id: int = Query(...),
-    db: Session = Depends(get_db)
+    db: AsyncDBSession = Depends(get_async_db)
 ):
     """获取试卷详情"""
     try:
-        paper = QuizPaperService.get_paper(db, paper_id, user_id)
+        paper = await QuizPaperService.aget_paper(db, paper_id, user_id)
         if not paper:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -344,11 +399,11 @@ async def list_papers(
     user_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncDBSession = Depends(get_async_db)
 ):
     """获取用户的试卷列表"""
     try:
-        papers = QuizPaperService.list_papers(db, user_id, skip, limit)
+        papers = await QuizPaperService.alist_papers(db, user_id, skip, limit)
         return {"success": True, "papers": papers, "count": len(papers)}
     except Exception as e:
         raise HTTPException(
@@ -387,30 +442,53 @@ async def export_paper(
     user_id: int = Query(...),
     format: str = Query("pdf", regex="^(pdf|word)$"),
     include_answer: bool = Query(True),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncDBSession = Depends(get_async_db)
 ):
     """
     导出试卷
     
+    同一试卷版本、格式和答案选项的导出结果会被缓存；ETag 未变化时返回 304
+    
     Args:
         paper_id: 试卷ID
         user_id: 用户ID
         format: 导出格式（pdf/word）
         include_answer: 是否包含答案
+        if_none_match: 客户端缓存的 ETag
         db: 数据库会话
         
     Returns:
-        FileResponse: 导出的文件
+        Response: 导出的文件
     """
     try:
         # 获取试卷数据
-        paper = QuizPaperService.get_paper(db, paper_id, user_id)
+        paper = await QuizPaperService.aget_paper(db, paper_id, user_id)
         if not paper:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="试卷不存在"
             )
         
+        file_ext = "pdf" if format == "pdf" else "docx"
+        filename = f"试卷_{paper_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_ext}"
+        media_type = "application/pdf" if format == "pdf" else "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        cache_key = export_cache.key(paper_id, paper.get("updated_at") or paper.get("created_at"), format, include_answer)
+        headers = {
+            "ETag": export_cache.etag(cache_key),
+            "Access-Control-Expose-Headers": "Content-Disposition, ETag",
+            "Cache-Control": "private, no-cache"
+        }
+        
+        # 客户端已有相同版本
+        if export_cache.etag_matches(if_none_match, cache_key):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        # 命中导出缓存，直接返回磁盘文件
+        cached_path = export_cache.get(paper_id, cache_key, file_ext)
+        if cached_path:
+            return FileResponse(cached_path, filename=filename, media_type=media_type, headers=headers)
+        
         # 准备导出数据
         export_data = {
             "title": paper["title"],
@@ -424,33 +502,24 @@ async def export_paper(
         if include_answer:
             export_data["answer_key"] = paper.get("answer_key")
         
-        # 创建临时文件
-        temp_dir = tempfile.gettempdir()
-        file_ext = "pdf" if format == "pdf" else "docx"
-        filename = f"试卷_{paper_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_ext}"
-        output_path = os.path.join(temp_dir, filename)
+        # 在导出进程池中生成文件（不阻塞事件循环），结果写入缓存并直接从内存返回
+        content = await export_pool.run(export_data, format)
+        export_cache.put(paper_id, cache_key, file_ext, content)
         
-        # 导出文件
-        if format == "pdf":
-            PaperExporter.export_to_pdf(export_data, output_path)
-        else:
-            PaperExporter.export_to_word(export_data, output_path)
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+        return Response(content=content, media_type=media_type, headers=headers)
         
-        # 返回文件
-        media_type = "application/pdf" if format == "pdf" else "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        headers = {
-            "Access-Control-Expose-Headers": "Content-Disposition",
-            "Cache-Control": "no-store"
-        }
-        resp = FileResponse(
-            output_path,
-            filename=filename,
-            media_type=media_type
+    except ExportBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ExportUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
         )
-        for k, v in headers.items():
-            resp.headers[k] = v
-        return resp
-        
     except HTTPException:
         raise
     except ValueError as e:
@@ -121,6 +121,9 @@ class DashboardStats(BaseModel):
     total_prompts: int
     api_calls_today: int
     api_calls_total: int
+    api_calls_cached_today: int = 0  # 其中命中响应缓存的次数
+    api_calls_cached_total: int = 0
+    ai_cache: Optional[Dict[str, Any]] = None  # 进程内缓存命中/未命中计数
 
 
 # 图表数据
@@ -170,6 +173,13 @@ class APICallLogResponse(BaseModel):
     provider: Optional[str]
     source: str
     success: bool
+    cache_hit: bool = False
+    user_id: Optional[int] = None
+    model: Optional[str] = None
+    latency_ms: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
     created_at: datetime
     
     class Config:
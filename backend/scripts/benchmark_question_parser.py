@@ -0,0 +1,117 @@
+"""
+题目解析器基准测试脚本
+作者：智学伴开发团队
+目的：在AI原始输出语料上对比增量解析器与旧版多遍解析器的耗时和解析题数
+用法：
+    # 使用内置的畸形输出样例
+    python scripts/benchmark_question_parser.py
+    # 使用真实语料（目录下每个 .txt 文件为一次AI原始输出）
+    python scripts/benchmark_question_parser.py --corpus ./ai_outputs
+    # 与旧版解析器对比（先从历史提交导出旧版服务文件）
+    git show <commit>:backend/services/quiz_paper_service.py > /tmp/legacy_quiz_paper_service.py
+    python scripts/benchmark_question_parser.py --legacy /tmp/legacy_quiz_paper_service.py
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.question_parser import iter_questions, parse_questions
+
+
+def _sample_question(idx: int) -> Dict:
+    return {
+        "question": f"第{idx}题：已知函数 f(x) = x^2 + {idx}x，求 f'(1) 的值。" + "请写出推导过程。" * 8,
+        "type": "choice",
+        "options": ["A. 1", "B. 2", f"C. {idx + 2}", "D. 4"],
+        "answer": "C",
+        "difficulty": "medium",
+        "knowledge_point": "导数",
+    }
+
+
+def build_sample_corpus(questions_per_output: int = 15) -> Dict[str, str]:
+    """构造常见的畸形AI输出样例"""
+    questions = [_sample_question(i) for i in range(questions_per_output)]
+    pretty = json.dumps({"questions": questions}, ensure_ascii=False, indent=2)
+    corpus = {
+        "fenced": f"好的，以下是试卷：\n```json\n{pretty}\n```\n希望对你有帮助。",
+        "truncated": pretty[: int(len(pretty) * 0.8)],
+        "raw_newlines": pretty.replace("请写出推导过程。", "请写出\n推导过程。"),
+        "trailing_commas": pretty.replace('"knowledge_point": "导数"', '"knowledge_point": "导数",'),
+        "string_array": json.dumps(
+            {"questions": [json.dumps(q, ensure_ascii=False) for q in questions]}, ensure_ascii=False
+        ),
+        "bad_difficulty": pretty.replace('"difficulty": "medium"', '"difficulty": "med'),
+    }
+    return corpus
+
+
+def load_corpus(corpus_dir: Path) -> Dict[str, str]:
+    return {
+        path.name: path.read_text(encoding="utf-8")
+        for path in sorted(corpus_dir.glob("*.txt"))
+    }
+
+
+def load_legacy_parser(path: Path) -> Callable[[str], List[Dict]]:
+    spec = importlib.util.spec_from_file_location("legacy_quiz_paper_service", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.QuizPaperService._parse_questions_from_text
+
+
+def stream_parse(text: str, chunk_size: int = 16) -> List[Dict]:
+    """模拟流式token逐块输入"""
+    return list(iter_questions(text[i:i + chunk_size] for i in range(0, len(text), chunk_size)))
+
+
+def bench(parser: Callable[[str], List[Dict]], text: str, rounds: int):
+    count = len(parser(text))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parser(text)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / rounds
+    return count, elapsed_ms
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="题目解析器基准测试")
+    arg_parser.add_argument("--corpus", type=Path, help="AI原始输出语料目录（*.txt）")
+    arg_parser.add_argument("--legacy", type=Path, help="旧版 quiz_paper_service.py 路径")
+    arg_parser.add_argument("--rounds", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    # 旧版解析器日志量很大，基准测试时静默
+    logging.getLogger("zhixueban").setLevel(logging.CRITICAL)
+
+    corpus = load_corpus(args.corpus) if args.corpus else build_sample_corpus()
+    parsers = {"incremental": parse_questions, "incremental_stream": stream_parse}
+    if args.legacy:
+        parsers["legacy"] = load_legacy_parser(args.legacy)
+
+    header = f"{'sample':<20}{'chars':>8}" + "".join(f"{name:>26}" for name in parsers)
+    print(header)
+    totals = {name: [0, 0.0] for name in parsers}
+    for name, text in corpus.items():
+        row = f"{name:<20}{len(text):>8}"
+        for parser_name, parser in parsers.items():
+            count, elapsed_ms = bench(parser, text, args.rounds)
+            totals[parser_name][0] += count
+            totals[parser_name][1] += elapsed_ms
+            row += f"{f'{count}题 / {elapsed_ms:.3f}ms':>26}"
+        print(row)
+    print("-" * len(header))
+    print(f"{'total':<28}" + "".join(f"{f'{c}题 / {t:.3f}ms':>26}" for c, t in totals.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+API调用汇总重建脚本
+作者：智学伴开发团队
+目的：从原始调用日志重建小时/天汇总表，并可清理保留期之前的原始日志
+运行：python scripts/rebuild_api_call_rollups.py [--days 30] [--retention-days 90]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from database import SessionLocal, Base, engine
+import models  # noqa: F401  确保所有表注册到元数据
+from services.api_call_rollup_service import APICallRollupService
+from core.logger import logger
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="重建API调用汇总表")
+    parser.add_argument("--days", type=int, default=None, help="只重建最近几天，默认重建原始日志仍覆盖的全部范围（已清理时段的汇总保留）")
+    parser.add_argument("--retention-days", type=int, default=None,
+                        help="清理该天数之前的原始日志，默认使用 API_CALL_LOG_RETENTION_DAYS")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        result = APICallRollupService.rebuild(db, days=args.days)
+        print(f"✅ 汇总重建完成：{result['hourly_groups']} 个小时分组，{result['rollup_rows']} 行汇总")
+        deleted = APICallRollupService.compact(db, retention_days=args.retention_days)
+        if deleted:
+            print(f"🧹 已清理 {deleted} 条原始日志")
+    except Exception as e:
+        db.rollback()
+        print(f"\n❌ 重建失败: {e}")
+        logger.error(f"重建API调用汇总失败: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ from services.ai_service import AIService
 from core.logger import logger
 from core.config import settings
 from repositories.api_call_repo import APICallRepository
+from utils.ai_response_cache import response_cache
 
 
 class AdminService:
@@ -25,15 +26,19 @@ class AdminService:
         active_models = ModelConfigRepository.count_enabled(db)
         total_prompts = len(PromptRepository.get_all(db, skip=0, limit=1000))
         
-        api_calls_today = APICallRepository.count_today(db)
-        api_calls_total = APICallRepository.count_total(db)
+        # 调用统计读取预聚合的汇总表，不扫描原始日志
+        api_calls_today = APICallRepository.count_today(db, use_rollups=True)
+        api_calls_total = APICallRepository.count_total(db, use_rollups=True)
         
         return {
             "total_users": total_users,
             "active_models": active_models,
             "total_prompts": total_prompts,
             "api_calls_today": api_calls_today,
-            "api_calls_total": api_calls_total
+            "api_calls_total": api_calls_total,
+            "api_calls_cached_today": APICallRepository.count_today(db, cache_hit=True, use_rollups=True),
+            "api_calls_cached_total": APICallRepository.count_total(db, cache_hit=True, use_rollups=True),
+            "ai_cache": response_cache.stats()
         }
     
     @staticmethod
@@ -69,14 +74,14 @@ class AdminService:
     @staticmethod
     def get_chart_data(db: Session, days: int = 7) -> Dict[str, Any]:
         """获取图表数据"""
-        provider_stats = APICallRepository.get_provider_stats(db)
-        source_stats = APICallRepository.get_source_stats(db)
+        provider_stats = APICallRepository.get_provider_stats(db, use_rollups=True)
+        source_stats = APICallRepository.get_source_stats(db, use_rollups=True)
         
         # 如果选择1天，使用按小时统计；否则使用按天统计
         if days == 1:
-            time_stats = APICallRepository.get_hourly_stats(db)
+            time_stats = APICallRepository.get_hourly_stats(db, use_rollups=True)
         else:
-            time_stats = APICallRepository.get_daily_stats(db, days=days)
+            time_stats = APICallRepository.get_daily_stats(db, days=days, use_rollups=True)
         
         return {
             "provider_stats": provider_stats,
@@ -113,7 +118,7 @@ class AdminService:
         )
         converted_logs = []
         tz_utc = timezone.utc
-        tz_beijing = timezone(timedelta(hours=8))
+        tz_beijing = timezone(timedelta(hours=settings.STATS_UTC_OFFSET_HOURS))
         for log in logs:
             created_at = log.created_at
             if created_at:
@@ -130,6 +135,13 @@ class AdminService:
                     "provider": log.provider,
                     "source": log.source,
                     "success": log.success,
+                    "cache_hit": bool(log.cache_hit),
+                    "user_id": log.user_id,
+                    "model": log.model,
+                    "latency_ms": log.latency_ms,
+                    "prompt_tokens": log.prompt_tokens,
+                    "completion_tokens": log.completion_tokens,
+                    "total_tokens": log.total_tokens,
                     "created_at": created_str,
                 }
             )
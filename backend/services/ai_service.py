@@ -3,12 +3,14 @@ AI服务
 作者：智学伴开发团队
 目的：统一AI调用接口，支持fallback和文本清理
 """
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
 from sqlalchemy.orm import Session
 from utils.model_registry import registry
+from utils.ai_response_cache import response_cache, is_cache_enabled
 from utils.markdown_sanitizer import clean_ai_response
 from services.prompt_service import PromptService
-from repositories.api_call_repo import APICallRepository
+from utils.api_call_recorder import api_call_recorder
 from repositories.model_config_repo import ModelConfigRepository
 from core.logger import logger
 
@@ -17,37 +19,36 @@ class AIService:
     """AI服务类"""
     
     @staticmethod
-    def _record_api_call(db: Session, provider: Optional[str], source: str, success: bool) -> None:
-        """记录API调用日志，失败时只打印警告"""
+    def _record_api_call(
+        db: Session,
+        provider: Optional[str],
+        source: str,
+        success: bool,
+        cache_hit: bool = False,
+        user_id: Optional[int] = None,
+        result: Optional[Dict[str, Any]] = None,
+        latency_ms: Optional[float] = None
+    ) -> None:
+        """记录API调用日志（进入缓冲批量写库，附带模型、耗时和token用量），失败时只打印警告"""
+        result = result or {}
         try:
-            APICallRepository.record_call(db, provider, source=source, success=success)
+            api_call_recorder.record(
+                db,
+                provider,
+                source=source,
+                success=success,
+                cache_hit=cache_hit,
+                user_id=user_id,
+                model=result.get("model"),
+                latency_ms=latency_ms if latency_ms is not None else result.get("latency_ms"),
+                usage=None if cache_hit else result.get("usage")
+            )
         except Exception as log_error:
             logger.warning(f"记录API调用日志失败: {log_error}")
     
     @staticmethod
-    def call_ai(
-        db: Session,
-        user_prompt: str,
-        system_prompt_name: str = "system_prompt",
-        provider: Optional[str] = None,
-        temperature: float = 0.7,
-        max_tokens: int = 2000
-    ) -> Dict[str, Any]:
-        """
-        调用AI模型
-        
-        Args:
-            db: 数据库会话
-            user_prompt: 用户提示词
-            system_prompt_name: 系统Prompt名称
-            provider: 指定的提供商（可选）
-            temperature: 温度参数
-            max_tokens: 最大token数
-        
-        Returns:
-            Dict包含: provider, raw, text, metadata
-        """
-        # 构建消息列表
+    def _build_messages(db: Session, user_prompt: str, system_prompt_name: str) -> List[Dict[str, str]]:
+        """构建消息列表（系统Prompt + 用户消息）"""
         messages = []
         
         # 添加系统Prompt
@@ -69,6 +70,102 @@ class AIService:
             "role": "user",
             "content": user_prompt
         })
+        return messages
+    
+    @staticmethod
+    def _format_result(result: Dict[str, Any], cached: bool = False) -> Dict[str, Any]:
+        """把注册表返回结果整理为统一结构"""
+        raw_text = result.get("text", "")
+        cleaned_text = clean_ai_response(raw_text)
+        
+        return {
+            "provider": result.get("provider", "unknown"),
+            "raw": raw_text,
+            "text": cleaned_text,
+            "metadata": {
+                "usage": result.get("usage", {}),
+                "model": result.get("model", ""),
+                "latency_ms": 0 if cached else result.get("latency_ms", 0),
+                "cached": cached
+            }
+        }
+    
+    @staticmethod
+    def _cache_lookup(
+        messages: List[Dict[str, str]],
+        provider: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        source: str,
+        use_cache: Optional[bool]
+    ) -> Tuple[Optional[str], Optional[str], Optional[Dict[str, Any]]]:
+        """
+        查询响应缓存
+        
+        Returns:
+            (缓存键, 目标提供商, 缓存结果)；不走缓存时缓存键为 None
+        """
+        if not is_cache_enabled(source, use_cache):
+            return None, None, None
+        target = registry.resolve_target(provider)
+        if target is None:
+            return None, None, None
+        target_provider, model = target
+        key = response_cache.make_key(messages, target_provider, model, temperature, max_tokens)
+        return key, target_provider, response_cache.get(key)
+    
+    @staticmethod
+    def _cache_store(key: Optional[str], target_provider: Optional[str], result: Dict[str, Any]) -> None:
+        """缓存成功结果（发生fallback时结果来自其他提供商，不写入该键）"""
+        if key is None or not result.get("text") or result.get("provider") != target_provider:
+            return
+        response_cache.set(key, {
+            "provider": result.get("provider"),
+            "text": result.get("text", ""),
+            "usage": result.get("usage", {}),
+            "model": result.get("model", "")
+        })
+    
+    @staticmethod
+    def call_ai(
+        db: Session,
+        user_prompt: str,
+        system_prompt_name: str = "system_prompt",
+        provider: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        source: str = "user",
+        use_cache: Optional[bool] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        调用AI模型
+        
+        Args:
+            db: 数据库会话
+            user_prompt: 用户提示词
+            system_prompt_name: 系统Prompt名称
+            provider: 指定的提供商（可选）
+            temperature: 温度参数
+            max_tokens: 最大token数
+            source: 调用来源（写入API调用日志，并用于判断是否走缓存）
+            use_cache: 是否使用响应缓存，None 时按 AI_CACHE_ENABLED / AI_CACHE_DISABLED_SOURCES 决定
+            user_id: 发起调用的用户（写入API调用日志）
+        
+        Returns:
+            Dict包含: provider, raw, text, metadata（metadata.cached 表示是否命中缓存）
+        """
+        messages = AIService._build_messages(db, user_prompt, system_prompt_name)
+        
+        cache_key, target_provider, cached = AIService._cache_lookup(
+            messages, provider, temperature, max_tokens, source, use_cache
+        )
+        if cached is not None:
+            AIService._record_api_call(
+                db, cached.get("provider"), source=source, success=True, cache_hit=True,
+                user_id=user_id, result=cached, latency_ms=0
+            )
+            return AIService._format_result(cached, cached=True)
         
         # 调用AI（带fallback）
         try:
@@ -81,27 +178,109 @@ class AIService:
             AIService._record_api_call(
                 db,
                 result.get("provider", provider or "unknown"),
-                source="user",
-                success=True
+                source=source,
+                success=True,
+                user_id=user_id,
+                result=result
             )
-            
-            raw_text = result.get("text", "")
-            cleaned_text = clean_ai_response(raw_text)
-            
-            return {
-                "provider": result.get("provider", "unknown"),
-                "raw": raw_text,
-                "text": cleaned_text,
-                "metadata": {
-                    "usage": result.get("usage", {}),
-                    "model": result.get("model", ""),
-                    "latency_ms": result.get("latency_ms", 0)
-                }
-            }
+            AIService._cache_store(cache_key, target_provider, result)
+            return AIService._format_result(result)
         except Exception as e:
             logger.error(f"AI调用失败: {e}")
-            AIService._record_api_call(db, provider or "unknown", source="user", success=False)
+            AIService._record_api_call(db, provider or "unknown", source=source, success=False, user_id=user_id)
+            raise Exception(f"AI服务暂时不可用: {str(e)}")
+    
+    @staticmethod
+    async def acall_ai(
+        db: Session,
+        user_prompt: str,
+        system_prompt_name: str = "system_prompt",
+        provider: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        source: str = "user",
+        use_cache: Optional[bool] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        异步调用AI模型（参数与返回值同 call_ai）
+        
+        等待模型响应期间不占用事件循环，适合在 async 路由中使用
+        """
+        messages = AIService._build_messages(db, user_prompt, system_prompt_name)
+        
+        cache_key, target_provider, cached = AIService._cache_lookup(
+            messages, provider, temperature, max_tokens, source, use_cache
+        )
+        if cached is not None:
+            AIService._record_api_call(
+                db, cached.get("provider"), source=source, success=True, cache_hit=True,
+                user_id=user_id, result=cached, latency_ms=0
+            )
+            return AIService._format_result(cached, cached=True)
+        
+        try:
+            result = await registry.acall_with_fallback(
+                messages=messages,
+                preferred_provider=provider,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            AIService._record_api_call(
+                db,
+                result.get("provider", provider or "unknown"),
+                source=source,
+                success=True,
+                user_id=user_id,
+                result=result
+            )
+            AIService._cache_store(cache_key, target_provider, result)
+            return AIService._format_result(result)
+        except Exception as e:
+            logger.error(f"AI异步调用失败: {e}")
+            AIService._record_api_call(db, provider or "unknown", source=source, success=False, user_id=user_id)
+            raise Exception(f"AI服务暂时不可用: {str(e)}")
+    
+    @staticmethod
+    async def astream_ai(
+        db: Session,
+        user_prompt: str,
+        system_prompt_name: str = "system_prompt",
+        provider: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        source: str = "user",
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式调用AI模型，逐块产出原始文本（参数同 call_ai）
+        
+        调用结束后记录一次API调用日志（耗时为完整生成耗时）
+        """
+        messages = AIService._build_messages(db, user_prompt, system_prompt_name)
+        used_provider = provider or "unknown"
+        started = time.perf_counter()
+        
+        try:
+            async for chunk in registry.astream_with_fallback(
+                messages=messages,
+                preferred_provider=provider,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ):
+                used_provider = chunk["provider"]
+                yield chunk["delta"]
+        except Exception as e:
+            logger.error(f"AI流式调用失败: {e}")
+            AIService._record_api_call(
+                db, used_provider, source=source, success=False, user_id=user_id,
+                latency_ms=(time.perf_counter() - started) * 1000
+            )
             raise Exception(f"AI服务暂时不可用: {str(e)}")
+        AIService._record_api_call(
+            db, used_provider, source=source, success=True, user_id=user_id,
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
     
     @staticmethod
     def test_model_call(
@@ -149,7 +328,6 @@ class AIService:
         provider, default_params = provider_bundle
 
         try:
-            import time
             start_time = time.time()
 
             call_kwargs = {**default_params}
@@ -163,7 +341,9 @@ class AIService:
                 db,
                 provider_name,
                 source="admin_test",
-                success=True
+                success=True,
+                result=result,
+                latency_ms=latency
             )
 
             return {
@@ -0,0 +1,133 @@
+"""
+学习分析服务
+作者：智学伴开发团队
+目的：学习进度与详细统计的业务逻辑；读取按用户增量维护的统计汇总，测评提交时同步累加
+测试：pytest backend/tests/test_analytics_service.py
+"""
+from typing import Dict, Any
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.quizzes import Quiz
+from models.learner_stats import UserQuizStats
+from repositories.learner_stats_repo import LearnerStatsRepository
+
+
+class AnalyticsService:
+    """学习分析服务类"""
+
+    @staticmethod
+    def _ensure_summary(db: Session, user_id: int) -> UserQuizStats:
+        """
+        读取用户统计，不存在时（首次访问/旧数据）从测评记录重建一次
+
+        两个请求同时首次读取时都会重建，后提交的一方违反唯一约束：回滚后读取先提交的结果
+        """
+        summary = LearnerStatsRepository.get_summary(db, user_id)
+        if summary is None:
+            try:
+                summary = LearnerStatsRepository.rebuild_user(db, user_id)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                summary = LearnerStatsRepository.get_summary(db, user_id)
+                if summary is None:
+                    raise
+        return summary
+
+    @staticmethod
+    def record_quiz(db: Session, quiz: Quiz) -> None:
+        """测评提交后累加统计（与测评记录同一事务，调用方负责提交）"""
+        LearnerStatsRepository.record_quiz(db, quiz.user_id, quiz.topic, quiz.score, quiz.created_at)
+
+    @staticmethod
+    def get_progress(db: Session, user_id: int) -> Dict[str, Any]:
+        """学习进度：完成率、平均分、弱项、最近得分与趋势"""
+        summary = AnalyticsService._ensure_summary(db, user_id)
+        total_plans = LearnerStatsRepository.count_plans(db, user_id)
+
+        # 如果没有数据，返回默认值
+        if not summary.quiz_count and not total_plans:
+            return {
+                "completion_rate": 0,
+                "average_score": 0,
+                "total_tests": 0,
+                "total_plans": 0,
+                "weak_topics": [],
+                "recent_scores": [],
+                "score_trend": []
+            }
+
+        avg_score = summary.score_sum / summary.quiz_count if summary.quiz_count else 0
+
+        # 计算完成率（基于平均分）
+        completion_rate = min(100, int(avg_score)) if summary.quiz_count else 0
+
+        # 分析弱项（平均分低于80时，找出主题平均分低于70的，最弱的在前）
+        weak_topics = []
+        if avg_score < 80 and summary.quiz_count:
+            topic_averages = [
+                (row.score_sum / row.quiz_count, row.topic)
+                for row in LearnerStatsRepository.get_topic_stats(db, user_id)
+                if row.topic and row.quiz_count
+            ]
+            weak_topics = [topic for average, topic in sorted(topic_averages) if average < 70]
+
+        # 如果没有明确的弱项，但平均分较低，给出通用建议
+        if not weak_topics and avg_score < 80:
+            weak_topics = ["基础知识", "综合应用"]
+
+        # 最近10次得分（倒序），用于折线图和趋势
+        recent = LearnerStatsRepository.get_recent_scores(db, user_id, limit=10)
+        recent_scores = [item["score"] for item in recent[:5]][::-1]  # 按时间正序
+        score_trend = [
+            {
+                "index": i + 1,
+                "score": item["score"],
+                "date": item["created_at"].strftime('%m-%d') if item["created_at"] else ""
+            }
+            for i, item in enumerate(recent[::-1])
+        ]
+
+        return {
+            "completion_rate": completion_rate,
+            "average_score": round(avg_score, 1),
+            "total_tests": summary.quiz_count,
+            "total_plans": total_plans,
+            "weak_topics": weak_topics[:5],  # 最多返回5个弱项
+            "recent_scores": recent_scores,
+            "score_trend": score_trend,
+            "max_score": summary.max_score or 0,
+            "min_score": summary.min_score or 0
+        }
+
+    @staticmethod
+    def get_detailed_stats(db: Session, user_id: int) -> Dict[str, Any]:
+        """详细统计：按主题、按月的平均分与次数"""
+        summary = AnalyticsService._ensure_summary(db, user_id)
+
+        topic_averages = [
+            {
+                "topic": row.topic or "未分类",
+                "average_score": round(row.score_sum / row.quiz_count, 1) if row.quiz_count else 0,
+                "count": row.quiz_count
+            }
+            for row in LearnerStatsRepository.get_topic_stats(db, user_id)
+        ]
+        monthly_data = [
+            {
+                "month": row.month,
+                "average_score": round(row.score_sum / row.quiz_count, 1) if row.quiz_count else 0,
+                "count": row.quiz_count
+            }
+            for row in LearnerStatsRepository.get_monthly_stats(db, user_id)
+        ]
+
+        return {
+            "success": True,
+            "topic_statistics": topic_averages,
+            "monthly_statistics": monthly_data,
+            "total_quizzes": summary.quiz_count,
+            "total_plans": LearnerStatsRepository.count_plans(db, user_id)
+        }
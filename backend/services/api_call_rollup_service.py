@@ -0,0 +1,100 @@
+"""
+API调用汇总维护服务
+作者：智学伴开发团队
+目的：从原始调用日志重建小时/天汇总表，并按保留天数清理已汇总的原始日志
+运行：python scripts/rebuild_api_call_rollups.py --days 30 --retention-days 90
+测试：pytest backend/tests/test_api_call_rollup.py
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.logger import logger
+from repositories.api_call_repo import APICallRepository
+from repositories.api_call_rollup_repo import APICallRollupRepository
+
+
+class APICallRollupService:
+    """API调用汇总维护服务类"""
+
+    @staticmethod
+    def _local_midnight_utc(days_ago: int) -> datetime:
+        """统计时区下 days_ago 天前零点对应的UTC时间"""
+        offset = timedelta(hours=settings.STATS_UTC_OFFSET_HOURS)
+        local_today = (datetime.now(timezone.utc) + offset).replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=None
+        )
+        return local_today - timedelta(days=days_ago) - offset
+
+    @staticmethod
+    def _raw_coverage_start(db: Session) -> Optional[datetime]:
+        """
+        原始日志完整覆盖的最早汇总桶起点（最早一条原始日志所在统计日的零点，UTC）
+
+        compact() 按统计日零点清理，因此该日及之后的桶都能从原始日志完整重建；没有原始日志时返回 None
+        """
+        oldest = APICallRepository.oldest_created_at(db)
+        if oldest is None:
+            return None
+        return APICallRollupRepository.bucket_starts(oldest, settings.STATS_UTC_OFFSET_HOURS)[1]
+
+    @staticmethod
+    def rebuild(db: Session, days: Optional[int] = None) -> Dict[str, int]:
+        """
+        从原始日志重建汇总表
+
+        Args:
+            days: 只重建最近几天（按统计时区整天对齐），为空时重建原始日志覆盖的全部范围；
+                  修改 STATS_UTC_OFFSET_HOURS 后需全部重建
+
+        原始日志已被 compact() 清理过的时间段无法重建，这部分汇总始终保留：
+        重建范围不早于最早一条原始日志所在的统计日
+        """
+        start = APICallRollupService._local_midnight_utc(days - 1) if days else None
+        coverage_start = APICallRollupService._raw_coverage_start(db)
+        if coverage_start is None:
+            if APICallRollupRepository.has_rows(db):
+                logger.warning("没有原始API调用日志可供重建，保留现有汇总")
+            return {"hourly_groups": 0, "rollup_rows": 0}
+        if start is None or start < coverage_start:
+            if APICallRollupRepository.has_rows(db, before=coverage_start):
+                logger.warning(
+                    "原始日志只保留到 %s（UTC），更早的汇总来自已清理的日志，不参与重建",
+                    coverage_start.isoformat(),
+                )
+            start = coverage_start
+        hourly = APICallRepository.hourly_aggregates(db, start)
+        totals = APICallRollupRepository.aggregate(hourly, settings.STATS_UTC_OFFSET_HOURS)
+        rollup_rows = APICallRollupRepository.replace_since(db, totals, start)
+        db.commit()
+        logger.info("API调用汇总重建完成：%s个小时分组 -> %s行汇总", len(hourly), rollup_rows)
+        return {"hourly_groups": len(hourly), "rollup_rows": rollup_rows}
+
+    @staticmethod
+    def ensure_backfilled(db: Session) -> bool:
+        """汇总表为空但已有原始日志时（首次升级）全量重建，返回是否执行了重建"""
+        if APICallRollupRepository.has_rows(db) or APICallRepository.count_total(db) == 0:
+            return False
+        APICallRollupService.rebuild(db)
+        return True
+
+    @staticmethod
+    def compact(db: Session, retention_days: Optional[int] = None) -> int:
+        """
+        删除保留期之前的原始日志（其统计已在汇总表中），返回删除条数
+
+        retention_days 为空时使用 API_CALL_LOG_RETENTION_DAYS，<= 0 表示不清理
+        """
+        if retention_days is None:
+            retention_days = settings.API_CALL_LOG_RETENTION_DAYS
+        if retention_days <= 0:
+            return 0
+        APICallRollupService.ensure_backfilled(db)
+        cutoff = APICallRollupService._local_midnight_utc(retention_days)
+        deleted = APICallRepository.delete_before(db, cutoff)
+        db.commit()
+        if deleted:
+            logger.info("已清理%s条%s天前的原始API调用日志", deleted, retention_days)
+        return deleted
@@ -3,14 +3,19 @@
 作者：智学伴开发团队
 """
 import ast
+import asyncio
 import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from fastapi import UploadFile
 from sqlalchemy.orm import Session
-from utils.file_parser import parse_file
+from database import AsyncDBSession
+from utils.upload_store import upload_store
 from repositories.learning_map_repo import LearningMapRepository
+from utils.graph_cache import graph_cache, CachedGraph
+from utils.graph_merge import GraphMerger, chunk_spans, select_spans, iter_chunks
 from services.ai_service import AIService
+from core.config import settings
 from core.logger import logger
 
 
@@ -46,33 +51,28 @@ LEARNING_MAP_PROMPT = """
 {content}
 """
 
+LEARNING_MAP_CHUNK_PROMPT = """
+以下是一份较长学习资料的第 {index}/{total} 部分，各部分会分别抽取后合并为一张知识图谱。
+请只提取本部分实际讲到的知识点（3~12 个节点即可，不必满足“至少 6 个节点与 8 条边”），
+同一知识点请使用教材中的规范名称，以便与其他部分合并。
+{topic_line}""" + LEARNING_MAP_PROMPT
+
 
 class LearningMapService:
     """封装知识图谱业务逻辑"""
 
-    UPLOAD_DIR = Path("uploads") / "learning_map"
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
     @staticmethod
     async def upload_file(
         db: Session, user_id: int, file: UploadFile
     ) -> Dict[str, str]:
         file_ext = Path(file.filename).suffix.lower()
-        target_path = LearningMapService.UPLOAD_DIR / f"{user_id}_{file.filename}"
-        if target_path.exists():
-            target_path = LearningMapService.UPLOAD_DIR / (
-                f"{user_id}_{Path(file.filename).stem}_{target_path.stat().st_mtime_ns}{file_ext}"
-            )
-
-        content = await file.read()
-        with open(target_path, "wb") as f:
-            f.write(content)
-
-        text, _ = parse_file(str(target_path))
+        # 按内容哈希去重保存，同一份教材只存一份、只解析一次；保留全文，生成图谱时再分块抽取
+        stored = await upload_store.save(file, file_ext)
+        text, _, _ = upload_store.parse(stored, max_length=settings.LEARNING_MAP_MAX_SOURCE_CHARS)
         record = LearningMapRepository.create_file(
             db,
             user_id=user_id,
-            file_path=str(target_path),
+            file_path=stored.path,
             raw_text=text,
             original_name=file.filename,
         )
@@ -135,24 +135,27 @@ class LearningMapService:
 """
 
     @staticmethod
-    def _invoke_ai_with_retry(
+    async def _invoke_ai_with_retry(
         db: Session,
         base_prompt: str,
         source_excerpt: str,
         provider: Optional[str],
         max_attempts: int = 2,
+        user_id: Optional[int] = None,
     ) -> Dict:
         """调用AI生成结构化内容，失败时自动重试"""
         attempt_prompt = base_prompt
         last_error: Optional[Exception] = None
         for attempt in range(1, max_attempts + 1):
-            ai_result = AIService.call_ai(
+            ai_result = await AIService.acall_ai(
                 db,
                 user_prompt=attempt_prompt,
                 system_prompt_name="learning_map_system",
                 provider=provider,
                 temperature=0.7,
-                max_tokens=4000  # 增加token数量，知识图谱需要更多内容
+                max_tokens=4000,  # 增加token数量，知识图谱需要更多内容
+                source="learning_map",
+                user_id=user_id
             )
             ai_text = ai_result.get("text", "")
             try:
@@ -174,13 +177,114 @@ class LearningMapService:
         raise ValueError("AI未返回合法的JSON，请提供更详细的资料或稍后重试")
 
     @staticmethod
-    def generate_graph(
+    def _normalize_subgraph(payload: Dict) -> Dict[str, List[Dict]]:
+        """统一AI输出中边的字段名（from/to 或 source/target）"""
+        edges = [
+            {
+                "from": edge.get("from") or edge.get("source"),
+                "to": edge.get("to") or edge.get("target"),
+                "relation": edge.get("relation", "depends_on"),
+            }
+            for edge in payload.get("edges", [])
+            if isinstance(edge, dict)
+        ]
+        return {"nodes": payload.get("nodes", []), "edges": edges}
+
+    @staticmethod
+    async def _extract_chunk(
+        db: Session,
+        chunk: str,
+        index: int,
+        total: int,
+        course_topic: Optional[str],
+        provider: Optional[str],
+        user_id: int,
+    ) -> Optional[Dict[str, List[Dict]]]:
+        """抽取单个分块的子图（多分块时失败返回 None，不中断其他分块）"""
+        topic_line = f"课程主题：{course_topic}\n" if course_topic else ""
+        if total == 1:
+            prompt = LEARNING_MAP_PROMPT.format(content=topic_line + chunk)
+        else:
+            prompt = LEARNING_MAP_CHUNK_PROMPT.format(
+                index=index + 1, total=total, topic_line=topic_line, content=chunk
+            )
+        try:
+            payload = await LearningMapService._invoke_ai_with_retry(
+                db,
+                base_prompt=prompt,
+                source_excerpt=chunk[:4000],
+                provider=provider,
+                user_id=user_id,
+            )
+        except Exception as exc:
+            if total == 1:
+                raise
+            logger.warning("知识图谱第%s/%s块抽取失败: %s", index + 1, total, exc)
+            return None
+        return LearningMapService._normalize_subgraph(payload)
+
+    @staticmethod
+    async def _map_reduce_graph(
+        db: Session,
+        source_text: str,
+        course_topic: Optional[str],
+        provider: Optional[str],
+        user_id: int,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        分块抽取子图并合并
+
+        全文按 LEARNING_MAP_CHUNK_CHARS 切成带重叠的分块（超过 LEARNING_MAP_MAX_CHUNKS 时均匀抽样），
+        LEARNING_MAP_CONCURRENCY 个协程从同一个分块迭代器取任务，同一时刻只有这么多分块在内存中处理；
+        每个子图完成后立即并入 GraphMerger，耗时约为 分块数 / 并发数 次AI调用；
+        每处理完一个分块调用 progress(已完成块数, 总块数)
+        """
+        spans = chunk_spans(
+            source_text, settings.LEARNING_MAP_CHUNK_CHARS, settings.LEARNING_MAP_CHUNK_OVERLAP
+        )
+        if not spans:
+            spans = [(0, 0)]
+        selected = select_spans(spans, settings.LEARNING_MAP_MAX_CHUNKS)
+        total = len(selected)
+        if total < len(spans):
+            logger.info("知识图谱资料共%s块，超过上限，均匀抽取%s块", len(spans), total)
+
+        chunks = iter_chunks(source_text, selected)
+        merger = GraphMerger()
+        succeeded = 0
+        finished = 0
+        if progress is not None:
+            progress(0, total)
+
+        async def worker() -> None:
+            nonlocal succeeded, finished
+            for index, chunk in chunks:
+                subgraph = await LearningMapService._extract_chunk(
+                    db, chunk, index, total, course_topic, provider, user_id
+                )
+                if subgraph is not None:
+                    merger.add(index, subgraph)
+                    succeeded += 1
+                finished += 1
+                if progress is not None:
+                    progress(finished, total)
+
+        concurrency = max(1, min(settings.LEARNING_MAP_CONCURRENCY, total))
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        logger.info("知识图谱分块抽取完成：成功%s/%s块", succeeded, total)
+        return merger.result(max_nodes=settings.LEARNING_MAP_MAX_NODES)
+
+    @staticmethod
+    async def generate_graph(
         db: Session,
         user_id: int,
         file_id: Optional[int],
         course_topic: Optional[str],
         provider: Optional[str],
+        progress: Optional[Callable[[int, int], None]] = None,
     ) -> Dict[str, int]:
+        """生成并保存知识图谱，progress(已完成块数, 总块数) 用于后台任务汇报进度"""
         if not file_id and not course_topic:
             raise ValueError("请提供文件ID或课程主题")
 
@@ -191,21 +295,13 @@ class LearningMapService:
             if not file_record:
                 raise ValueError("找不到指定的学习资料")
             source_text = file_record.raw_text or ""
-        if course_topic:
-            source_text = f"课程主题：{course_topic}\n" + source_text
+        if not source_text and course_topic:
+            source_text = f"课程主题：{course_topic}"
 
-        content_excerpt = source_text[:4000]
-        prompt = LEARNING_MAP_PROMPT.format(content=content_excerpt)
-        payload = LearningMapService._invoke_ai_with_retry(
-            db,
-            base_prompt=prompt,
-            source_excerpt=content_excerpt,
-            provider=provider,
+        nodes_data, edges_data = await LearningMapService._map_reduce_graph(
+            db, source_text, course_topic if file_id else None, provider, user_id, progress
         )
 
-        nodes_data = payload.get("nodes", [])
-        edges_data = payload.get("edges", [])
-
         if not nodes_data:
             raise ValueError("AI未生成任何知识点，请提供更详细的资料")
 
@@ -214,56 +310,32 @@ class LearningMapService:
             normalized_nodes.append(
                 {
                     "title": node.get("title", "未命名知识点")[:255],
-                    "description": node.get("description", "")[:1000],
+                    "description": (node.get("description") or "")[:1000],
                     "level": node.get("level", "intermediate"),
                     "mastery": node.get("mastery", "medium"),
-                    "example": node.get("example", "")[:1000],
+                    "example": (node.get("example") or "")[:1000],
                     "resources": json.dumps(
                         node.get("resources", []), ensure_ascii=False
                     ),
                 }
             )
 
-        session_record = LearningMapRepository.create_session(
+        session_record, node_count, edge_count = LearningMapRepository.create_graph(
             db,
             user_id=user_id,
             topic=course_topic or (file_record.original_name if file_id else None),
             provider=provider,
             file_id=file_id,
-            source_preview=content_excerpt[:200],
-        )
-
-        nodes = LearningMapRepository.create_nodes(
-            db,
-            user_id=user_id,
-            session_id=session_record.id,
+            source_preview=source_text[:200],
             nodes_data=normalized_nodes,
-            file_id=file_id,
-        )
-        title_to_id = {node.title: node.id for node in nodes}
-
-        normalized_edges = []
-        for edge in edges_data:
-            normalized_edges.append(
-                {
-                    "from": edge.get("from") or edge.get("source"),
-                    "to": edge.get("to") or edge.get("target"),
-                    "relation": edge.get("relation", "depends_on"),
-                }
-            )
-
-        LearningMapRepository.create_edges(
-            db,
-            user_id=user_id,
-            session_id=session_record.id,
-            edges_payload=normalized_edges,
-            title_to_id=title_to_id,
+            edges_payload=edges_data,
         )
+        LearningMapService._warm_graph_cache(db, user_id, session_record)
 
         return {
             "success": True,
-            "node_count": len(nodes),
-            "edge_count": len(normalized_edges),
+            "node_count": node_count,
+            "edge_count": edge_count,
             "session_id": session_record.id,
             "message": "知识图谱生成完成",
         }
@@ -316,6 +388,71 @@ class LearningMapService:
         nodes, edges = LearningMapRepository.get_graph_by_session(
             db, user_id, session_record
         )
+        return LearningMapService._graph_payload(session_record, nodes, edges)
+
+    @staticmethod
+    async def aget_graph(
+        db: AsyncDBSession, user_id: int, session_id: Optional[int] = None
+    ) -> Dict[str, List[Dict]]:
+        """get_graph 的异步会话版本"""
+        session_record = None
+        if session_id:
+            session_record = await LearningMapRepository.aget_session(
+                db, user_id=user_id, session_id=session_id
+            )
+        if not session_record:
+            session_record = await LearningMapRepository.aget_latest_session(db, user_id)
+        if not session_record:
+            return {"session": None, "nodes": [], "edges": []}
+
+        nodes, edges = await LearningMapRepository.aget_graph_by_session(
+            db, user_id, session_record
+        )
+        return LearningMapService._graph_payload(session_record, nodes, edges)
+
+    @staticmethod
+    async def aget_graph_cached(
+        db: AsyncDBSession, user_id: int, session_id: Optional[int] = None, fmt: str = "full"
+    ) -> Optional[CachedGraph]:
+        """
+        获取已编码的图谱响应：指定会话且已缓存时不访问数据库，未指定时只查一次最新会话ID；
+        未命中时查询并写入缓存。用户还没有图谱时返回 None
+        """
+        if not session_id:
+            session_id = await LearningMapRepository.aget_latest_session_id(db, user_id)
+            if session_id is None:
+                return None
+        cached = graph_cache.get(user_id, session_id, fmt)
+        if cached is not None:
+            return cached
+        graph = await LearningMapService.aget_graph(db, user_id, session_id=session_id)
+        if graph["session"] is None:
+            return None
+        return graph_cache.put(user_id, graph["session"]["id"], fmt, graph)
+
+    @staticmethod
+    def _warm_graph_cache(db: Session, user_id: int, session_record) -> None:
+        """
+        生成完成后预先编码两种格式（前端请求 compact），首次打开图谱即命中缓存；失败不影响生成结果
+        """
+        try:
+            nodes, edges = LearningMapRepository.get_graph_by_session(db, user_id, session_record)
+            graph = LearningMapService._graph_payload(session_record, nodes, edges)
+            for fmt in ("compact", "full"):
+                graph_cache.put(user_id, session_record.id, fmt, graph)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning(f"预热知识图谱缓存失败: {exc}")
+
+    @staticmethod
+    def delete_session(db: Session, user_id: int, session_id: int) -> bool:
+        """删除知识图谱会话并清除其缓存"""
+        deleted = LearningMapRepository.delete_session(db, user_id, session_id)
+        if deleted:
+            graph_cache.invalidate(user_id, session_id)
+        return deleted
+
+    @staticmethod
+    def _graph_payload(session_record, nodes: List, edges: List) -> Dict[str, List[Dict]]:
         graph = LearningMapService._serialize_graph(nodes, edges)
         graph["session"] = {
             "id": session_record.id,
@@ -16,7 +16,7 @@ class QuizService:
         """生成测验（使用AI服务）"""
         prompt = f"请为以下主题生成{num_questions}道测验题目：{topic}。要求：3道选择题（4个选项），2道填空题。返回JSON格式。"
         
-        result = AIService.call_ai(db, prompt, system_prompt_name="quiz_generator")
+        result = AIService.call_ai(db, prompt, system_prompt_name="quiz_generator", source="quiz")
         # 这里简化处理，实际应该解析AI返回的JSON
         return {
             "topic": topic,
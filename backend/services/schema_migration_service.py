@@ -3,16 +3,24 @@
 负责在启动时自动校验/修补学习图谱相关表结构，避免因 schema 变更导致 500
 """
 from datetime import datetime
-from sqlalchemy import inspect, text
+from typing import Optional, Union
+from sqlalchemy import Integer, false, inspect, text
+from sqlalchemy.engine import Dialect
 from sqlalchemy.exc import NoSuchTableError, OperationalError
+from sqlalchemy.sql import ClauseElement
+from sqlalchemy.types import TypeEngine
 
 from core.logger import logger
 from database import engine, SessionLocal
 from models.learning_map import (
+    LearningMapFile,
     LearningMapSession,
     LearningNode,
     LearningEdge,
 )
+from models.api_call_log import APICallLog
+from models.chat_sessions import ChatSession, ChatMessage
+from models.quizzes import Quiz
 
 
 class SchemaMigrationService:
@@ -25,15 +33,75 @@ class SchemaMigrationService:
         - 存在 learning_map_sessions 表
         - learning_nodes / learning_edges 包含 session_id 字段
         - 旧数据补写 session_id，保证后续查询不报错
+        - MySQL 中 learning_map_files.raw_text 为 LONGTEXT（整本教材的文本超过 TEXT 的 64KB 上限）
         """
         try:
             SchemaMigrationService._ensure_sessions_table()
             SchemaMigrationService._ensure_column("learning_nodes", "session_id")
             SchemaMigrationService._ensure_column("learning_edges", "session_id")
+            SchemaMigrationService._ensure_mysql_longtext(LearningMapFile.__tablename__, "raw_text")
             SchemaMigrationService._backfill_legacy_sessions()
         except Exception as exc:  # pylint: disable=broad-except
             logger.error("学习图谱 schema 自动迁移失败: %s", exc, exc_info=True)
 
+    @staticmethod
+    def ensure_api_call_log_schema() -> None:
+        """
+        确保 api_call_logs 包含新增列（旧库中补建）：
+        - cache_hit：历史记录均视为实际调用
+        - user_id / model / latency_ms / *_tokens：历史记录为空
+        """
+        try:
+            if not inspect(engine).has_table(APICallLog.__tablename__):
+                return
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("API调用日志 schema 自动迁移失败: %s", exc, exc_info=True)
+            return
+        # 每列单独迁移：某一列失败不影响其他列
+        table = APICallLog.__table__
+        SchemaMigrationService._try_ensure_column(table.name, "cache_hit", table.c.cache_hit.type, default=false())
+        for column_name in (
+            "user_id", "model", "latency_ms", "prompt_tokens", "completion_tokens", "total_tokens",
+        ):
+            SchemaMigrationService._try_ensure_column(table.name, column_name, table.c[column_name].type)
+
+    @staticmethod
+    def ensure_chat_schema() -> None:
+        """
+        为已有的聊天表补齐结构：
+        - chat_messages.seq 列（旧消息在首次读取/追加时按时间顺序补写）
+        - chat_sessions (user_id, updated_at) 复合索引、chat_messages (session_id, seq) 唯一索引
+          （SQL Server 上为排除 seq 为空的旧消息的筛选索引）
+        """
+        try:
+            inspector = inspect(engine)
+            tables = [model.__table__ for model in (ChatSession, ChatMessage) if inspector.has_table(model.__tablename__)]
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("聊天表 schema 自动迁移失败: %s", exc, exc_info=True)
+            return
+        if ChatMessage.__table__ in tables:
+            SchemaMigrationService._try_ensure_column(
+                ChatMessage.__tablename__, "seq", ChatMessage.__table__.c.seq.type
+            )
+        # 每个索引单独创建：seq 列补建失败时不影响会话列表索引
+        for table in tables:
+            for index in table.indexes:
+                try:
+                    index.create(bind=engine, checkfirst=True)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.error("创建索引 %s 失败: %s", index.name, exc, exc_info=True)
+
+    @staticmethod
+    def ensure_quiz_indexes() -> None:
+        """为已有的 quizzes 表补建 (user_id, created_at) 复合索引（学习分析取最近得分）"""
+        try:
+            if not inspect(engine).has_table(Quiz.__tablename__):
+                return
+            for index in Quiz.__table__.indexes:
+                index.create(bind=engine, checkfirst=True)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("测评表索引自动迁移失败: %s", exc, exc_info=True)
+
     @staticmethod
     def _ensure_sessions_table() -> None:
         inspector = inspect(engine)
@@ -45,7 +113,32 @@ class SchemaMigrationService:
         logger.info("learning_map_sessions 表创建完成")
 
     @staticmethod
-    def _ensure_column(table_name: str, column_name: str) -> None:
+    def _add_column_ddl(
+        dialect: Dialect,
+        table_name: str,
+        column_name: str,
+        column_type: Union[str, TypeEngine],
+        default: Optional[ClauseElement] = None,
+    ) -> str:
+        """
+        生成新增列的 DDL：列类型按方言编译（如 Boolean 在 SQL Server 上为 BIT），
+        SQL Server 的语法为 ADD（没有 COLUMN 关键字）；给出 default 时新增为 NOT NULL 并以其填充旧行
+        """
+        if not isinstance(column_type, str):
+            column_type = column_type.compile(dialect=dialect)
+        keyword = "ADD" if dialect.name == "mssql" else "ADD COLUMN"
+        ddl = f"ALTER TABLE {table_name} {keyword} {column_name} {column_type}"
+        if default is not None:
+            ddl += f" NOT NULL DEFAULT {default.compile(dialect=dialect)}"
+        return ddl
+
+    @staticmethod
+    def _ensure_column(
+        table_name: str,
+        column_name: str,
+        column_type: Union[str, TypeEngine] = Integer(),
+        default: Optional[ClauseElement] = None,
+    ) -> None:
         try:
             inspector = inspect(engine)
             columns = {col["name"] for col in inspector.get_columns(table_name)}
@@ -57,11 +150,44 @@ class SchemaMigrationService:
             return
 
         logger.info("为表 %s 自动新增列 %s ...", table_name, column_name)
-        ddl = text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} INTEGER")
+        ddl = text(SchemaMigrationService._add_column_ddl(
+            engine.dialect, table_name, column_name, column_type, default
+        ))
         with engine.begin() as conn:
             conn.execute(ddl)
         logger.info("表 %s 列 %s 创建完成", table_name, column_name)
 
+    @staticmethod
+    def _try_ensure_column(
+        table_name: str,
+        column_name: str,
+        column_type: Union[str, TypeEngine] = Integer(),
+        default: Optional[ClauseElement] = None,
+    ) -> bool:
+        """_ensure_column 的容错版本：失败时记录日志并返回 False"""
+        try:
+            SchemaMigrationService._ensure_column(table_name, column_name, column_type, default)
+            return True
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("为表 %s 新增列 %s 失败: %s", table_name, column_name, exc, exc_info=True)
+            return False
+
+    @staticmethod
+    def _ensure_mysql_longtext(table_name: str, column_name: str) -> None:
+        """MySQL 旧库中把 TEXT 列扩为 LONGTEXT（其他数据库的 TEXT 没有 64KB 限制，无需处理）"""
+        if engine.dialect.name not in ("mysql", "mariadb"):
+            return
+        inspector = inspect(engine)
+        if not inspector.has_table(table_name):
+            return
+        column = next((col for col in inspector.get_columns(table_name) if col["name"] == column_name), None)
+        if column is None or str(column["type"]).upper().startswith("LONGTEXT"):
+            return
+        logger.info("将表 %s 列 %s 扩为 LONGTEXT ...", table_name, column_name)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} MODIFY {column_name} LONGTEXT NULL"))
+        logger.info("表 %s 列 %s 已扩为 LONGTEXT", table_name, column_name)
+
     @staticmethod
     def _backfill_legacy_sessions() -> None:
         """
@@ -0,0 +1,123 @@
+"""
+AI响应缓存测试
+作者：智学伴开发团队
+目的：验证LRU/TTL淘汰、磁盘缓存，以及 AIService 命中缓存时不再调用模型并单独记录日志
+运行：pytest backend/tests/test_ai_response_cache.py -v
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.api_call_log import APICallLog
+from repositories.api_call_repo import APICallRepository
+from services.ai_service import AIService
+from services.prompt_service import PromptService
+from utils import ai_response_cache
+from utils.ai_response_cache import AIResponseCache
+from utils.api_call_recorder import APICallRecorder
+from utils.model_registry import registry
+
+
+@pytest.fixture
+def db_session():
+    """创建内存数据库会话"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+def _messages(user_prompt, system_prompt="你是助手"):
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+
+
+def test_key_changes_with_system_prompt_and_params():
+    base = AIResponseCache.make_key(_messages("导数"), "deepseek", "deepseek-chat", 0.7, 2000)
+
+    assert base == AIResponseCache.make_key(_messages(" 导数 "), "deepseek", "deepseek-chat", 0.7, 2000)
+    assert base != AIResponseCache.make_key(_messages("导数", "新版系统Prompt"), "deepseek", "deepseek-chat", 0.7, 2000)
+    assert base != AIResponseCache.make_key(_messages("导数"), "deepseek", "deepseek-chat", 0.2, 2000)
+    assert base != AIResponseCache.make_key(_messages("导数"), "qwen", "qwen-turbo", 0.7, 2000)
+
+
+def test_memory_lru_and_ttl(monkeypatch):
+    cache = AIResponseCache(ttl=10, max_entries=2)
+    now = [1000.0]
+    monkeypatch.setattr(ai_response_cache.time, "time", lambda: now[0])
+
+    cache.set("a", {"text": "A"})
+    cache.set("b", {"text": "B"})
+    assert cache.get("a") == {"text": "A"}  # a 变为最近使用
+    cache.set("c", {"text": "C"})
+
+    assert cache.get("b") is None
+    assert cache.get("c") == {"text": "C"}
+
+    now[0] += 11
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_disk_tier_survives_new_instance_and_evicts_by_size(tmp_path):
+    path = str(tmp_path / "ai_cache.db")
+    cache = AIResponseCache(ttl=60, max_entries=1, disk_path=path, disk_max_bytes=10_000)
+    cache.set("a", {"text": "A" * 10})
+
+    fresh = AIResponseCache(ttl=60, max_entries=1, disk_path=path, disk_max_bytes=10_000)
+    assert fresh.get("a") == {"text": "A" * 10}
+    assert fresh.stats()["disk_hits"] == 1
+
+    small = AIResponseCache(ttl=60, max_entries=1, disk_path=path, disk_max_bytes=200)
+    small.set("b", {"text": "B" * 150})
+    small.set("c", {"text": "C" * 150})
+    small._memory.clear()  # 只清内存层，强制读磁盘
+    assert small.get("b") is None
+    assert small.get("c") == {"text": "C" * 150}
+
+
+def test_call_ai_serves_repeat_from_cache(db_session, monkeypatch):
+    calls = []
+
+    def fake_call_with_fallback(messages, preferred_provider=None, **kwargs):
+        calls.append(messages)
+        return {"provider": "deepseek", "text": "答案", "usage": {}, "model": "deepseek-chat", "latency_ms": 5}
+
+    monkeypatch.setattr(ai_response_cache.settings, "AI_CACHE_ENABLED", True)
+    monkeypatch.setattr("services.ai_service.response_cache", AIResponseCache(ttl=60))
+    recorder = APICallRecorder(flush_interval=60)
+    monkeypatch.setattr("services.ai_service.api_call_recorder", recorder)
+    monkeypatch.setattr(registry, "resolve_target", lambda provider=None: ("deepseek", "deepseek-chat"))
+    monkeypatch.setattr(registry, "call_with_fallback", fake_call_with_fallback)
+    monkeypatch.setattr(PromptService, "get_active_prompt", staticmethod(lambda db, name: "系统Prompt"))
+
+    first = AIService.call_ai(db_session, "什么是导数", source="quiz")
+    second = AIService.call_ai(db_session, "什么是导数", source="quiz")
+    AIService.call_ai(db_session, "什么是导数", source="quiz", use_cache=False)
+    recorder.flush()
+
+    assert len(calls) == 2
+    assert first["metadata"]["cached"] is False
+    assert second["metadata"]["cached"] is True
+    assert second["text"] == first["text"]
+    assert APICallRepository.count_total(db_session) == 3
+    assert APICallRepository.count_total(db_session, cache_hit=True) == 1
+    cached_log = db_session.query(APICallLog).filter(APICallLog.cache_hit.is_(True)).one()
+    assert cached_log.source == "quiz"
+
+
+def test_disabled_source_skips_cache(monkeypatch):
+    monkeypatch.setattr(ai_response_cache.settings, "AI_CACHE_ENABLED", True)
+    monkeypatch.setattr(ai_response_cache.settings, "AI_CACHE_DISABLED_SOURCES", ["user_chat"])
+
+    assert ai_response_cache.is_cache_enabled("quiz") is True
+    assert ai_response_cache.is_cache_enabled("user_chat") is False
+    assert ai_response_cache.is_cache_enabled("user_chat", use_cache=True) is True
@@ -0,0 +1,161 @@
+"""
+学习分析服务测试
+作者：智学伴开发团队
+目的：验证统计首次访问时用聚合SQL重建（不加载大字段）、测评提交后增量累加，且结果与逐条计算一致；
+     并发提交不丢增量，两个请求同时首次读取时后提交的一方改为读取已有结果
+运行：pytest backend/tests/test_analytics_service.py -v
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.quizzes import Quiz
+from models.study_plans import StudyPlan
+from repositories.learner_stats_repo import LearnerStatsRepository
+from services.analytics_service import AnalyticsService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db_session(engine):
+    """创建内存数据库会话"""
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _quiz(user_id, topic, score, created_at):
+    return Quiz(
+        user_id=user_id, topic=topic, score=score, created_at=created_at,
+        questions="[]", answers="[]", explanations="[]",
+    )
+
+
+def _seed(db):
+    db.add_all([
+        _quiz(1, "函数", 50, datetime(2025, 1, 5, 9)),
+        _quiz(1, "函数", 60, datetime(2025, 1, 20, 9)),
+        _quiz(1, "几何", 90, datetime(2025, 2, 3, 9)),
+        _quiz(1, None, 40, datetime(2025, 2, 10, 9)),
+        _quiz(2, "别人的", 100, datetime(2025, 2, 10, 9)),
+    ])
+    db.add(StudyPlan(user_id=1, goal="期末复习", plan_json="{}"))
+    db.commit()
+
+
+def test_first_read_rebuilds_without_loading_blob_columns(db_session, engine):
+    _seed(db_session)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    progress = AnalyticsService.get_progress(db_session, 1)
+
+    assert not any("quizzes.questions" in sql or "quizzes.explanations" in sql for sql in statements)
+    assert progress["total_tests"] == 4
+    assert progress["total_plans"] == 1
+    assert progress["average_score"] == 60.0
+    assert (progress["max_score"], progress["min_score"]) == (90, 40)
+    assert progress["weak_topics"] == ["函数"]
+    assert progress["recent_scores"] == [50, 60, 90, 40]
+    assert [point["date"] for point in progress["score_trend"]] == ["01-05", "01-20", "02-03", "02-10"]
+
+    stats = AnalyticsService.get_detailed_stats(db_session, 1)
+    assert {item["topic"]: (item["average_score"], item["count"]) for item in stats["topic_statistics"]} == {
+        "函数": (55.0, 2), "几何": (90.0, 1), "未分类": (40.0, 1)
+    }
+    assert stats["monthly_statistics"] == [
+        {"month": "2025-01", "average_score": 55.0, "count": 2},
+        {"month": "2025-02", "average_score": 65.0, "count": 2},
+    ]
+
+
+def test_submit_updates_stats_incrementally(db_session, engine):
+    _seed(db_session)
+    AnalyticsService.get_progress(db_session, 1)  # 建立统计
+
+    quiz = _quiz(1, "几何", 70, datetime(2025, 3, 1, 9))
+    db_session.add(quiz)
+    db_session.flush()
+    AnalyticsService.record_quiz(db_session, quiz)
+    db_session.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    stats = AnalyticsService.get_detailed_stats(db_session, 1)
+
+    assert not any("GROUP BY" in sql for sql in statements)
+    assert stats["total_quizzes"] == 5
+    assert {item["topic"]: item["count"] for item in stats["topic_statistics"]}["几何"] == 2
+    assert stats["monthly_statistics"][-1] == {"month": "2025-03", "average_score": 70.0, "count": 1}
+    assert AnalyticsService.get_progress(db_session, 1)["average_score"] == 62.0
+
+
+@pytest.fixture
+def shared_sessions(tmp_path):
+    """同一个文件数据库上的两个会话，模拟两个并发请求"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    first, second = SessionLocal(), SessionLocal()
+    try:
+        yield first, second
+    finally:
+        first.close()
+        second.close()
+        engine.dispose()
+
+
+def test_concurrent_submits_do_not_lose_increments(shared_sessions):
+    first, second = shared_sessions
+    _seed(first)
+    AnalyticsService.get_progress(first, 1)
+    assert AnalyticsService.get_progress(second, 1)["total_tests"] == 4  # 两个会话都已加载统计行
+
+    for db, score in ((second, 100), (first, 20)):
+        quiz = _quiz(1, "概率", score, datetime(2025, 3, 1, 9))
+        db.add(quiz)
+        db.flush()
+        AnalyticsService.record_quiz(db, quiz)
+        db.commit()
+
+    stats = AnalyticsService.get_detailed_stats(first, 1)
+    assert stats["total_quizzes"] == 6
+    assert {item["topic"]: item["count"] for item in stats["topic_statistics"]}["概率"] == 2
+    assert stats["monthly_statistics"][-1] == {"month": "2025-03", "average_score": 60.0, "count": 2}
+    progress = AnalyticsService.get_progress(second, 1)
+    assert (progress["max_score"], progress["min_score"]) == (100, 20)
+
+
+def test_concurrent_first_read_reuses_committed_rebuild(shared_sessions, monkeypatch):
+    first, second = shared_sessions
+    _seed(first)
+    original = LearnerStatsRepository.get_summary
+    misses = []
+
+    def get_summary(db, user_id):
+        # 本请求两次读取时统计都尚未提交；另一个请求在此期间完成重建并提交
+        if db is first and len(misses) < 2:
+            misses.append(user_id)
+            if len(misses) == 1:
+                AnalyticsService.get_progress(second, user_id)
+            return None
+        return original(db, user_id)
+
+    monkeypatch.setattr(LearnerStatsRepository, "get_summary", staticmethod(get_summary))
+    progress = AnalyticsService.get_progress(first, 1)
+
+    assert progress["total_tests"] == 4 and progress["average_score"] == 60.0
+    assert len(AnalyticsService.get_detailed_stats(first, 1)["topic_statistics"]) == 3
@@ -0,0 +1,117 @@
+"""
+API调用日志缓冲写入测试
+作者：智学伴开发团队
+目的：验证调用记录先进缓冲、批量写库，并保留模型/耗时/token/用户信息；写库失败时留待重试
+运行：pytest backend/tests/test_api_call_recorder.py -v
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models.api_call_log import APICallLog
+from repositories.api_call_repo import APICallRepository
+from services.ai_service import AIService
+from utils import api_call_recorder as recorder_module
+from utils.api_call_recorder import APICallRecorder
+
+
+@pytest.fixture
+def engine():
+    # StaticPool：后台写入线程与测试线程共用同一个内存库
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db_session(engine):
+    """创建内存数据库会话"""
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_records_are_buffered_then_bulk_inserted(db_session, engine):
+    recorder = APICallRecorder(flush_interval=60)
+    inserts = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: inserts.append(statement)
+        if statement.startswith("INSERT INTO api_call_logs") else None,
+    )
+
+    for i in range(3):
+        recorder.record(
+            db_session, "deepseek", source="quiz", user_id=7, model="deepseek-chat",
+            latency_ms=120.4 + i, usage={"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        )
+
+    assert recorder.pending() == 3
+    assert APICallRepository.count_total(db_session) == 0
+
+    assert recorder.flush() == 3
+    assert len(inserts) == 1
+    log = db_session.query(APICallLog).order_by(APICallLog.id).first()
+    assert (log.user_id, log.model, log.latency_ms, log.total_tokens) == (7, "deepseek-chat", 120, 15)
+    assert log.created_at is not None
+
+
+def test_background_thread_flushes_on_batch_size(db_session):
+    recorder = APICallRecorder(flush_interval=60, batch_size=2)
+    try:
+        recorder.record(db_session, "qwen", source="user_chat")
+        recorder.record(db_session, "qwen", source="user_chat", success=False)
+        deadline = time.time() + 2
+        while recorder.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        assert recorder.pending() == 0
+        assert APICallRepository.count_total(db_session) == 2
+    finally:
+        recorder.stop()
+
+
+def test_failed_flush_keeps_records_for_retry(db_session, monkeypatch):
+    recorder = APICallRecorder(flush_interval=60)
+    recorder.record(db_session, "deepseek")
+
+    def broken_insert(db, rows):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(recorder_module.APICallRepository, "bulk_insert", staticmethod(broken_insert))
+    assert recorder.flush() == 0
+    assert recorder.pending() == 1
+
+    monkeypatch.undo()
+    recorder.stop()
+    assert APICallRepository.count_total(db_session) == 1
+
+
+def test_call_ai_records_usage_and_latency(db_session, monkeypatch):
+    recorder = APICallRecorder(flush_interval=60)
+    monkeypatch.setattr("services.ai_service.api_call_recorder", recorder)
+    monkeypatch.setattr(
+        "services.ai_service.registry.call_with_fallback",
+        lambda **kwargs: {
+            "provider": "deepseek", "text": "答案", "model": "deepseek-chat", "latency_ms": 321.6,
+            "usage": {"prompt_tokens": 30, "completion_tokens": 12, "total_tokens": 42},
+        },
+    )
+    monkeypatch.setattr("services.ai_service.PromptService.get_active_prompt", staticmethod(lambda db, name: "系统Prompt"))
+
+    AIService.call_ai(db_session, "什么是极限", source="quiz", use_cache=False, user_id=3)
+    recorder.flush()
+
+    log = db_session.query(APICallLog).one()
+    assert (log.source, log.user_id, log.model, log.latency_ms) == ("quiz", 3, "deepseek-chat", 322)
+    assert (log.prompt_tokens, log.completion_tokens, log.total_tokens) == (30, 12, 42)
@@ -4,13 +4,14 @@ API调用日志仓储测试
 目的：验证API调用统计逻辑
 """
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta, timezone
 
 from database import Base
 from repositories.api_call_repo import APICallRepository
 from models.api_call_log import APICallLog
+from utils.sql_time import time_bucket
 
 
 @pytest.fixture
@@ -49,9 +50,87 @@ def test_count_today_filters_by_date(db_session):
     assert APICallRepository.count_today(db_session) == 1
 
 
+def test_count_today_uses_stats_timezone(db_session, monkeypatch):
+    """原始日志按UTC存储，当天按统计时区划分，与汇总表口径一致"""
+    monkeypatch.setattr("repositories.api_call_repo.settings.STATS_UTC_OFFSET_HOURS", 8)
+    start = APICallRepository._today_start_utc()
+    db_session.add_all([
+        APICallLog(provider="deepseek", source="user", success=True, created_at=start - timedelta(minutes=1)),
+        APICallLog(provider="deepseek", source="user", success=True, created_at=start + timedelta(minutes=1)),
+        APICallLog(provider="qwen", source="user", success=True, cache_hit=True, created_at=start + timedelta(hours=23)),
+        APICallLog(provider="qwen", source="user", success=True, created_at=start + timedelta(days=1)),
+    ])
+    db_session.commit()
+
+    assert APICallRepository.count_today(db_session) == 2
+    assert APICallRepository.count_today(db_session, cache_hit=True) == 1
+
+
+def test_time_bucket_fallback_for_other_dialects(db_session, monkeypatch):
+    """未专门适配的数据库退回到“时间转字符串后截取前缀”"""
+    monkeypatch.setattr(db_session.get_bind().dialect, "name", "oracle")
+    db_session.add(APICallLog(provider="deepseek", source="user", success=True, created_at=datetime(2025, 3, 9, 17, 5)))
+    db_session.commit()
+
+    buckets = [
+        db_session.query(time_bucket(db_session, APICallLog.created_at, unit)).scalar()
+        for unit in ("hour", "day", "month")
+    ]
+    assert buckets == ["2025-03-09 17", "2025-03-09", "2025-03"]
+
+
 def test_count_total_includes_success_and_failure(db_session):
     """总调用次数应包含成功和失败"""
     APICallRepository.record_call(db_session, provider="deepseek", source="user_chat", success=True)
     APICallRepository.record_call(db_session, provider="deepseek", source="user_chat", success=False)
     assert APICallRepository.count_total(db_session) == 2
 
+
+
+def _utc_naive(dt):
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def test_daily_stats_grouped_in_sql_with_breakdowns(db_session, monkeypatch):
+    """按天统计应在一条SQL内完成分组，并带出成功/失败和各模型数量"""
+    monkeypatch.setattr("repositories.api_call_repo.settings.STATS_UTC_OFFSET_HOURS", 8)
+    beijing = timezone(timedelta(hours=8))
+    today = datetime.now(beijing).replace(hour=0, minute=30, second=0, microsecond=0)
+    db_session.add_all([
+        # 北京时间今天 00:30，对应UTC前一天 16:30，应计入今天
+        APICallLog(provider="deepseek", source="user", success=True, created_at=_utc_naive(today)),
+        APICallLog(provider="qwen", source="user", success=False, created_at=_utc_naive(today)),
+        APICallLog(provider="deepseek", source="quiz", success=True, created_at=_utc_naive(today - timedelta(days=1))),
+        # 超出7天窗口
+        APICallLog(provider="deepseek", source="quiz", success=True, created_at=_utc_naive(today - timedelta(days=9))),
+    ])
+    db_session.commit()
+
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    stats = APICallRepository.get_daily_stats(db_session, days=7)
+
+    assert len(statements) == 1
+    assert len(stats) == 7
+    assert stats[-1]["date"] == today.strftime("%m-%d")
+    assert (stats[-1]["count"], stats[-1]["success"], stats[-1]["failed"]) == (2, 1, 1)
+    assert stats[-1]["providers"] == {"deepseek": 1, "qwen": 1}
+    assert stats[-2]["count"] == 1
+    assert sum(day["count"] for day in stats) == 3
+
+
+def test_hourly_stats_buckets_last_24_hours(db_session, monkeypatch):
+    """按小时统计返回24个连续的桶，当前小时的调用计入最后一个桶"""
+    monkeypatch.setattr("repositories.api_call_repo.settings.STATS_UTC_OFFSET_HOURS", 0)
+    now = datetime.now(timezone.utc)
+    APICallRepository.record_call(db_session, provider="deepseek", source="user_chat", success=True)
+    db_session.add(APICallLog(provider="deepseek", source="user", success=True,
+                              created_at=_utc_naive(now - timedelta(hours=30))))
+    db_session.commit()
+
+    stats = APICallRepository.get_hourly_stats(db_session)
+
+    assert len(stats) == 24
+    assert stats[-1]["date"] == f"{now.hour:02d}:00"
+    assert stats[-1]["count"] == 1
+    assert sum(hour["count"] for hour in stats) == 1
@@ -0,0 +1,111 @@
+"""
+API调用汇总测试
+作者：智学伴开发团队
+目的：验证写入调用日志时增量累加汇总表、从原始日志重建汇总，以及清理原始日志后看板统计不变
+运行：pytest backend/tests/test_api_call_rollup.py -v
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.api_call_log import APICallLog
+from models.api_call_rollup import APICallRollup
+from repositories.api_call_repo import APICallRepository
+from services.api_call_rollup_service import APICallRollupService
+
+
+@pytest.fixture
+def db_session(monkeypatch):
+    """创建内存数据库会话（统计时区固定为 UTC+8）"""
+    monkeypatch.setattr("core.config.settings.STATS_UTC_OFFSET_HOURS", 8)
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+def _row(provider, created_at, success=True, source="user", cache_hit=False, tokens=None):
+    return {
+        "provider": provider, "source": source, "success": success, "cache_hit": cache_hit,
+        "total_tokens": tokens, "latency_ms": 100, "created_at": created_at,
+    }
+
+
+def _now_utc():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def test_bulk_insert_maintains_rollups_incrementally(db_session):
+    now = _now_utc()
+    APICallRepository.bulk_insert(db_session, [
+        _row("deepseek", now, tokens=10),
+        _row("deepseek", now, tokens=5),
+        _row("qwen", now, success=False),
+    ])
+    APICallRepository.bulk_insert(db_session, [_row("deepseek", now, cache_hit=True)])
+
+    hour_row = (
+        db_session.query(APICallRollup)
+        .filter_by(period="hour", provider="deepseek", success=True, cache_hit=False)
+        .one()
+    )
+    assert (hour_row.call_count, hour_row.total_tokens, hour_row.latency_ms_sum) == (2, 15, 200)
+    assert APICallRepository.count_total(db_session, use_rollups=True) == 4
+    assert APICallRepository.count_today(db_session, use_rollups=True) == 4
+    assert APICallRepository.count_total(db_session, cache_hit=True, use_rollups=True) == 1
+    assert APICallRepository.get_provider_stats(db_session, use_rollups=True) == [
+        {"name": "deepseek", "value": 3}, {"name": "qwen", "value": 1}
+    ]
+    assert APICallRepository.get_daily_stats(db_session, use_rollups=True) == APICallRepository.get_daily_stats(db_session)
+    assert APICallRepository.get_hourly_stats(db_session, use_rollups=True) == APICallRepository.get_hourly_stats(db_session)
+
+
+def test_dashboard_stats_do_not_touch_raw_logs(db_session):
+    APICallRepository.bulk_insert(db_session, [_row("deepseek", _now_utc())])
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    APICallRepository.count_total(db_session, use_rollups=True)
+    APICallRepository.get_source_stats(db_session, use_rollups=True)
+    APICallRepository.get_daily_stats(db_session, days=30, use_rollups=True)
+
+    assert statements and not any("api_call_logs" in statement for statement in statements)
+
+
+def test_rebuild_then_compact_keeps_dashboard_totals(db_session):
+    now = _now_utc()
+    # 绕过仓储直接写原始日志，模拟汇总功能上线前的历史数据
+    db_session.add_all([
+        APICallLog(provider="deepseek", source="quiz", success=True, created_at=now - timedelta(days=40)),
+        APICallLog(provider="deepseek", source="quiz", success=True, created_at=now - timedelta(days=2)),
+        APICallLog(provider="moonshot", source="user", success=False, created_at=now),
+    ])
+    db_session.commit()
+
+    assert APICallRollupService.ensure_backfilled(db_session) is True
+    assert APICallRollupService.ensure_backfilled(db_session) is False
+    assert APICallRepository.count_total(db_session, use_rollups=True) == 3
+    daily_before = APICallRepository.get_daily_stats(db_session, days=7, use_rollups=True)
+
+    assert APICallRollupService.compact(db_session, retention_days=30) == 1
+    assert APICallRepository.count_total(db_session) == 2
+    assert APICallRepository.count_total(db_session, use_rollups=True) == 3
+    assert APICallRepository.get_source_stats(db_session, use_rollups=True)[0] == {"name": "AI测评", "value": 2}
+    assert APICallRepository.get_daily_stats(db_session, days=7, use_rollups=True) == daily_before
+
+    # 只重建最近几天时不影响更早的汇总
+    APICallRollupService.rebuild(db_session, days=7)
+    assert APICallRepository.count_total(db_session, use_rollups=True) == 3
+
+    # 全量重建只覆盖原始日志仍保留的时间段，已清理日志的汇总不丢失
+    APICallRollupService.rebuild(db_session)
+    assert APICallRepository.count_total(db_session, use_rollups=True) == 3
+    assert APICallRepository.get_daily_stats(db_session, days=7, use_rollups=True) == daily_before
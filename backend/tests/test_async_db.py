@@ -0,0 +1,157 @@
+"""
+异步会话测试
+作者：智学伴开发团队
+目的：验证同步URL到异步驱动的转换、异步仓储方法与同步版本结果一致（ThreadedSession 与 aiosqlite 两种会话），
+     以及旧消息补写 seq 在异步会话中同样生效
+运行：pytest backend/tests/test_async_db.py -v
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, ThreadedSession, async_database_url, create_async_db_engine
+from models.chat_sessions import ChatSession, ChatMessage
+from models.quiz_paper import QuizPaper
+from models.quizzes import Quiz
+from models.users import User
+from repositories.chat_repo import ChatRepository
+from repositories.quiz_repo import QuizRepository
+from repositories.user_repo import UserRepository
+from services.learning_map_service import LearningMapService
+from services.quiz_paper_service import QuizPaperService
+from repositories.learning_map_repo import LearningMapRepository
+
+
+@pytest.fixture
+def db_session():
+    """创建内存数据库会话（StaticPool 使线程池中的调用共用同一个连接）"""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+def _seed(db):
+    user = User(email="a@example.com", name="小明", hashed_password="x")
+    db.add(user)
+    db.commit()
+    for i in range(3):
+        chat = ChatSession(user_id=user.id, title=f"会话{i}")
+        db.add(chat)
+        db.flush()
+        db.add_all([
+            ChatMessage(session_id=chat.id, role="user", content=f"问题{i}", seq=0),
+            ChatMessage(session_id=chat.id, role="ai", content=f"回答{i}", seq=1),
+        ])
+    db.add_all([
+        Quiz(user_id=user.id, topic="函数", questions="[]", answers="[]", score=80, explanations="[]"),
+        QuizPaper(user_id=user.id, title="期中", total_questions=1, questions=[{"question": "1+1=?"}]),
+    ])
+    db.commit()
+    session_record = LearningMapRepository.create_session(db, user.id, "函数", "deepseek", None, "预览")
+    nodes = LearningMapRepository.create_nodes(
+        db, user.id, session_record.id, [{"title": "定义"}, {"title": "图像"}], None
+    )
+    LearningMapRepository.create_edges(
+        db, user.id, session_record.id, [{"from": "定义", "to": "图像"}], {n.title: n.id for n in nodes}
+    )
+    return user
+
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///./zhixueban.db") == "sqlite+aiosqlite:///./zhixueban.db"
+    assert async_database_url("mysql+pymysql://u:p@localhost/db") == "mysql+asyncmy://u:p@localhost/db"
+    assert async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    with pytest.raises(ValueError):
+        async_database_url("oracle://u:p@localhost/db")
+
+
+def test_threaded_session_matches_sync_repositories(db_session):
+    user = _seed(db_session)
+    adb = ThreadedSession(db_session)
+
+    async def scenario():
+        return (
+            await UserRepository.aget_by_id(adb, user.id),
+            await ChatRepository.alist_sessions(adb, user.id, limit=2, include_messages=True),
+            await QuizRepository.alist_by_user(adb, user.id),
+            await LearningMapService.aget_graph(adb, user.id),
+            await QuizPaperService.alist_papers(adb, user.id),
+        )
+
+    found, (rows, has_more), quizzes, graph, papers = asyncio.run(scenario())
+    assert found.email == "a@example.com"
+
+    sync_rows, sync_has_more = ChatRepository.list_sessions(db_session, user.id, limit=2, include_messages=True)
+    assert has_more is sync_has_more is True
+    assert [(r[0].id, r[1], r[2], r[3]) for r in rows] == [(r[0].id, r[1], r[2], r[3]) for r in sync_rows]
+    assert [len(r[0].messages) for r in rows] == [2, 2]
+
+    assert [q.topic for q in quizzes] == ["函数"]
+    assert graph == LearningMapService.get_graph(db_session, user.id)
+    assert len(graph["nodes"]) == 2 and len(graph["edges"]) == 1
+    assert papers == QuizPaperService.list_papers(db_session, user.id)
+    assert asyncio.run(QuizPaperService.aget_paper(adb, papers[0]["id"], user.id + 1)) is None
+
+
+def test_aget_messages_backfills_seq(db_session):
+    user = _seed(db_session)
+    chat = ChatSession(user_id=user.id, title="旧会话")
+    db_session.add(chat)
+    db_session.flush()
+    db_session.add_all([
+        ChatMessage(session_id=chat.id, role="user", content="你好"),
+        ChatMessage(session_id=chat.id, role="ai", content="你好！"),
+    ])
+    db_session.commit()
+    adb = ThreadedSession(db_session)
+
+    async def scenario():
+        session = await ChatRepository.aget_session(adb, chat.id, user.id)
+        messages = await ChatRepository.aget_messages(adb, session.id)
+        newer = await ChatRepository.aget_messages(adb, session.id, since=0)
+        return messages, newer
+
+    messages, newer = asyncio.run(scenario())
+    assert [m.seq for m in messages] == [0, 1]
+    assert [m.content for m in newer] == ["你好！"]
+
+
+def test_aiosqlite_session(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+    with sessionmaker(bind=sync_engine)() as db:
+        user = _seed(db)
+        user_id = user.id
+    sync_engine.dispose()
+
+    async def scenario():
+        engine = create_async_db_engine(url)
+        try:
+            async with async_sessionmaker(bind=engine, expire_on_commit=False)() as adb:
+                rows, has_more = await ChatRepository.alist_sessions(adb, user_id, include_messages=True)
+                graph = await LearningMapService.aget_graph(adb, user_id)
+                return rows, has_more, graph
+        finally:
+            await engine.dispose()
+
+    rows, has_more, graph = asyncio.run(scenario())
+    assert len(rows) == 3 and has_more is False
+    assert all(len(r[0].messages) == 2 for r in rows)
+    assert len(graph["nodes"]) == 2
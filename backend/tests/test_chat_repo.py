@@ -0,0 +1,220 @@
+"""
+聊天记录仓储测试
+作者：智学伴开发团队
+目的：验证会话列表单条SQL带出消息数/最后一条消息、游标分页（游标自带 updated_at 与 ID），以及按 seq 的幂等追加（含并发重试）和增量拉取
+运行：pytest backend/tests/test_chat_repo.py -v
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import users  # noqa: F401  确保 users 表注册到元数据
+from models.chat_sessions import ChatSession, ChatMessage
+from repositories.chat_repo import ChatRepository
+from routers.chat import _decode_cursor, _encode_cursor
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db_session(engine):
+    """创建内存数据库会话"""
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _seed(db, user_id=1, count=5, other_user_sessions=1):
+    base = datetime(2025, 1, 1, 8, 0, 0)
+    sessions = []
+    for i in range(count):
+        session = ChatSession(
+            user_id=user_id,
+            title=f"会话{i}",
+            created_at=base,
+            updated_at=base + timedelta(minutes=i),
+        )
+        db.add(session)
+        db.flush()
+        for j in range(i + 1):
+            db.add(ChatMessage(
+                session_id=session.id,
+                role="user" if j % 2 == 0 else "ai",
+                content=f"会话{i}-消息{j}",
+                created_at=base + timedelta(seconds=j),
+            ))
+        sessions.append(session)
+    for _ in range(other_user_sessions):
+        other = ChatSession(user_id=user_id + 1, title="别人的会话", created_at=base, updated_at=base)
+        db.add(other)
+        db.flush()
+        db.add(ChatMessage(session_id=other.id, role="user", content="不应出现"))
+    db.commit()
+    return sessions
+
+
+def test_list_sessions_single_query_with_summary(db_session, engine):
+    _seed(db_session)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    rows, has_more = ChatRepository.list_sessions(db_session, user_id=1, limit=10)
+
+    assert len(statements) == 1
+    assert has_more is False
+    assert [row[0].title for row in rows] == ["会话4", "会话3", "会话2", "会话1", "会话0"]
+    session, message_count, last_role, last_preview = rows[0]
+    assert message_count == 5
+    assert last_role == "user"
+    assert last_preview == "会话4-消息4"
+
+
+def _cursor(row):
+    return _decode_cursor(_encode_cursor(row[0]))
+
+
+def test_list_sessions_keyset_pagination(db_session):
+    _seed(db_session)
+
+    first_page, has_more = ChatRepository.list_sessions(db_session, user_id=1, limit=2)
+    assert has_more is True
+    second_page, _ = ChatRepository.list_sessions(db_session, user_id=1, limit=2, before=_cursor(first_page[-1]))
+    third_page, has_more = ChatRepository.list_sessions(
+        db_session, user_id=1, limit=2, before=_cursor(second_page[-1])
+    )
+
+    titles = [row[0].title for row in first_page + second_page + third_page]
+    assert titles == ["会话4", "会话3", "会话2", "会话1", "会话0"]
+    assert has_more is False
+
+
+def test_cursor_survives_deleted_or_bumped_session(db_session):
+    sessions = _seed(db_session)
+    first_page, _ = ChatRepository.list_sessions(db_session, user_id=1, limit=2)
+    cursor = _cursor(first_page[-1])
+
+    # 游标所指的会话被删除、另一个会话被更新到最前，下一页仍从原位置继续
+    db_session.delete(first_page[-1][0])
+    sessions[0].updated_at = datetime(2025, 2, 1)
+    db_session.commit()
+
+    second_page, has_more = ChatRepository.list_sessions(db_session, user_id=1, limit=10, before=cursor)
+    assert [row[0].title for row in second_page] == ["会话2", "会话1"]
+    assert has_more is False
+
+
+def test_keyset_pagination_with_server_timestamps(db_session):
+    """updated_at 由数据库写入（SQLite 为不带小数秒的文本），含同一秒内的多个会话"""
+    for i in range(6):
+        db_session.add(ChatSession(user_id=1, title=f"会话{i}"))
+    db_session.commit()
+    # 会话0、1保持同一时间，其余依次晚1秒（仍由数据库格式化）
+    for i, session in enumerate(db_session.query(ChatSession).order_by(ChatSession.id)):
+        if i >= 2:
+            db_session.execute(
+                text("UPDATE chat_sessions SET updated_at = datetime(updated_at, :shift) WHERE id = :id"),
+                {"shift": f"+{i} seconds", "id": session.id},
+            )
+    db_session.commit()
+    db_session.expire_all()
+    # 追加消息用 func.now() 刷新 updated_at
+    bumped = db_session.query(ChatSession).filter(ChatSession.title == "会话3").one()
+    ChatRepository.append_messages(db_session, bumped, [{"seq": 0, "role": "user", "content": "你好"}])
+    db_session.execute(
+        text("UPDATE chat_sessions SET updated_at = datetime(updated_at, '+1 minute') WHERE id = :id"),
+        {"id": bumped.id},
+    )
+    db_session.commit()
+    db_session.expire_all()
+
+    titles, cursor = [], None
+    for _ in range(10):
+        page, has_more = ChatRepository.list_sessions(db_session, user_id=1, limit=2, before=cursor)
+        titles.extend(row[0].title for row in page)
+        if not has_more:
+            break
+        cursor = _cursor(page[-1])
+
+    assert titles == ["会话3", "会话5", "会话4", "会话2", "会话1", "会话0"]
+
+
+def test_list_sessions_include_messages_uses_selectin(db_session, engine):
+    _seed(db_session, count=3)
+    db_session.expire_all()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    rows, _ = ChatRepository.list_sessions(db_session, user_id=1, include_messages=True)
+    contents = [[m.content for m in row[0].messages] for row in rows]
+
+    assert len(statements) == 2
+    assert contents[0] == ["会话2-消息0", "会话2-消息1", "会话2-消息2"]
+
+
+def test_append_messages_is_idempotent_and_bumps_updated_at(db_session):
+    session = _seed(db_session, count=1, other_user_sessions=0)[0]
+    before = session.updated_at
+
+    first = ChatRepository.append_messages(db_session, session, [
+        {"seq": 1, "role": "user", "content": "新问题"},
+        {"seq": 2, "role": "ai", "content": "新回答", "provider": "deepseek"},
+    ], title="改名")
+    retried = ChatRepository.append_messages(db_session, session, [
+        {"seq": 2, "role": "ai", "content": "新回答", "provider": "deepseek"},
+        {"seq": 3, "role": "user", "content": "追问"},
+    ])
+
+    assert [(m.seq, m.content) for m in first] == [(1, "新问题"), (2, "新回答")]
+    assert [(m.seq, m.content) for m in retried] == [(3, "追问")]
+    db_session.refresh(session)
+    assert session.title == "改名"
+    assert session.updated_at > before
+    assert [m.seq for m in ChatRepository.get_messages(db_session, session.id)] == [0, 1, 2, 3]
+
+
+def test_append_messages_skips_seq_inserted_concurrently(db_session):
+    session = _seed(db_session, count=1, other_user_sessions=0)[0]
+    ChatRepository.get_messages(db_session, session.id)  # 旧消息先补写 seq
+    inserted = []
+
+    def concurrent_retry(conn, cursor, statement, parameters, context, executemany):
+        # 本请求查询已有 seq 之后、插入之前，同一批消息的重试请求先插入了 seq=1
+        if statement.startswith("SAVEPOINT") and not inserted:
+            inserted.append(True)
+            cursor.connection.execute(
+                "INSERT INTO chat_messages (session_id, seq, role, content, created_at) "
+                f"VALUES ({session.id}, 1, 'user', '新问题', '2025-01-01 09:00:00')"
+            )
+
+    event.listen(db_session.connection(), "before_cursor_execute", concurrent_retry)
+    appended = ChatRepository.append_messages(db_session, session, [
+        {"seq": 1, "role": "user", "content": "新问题"},
+        {"seq": 2, "role": "ai", "content": "新回答"},
+    ])
+
+    assert inserted and [m.seq for m in appended] == [2]
+    assert [m.seq for m in ChatRepository.get_messages(db_session, session.id)] == [0, 1, 2]
+
+
+def test_get_messages_since_returns_only_delta(db_session):
+    session = _seed(db_session, count=3, other_user_sessions=0)[-1]
+
+    full = ChatRepository.get_messages(db_session, session.id)
+    delta = ChatRepository.get_messages(db_session, session.id, since=full[0].seq)
+
+    assert [m.seq for m in full] == [0, 1, 2]
+    assert [m.content for m in delta] == ["会话2-消息1", "会话2-消息2"]
+    assert ChatRepository.get_messages(db_session, session.id, since=2) == []
+    assert ChatRepository.last_seq(db_session, session.id) == 2
@@ -0,0 +1,94 @@
+"""
+试卷导出缓存测试
+作者：智学伴开发团队
+目的：验证缓存键随试卷版本/导出选项变化、ETag 匹配、按最久未用淘汰，以及删除试卷时清除缓存
+运行：pytest backend/tests/test_export_cache.py -v
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.quiz_paper import QuizPaper
+from services import quiz_paper_service
+from services.quiz_paper_service import QuizPaperService
+from utils.export_cache import ExportCache
+
+
+@pytest.fixture
+def db_session():
+    """创建内存数据库会话"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+def test_key_depends_on_version_and_options():
+    base = ExportCache.key(1, "2025-01-01T08:00:00", "pdf", True)
+    assert ExportCache.key(1, "2025-01-01T08:00:00", "pdf", True) == base
+    assert ExportCache.key(1, "2025-01-02T08:00:00", "pdf", True) != base
+    assert ExportCache.key(1, "2025-01-01T08:00:00", "word", True) != base
+    assert ExportCache.key(1, "2025-01-01T08:00:00", "pdf", False) != base
+    assert ExportCache.key(2, "2025-01-01T08:00:00", "pdf", True) != base
+
+
+def test_etag_matches():
+    key = ExportCache.key(1, "v1", "pdf", True)
+    assert ExportCache.etag_matches(f'"{key}"', key)
+    assert ExportCache.etag_matches(f'"other", W/"{key}"', key)
+    assert ExportCache.etag_matches("*", key)
+    assert not ExportCache.etag_matches('"other"', key)
+    assert not ExportCache.etag_matches(None, key)
+
+
+def test_put_get_and_lru_eviction(tmp_path):
+    cache = ExportCache(cache_dir=str(tmp_path), max_mb=1)
+    first, second, third = (ExportCache.key(i, "v1", "pdf", True) for i in (1, 2, 3))
+
+    assert cache.get(1, first, "pdf") is None
+    path = cache.put(1, first, "pdf", b"0" * 400 * 1024)
+    assert cache.get(1, first, "pdf") == path
+    cache.put(2, second, "pdf", b"0" * 400 * 1024)
+    os.utime(path, (1, 1))
+    os.utime(cache._path(2, second, "pdf"), (2, 2))
+    cache.get(1, first, "pdf")  # 读取后变为最近使用
+
+    cache.put(3, third, "pdf", b"0" * 400 * 1024)
+    assert cache.get(1, first, "pdf") is not None
+    assert cache.get(2, second, "pdf") is None
+    assert cache.get(3, third, "pdf") is not None
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_disabled_cache_is_noop():
+    cache = ExportCache(cache_dir=None)
+    key = ExportCache.key(1, "v1", "pdf", True)
+    assert cache.put(1, key, "pdf", b"data") is None
+    assert cache.get(1, key, "pdf") is None
+    assert cache.invalidate(1) == 0
+
+
+def test_delete_paper_invalidates_exports(db_session, tmp_path, monkeypatch):
+    cache = ExportCache(cache_dir=str(tmp_path))
+    monkeypatch.setattr(quiz_paper_service, "export_cache", cache)
+    paper = QuizPaper(user_id=1, title="期中", total_questions=1, questions=[{"question": "1+1=?"}])
+    other = QuizPaper(user_id=1, title="期末", total_questions=1, questions=[{"question": "2+2=?"}])
+    db_session.add_all([paper, other])
+    db_session.commit()
+
+    updated_at = QuizPaperService.get_paper(db_session, paper.id, 1)["updated_at"]
+    for fmt, ext in (("pdf", "pdf"), ("word", "docx")):
+        cache.put(paper.id, ExportCache.key(paper.id, updated_at, fmt, True), ext, b"data")
+    other_key = ExportCache.key(other.id, "v1", "pdf", True)
+    cache.put(other.id, other_key, "pdf", b"data")
+
+    assert QuizPaperService.delete_paper(db_session, paper.id, 1) is True
+    assert sorted(os.listdir(tmp_path)) == [f"paper_{other.id}_{other_key}.pdf"]
@@ -0,0 +1,100 @@
+"""
+试卷导出进程池测试
+作者：智学伴开发团队
+目的：验证导出在线程/进程池中执行、超过排队上限时拒绝、超时任务在真正结束前继续占用名额，以及按格式的耗时统计
+运行：pytest backend/tests/test_export_pool.py -v
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.export_pool import ExportPool, ExportBusyError, ExportUnavailableError, export_paper_bytes
+
+
+class FakeExport:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.calls = 0
+
+    def __call__(self, export_data, fmt):
+        self.calls += 1
+        self.gate.wait(5)
+        if export_data.get("fail"):
+            raise ValueError("导出PDF失败: 数据错误")
+        return f"{fmt}:{export_data['title']}".encode("utf-8")
+
+
+def _pool(export, **kwargs):
+    return ExportPool(
+        executor_factory=lambda: ThreadPoolExecutor(max_workers=kwargs.get("max_workers", 1)),
+        export_func=export,
+        **kwargs,
+    )
+
+
+def test_run_returns_content_and_records_metrics():
+    pool = _pool(FakeExport())
+
+    async def scenario():
+        content = await pool.run({"title": "期中"}, "pdf")
+        with pytest.raises(ValueError):
+            await pool.run({"title": "坏", "fail": True}, "word")
+        return content
+
+    assert asyncio.run(scenario()) == b"pdf:\xe6\x9c\x9f\xe4\xb8\xad"
+    stats = pool.stats()
+    assert stats["in_flight"] == 0
+    assert stats["formats"]["pdf"]["count"] == 1
+    assert stats["formats"]["word"]["failed"] == 1
+    pool.shutdown()
+
+
+def test_rejects_when_queue_is_full():
+    export = FakeExport()
+    export.gate.clear()
+    pool = _pool(export, max_workers=1, max_queue=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run({"title": "1"}, "pdf"))
+        second = asyncio.ensure_future(pool.run({"title": "2"}, "pdf"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExportBusyError) as exc_info:
+            await pool.run({"title": "3"}, "pdf")
+        assert exc_info.value.retry_after >= 1
+        export.gate.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [b"pdf:1", b"pdf:2"]
+    assert pool.stats()["formats"]["pdf"]["rejected"] == 1
+    assert pool.stats()["in_flight"] == 0
+    pool.shutdown()
+
+
+def test_timed_out_export_keeps_slot_until_finished():
+    export = FakeExport()
+    export.gate.clear()
+    pool = _pool(export, max_workers=1, max_queue=0, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(ExportUnavailableError):
+            await pool.run({"title": "慢"}, "pdf")
+        # 超时的任务仍在执行，名额未释放
+        assert pool.stats()["in_flight"] == 1
+        with pytest.raises(ExportBusyError):
+            await pool.run({"title": "新"}, "pdf")
+
+    asyncio.run(scenario())
+    export.gate.set()
+    pool.shutdown()
+    assert pool.stats()["formats"]["pdf"]["timeouts"] == 1
+
+
+def test_export_paper_bytes_produces_word_document():
+    from utils import paper_exporter
+    if not paper_exporter.DOCX_AVAILABLE:
+        pytest.skip("python-docx 未安装")
+    content = export_paper_bytes({"title": "测验", "questions": [{"type": "fill", "question": "1+1=?"}]}, "word")
+    assert content[:2] == b"PK"
@@ -0,0 +1,126 @@
+"""
+文件解析测试
+作者：智学伴开发团队
+目的：验证逐页提取读够字符数即停止（不解析剩余页面）、截断规则与整篇解析一致、
+     大 PDF 进程池并行提取结果与逐页一致，以及文本文件只用开头样本检测编码
+运行：pytest backend/tests/test_file_parser.py -v
+"""
+import fitz
+import pytest
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+from utils import file_parser
+from utils.file_parser import (
+    PdfPagePool,
+    collect_text,
+    detect_encoding,
+    iter_file_text,
+    parse_file,
+    parse_pdf,
+)
+
+
+def _pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i} " + "x" * 80)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def counted_pages(monkeypatch):
+    """统计 PyMuPDF 实际提取文本的页数"""
+    calls = []
+    original = fitz.Page.get_text
+
+    def get_text(self, *args, **kwargs):
+        calls.append(self.number)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, "get_text", get_text)
+    return calls
+
+
+def test_pdf_budget_stops_early(tmp_path, counted_pages, monkeypatch):
+    monkeypatch.setattr(file_parser, "pdf_page_pool", PdfPagePool(workers=0))
+    path = _pdf(tmp_path / "book.pdf", 200)
+
+    text, length = parse_file(path, max_length=500)
+    assert length == 500 and text.startswith("Page 0")
+    assert len(counted_pages) <= 6  # 200页中只解析了开头几页
+
+    counted_pages.clear()
+    full = parse_pdf(path)
+    assert len(counted_pages) == 200
+    assert parse_file(path, max_length=len(full)) == (full, len(full))
+    # 未指定 max_length 时沿用原规则：超过 MAX_TEXT_LENGTH 截断到 TRUNCATE_LENGTH
+    assert parse_file(path) == (full[:file_parser.TRUNCATE_LENGTH], file_parser.TRUNCATE_LENGTH)
+
+
+def test_parallel_pdf_matches_sequential(tmp_path, monkeypatch):
+    path = _pdf(tmp_path / "large.pdf", 40)
+    expected = parse_pdf(path)
+    pool = PdfPagePool(workers=2, parallel_min_pages=10, pages_per_task=4)
+    monkeypatch.setattr(file_parser, "pdf_page_pool", pool)
+    try:
+        assert parse_pdf(path) == expected
+        pieces = iter_file_text(path)
+        text, truncated = collect_text(pieces, 300)
+        assert truncated is True and text == expected[:300]
+    finally:
+        pool.shutdown()
+
+
+def test_text_file_encoding_from_sample(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_parser, "TEXT_READ_CHARS", 1000)
+    content = "第一章 函数的概念与性质。\n" * 2000
+    path = tmp_path / "notes.txt"
+    path.write_bytes(content.encode("gbk"))
+
+    assert detect_encoding(str(path), sample_bytes=4096).lower() in ("gb2312", "gbk", "gb18030")
+    text, truncated = collect_text(iter_file_text(str(path)), 2500)
+    assert text == content[:2500] and truncated is True
+    assert parse_file(str(path), max_length=len(content)) == (content, len(content))
+
+    short = tmp_path / "short.md"
+    short.write_text("# 标题\n正文", encoding="utf-8")
+    assert parse_file(str(short)) == ("# 标题\n正文", 7)
+
+    empty = tmp_path / "empty.txt"
+    empty.write_text("  \n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        parse_file(str(empty))
+
+
+def test_docx_and_pptx_join_pieces(tmp_path):
+    doc = Document()
+    for i in range(3):
+        doc.add_paragraph(f"段落{i}")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "定义"
+    table.cell(0, 1).text = "性质"
+    docx_path = str(tmp_path / "lesson.docx")
+    doc.save(docx_path)
+    assert parse_file(docx_path) == ("段落0\n段落1\n段落2\n定义 | 性质", 19)
+    assert parse_file(docx_path, max_length=5) == ("段落0\n段", 5)
+    assert "\n".join(file_parser._iter_docx_via_zip(docx_path)).startswith("段落0\n段落1\n段落2")
+
+    prs = Presentation()
+    for i in range(2):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = f"第{i}页"
+        box = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(4), Inches(1))
+        box.text_frame.text = f"要点{i}"
+    pptx_path = str(tmp_path / "slides.pptx")
+    prs.save(pptx_path)
+    assert parse_file(pptx_path)[0] == "第0页\n要点0\n第1页\n要点1"
+
+    sheet = tmp_path / "scores.xls"
+    sheet.write_bytes(b"xls")
+    with pytest.raises(ValueError):
+        parse_file(str(sheet))
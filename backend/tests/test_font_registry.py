@@ -0,0 +1,51 @@
+"""
+PDF字体注册表测试
+作者：智学伴开发团队
+目的：验证字体文件在进程内只解析一次、候选不可用时回退到CID字体，以及健康检查结果
+运行：pytest backend/tests/test_font_registry.py -v
+"""
+import os
+
+import reportlab
+
+from utils import font_registry as font_registry_module
+from utils.font_registry import FontRegistry, CID_FONT
+
+VERA_PATH = os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")
+
+
+def test_font_file_is_parsed_once(monkeypatch):
+    parsed = []
+    original = font_registry_module.TTFont
+
+    def counting_ttfont(name, path, *args, **kwargs):
+        parsed.append(path)
+        return original(name, path, *args, **kwargs)
+
+    monkeypatch.setattr(font_registry_module, "TTFont", counting_ttfont)
+    registry = FontRegistry(candidates=[("Missing", "/nonexistent/font.ttf"), ("RegistryVera", VERA_PATH)])
+
+    assert registry.health()["loaded"] is False
+    assert registry.get_cjk_font() == "RegistryVera"
+    assert registry.get_cjk_font() == "RegistryVera"
+    assert parsed == [VERA_PATH]
+
+    health = registry.health()
+    assert health["loaded"] is True
+    assert health["kind"] == "ttf"
+    assert health["path"] == VERA_PATH
+    assert health["glyphs"] > 0
+    assert health["cjk_ok"] is False  # Vera 不包含中文字形
+
+    # 新的注册表实例复用 reportlab 中已注册的字体，不再解析文件
+    assert FontRegistry(candidates=[("RegistryVera", VERA_PATH)]).get_cjk_font() == "RegistryVera"
+    assert parsed == [VERA_PATH]
+
+
+def test_falls_back_to_cid_font():
+    registry = FontRegistry(candidates=[("Missing", "/nonexistent/font.ttf")])
+
+    assert registry.get_cjk_font() == CID_FONT
+    health = registry.health()
+    assert health["kind"] == "cid"
+    assert health["cjk_ok"] is True
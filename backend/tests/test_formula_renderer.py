@@ -0,0 +1,97 @@
+"""
+LaTeX公式渲染缓存测试
+作者：智学伴开发团队
+目的：验证同一公式只渲染一次（内存/磁盘缓存）、失败结果不落盘、磁盘缓存按大小清理，
+     以及Word导出整份试卷批量渲染公式且不产生临时文件
+运行：pytest backend/tests/test_formula_renderer.py -v
+"""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from utils import paper_exporter
+from utils.formula_renderer import FormulaRenderer
+
+
+def _png(color="black"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 10), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class CountingRender:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def __call__(self, formula):
+        self.calls.append(formula)
+        return None if formula in self.fail else _png()
+
+
+def test_render_many_dedupes_and_caches_in_memory():
+    render = CountingRender()
+    renderer = FormulaRenderer(cache_dir=None, render_func=render)
+
+    images = renderer.render_many(["x^2", "$x^2$", " x^2 ", "\\frac{1}{2}"])
+    assert set(images) == {"x^2", "\\frac{1}{2}"}
+    assert render.calls == ["x^2", "\\frac{1}{2}"]
+
+    assert renderer.render("$$x^2$$") == images["x^2"]
+    assert render.calls == ["x^2", "\\frac{1}{2}"]
+    assert renderer.stats()["memory_hits"] == 1
+
+
+def test_disk_cache_is_shared_and_failures_are_not_persisted(tmp_path):
+    render = CountingRender(fail={"\\bad{"})
+    first = FormulaRenderer(cache_dir=str(tmp_path), render_func=render)
+    images = first.render_many(["a+b", "\\bad{"])
+    assert images["\\bad{"] is None
+    assert len(list(tmp_path.glob("*.png"))) == 1
+
+    # 失败结果在内存中记住，不重复尝试
+    first.render_many(["\\bad{"])
+    assert render.calls == ["a+b", "\\bad{"]
+
+    # 新实例（如另一个工作进程）从磁盘读取已渲染的公式
+    second_render = CountingRender()
+    second = FormulaRenderer(cache_dir=str(tmp_path), render_func=second_render)
+    assert second.render("a+b") == images["a+b"]
+    assert second_render.calls == []
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_prune_disk_removes_oldest_files(tmp_path):
+    renderer = FormulaRenderer(cache_dir=str(tmp_path), max_disk_mb=1, render_func=CountingRender())
+    old = tmp_path / "old.png"
+    new = tmp_path / "new.png"
+    old.write_bytes(b"0" * 700 * 1024)
+    new.write_bytes(b"0" * 700 * 1024)
+    os.utime(old, (1, 1))
+
+    assert renderer.prune_disk() == 1
+    assert not old.exists()
+    assert new.exists()
+
+
+def test_word_export_renders_each_formula_once(tmp_path, monkeypatch):
+    if not paper_exporter.DOCX_AVAILABLE:
+        pytest.skip("python-docx 未安装")
+    render = CountingRender()
+    monkeypatch.setattr(paper_exporter, "formula_renderer", FormulaRenderer(cache_dir=None, render_func=render))
+    paper = {
+        "title": "函数测验",
+        "questions": [
+            {"type": "choice", "question": "求 $x^2$ 的导数", "options": ["$2x$", "$x^2$", "\\(x\\)"]},
+            {"type": "fill", "question": "已知 $x^2$ = 4，则 x = ?"},
+        ],
+        "answer_key": {"1": {"answer": "$2x$"}, "2": {"answer": "$\\pm 2$"}},
+    }
+    output_path = str(tmp_path / "paper.docx")
+
+    paper_exporter.PaperExporter.export_to_word(paper, output_path)
+
+    assert os.path.getsize(output_path) > 0
+    assert sorted(render.calls) == sorted(["x^2", "2x", "x", "\\pm 2"])
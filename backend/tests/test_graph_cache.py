@@ -0,0 +1,135 @@
+"""
+知识图谱序列化缓存测试
+作者：智学伴开发团队
+目的：验证 compact 格式与 full 格式内容一致、gzip 按客户端能力返回、按字节数淘汰，
+     以及缓存命中时不访问数据库、删除会话时清除缓存
+运行：pytest backend/tests/test_graph_cache.py -v
+"""
+import asyncio
+import gzip
+import json
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, ThreadedSession
+from repositories.learning_map_repo import LearningMapRepository
+from services import learning_map_service
+from services.learning_map_service import LearningMapService
+from utils.graph_cache import GraphCache, encode_graph, to_compact
+
+
+@pytest.fixture
+def db_session():
+    """创建内存数据库会话（StaticPool 使线程池中的调用共用同一个连接）"""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = GraphCache(max_mb=1, gzip_min_bytes=1024)
+    monkeypatch.setattr(learning_map_service, "graph_cache", cache)
+    return cache
+
+
+def _graph(size):
+    return {
+        "session": {"id": 1, "topic": "函数", "created_at": "2025-01-01T08:00:00"},
+        "nodes": [
+            {"id": 10 + i, "title": f"知识点{i}", "description": "说明" * 5, "level": "foundation",
+             "mastery": "medium", "example": None, "resources": ["教材"]}
+            for i in range(size)
+        ],
+        "edges": [
+            {"id": 100 + i, "from_node_id": 10 + i, "to_node_id": 11 + i, "relation": "depends_on"}
+            for i in range(size - 1)
+        ],
+    }
+
+
+def _create_graph(db, user_id=1):
+    nodes = [{"title": "定义"}, {"title": "图像"}, {"title": "性质"}]
+    edges = [{"from": "定义", "to": "图像"}, {"from": "定义", "to": "性质", "relation": "explains"}]
+    session_record, _, _ = LearningMapRepository.create_graph(
+        db, user_id, "函数", "demo", None, "预览", nodes, edges
+    )
+    return session_record
+
+
+def test_compact_format_preserves_graph():
+    graph = _graph(50)
+    compact = to_compact(graph)
+    assert compact["nodes"]["title"][3] == "知识点3"
+    assert compact["relations"] == ["depends_on"]
+    rebuilt = [
+        (compact["nodes"]["id"][i], compact["nodes"]["id"][j], compact["relations"][r])
+        for i, targets in enumerate(compact["adjacency"])
+        for j, r in targets
+    ]
+    assert rebuilt == [(e["from_node_id"], e["to_node_id"], e["relation"]) for e in graph["edges"]]
+    assert len(encode_graph(graph, "compact")) < len(encode_graph(graph, "full")) * 0.7
+
+
+def test_gzip_and_lru_by_size():
+    cache = GraphCache(max_mb=1, gzip_min_bytes=1024)
+    small = cache.put(1, 1, "full", _graph(1))
+    large = cache.put(1, 2, "full", _graph(50))
+    assert small.gzipped is False
+    assert large.gzipped is True
+    body, gzipped = large.content(accept_gzip=False)
+    assert gzipped is False
+    assert json.loads(body) == json.loads(gzip.decompress(large.body))
+    assert cache.get(1, 2, "full") is large
+    assert cache.get(2, 2, "full") is None  # 其他用户不会命中
+
+    cache.max_bytes = len(large.body) + 1
+    cache.put(1, 3, "compact", _graph(1))
+    assert cache.get(1, 2, "full") is None
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_cached_graph_skips_database(db_session, cache):
+    session_record = _create_graph(db_session)
+    adb = ThreadedSession(db_session)
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    first = asyncio.run(LearningMapService.aget_graph_cached(adb, 1, session_record.id, fmt="compact"))
+    queries_on_miss = len(statements)
+    again = asyncio.run(LearningMapService.aget_graph_cached(adb, 1, session_record.id, fmt="compact"))
+    assert again is first
+    assert len(statements) == queries_on_miss
+
+    latest = asyncio.run(LearningMapService.aget_graph_cached(adb, 1, fmt="compact"))
+    assert latest is first
+    assert len(statements) == queries_on_miss + 1  # 只查询最新会话ID
+
+    data = json.loads(first.content(accept_gzip=False)[0])
+    assert data["relations"] == ["depends_on", "explains"]
+    assert data == to_compact(LearningMapService.get_graph(db_session, 1, session_record.id)) | {
+        "session": data["session"]
+    }
+    assert asyncio.run(LearningMapService.aget_graph_cached(adb, 2)) is None
+
+
+def test_delete_session_invalidates_cache(db_session, cache):
+    session_record = _create_graph(db_session)
+    LearningMapService._warm_graph_cache(db_session, 1, session_record)
+    assert cache.get(1, session_record.id, "full") is not None
+
+    assert LearningMapService.delete_session(db_session, 1, session_record.id) is True
+    assert cache.get(1, session_record.id, "full") is None
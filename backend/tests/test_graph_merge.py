@@ -0,0 +1,135 @@
+"""
+知识图谱分块合并测试
+作者：智学伴开发团队
+目的：验证分块覆盖全文且带重叠、超过上限时均匀抽样、节点按规范化标题与模糊匹配去重、边取并集，
+     以及分块并发抽取受并发上限约束、单块失败不影响整体，合并结果写入同一个会话
+运行：pytest backend/tests/test_graph_merge.py -v
+"""
+import asyncio
+import json
+import re
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from database import Base
+from repositories.learning_map_repo import LearningMapRepository
+from services import learning_map_service
+from services.ai_service import AIService
+from services.learning_map_service import LearningMapService
+from utils.graph_cache import GraphCache
+from utils.graph_merge import GraphMerger, chunk_spans, normalize_title, select_spans
+
+
+@pytest.fixture
+def db_session():
+    """创建内存数据库会话"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+def test_chunk_spans_cover_text_with_overlap():
+    text = "".join(f"第{i}段讲解知识点{i}。\n" for i in range(500))
+    spans = chunk_spans(text, size=1000, overlap=100)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (_, prev_end), (start, end) in zip(spans, spans[1:]):
+        assert 0 < prev_end - start <= 100  # 与上一块重叠
+        assert end - start <= 1000
+    assert all(text[end - 1] in "。\n" for _, end in spans[:-1])  # 在句子边界断开
+
+    sampled = select_spans(spans, 5)
+    assert len(sampled) == 5
+    assert sampled[0] == spans[0] and sampled[-1] == spans[-1]
+    assert chunk_spans("短文本", size=1000, overlap=100) == [(0, 3)]
+
+
+def test_merger_dedupes_titles_and_unions_edges():
+    merger = GraphMerger()
+    merger.add(1, {
+        "nodes": [{"title": "一元二次方程的解法", "resources": ["教材"]}, {"title": "判别式"}],
+        "edges": [{"from": "判别式", "to": "一元二次方程的解法", "relation": "先修"}],
+    })
+    merger.add(0, {
+        "nodes": [
+            {"title": "一元二次方程 解法", "description": "配方法与公式法", "resources": ["习题"]},
+            {"title": "函数"},
+        ],
+        "edges": [
+            {"from": "函数", "to": "一元二次方程 解法"},
+            {"from": "函数", "to": "不存在的节点"},
+        ],
+    })
+    merger.add(2, {
+        "nodes": [{"title": "一元二次方程解法"}, {"title": "Discriminant"}, {"title": "判别式 "}],
+        "edges": [
+            {"from": "判别式", "to": "一元二次方程解法", "relation": "依赖"},
+            {"from": "判别式", "to": "判别式"},
+        ],
+    })
+    nodes, edges = merger.result()
+
+    assert [n["title"] for n in nodes] == ["一元二次方程 解法", "函数", "判别式", "Discriminant"]
+    assert nodes[0]["description"] == "配方法与公式法"
+    assert nodes[0]["resources"] == ["习题", "教材"]
+    assert edges == [
+        {"from": "函数", "to": "一元二次方程 解法", "relation": "depends_on"},
+        {"from": "判别式", "to": "一元二次方程 解法", "relation": "先修"},
+    ]
+
+    top, top_edges = merger.result(max_nodes=2)
+    assert [n["title"] for n in top] == ["一元二次方程 解法", "判别式"]
+    assert len(top_edges) == 1
+    assert normalize_title("（函数）的 定义") == "函数的定义"
+
+
+def test_generate_graph_map_reduce(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "LEARNING_MAP_CHUNK_CHARS", 500)
+    monkeypatch.setattr(settings, "LEARNING_MAP_CHUNK_OVERLAP", 50)
+    monkeypatch.setattr(settings, "LEARNING_MAP_MAX_CHUNKS", 8)
+    monkeypatch.setattr(settings, "LEARNING_MAP_CONCURRENCY", 3)
+    cache = GraphCache()
+    monkeypatch.setattr(learning_map_service, "graph_cache", cache)
+    text = "".join(f"第{i}章讲解知识点{i}。\n" for i in range(400))
+    record = LearningMapRepository.create_file(db_session, 1, "/tmp/book.txt", text, "book.txt")
+    state = {"in_flight": 0, "max_in_flight": 0, "prompts": []}
+
+    async def fake_acall_ai(db, user_prompt, **kwargs):
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        state["prompts"].append(user_prompt)
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        part = int(re.search(r"第 (\d+)/", user_prompt).group(1))
+        if part == 2:
+            raise Exception("AI服务暂时不可用")
+        payload = {
+            "nodes": [{"title": "总览"}, {"title": f"知识点{part}"}],
+            "edges": [{"source": "总览", "target": f"知识点{part}", "relation": "包含"}],
+        }
+        return {"text": json.dumps(payload, ensure_ascii=False)}
+
+    monkeypatch.setattr(AIService, "acall_ai", staticmethod(fake_acall_ai))
+
+    result = asyncio.run(LearningMapService.generate_graph(db_session, 1, record.id, None, "demo"))
+
+    assert state["max_in_flight"] == 3
+    assert all("/8 部分" in prompt for prompt in state["prompts"])
+    assert any("知识点399" in prompt for prompt in state["prompts"])  # 抽样覆盖到资料末尾
+    # 第2块重试后仍失败被跳过：7块各贡献一个知识点，“总览”合并为一个节点
+    assert result["node_count"] == 8
+    assert result["edge_count"] == 7
+    # 生成时已预热两种格式，前端默认的 compact 请求直接命中缓存
+    assert cache.get(1, result["session_id"], "compact") is not None
+    assert cache.get(1, result["session_id"], "full") is not None
+    graph = LearningMapService.get_graph(db_session, 1, result["session_id"])
+    assert [n["title"] for n in graph["nodes"]][0] == "总览"
+    assert len(LearningMapService.get_history(db_session, 1)) == 1
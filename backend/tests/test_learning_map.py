@@ -3,9 +3,10 @@
 """
 import json
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from database import Base
+from models.learning_map import LearningMapFile, LearningMapSession
 from repositories.learning_map_repo import LearningMapRepository
 from services.learning_map_service import LearningMapService
 
@@ -23,6 +24,14 @@ def db_session():
         Base.metadata.drop_all(engine)
 
 
+def test_raw_text_is_longtext_on_mysql():
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateTable
+
+    ddl = str(CreateTable(LearningMapFile.__table__).compile(dialect=mysql.dialect()))
+    assert "raw_text LONGTEXT" in ddl
+
+
 def test_create_and_fetch_file(db_session):
     record = LearningMapRepository.create_file(
         db_session,
@@ -77,6 +86,59 @@ def test_session_graph_flow(db_session):
     assert len(fetched_edges) == 1
 
 
+def _graph_payload(size):
+    nodes = [{"title": f"N{i}", "description": "desc"} for i in range(size)]
+    edges = [{"from": f"N{i}", "to": f"N{i + 1}"} for i in range(size - 1)]
+    edges.append({"from": "N0", "to": "缺失"})  # 端点不存在的边被跳过
+    return nodes, edges
+
+
+def _count_statements(db_session, fn):
+    statements = []
+    engine = db_session.get_bind()
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+def test_create_graph_bulk_and_size_independent(db_session):
+    counts = []
+    for size in (3, 60):
+        nodes, edges = _graph_payload(size)
+        (session_record, node_count, edge_count), statements = _count_statements(
+            db_session,
+            lambda: LearningMapRepository.create_graph(
+                db_session, 1, "topic", "demo", None, "preview", nodes, edges
+            ),
+        )
+        assert (node_count, edge_count) == (size, size - 1)
+        counts.append(statements)
+
+        fetched_nodes, fetched_edges = LearningMapRepository.get_graph_by_session(
+            db_session, 1, session_record
+        )
+        ids = {node.title: node.id for node in fetched_nodes}
+        assert len(fetched_nodes) == size
+        assert [(e.from_node_id, e.to_node_id) for e in fetched_edges][:2] == [
+            (ids["N0"], ids["N1"]),
+            (ids["N1"], ids["N2"]),
+        ]
+    assert counts[0] == counts[1]
+
+
+def test_create_graph_rolls_back_on_failure(db_session):
+    nodes = [{"title": "A"}, {"title": None}]  # title 非空约束失败
+    with pytest.raises(Exception):
+        LearningMapRepository.create_graph(
+            db_session, 1, "topic", "demo", None, "preview", nodes, []
+        )
+    assert db_session.query(LearningMapSession).count() == 0
+
+
 def test_history_listing(db_session):
     session_ids = []
     for idx in range(3):
@@ -0,0 +1,69 @@
+"""
+知识图谱生成任务测试
+作者：智学伴开发团队
+目的：验证提交后立即返回、按分块汇报进度、相同请求复用进行中的任务、
+     参数错误记为400失败，以及等待超时不会取消后台生成
+运行：pytest backend/tests/test_learning_map_jobs.py -v
+"""
+import asyncio
+
+from utils.learning_map_jobs import LearningMapJobManager, STATUS_DONE, STATUS_FAILED, STATUS_RUNNING
+
+
+class FakeGenerator:
+    """按分块汇报进度的生成函数，gate 放行前停在第一块之后"""
+
+    def __init__(self, chunks: int = 4):
+        self.chunks = chunks
+        self.calls = []
+        self.gate = None
+
+    async def __call__(self, user_id, file_id, course_topic, provider, progress):
+        self.calls.append((user_id, file_id, course_topic, provider))
+        if file_id == -1:
+            raise ValueError("找不到指定的学习资料")
+        progress(0, self.chunks)
+        progress(1, self.chunks)
+        await self.gate.wait()
+        progress(self.chunks, self.chunks)
+        return {"success": True, "node_count": 3, "edge_count": 2, "session_id": 7, "message": "知识图谱生成完成"}
+
+
+def test_job_reports_chunk_progress_and_result():
+    generate = FakeGenerator()
+    manager = LearningMapJobManager(generate=generate)
+
+    async def scenario():
+        generate.gate = asyncio.Event()
+        job = manager.submit(1, 10, None, None)
+        assert job["status"] == "queued" and job["result"] is None
+        await asyncio.sleep(0)
+
+        running = manager.get(job["job_id"])
+        assert running["status"] == STATUS_RUNNING
+        assert (running["chunks_done"], running["chunks_total"], running["progress"]) == (1, 4, 23)
+        # 相同请求在生成期间复用同一任务
+        assert manager.submit(1, 10, None, None)["job_id"] == job["job_id"]
+
+        # 等待超时只放弃等待，任务继续执行
+        assert (await manager.wait(job["job_id"], 0.01))["status"] == STATUS_RUNNING
+        generate.gate.set()
+        return await manager.wait(job["job_id"], 1)
+
+    done = asyncio.run(scenario())
+    assert done["status"] == STATUS_DONE and done["progress"] == 100
+    assert done["result"]["session_id"] == 7
+    assert len(generate.calls) == 1
+    assert manager.get("missing") is None
+
+
+def test_invalid_request_fails_with_400():
+    manager = LearningMapJobManager(generate=FakeGenerator())
+
+    async def scenario():
+        job = manager.submit(1, -1, None, None)
+        return await manager.wait(job["job_id"], 1)
+
+    failed = asyncio.run(scenario())
+    assert failed["status"] == STATUS_FAILED
+    assert (failed["error"], failed["error_code"]) == ("找不到指定的学习资料", 400)
@@ -0,0 +1,71 @@
+"""
+日志模块测试
+作者：智学伴开发团队
+目的：验证日志经队列异步写出、访问日志为JSON行以及按路由采样
+运行：pytest backend/tests/test_logger.py -v
+"""
+import json
+import logging
+import logging.handlers
+
+import pytest
+
+from core import logger as logger_module
+from core.logger import StructuredFormatter, log_access, access_logger, logger
+
+
+class _CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured():
+    handler = _CaptureHandler()
+    access_logger.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        access_logger.removeHandler(handler)
+
+
+def test_app_logger_only_enqueues():
+    assert len(logger.handlers) == 1
+    assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
+
+
+def test_access_log_is_json_line(captured, monkeypatch):
+    monkeypatch.setattr(logger_module.settings, "LOG_ACCESS_SAMPLE_RATES", {})
+    log_access("GET", "/api/v1/chat/sessions", 200, 12.345, user_id=7, provider="deepseek", client="127.0.0.1")
+
+    assert len(captured) == 1
+    line = json.loads(StructuredFormatter().format(captured[0]))
+    assert line["method"] == "GET"
+    assert line["path"] == "/api/v1/chat/sessions"
+    assert line["status"] == 200
+    assert line["latency_ms"] == 12.35
+    assert line["user_id"] == 7
+    assert line["provider"] == "deepseek"
+
+
+def test_sampling_skips_high_volume_routes_but_keeps_errors(captured, monkeypatch):
+    monkeypatch.setattr(logger_module.settings, "LOG_ACCESS_SAMPLE_RATES", {"/health": 0.0, "/api": 1.0})
+
+    log_access("GET", "/health", 200, 1.0)
+    log_access("GET", "/health", 503, 1.0)
+    log_access("GET", "/api/v1/quiz/history/1", 200, 1.0)
+
+    assert [(r.fields["path"], r.fields["status"]) for r in captured] == [
+        ("/health", 503),
+        ("/api/v1/quiz/history/1", 200),
+    ]
+
+
+def test_text_format_for_regular_records():
+    record = logging.LogRecord("zhixueban", logging.INFO, __file__, 1, "普通日志 %s", ("ok",), None)
+    assert StructuredFormatter().format(record).endswith("zhixueban - INFO - 普通日志 ok")
+    assert json.loads(StructuredFormatter(json_lines=True).format(record))["message"] == "普通日志 ok"
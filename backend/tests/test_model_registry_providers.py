@@ -4,6 +4,7 @@
 目的：确保新增的文心 / 星火 / Moonshot 提供商能够正确构造请求并解析响应
 运行：pytest backend/tests/test_model_registry_providers.py -v
 """
+import asyncio
 import pytest
 
 from utils.model_registry import (
@@ -119,3 +120,73 @@ def test_registry_merges_config_params():
         registry._providers = original_providers
         registry._provider_params = original_params
 
+
+
+def patch_async_httpx(monkeypatch, expected_payload, capture):
+    """替换 httpx.AsyncClient 以拦截异步请求"""
+
+    class DummyAsyncClient:
+        instances = 0
+
+        def __init__(self, *args, **kwargs):
+            DummyAsyncClient.instances += 1
+            self.is_closed = False
+
+        async def post(self, url, json=None, headers=None):
+            capture["url"] = url
+            capture["json"] = json
+            capture["headers"] = headers
+            return DummyResponse(expected_payload)
+
+        async def aclose(self):
+            self.is_closed = True
+
+    monkeypatch.setattr("utils.model_registry.httpx.AsyncClient", DummyAsyncClient)
+    return DummyAsyncClient
+
+
+def test_provider_acall_reuses_pooled_client(monkeypatch):
+    capture = {}
+    payload = {"choices": [{"message": {"content": "异步回答"}}], "model": "kimi-k2"}
+    client_cls = patch_async_httpx(monkeypatch, payload, capture)
+
+    provider = MoonshotProvider("moon-key", base_url="https://moonshot.async.mock")
+
+    async def run():
+        first = await provider.acall([{"role": "user", "content": "hi"}])
+        second = await provider.acall([{"role": "user", "content": "again"}])
+        await registry.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first["text"] == "异步回答"
+    assert second["model"] == "kimi-k2"
+    assert capture["json"]["messages"][0]["content"] == "again"
+    assert client_cls.instances == 1
+
+
+def test_registry_acall_with_fallback_skips_failed_provider():
+    """首选提供商失败时，异步调用应回退到下一个提供商"""
+
+    class _FailingProvider(AIProvider):
+        def call(self, messages, **kwargs):
+            raise RuntimeError("boom")
+
+    original_providers = registry._providers.copy()
+    original_params = registry._provider_params.copy()
+    try:
+        registry._providers.clear()
+        registry._provider_params.clear()
+        registry.register_provider("broken", _FailingProvider())
+        registry.register_provider("deepseek", _DummyProvider(), {"model": "deepseek-chat"})
+
+        result = asyncio.run(
+            registry.acall_with_fallback([{"role": "user", "content": "hi"}], preferred_provider="broken")
+        )
+
+        assert result["text"] == "ok"
+        assert result["provider"] == "deepseek"
+    finally:
+        registry._providers = original_providers
+        registry._provider_params = original_params
@@ -0,0 +1,78 @@
+"""
+OpenAI SDK 客户端工厂测试
+作者：智学伴开发团队
+目的：验证客户端按 (provider, base_url, api_key) 复用、配置变化时替换，以及异步流式输出
+运行：pytest backend/tests/test_openai_client.py -v
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import openai_client
+
+
+@pytest.fixture(autouse=True)
+def clean_clients():
+    openai_client.invalidate_clients()
+    yield
+    openai_client.invalidate_clients()
+
+
+def test_sync_client_is_shared_and_replaced_on_key_change():
+    first = openai_client.get_openai_client("deepseek", "https://api.example.com/v1", "key-1")
+    again = openai_client.get_openai_client("deepseek", "https://api.example.com/v1", "key-1")
+    rotated = openai_client.get_openai_client("deepseek", "https://api.example.com/v1", "key-2")
+
+    assert first is again
+    assert rotated is not first
+    assert list(openai_client._sync_clients) == [("deepseek", "https://api.example.com/v1", "key-2")]
+
+
+def test_async_client_reused_within_loop():
+    async def fetch_twice():
+        a = openai_client.get_async_openai_client("moonshot", "https://api.example.com/v1", "key")
+        b = openai_client.get_async_openai_client("moonshot", "https://api.example.com/v1", "key")
+        return a, b
+
+    a, b = asyncio.run(fetch_twice())
+    assert a is b
+
+    # 新的事件循环会重建客户端
+    c, _ = asyncio.run(fetch_twice())
+    assert c is not a
+
+
+def test_ask_gpt_stream_iterates_async_stream(monkeypatch):
+    class FakeStream:
+        def __init__(self, parts):
+            self._parts = list(parts)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self._parts:
+                raise StopAsyncIteration
+            await asyncio.sleep(0)
+            part = self._parts.pop(0)
+            return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+    captured = {}
+
+    async def fake_create(**kwargs):
+        captured.update(kwargs)
+        return FakeStream(["你好", "，同学"])
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setattr(openai_client, "get_async_openai_client", lambda *args: fake_client)
+
+    async def collect():
+        return [chunk async for chunk in openai_client.ask_gpt_stream("你好", "deepseek")]
+
+    chunks = asyncio.run(collect())
+
+    assert [c["content"] for c in chunks] == ["你好", "，同学"]
+    assert all(c["type"] == "content" for c in chunks)
+    assert captured["stream"] is True
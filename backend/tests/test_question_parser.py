@@ -0,0 +1,73 @@
+"""
+题目增量解析器测试
+作者：智学伴开发团队
+目的：验证各类畸形AI输出（代码块、截断、裸换行、字符串数组等）都能解析，且流式输入逐题产出
+运行：pytest backend/tests/test_question_parser.py -v
+"""
+import json
+
+from utils.question_parser import IncrementalQuestionParser, iter_questions, parse_questions
+
+
+def _questions(count):
+    return [
+        {"question": f"题目{i}", "type": "choice", "options": ["A. 1", "B. 2"], "answer": "A", "difficulty": "easy"}
+        for i in range(count)
+    ]
+
+
+def test_parse_fenced_output_with_prose():
+    body = json.dumps({"questions": _questions(3)}, ensure_ascii=False, indent=2)
+    text = f"以下是生成的题目：\n```json\n{body}\n```\n祝学习愉快！"
+    questions = parse_questions(text)
+    assert [q["question"] for q in questions] == ["题目0", "题目1", "题目2"]
+
+
+def test_parse_truncated_output_keeps_complete_questions():
+    body = json.dumps({"questions": _questions(3)}, ensure_ascii=False)
+    truncated = body[: body.index("题目2") + 5]
+    questions = parse_questions(truncated)
+    assert [q["question"] for q in questions] == ["题目0", "题目1"]
+
+
+def test_parse_unescaped_control_characters_and_trailing_comma():
+    text = '{"questions": [{"question": "第一行\n第二行\t缩进", "answer": "B", "difficulty": "hard",},]}'
+    questions = parse_questions(text)
+    assert len(questions) == 1
+    assert questions[0]["question"] == "第一行\n第二行\t缩进"
+    assert questions[0]["type"] == "fill"
+
+
+def test_parse_unclosed_difficulty_string():
+    text = '{"questions": [{"question": "Q", "answer": "A", "difficulty": "ea\n  "knowledge_point": "导数"}]}'
+    questions = parse_questions(text)
+    assert len(questions) == 1
+    assert questions[0]["difficulty"] == "easy"
+    assert questions[0]["knowledge_point"] == "导数"
+
+
+def test_parse_string_array_format():
+    text = json.dumps({"questions": [json.dumps(q, ensure_ascii=False) for q in _questions(2)]}, ensure_ascii=False)
+    questions = parse_questions(text)
+    assert [q["question"] for q in questions] == ["题目0", "题目1"]
+
+
+def test_stream_emits_each_question_when_its_brace_closes():
+    text = json.dumps({"questions": _questions(2)}, ensure_ascii=False)
+    first_end = text.index("}") + 1
+    parser = IncrementalQuestionParser()
+
+    assert parser.feed(text[: first_end - 1]) == []
+    emitted = parser.feed(text[first_end - 1: first_end])
+    assert [q["question"] for q in emitted] == ["题目0"]
+    emitted = parser.feed(text[first_end:])
+    assert [q["question"] for q in emitted] == ["题目1"]
+    assert len(parser.close()) == 2
+
+
+def test_stream_single_character_chunks_match_full_parse():
+    text = '```json\n{"questions": [{"question": "a\nb", "answer": "A", "difficulty": "me\n "type": "fill"}, ' \
+           '{"question": "c", "answer": "B"}]}\n```'
+    streamed = list(iter_questions(iter(text)))
+    assert streamed == parse_questions(text)
+    assert [q["difficulty"] for q in streamed] == ["medium", "medium"]
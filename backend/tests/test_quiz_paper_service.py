@@ -0,0 +1,148 @@
+"""
+智能组卷服务测试
+作者：智学伴开发团队
+目的：验证分批计划、并发生成与缺口补生成逻辑
+运行：pytest backend/tests/test_quiz_paper_service.py -v
+"""
+import asyncio
+import json
+import pytest
+
+from services.ai_service import AIService
+from services.quiz_paper_service import QuizPaperService
+
+
+def _make_questions(qtype, count, prefix):
+    return [
+        {"question": f"{prefix}-{i}", "type": qtype, "answer": "A", "difficulty": "easy"}
+        for i in range(count)
+    ]
+
+
+def test_plan_batches_covers_all_questions():
+    config = {
+        "total_questions": 45,
+        "question_type_distribution": {"choice": 30, "fill": 10, "composition": 5},
+    }
+    plans = QuizPaperService._plan_batches(config, batch_size=15)
+
+    assert [plan["index"] for plan in plans] == [0, 1, 2]
+    assert sum(plan["count"] for plan in plans) == 45
+    assert plans[-1]["distribution"]["composition"] == 5
+    assert all("composition" not in plan["distribution"] for plan in plans[:-1])
+
+
+def test_plan_batches_fills_distribution_below_total():
+    # 路由默认分布 {"choice": 15, "fill": 5} 之和小于总题数时按 3:1 补足，不丢题
+    for total in (40, 60):
+        config = {"total_questions": total, "question_type_distribution": {"choice": 15, "fill": 5}}
+        plans = QuizPaperService._plan_batches(config, batch_size=15)
+        assert sum(plan["count"] for plan in plans) == total
+        assert all(0 < plan["count"] <= 15 for plan in plans)
+        fill = sum(plan["distribution"].get("fill", 0) for plan in plans)
+        assert fill == total // 4
+
+    config = {"total_questions": 16, "question_type_distribution": {"choice": 5, "composition": 3}}
+    plans = QuizPaperService._plan_batches(config, batch_size=15)
+    assert [plan["distribution"] for plan in plans] == [{"choice": 13}, {"composition": 3}]
+
+
+def test_plan_batches_empty_distribution():
+    config = {"total_questions": 20, "question_type_distribution": {}}
+    plans = QuizPaperService._plan_batches(config, batch_size=15)
+    assert [plan["distribution"] for plan in plans] == [{"choice": 15}, {"choice": 5}]
+    assert QuizPaperService._plan_batches({"total_questions": 0}, batch_size=15) == []
+
+
+def test_shortfall_distribution_only_requests_missing_types():
+    planned = {"choice": 10, "fill": 5}
+    delivered = _make_questions("choice", 10, "c") + _make_questions("fill", 2, "f")
+
+    missing = QuizPaperService._shortfall_distribution(planned, delivered)
+
+    assert missing == {"fill": 3}
+    assert QuizPaperService._shortfall_distribution(planned, delivered + _make_questions("fill", 3, "x")) == {}
+
+
+def test_batches_run_concurrently_and_merge_in_order(monkeypatch):
+    config = {
+        "title": "并发测试",
+        "total_questions": 30,
+        "question_type_distribution": {"choice": 30},
+    }
+    state = {"in_flight": 0, "max_in_flight": 0, "calls": [], "callers": set()}
+
+    async def fake_acall_ai(db, user_prompt, **kwargs):
+        state["callers"].add((kwargs.get("user_id"), kwargs.get("source")))
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        state["calls"].append(user_prompt)
+        is_first_batch = "第1批（共2批）" in user_prompt
+        is_topup = "补充题目" in user_prompt
+        # 第二批先返回，验证合并顺序不受完成顺序影响
+        await asyncio.sleep(0.02 if is_first_batch else 0)
+        state["in_flight"] -= 1
+        if is_topup:
+            questions = _make_questions("choice", 5, "topup")
+        elif is_first_batch:
+            questions = _make_questions("choice", 10, "first")
+        else:
+            questions = _make_questions("choice", 15, "second")
+        return {"raw": json.dumps({"questions": questions}, ensure_ascii=False)}
+
+    monkeypatch.setattr(AIService, "acall_ai", staticmethod(fake_acall_ai))
+
+    questions = asyncio.run(QuizPaperService._generate_questions_in_batches(None, config, batch_size=15, user_id=7))
+
+    assert state["max_in_flight"] == 2
+    assert len(questions) == 30
+    assert [q["question"] for q in questions[:10]] == [f"first-{i}" for i in range(10)]
+    assert [q["question"] for q in questions[10:15]] == [f"topup-{i}" for i in range(5)]
+    assert questions[15]["question"] == "second-0"
+    assert sum("补充题目" in call for call in state["calls"]) == 1
+    assert state["callers"] == {(7, "quiz_paper")}  # 每次调用都记录到用户和组卷来源
+
+
+def test_stream_pushes_questions_before_batches_finish(monkeypatch):
+    config = {
+        "title": "流式测试",
+        "total_questions": 3,
+        "question_type_distribution": {"choice": 3},
+    }
+    text = json.dumps({"questions": _make_questions("choice", 3, "s")}, ensure_ascii=False)
+    state = {"sent": 0, "seen_at": [], "callers": set()}
+
+    async def fake_astream_ai(db, user_prompt, **kwargs):
+        state["callers"].add((kwargs.get("user_id"), kwargs.get("source")))
+        for i in range(0, len(text), 7):
+            state["sent"] = i + 7
+            yield text[i:i + 7]
+            await asyncio.sleep(0)
+
+    class FakePaper:
+        id = 42
+        title = "流式测试"
+        total_score = 100
+
+    monkeypatch.setattr(AIService, "astream_ai", staticmethod(fake_astream_ai))
+    monkeypatch.setattr(
+        QuizPaperService, "_save_paper",
+        staticmethod(lambda db, user_id, cfg, questions: (FakePaper(), {"1": "A"}))
+    )
+
+    async def collect():
+        events = []
+        async for event in QuizPaperService.generate_custom_paper_stream(None, 1, config):
+            if event["type"] == "question":
+                state["seen_at"].append(state["sent"])
+            events.append(event)
+        return events
+
+    events = asyncio.run(collect())
+
+    assert [e["type"] for e in events] == ["start", "question", "question", "question", "done"]
+    assert state["callers"] == {(1, "quiz_paper")}
+    assert [e["question"]["question"] for e in events[1:4]] == ["s-0", "s-1", "s-2"]
+    # 第一道题在流结束之前就已推送
+    assert state["seen_at"][0] < len(text)
+    assert events[-1]["paper_id"] == 42
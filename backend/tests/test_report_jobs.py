@@ -0,0 +1,150 @@
+"""
+PDF报告任务测试
+作者：智学伴开发团队
+目的：验证报告按数据指纹缓存、同指纹任务合并、失败状态记录，以及报告目录按时间/大小清理
+运行：pytest backend/tests/test_report_jobs.py -v
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.quizzes import Quiz
+from utils.report_jobs import ReportJobManager, STATUS_DONE, STATUS_FAILED
+
+
+@pytest.fixture
+def db_session():
+    """创建内存数据库会话"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+class FakeRenderer:
+    """记录调用次数的报告生成函数，可用 gate 阻塞以模拟生成耗时"""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, user_id, output_path):
+        self.calls.append(user_id)
+        self.gate.wait(5)
+        if self.fail:
+            raise ValueError("生成PDF报告失败: 字体不可用")
+        with open(output_path, "wb") as f:
+            f.write(b"%PDF-1.4 fake")
+        return output_path
+
+
+def _manager(tmp_path, render, **kwargs):
+    return ReportJobManager(
+        report_dir=str(tmp_path / "reports"),
+        executor_factory=lambda: ThreadPoolExecutor(max_workers=2),
+        render=render,
+        **kwargs,
+    )
+
+
+def _add_quiz(db, user_id, score):
+    db.add(Quiz(user_id=user_id, topic="函数", score=score, questions="[]", answers="[]", explanations="[]"))
+    db.commit()
+
+
+def _finish(manager, job):
+    manager._jobs[job["job_id"]]["future"].result(timeout=5)
+    return manager.get(job["job_id"])
+
+
+def test_unchanged_data_reuses_previous_report(db_session, tmp_path):
+    render = FakeRenderer()
+    manager = _manager(tmp_path, render)
+    _add_quiz(db_session, 1, 80)
+
+    first = _finish(manager, manager.submit(db_session, 1))
+    assert first["status"] == STATUS_DONE and first["progress"] == 100
+    assert first["cached"] is False
+    path = manager.get_file(first["job_id"])
+    assert os.path.basename(path).startswith("report_1_")
+
+    second = manager.submit(db_session, 1)
+    assert second["status"] == STATUS_DONE and second["cached"] is True
+    assert manager.get_file(second["job_id"]) == path
+    assert render.calls == [1]
+
+    # 新提交测评后指纹变化，重新生成
+    _add_quiz(db_session, 1, 90)
+    third = _finish(manager, manager.submit(db_session, 1))
+    assert third["cached"] is False
+    assert manager.get_file(third["job_id"]) != path
+    assert render.calls == [1, 1]
+    manager.shutdown()
+
+
+def test_concurrent_submits_share_one_job(db_session, tmp_path):
+    render = FakeRenderer()
+    render.gate.clear()
+    manager = _manager(tmp_path, render)
+
+    first = manager.submit(db_session, 1)
+    second = manager.submit(db_session, 1)
+    assert second["job_id"] == first["job_id"]
+    assert second["status"] in ("queued", "running")
+    assert manager.get_file(first["job_id"]) is None
+
+    render.gate.set()
+    assert _finish(manager, first)["status"] == STATUS_DONE
+    assert render.calls == [1]
+    manager.shutdown()
+
+
+def test_failed_render_is_reported(db_session, tmp_path):
+    manager = _manager(tmp_path, FakeRenderer(fail=True))
+
+    job = manager.submit(db_session, 1)
+    with pytest.raises(ValueError):
+        manager._jobs[job["job_id"]]["future"].result(timeout=5)
+    job = manager.get(job["job_id"])
+    assert job["status"] == STATUS_FAILED
+    assert "字体不可用" in job["error"]
+    assert manager.get_file(job["job_id"]) is None
+    assert manager.get("missing") is None
+    manager.shutdown()
+
+
+def test_collect_garbage_by_age_and_total_size(tmp_path):
+    manager = _manager(tmp_path, FakeRenderer(), max_age_days=7, max_total_mb=1)
+    report_dir = tmp_path / "reports"
+    report_dir.mkdir()
+    now = time.time()
+
+    def write(name, size, days_ago):
+        path = report_dir / name
+        path.write_bytes(b"0" * size)
+        os.utime(path, (now - days_ago * 86400, now - days_ago * 86400))
+        return path
+
+    expired = write("report_1_old.pdf", 10, days_ago=30)
+    oldest = write("report_2_a.pdf", 600 * 1024, days_ago=3)
+    newest = write("report_3_b.pdf", 600 * 1024, days_ago=1)
+    other = write("notes.txt", 10, days_ago=30)
+
+    assert manager.collect_garbage() == 2
+    assert not expired.exists()
+    assert not oldest.exists()
+    assert newest.exists()
+    assert other.exists()
@@ -0,0 +1,84 @@
+"""
+启动时 schema 迁移测试
+作者：智学伴开发团队
+目的：验证新增列的 DDL 按数据库方言生成（SQL Server 为 ADD + BIT），旧版 api_call_logs 表补齐新增列，
+     以及某一列迁移失败时其他列仍会补建；旧版 chat_messages 表补建 seq 列与唯一索引
+运行：pytest backend/tests/test_schema_migration.py -v
+"""
+import pytest
+from sqlalchemy import Boolean, create_engine, false, inspect, text
+from sqlalchemy.dialects import mssql, postgresql, sqlite
+
+from services import schema_migration_service
+from services.schema_migration_service import SchemaMigrationService
+
+
+@pytest.fixture
+def legacy_engine(monkeypatch):
+    """只有旧版列的 api_call_logs 表"""
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE api_call_logs (id INTEGER PRIMARY KEY, provider VARCHAR(50), "
+            "source VARCHAR(50), success BOOLEAN, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO api_call_logs (provider, source, success) VALUES ('deepseek', 'user', 1)"))
+    monkeypatch.setattr(schema_migration_service, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_add_column_ddl_per_dialect():
+    ddl = SchemaMigrationService._add_column_ddl
+    assert ddl(mssql.dialect(), "api_call_logs", "cache_hit", Boolean(), false()) == (
+        "ALTER TABLE api_call_logs ADD cache_hit BIT NOT NULL DEFAULT 0"
+    )
+    assert ddl(sqlite.dialect(), "api_call_logs", "cache_hit", Boolean(), false()) == (
+        "ALTER TABLE api_call_logs ADD COLUMN cache_hit BOOLEAN NOT NULL DEFAULT 0"
+    )
+    assert ddl(postgresql.dialect(), "api_call_logs", "cache_hit", Boolean(), false()).endswith(
+        "BOOLEAN NOT NULL DEFAULT false"
+    )
+
+
+def test_api_call_log_schema_adds_missing_columns(legacy_engine):
+    SchemaMigrationService.ensure_api_call_log_schema()
+
+    columns = {col["name"] for col in inspect(legacy_engine).get_columns("api_call_logs")}
+    assert {"cache_hit", "user_id", "model", "latency_ms", "total_tokens"} <= columns
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT cache_hit FROM api_call_logs")).scalar() == 0
+
+
+def test_failed_column_does_not_block_others(legacy_engine, monkeypatch):
+    original = SchemaMigrationService._add_column_ddl
+
+    def add_column_ddl(dialect, table_name, column_name, *args):
+        if column_name == "cache_hit":
+            return "ALTER TABLE api_call_logs ADD COLUMN cache_hit NOT A TYPE ("
+        return original(dialect, table_name, column_name, *args)
+
+    monkeypatch.setattr(SchemaMigrationService, "_add_column_ddl", staticmethod(add_column_ddl))
+    SchemaMigrationService.ensure_api_call_log_schema()
+
+    columns = {col["name"] for col in inspect(legacy_engine).get_columns("api_call_logs")}
+    assert "cache_hit" not in columns
+    assert {"user_id", "model", "latency_ms", "prompt_tokens", "completion_tokens", "total_tokens"} <= columns
+
+
+def test_chat_schema_adds_seq_and_indexes(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE chat_sessions (id INTEGER PRIMARY KEY, user_id INTEGER, title VARCHAR(200), "
+            "created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, session_id INTEGER, role VARCHAR(20), "
+            "content TEXT, provider VARCHAR(50), created_at DATETIME)"
+        ))
+    SchemaMigrationService.ensure_chat_schema()
+
+    inspector = inspect(legacy_engine)
+    assert "seq" in {col["name"] for col in inspector.get_columns("chat_messages")}
+    assert "uq_chat_messages_session_seq" in {index["name"] for index in inspector.get_indexes("chat_messages")}
+    assert "ix_chat_sessions_user_updated" in {index["name"] for index in inspector.get_indexes("chat_sessions")}
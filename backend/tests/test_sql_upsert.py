@@ -0,0 +1,81 @@
+"""
+SQL插入或累加工具测试
+作者：智学伴开发团队
+目的：验证 ON CONFLICT 路径与通用路径（UPDATE + 保存点 INSERT）结果一致，
+     以及通用路径在其他写入方抢先插入同一行时改为累加、不回滚调用方的事务
+运行：pytest backend/tests/test_sql_upsert.py -v
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.learner_stats import UserQuizStats, UserTopicStats
+from utils.sql_upsert import add, greatest, least, upsert
+
+MERGE = {"quiz_count": add, "score_sum": add, "max_score": greatest, "min_score": least}
+
+
+def _session(generic: bool):
+    """创建内存数据库会话；generic 时把方言名改为 mssql，走通用的 UPDATE + 保存点 INSERT 路径"""
+    engine = create_engine("sqlite:///:memory:")
+    if generic:
+        engine.dialect.name = "mssql"
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+@pytest.fixture(params=["native", "generic"])
+def db_session(request):
+    session = _session(request.param == "generic")
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def generic_session():
+    session = _session(generic=True)
+    yield session
+    session.close()
+
+
+def _stats(user_id, score):
+    return {"user_id": user_id, "quiz_count": 1, "score_sum": score, "max_score": score, "min_score": score}
+
+
+def test_upsert_inserts_then_merges(db_session):
+    for score in (60, 90, 30):
+        upsert(db_session, UserQuizStats, [_stats(1, score)], ["user_id"], MERGE)
+    upsert(db_session, UserQuizStats, [_stats(2, 75), _stats(1, 100)], ["user_id"], MERGE)
+    db_session.commit()
+
+    rows = {row.user_id: row for row in db_session.query(UserQuizStats)}
+    one = rows[1]
+    assert (one.quiz_count, one.score_sum, one.max_score, one.min_score) == (4, 280, 100, 30)
+    assert (rows[2].quiz_count, rows[2].score_sum) == (1, 75)
+
+
+def test_generic_path_merges_concurrent_insert(generic_session):
+    db_session = generic_session
+    keys = ["user_id", "topic"]
+    merge = {"quiz_count": add, "score_sum": add}
+    db_session.add(UserQuizStats(user_id=1, quiz_count=0, score_sum=0))
+    db_session.flush()
+
+    inserted = []
+
+    def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+        # UPDATE 没有命中后、本事务创建保存点 INSERT 之前，另一个写入方插入了同一行
+        if statement.startswith("SAVEPOINT") and not inserted:
+            inserted.append(True)
+            cursor.connection.execute(
+                "INSERT INTO user_topic_stats (user_id, topic, quiz_count, score_sum) VALUES (1, '函数', 1, 50)"
+            )
+
+    event.listen(db_session.connection(), "before_cursor_execute", concurrent_insert)
+    upsert(db_session, UserTopicStats, [{"user_id": 1, "topic": "函数", "quiz_count": 1, "score_sum": 80}], keys, merge)
+    db_session.commit()
+
+    row = db_session.query(UserTopicStats).one()
+    assert (row.quiz_count, row.score_sum) == (2, 130)
+    assert db_session.query(UserQuizStats).count() == 1  # 调用方事务中的其他写入未被回滚
@@ -0,0 +1,89 @@
+"""
+内容寻址上传存储测试
+作者：智学伴开发团队
+目的：验证相同内容只保存一份、超过大小上限时不留下文件、解析结果按内容哈希和截断长度缓存，
+     以及新上传的文件解析失败时被删除
+运行：pytest backend/tests/test_upload_store.py -v
+"""
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from utils import upload_store as upload_store_module
+from utils.upload_store import UploadStore, UploadTooLarge
+
+
+def _upload(content: bytes, filename: str = "notes.txt") -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+def _save(store, content, ext=".txt", **kwargs):
+    return asyncio.run(store.save(_upload(content), ext, **kwargs))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store_module, "CHUNK_BYTES", 1024)
+    return UploadStore(str(tmp_path / "store"))
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    original = upload_store_module.parse_file
+
+    def parse_file(path, max_length=None):
+        calls.append((path, max_length))
+        return original(path, max_length=max_length)
+
+    monkeypatch.setattr(upload_store_module, "parse_file", parse_file)
+    return calls
+
+
+def test_identical_content_is_stored_once(store):
+    content = ("第一章 函数的概念\n" * 500).encode("utf-8")
+    first = _save(store, content)
+    second = _save(store, content, ".TXT")
+    other = _save(store, content + b"!")
+
+    assert first.sha256 == hashlib.sha256(content).hexdigest()
+    assert first.path == second.path and first.existed is False and second.existed is True
+    assert other.path != first.path
+    assert first.size == len(content)
+    assert os.listdir(os.path.join(store.root_dir, "tmp")) == []
+    assert store.resolve(first.name) == first.path
+    assert store.resolve("../../etc/passwd") is None
+    assert store.stats()["deduplicated"] == 1
+
+    with pytest.raises(UploadTooLarge):
+        _save(store, b"x" * 5000, max_bytes=4096)
+    assert os.listdir(os.path.join(store.root_dir, "tmp")) == []
+    assert store.resolve(f"{hashlib.sha256(b'x' * 5000).hexdigest()}.txt") is None
+
+
+def test_parse_results_are_cached_per_hash(store, parse_calls):
+    content = ("第一章 函数的概念与性质。\n" * 1000).encode("utf-8")
+    stored = _save(store, content)
+    text, length, cached = store.parse(stored)
+    assert (length, cached) == (6000, False)
+
+    again = _save(store, content)
+    assert store.parse(again) == (text, length, True)
+    assert len(parse_calls) == 1
+
+    full, full_length, cached = store.parse(again, max_length=100_000)
+    assert cached is False and full == content.decode("utf-8") and full_length == len(full)
+    assert store.parse(again, max_length=100_000)[2] is True
+    assert len(parse_calls) == 2
+    assert store.stats()["parse_hit_rate"] == 0.5
+
+
+def test_failed_parse_discards_new_upload(store):
+    stored = _save(store, b"   \n")
+    with pytest.raises(ValueError):
+        store.parse(stored)
+    assert not os.path.exists(stored.path)
@@ -0,0 +1,232 @@
+"""
+AI响应缓存
+作者：智学伴开发团队
+目的：相同的（系统Prompt、用户Prompt、提供商、模型、温度、max_tokens）组合直接复用上次的模型输出，
+     减少重复付费调用。两级缓存：进程内 LRU + 可选的 SQLite 磁盘缓存，均支持 TTL 和容量淘汰
+测试：pytest backend/tests/test_ai_response_cache.py
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.config import settings
+from core.logger import logger
+
+
+class AIResponseCache:
+    """
+    AI响应两级缓存
+
+    - 内存层：OrderedDict 实现的 LRU，超过 max_entries 淘汰最久未使用的条目
+    - 磁盘层（disk_path 非空时启用）：SQLite 单表，超过 disk_max_bytes 按最久未访问淘汰
+    - 两层都按 ttl 秒过期；磁盘命中会回填内存层
+    """
+
+    def __init__(
+        self,
+        ttl: int = 3600,
+        max_entries: int = 512,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 100 * 1024 * 1024,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_ready = False
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(
+        messages: List[Dict[str, str]],
+        provider: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+    ) -> str:
+        """根据完整消息内容与调用参数计算缓存键（系统Prompt内容变化即视为新版本）"""
+        payload = json.dumps(
+            {
+                "messages": [[m.get("role"), (m.get("content") or "").strip()] for m in messages],
+                "provider": provider,
+                "model": model,
+                "temperature": round(float(temperature), 4),
+                "max_tokens": int(max_tokens),
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return dict(value)
+                del self._memory[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._memory_put(key, value, now)
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """写入缓存（内存层 + 磁盘层）"""
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, value, now)
+            self._stats["stores"] += 1
+        self._disk_set(key, value, now)
+
+    def clear(self) -> None:
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self._connect_disk():
+            try:
+                with self._disk_connection() as conn:
+                    conn.execute("DELETE FROM ai_response_cache")
+            except sqlite3.Error as exc:
+                logger.warning(f"清空AI磁盘缓存失败: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中计数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["disk_enabled"] = bool(self.disk_path)
+        return stats
+
+    def _memory_put(self, key: str, value: Dict[str, Any], now: float) -> None:
+        self._memory[key] = (now, dict(value))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # ---------- 磁盘层 ----------
+
+    @contextmanager
+    def _disk_connection(self) -> Iterator[sqlite3.Connection]:
+        """打开磁盘缓存连接，退出时提交并关闭"""
+        conn = sqlite3.connect(self.disk_path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect_disk(self) -> bool:
+        """首次使用时建表，未配置磁盘路径时返回 False"""
+        if not self.disk_path:
+            return False
+        if self._disk_ready:
+            return True
+        try:
+            directory = os.path.dirname(os.path.abspath(self.disk_path))
+            os.makedirs(directory, exist_ok=True)
+            with self._disk_connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ai_response_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_ai_response_cache_accessed ON ai_response_cache (accessed_at)"
+                )
+            self._disk_ready = True
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning(f"AI磁盘缓存不可用，仅使用内存缓存: {exc}")
+            self.disk_path = None
+        return self._disk_ready
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if not self._connect_disk():
+            return None
+        try:
+            with self._disk_connection() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM ai_response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE ai_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as exc:
+            logger.warning(f"读取AI磁盘缓存失败: {exc}")
+            return None
+
+    def _disk_set(self, key: str, value: Dict[str, Any], now: float) -> None:
+        if not self._connect_disk():
+            return
+        data = json.dumps(value, ensure_ascii=False)
+        try:
+            with self._disk_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ai_response_cache (key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, data, len(data.encode("utf-8")), now, now),
+                )
+                self._disk_evict(conn, now)
+        except sqlite3.Error as exc:
+            logger.warning(f"写入AI磁盘缓存失败: {exc}")
+
+    def _disk_evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """删除过期条目，超出容量时按最久未访问淘汰"""
+        conn.execute("DELETE FROM ai_response_cache WHERE created_at < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_response_cache").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        removed = 0
+        for key, size in conn.execute(
+            "SELECT key, size FROM ai_response_cache ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.disk_max_bytes:
+                break
+            conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        with self._lock:
+            self._stats["evictions"] += removed
+
+
+def is_cache_enabled(source: str, use_cache: Optional[bool] = None) -> bool:
+    """判断本次调用是否走缓存：显式参数优先，其次全局开关与来源黑名单"""
+    if use_cache is not None:
+        return use_cache
+    return settings.AI_CACHE_ENABLED and source not in settings.AI_CACHE_DISABLED_SOURCES
+
+
+# 全局缓存实例
+response_cache = AIResponseCache(
+    ttl=settings.AI_CACHE_TTL,
+    max_entries=settings.AI_CACHE_MAX_ENTRIES,
+    disk_path=settings.AI_CACHE_DISK_PATH,
+    disk_max_bytes=settings.AI_CACHE_DISK_MAX_MB * 1024 * 1024,
+)
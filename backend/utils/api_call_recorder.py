@@ -0,0 +1,172 @@
+"""
+API调用日志缓冲写入
+作者：智学伴开发团队
+目的：AI调用的计费/统计日志先放入内存缓冲，由后台线程按时间间隔或条数阈值批量写库，
+     请求路径（包括SSE流式生成器）中不再为每次调用执行一次 commit；应用关闭时写完剩余记录
+环境变量：API_CALL_LOG_BUFFERED, API_CALL_LOG_FLUSH_INTERVAL, API_CALL_LOG_BATCH_SIZE, API_CALL_LOG_MAX_BUFFER
+测试：pytest backend/tests/test_api_call_recorder.py
+"""
+import atexit
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.logger import logger
+from repositories.api_call_repo import APICallRepository
+
+
+def _usage_fields(usage: Optional[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+    """从提供商返回的 usage（OpenAI 兼容格式）中取出 token 数"""
+    usage = usage or {}
+    fields = {}
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = usage.get(key)
+        fields[key] = int(value) if isinstance(value, (int, float)) else None
+    return fields
+
+
+class APICallRecorder:
+    """
+    缓冲式API调用日志记录器
+
+    - record() 只把记录追加到内存队列（按调用方会话的数据库连接分组），不做任何数据库I/O
+    - 后台线程每 flush_interval 秒，或缓冲达到 batch_size 条时，用一条批量 INSERT 写入
+    - 写库失败的记录放回队列等待下次重试，最多保留 max_buffer 条
+    """
+
+    def __init__(self, flush_interval: float = 2.0, batch_size: int = 200, max_buffer: int = 10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Tuple[Any, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._dropped = 0
+
+    def record(
+        self,
+        db: Session,
+        provider: Optional[str],
+        source: str = "user",
+        success: bool = True,
+        cache_hit: bool = False,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """记录一次AI调用（缓冲模式下立即返回）"""
+        row = {
+            "provider": provider,
+            "source": source,
+            "success": success,
+            "cache_hit": cache_hit,
+            "user_id": user_id,
+            "model": model or None,
+            "latency_ms": int(round(latency_ms)) if latency_ms is not None else None,
+            # 与数据库 CURRENT_TIMESTAMP 一致使用 UTC，记录的是调用时间而不是写库时间
+            "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+            **_usage_fields(usage),
+        }
+
+        if not settings.API_CALL_LOG_BUFFERED:
+            APICallRepository.bulk_insert(db, [row])
+            return
+
+        with self._lock:
+            self._buffer.append((db.get_bind(), row))
+            overflow = len(self._buffer) - self.max_buffer
+            for _ in range(max(overflow, 0)):
+                self._buffer.popleft()
+                self._dropped += 1
+            pending = len(self._buffer)
+        self._ensure_thread()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """把缓冲中的记录全部写库，返回成功写入的条数"""
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._buffer)
+                self._buffer.clear()
+            if not items:
+                return 0
+
+            groups: Dict[Any, List[Dict[str, Any]]] = {}
+            for bind, row in items:
+                groups.setdefault(bind, []).append(row)
+
+            written = 0
+            failed: List[Tuple[Any, Dict[str, Any]]] = []
+            for bind, rows in groups.items():
+                try:
+                    with Session(bind=bind) as session:
+                        written += APICallRepository.bulk_insert(session, rows)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("批量写入API调用日志失败（%s条，稍后重试）: %s", len(rows), exc)
+                    failed.extend((bind, row) for row in rows)
+
+            if failed:
+                with self._lock:
+                    self._buffer.extendleft(reversed(failed))
+                    while len(self._buffer) > self.max_buffer:
+                        self._buffer.popleft()
+                        self._dropped += 1
+            return written
+
+    def pending(self) -> int:
+        """缓冲中尚未写库的条数"""
+        with self._lock:
+            return len(self._buffer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pending": len(self._buffer), "dropped": self._dropped}
+
+    def stop(self) -> None:
+        """停止后台线程并写完剩余记录（应用关闭时调用）"""
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=max(self.flush_interval, 1.0) * 2)
+        self._thread = None
+        self.flush()
+        self._stopping.clear()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="api-call-recorder", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error("API调用日志后台写入异常: %s", exc, exc_info=True)
+
+
+# 全局记录器实例
+api_call_recorder = APICallRecorder(
+    flush_interval=settings.API_CALL_LOG_FLUSH_INTERVAL,
+    batch_size=settings.API_CALL_LOG_BATCH_SIZE,
+    max_buffer=settings.API_CALL_LOG_MAX_BUFFER,
+)
+atexit.register(api_call_recorder.stop)
@@ -0,0 +1,26 @@
+"""
+ETag工具
+作者：智学伴开发团队
+目的：生成强校验 ETag，并判断请求头 If-None-Match 是否命中（导出文件缓存、知识图谱缓存共用）
+"""
+from typing import Optional
+
+
+def make_etag(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], key: str) -> bool:
+    """If-None-Match 是否命中（支持 *、多个值和弱校验 W/ 前缀）"""
+    if not if_none_match:
+        return False
+    expected = make_etag(key)
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == expected:
+            return True
+    return False
@@ -0,0 +1,121 @@
+"""
+试卷导出结果缓存
+作者：智学伴开发团队
+目的：按 (试卷ID, 试卷更新时间, 导出格式, 是否含答案, 导出器版本) 缓存导出文件，重复导出直接返回磁盘文件；
+     缓存键同时作为 ETag，客户端带 If-None-Match 时返回 304；目录总大小超过上限时按最久未用淘汰，
+     删除试卷时清除该试卷的全部缓存
+环境变量：EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_MB
+测试：pytest backend/tests/test_export_cache.py
+"""
+import hashlib
+import os
+import threading
+from typing import Any, Optional
+
+from core.config import settings
+from core.logger import logger
+from utils.etag import etag_matches, make_etag
+from utils.paper_exporter import EXPORTER_VERSION
+
+
+class ExportCache:
+    """导出文件的磁盘LRU缓存（文件修改时间即最后使用时间）"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: int = 500):
+        self.cache_dir = cache_dir
+        self.max_mb = max_mb
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.cache_dir)
+
+    @staticmethod
+    def key(paper_id: int, updated_at: Any, fmt: str, include_answer: bool) -> str:
+        raw = f"{paper_id}|{updated_at}|{fmt}|{int(bool(include_answer))}|{EXPORTER_VERSION}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def etag(key: str) -> str:
+        return make_etag(key)
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], key: str) -> bool:
+        return etag_matches(if_none_match, key)
+
+    def _path(self, paper_id: int, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, f"paper_{paper_id}_{key}.{ext}")
+
+    def get(self, paper_id: int, key: str, ext: str) -> Optional[str]:
+        """返回缓存文件路径并刷新其最后使用时间，未命中时返回 None"""
+        if not self.enabled:
+            return None
+        path = self._path(paper_id, key, ext)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, paper_id: int, key: str, ext: str, content: bytes) -> Optional[str]:
+        """写入缓存（先写临时文件再原子替换），返回缓存文件路径；写入失败只记录日志"""
+        if not self.enabled:
+            return None
+        path = self._path(paper_id, key, ext)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning(f"写入导出缓存失败: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        self.evict()
+        return path
+
+    def invalidate(self, paper_id: int) -> int:
+        """删除某份试卷的全部导出缓存，返回删除个数"""
+        if not self.enabled or not os.path.isdir(self.cache_dir):
+            return 0
+        prefix = f"paper_{paper_id}_"
+        removed = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.startswith(prefix):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def evict(self) -> int:
+        """总大小超过 max_mb 时按最久未用删除，返回删除个数"""
+        if not self.enabled or self.max_mb <= 0 or not os.path.isdir(self.cache_dir):
+            return 0
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.startswith("paper_") and not entry.name.endswith(".part"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            limit = self.max_mb * 1024 * 1024
+            removed = 0
+            for _, size, path in sorted(files):
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+        if removed:
+            logger.info("导出缓存超出上限，已淘汰%s个文件", removed)
+        return removed
+
+
+export_cache = ExportCache(cache_dir=settings.EXPORT_CACHE_DIR, max_mb=settings.EXPORT_CACHE_MAX_MB)
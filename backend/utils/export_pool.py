@@ -0,0 +1,195 @@
+"""
+试卷导出进程池
+作者：智学伴开发团队
+目的：PDF/Word 渲染在有界的独立进程池中执行，事件循环只等待结果；排队数超过上限时直接拒绝（429），
+     而不是让所有导出请求堆积拖慢其他接口；工作进程在临时目录中生成文件并以字节返回，目录随即删除；
+     按格式统计导出耗时
+环境变量：EXPORT_MAX_WORKERS, EXPORT_MAX_QUEUE, EXPORT_TIMEOUT
+测试：pytest backend/tests/test_export_pool.py
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+from core.logger import logger
+
+FORMAT_EXTENSIONS = {"pdf": "pdf", "word": "docx"}
+
+
+class ExportBusyError(Exception):
+    """导出队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("导出任务过多，请稍后重试")
+        self.retry_after = retry_after
+
+
+class ExportUnavailableError(Exception):
+    """导出进程池不可用或导出超时"""
+
+
+def _init_worker() -> None:
+    """工作进程启动时预加载中文字体"""
+    from utils.font_registry import font_registry
+
+    font_registry.warmup()
+
+
+def export_paper_bytes(export_data: Dict[str, Any], fmt: str) -> bytes:
+    """在工作进程中导出试卷，返回文件内容；临时目录在返回前删除"""
+    from utils.paper_exporter import PaperExporter
+
+    with tempfile.TemporaryDirectory(prefix="paper_export_") as temp_dir:
+        output_path = os.path.join(temp_dir, f"paper.{FORMAT_EXTENSIONS[fmt]}")
+        if fmt == "pdf":
+            PaperExporter.export_to_pdf(export_data, output_path)
+        else:
+            PaperExporter.export_to_word(export_data, output_path)
+        with open(output_path, "rb") as f:
+            return f.read()
+
+
+class ExportPool:
+    """
+    有界导出进程池
+
+    - 同时在途（执行中 + 排队）的任务最多 max_workers + max_queue 个，超出抛出 ExportBusyError
+    - 在途计数在任务真正结束时才释放：等待超时的任务仍占用进程，不会让新任务继续堆积
+    - 工作进程异常退出导致进程池损坏时重建一次
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue: int = 8,
+        timeout: float = 120.0,
+        executor_factory: Optional[Callable[[], Executor]] = None,
+        export_func: Callable[[Dict[str, Any], str], bytes] = export_paper_bytes,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor_factory = executor_factory
+        self._export_func = export_func
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self._executor_factory is not None:
+                self._executor = self._executor_factory()
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+        return self._executor
+
+    def _metric(self, fmt: str) -> Dict[str, float]:
+        return self._metrics.setdefault(fmt, {
+            "count": 0, "failed": 0, "rejected": 0, "timeouts": 0,
+            "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0,
+        })
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, export_data: Dict[str, Any], fmt: str) -> Future:
+        try:
+            return self._get_executor().submit(self._export_func, export_data, fmt)
+        except BrokenExecutor:
+            logger.warning("导出进程池已损坏，重新创建")
+            self._executor = None
+            try:
+                return self._get_executor().submit(self._export_func, export_data, fmt)
+            except BrokenExecutor as exc:
+                raise ExportUnavailableError("导出服务暂不可用，请稍后重试") from exc
+
+    async def run(self, export_data: Dict[str, Any], fmt: str) -> bytes:
+        """在进程池中导出试卷，返回文件内容"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._metric(fmt)["rejected"] += 1
+                raise ExportBusyError(retry_after=max(1, int(self.timeout // 10)))
+            self._in_flight += 1
+
+        started = time.perf_counter()
+        try:
+            future = self._submit(export_data, fmt)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self._metric(fmt)["failed"] += 1
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            # 超时后取消等待；排队中的任务会被取消，已开始的任务跑完后释放名额
+            content = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError as exc:
+            with self._lock:
+                self._metric(fmt)["timeouts"] += 1
+            logger.warning("试卷导出超时: format=%s, %ss", fmt, self.timeout)
+            raise ExportUnavailableError("导出超时，请稍后重试") from exc
+        except BrokenExecutor as exc:
+            with self._lock:
+                self._metric(fmt)["failed"] += 1
+            raise ExportUnavailableError("导出服务暂不可用，请稍后重试") from exc
+        except Exception:
+            with self._lock:
+                self._metric(fmt)["failed"] += 1
+            raise
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            metric = self._metric(fmt)
+            metric["count"] += 1
+            metric["total_ms"] += elapsed_ms
+            metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+            metric["last_ms"] = elapsed_ms
+        logger.info("试卷导出完成: format=%s, %.0fms, %s字节", fmt, elapsed_ms, len(content))
+        return content
+
+    def stats(self) -> Dict[str, Any]:
+        """导出进程池状态和按格式的耗时统计（毫秒）"""
+        with self._lock:
+            formats = {
+                fmt: {
+                    "count": int(metric["count"]),
+                    "failed": int(metric["failed"]),
+                    "rejected": int(metric["rejected"]),
+                    "timeouts": int(metric["timeouts"]),
+                    "avg_ms": round(metric["total_ms"] / metric["count"], 1) if metric["count"] else 0,
+                    "max_ms": round(metric["max_ms"], 1),
+                    "last_ms": round(metric["last_ms"], 1),
+                }
+                for fmt, metric in self._metrics.items()
+            }
+            return {
+                "in_flight": self._in_flight,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "formats": formats,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+export_pool = ExportPool(
+    max_workers=settings.EXPORT_MAX_WORKERS,
+    max_queue=settings.EXPORT_MAX_QUEUE,
+    timeout=settings.EXPORT_TIMEOUT,
+)
@@ -1,135 +1,326 @@
 """
 文件解析工具
 支持 PDF、TXT、Markdown、DOCX、PPTX 文件解析
+
+作者：智学伴开发团队
+目的：按页/幻灯片/段落逐段产出文本（iter_file_text），调用方只需要前 N 个字符时读够即停，
+     不再把整份文档拼成一个字符串后再截断；大 PDF 可在进程池中按页段并行提取；
+     文本文件只取开头一段样本检测编码，随后按块流式读取
+环境变量：FILE_PARSE_PDF_WORKERS, FILE_PARSE_PDF_PARALLEL_MIN_PAGES, FILE_PARSE_PDF_PAGES_PER_TASK,
+         FILE_PARSE_ENCODING_SAMPLE_BYTES
+测试：pytest backend/tests/test_file_parser.py
 """
+import codecs
+import multiprocessing
 import os
+import threading
 import zipfile
 import chardet
-from typing import Optional, List
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, Optional, List, Tuple
 from xml.etree import ElementTree as ET
 
+from core.config import settings
 from core.logger import logger
 
 # 最大提取文本长度（字符数）
 MAX_TEXT_LENGTH = 8000
 TRUNCATE_LENGTH = 6000
 
+# 文本文件流式读取时每次读取的字符数
+TEXT_READ_CHARS = 64 * 1024
+
 
-def parse_file(file_path: str) -> tuple[str, int]:
+def parse_file(file_path: str, max_length: Optional[int] = None) -> tuple[str, int]:
     """
     自动识别文件类型并提取文本内容
     支持 .pdf / .txt / .md / .docx / .pptx
-    
+
     Args:
         file_path: 文件路径
-        
+        max_length: 最大保留字符数；为空时超过 MAX_TEXT_LENGTH 截断到 TRUNCATE_LENGTH（直接送入AI的场景）
+
     Returns:
         tuple: (提取的文本内容, 文本长度)
-        
+
     Raises:
         ValueError: 不支持的文件类型或解析失败
         FileNotFoundError: 文件不存在
     """
+    # 只读取需要的字符数：为空时多读一个字符即可判断是否超过 MAX_TEXT_LENGTH
+    budget = max_length if max_length is not None else MAX_TEXT_LENGTH + 1
+    text, truncated = collect_text(iter_file_text(file_path), budget)
+
+    # 检查文本是否为空
+    if not text or len(text.strip()) == 0:
+        raise ValueError(f"文件内容为空或无法提取文本: {file_path}")
+
+    # 安全截断，防止AI调用时Token过多
+    if max_length is None and len(text) > MAX_TEXT_LENGTH:
+        text = text[:TRUNCATE_LENGTH]
+        truncated = True
+    if truncated:
+        logger.info(f"文件文本已截断为 {len(text)} 字符，未读取剩余内容: {file_path}")
+
+    return text, len(text)
+
+
+def iter_file_text(file_path: str) -> Iterator[str]:
+    """
+    按文件类型逐段产出文本（PDF按页、PPTX按幻灯片、DOCX按段落、文本文件按块）
+
+    各段直接拼接即为全文（段与段之间的换行已包含在段首），调用方停止迭代时不再解析剩余内容
+
+    Raises:
+        ValueError: 不支持的文件类型
+        FileNotFoundError: 文件不存在
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件不存在: {file_path}")
-    
+
     file_ext = os.path.splitext(file_path)[1].lower()
-    
+
     # 根据文件类型调用对应的解析函数
     if file_ext == '.pdf':
-        text = parse_pdf(file_path)
+        pieces = iter_pdf_pages(file_path)
     elif file_ext in ['.txt', '.md', '.markdown']:
-        text = parse_text_file(file_path)
+        return iter_text_file(file_path)
     elif file_ext == '.docx':
-        text = parse_docx(file_path)
+        pieces = iter_docx(file_path)
     elif file_ext == '.pptx':
-        text = parse_pptx(file_path)
+        pieces = iter_pptx_slides(file_path)
     else:
         raise ValueError(f"不支持的文件类型: {file_ext}。支持的类型: .pdf, .txt, .md, .docx, .pptx")
-    
-    # 检查文本是否为空
-    if not text or len(text.strip()) == 0:
-        raise ValueError(f"文件内容为空或无法提取文本: {file_path}")
-    
-    # 安全截断，防止AI调用时Token过多
-    original_length = len(text)
-    if original_length > MAX_TEXT_LENGTH:
-        text = text[:TRUNCATE_LENGTH]
-        print(f"[INFO] 文件文本已截断: {original_length} -> {len(text)} 字符")
-    
-    return text, len(text)
+    return _join_lines(pieces)
 
 
-def parse_pdf(file_path: str) -> str:
+def _join_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """逐段产出 "\\n".join(pieces) 的内容"""
+    first = True
+    for piece in pieces:
+        if first:
+            first = False
+            yield piece
+        else:
+            yield "\n" + piece
+
+
+def collect_text(pieces: Iterator[str], limit: Optional[int] = None) -> Tuple[str, bool]:
     """
-    解析 PDF 文件
-    
+    拼接分段文本，达到 limit 个字符时停止并关闭生成器（释放文件句柄、取消未完成的并行任务）
+
+    Returns:
+        tuple: (文本, 是否因达到 limit 而未读完)
+    """
+    parts: List[str] = []
+    total = 0
+    truncated = False
+    try:
+        for piece in pieces:
+            if limit is not None and total + len(piece) >= limit:
+                parts.append(piece[:limit - total])
+                truncated = total + len(piece) > limit or _has_more(pieces)
+                break
+            parts.append(piece)
+            total += len(piece)
+    finally:
+        close = getattr(pieces, "close", None)
+        if close is not None:
+            close()
+    return "".join(parts), truncated
+
+
+def _has_more(pieces: Iterator[str]) -> bool:
+    """恰好读满 limit 时再看一段，判断后面是否还有非空内容"""
+    for piece in pieces:
+        if piece.strip():
+            return True
+    return False
+
+
+def _extract_pdf_range(file_path: str, start: int, stop: int) -> List[str]:
+    """子进程中提取 [start, stop) 页的文本"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+class PdfPagePool:
+    """
+    大 PDF 按页段并行提取
+
+    - 页数达到 parallel_min_pages 且 workers > 1 时，前 pages_per_task 页在当前进程提取（预算很小时不必启动子进程），
+      其余页按 pages_per_task 一段提交到进程池
+    - 同时在途的任务不超过 workers * 2 段，结果按页序产出；调用方提前停止时取消未开始的任务
+    - 进程池启动或运行失败时退回逐页提取
+    """
+
+    def __init__(self, workers: int = 0, parallel_min_pages: int = 64, pages_per_task: int = 16):
+        self.workers = workers
+        self.parallel_min_pages = parallel_min_pages
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def enabled_for(self, page_count: int) -> bool:
+        return self.workers > 1 and page_count >= self.parallel_min_pages
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def iter_pages(self, file_path: str, start: int, stop: int) -> Iterator[str]:
+        """按页序产出 [start, stop) 页的文本"""
+        pending: Deque[Tuple[int, Future]] = deque()
+        next_page = start
+        try:
+            executor = self._get_executor()
+            while next_page < stop or pending:
+                while next_page < stop and len(pending) < self.workers * 2:
+                    end = min(next_page + self.pages_per_task, stop)
+                    pending.append((next_page, executor.submit(_extract_pdf_range, file_path, next_page, end)))
+                    next_page = end
+                _, future = pending[0]
+                texts = future.result()
+                pending.popleft()
+                for text in texts:
+                    yield text
+        except Exception as exc:  # pylint: disable=broad-except
+            resume = pending[0][0] if pending else next_page
+            logger.warning(f"PDF 并行提取失败，从第 {resume + 1} 页起改为逐页提取: {exc}")
+            self.shutdown()
+            pending.clear()
+            yield from _iter_pdf_range(file_path, resume, stop)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def _iter_pdf_range(file_path: str, start: int, stop: int) -> Iterator[str]:
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        for i in range(start, stop):
+            yield doc[i].get_text("text")
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """
+    逐页产出 PDF 文本（跳过没有文本的页）
+
     Args:
         file_path: PDF 文件路径
-        
-    Returns:
-        str: 提取的文本内容
     """
     try:
         import fitz  # PyMuPDF
     except ImportError:
         raise ImportError("请安装 PyMuPDF: pip install pymupdf")
-    
-    text_content = []
-    
+
     try:
         with fitz.open(file_path) as doc:
-            for page in doc:
-                text = page.get_text("text")
+            page_count = doc.page_count
+            head = page_count
+            if pdf_page_pool.enabled_for(page_count):
+                head = min(pdf_page_pool.pages_per_task, page_count)
+            for i in range(head):
+                text = doc[i].get_text("text")
+                if text:
+                    yield text
+        if head < page_count:
+            for text in pdf_page_pool.iter_pages(file_path, head, page_count):
                 if text:
-                    text_content.append(text)
-        
-        full_text = "\n".join(text_content)
-        return full_text
+                    yield text
     except Exception as e:
         raise ValueError(f"PDF 解析失败: {str(e)}")
 
 
-def parse_text_file(file_path: str) -> str:
+def parse_pdf(file_path: str) -> str:
     """
-    解析文本文件（TXT、Markdown）
-    自动检测文件编码
-    
+    解析 PDF 文件
+
     Args:
-        file_path: 文本文件路径
-        
+        file_path: PDF 文件路径
+
     Returns:
         str: 提取的文本内容
     """
-    # 先读取二进制数据检测编码
+    return "\n".join(iter_pdf_pages(file_path))
+
+
+def detect_encoding(file_path: str, sample_bytes: Optional[int] = None) -> str:
+    """
+    用文件开头的一段样本检测编码（不读取整个文件）
+
+    检测置信度不足时依次尝试 utf-8 / gbk / gb2312 严格解码样本，都失败时使用 utf-8（忽略错误字节）
+    """
+    sample_bytes = sample_bytes or settings.FILE_PARSE_ENCODING_SAMPLE_BYTES
     with open(file_path, 'rb') as f:
-        raw_data = f.read()
-    
-    # 检测编码
-    detected = chardet.detect(raw_data)
-    encoding = detected.get('encoding', 'utf-8')
-    
-    # 如果检测失败，尝试常见编码
-    if not encoding or detected.get('confidence', 0) < 0.7:
-        encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-        for enc in encodings:
-            try:
-                with open(file_path, 'r', encoding=enc, errors='ignore') as f:
-                    content = f.read()
-                return content
-            except (UnicodeDecodeError, UnicodeError):
-                continue
-        raise ValueError(f"无法识别文件编码: {file_path}")
-    
-    # 使用检测到的编码读取文件
+        sample = f.read(sample_bytes)
+
+    detected = chardet.detect(sample)
+    encoding = detected.get('encoding')
+    if encoding and detected.get('confidence', 0) >= 0.7:
+        try:
+            codecs.lookup(encoding)
+            return encoding
+        except LookupError:
+            pass
+
+    # 样本末尾可能截断了多字节字符，用增量解码器忽略未完成的部分
+    for enc in ['utf-8', 'gbk', 'gb2312']:
+        try:
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except (UnicodeDecodeError, UnicodeError):
+            continue
+    return 'utf-8'
+
+
+def iter_text_file(file_path: str) -> Iterator[str]:
+    """
+    按块流式读取文本文件（TXT、Markdown），编码由开头的样本检测
+
+    Args:
+        file_path: 文本文件路径
+    """
+    encoding = detect_encoding(file_path)
     try:
         with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-            content = f.read()
-        return content
+            while True:
+                block = f.read(TEXT_READ_CHARS)
+                if not block:
+                    break
+                yield block
     except Exception as e:
         raise ValueError(f"文本文件读取失败: {str(e)}")
 
 
+def parse_text_file(file_path: str) -> str:
+    """
+    解析文本文件（TXT、Markdown）
+    自动检测文件编码
+
+    Args:
+        file_path: 文本文件路径
+
+    Returns:
+        str: 提取的文本内容
+    """
+    return "".join(iter_text_file(file_path))
+
+
 try:
     from docx import Document  # type: ignore
     DOCX_AVAILABLE = True
@@ -139,122 +330,152 @@ except Exception as exc:  # pragma: no cover - 环境缺少lxml等依赖时会
     DOCX_AVAILABLE = False
 
 
-def parse_docx(file_path: str) -> str:
+def iter_docx(file_path: str) -> Iterator[str]:
     """
-    解析 DOCX (Word) 文件
-    
-    Args:
-        file_path: DOCX 文件路径
-        
-    Returns:
-        str: 提取的文本内容
+    逐段产出 DOCX (Word) 文本：先正文段落，再表格行
+
+    python-docx 不可用、解析失败或没有文本时改用 ZIP 流式解析
     """
     if not DOCX_AVAILABLE:
-        return _parse_docx_via_zip(file_path)
+        yield from _iter_docx_via_zip(file_path)
+        return
 
     try:
-        text_content: List[str] = []
         doc = Document(file_path)
+    except Exception as exc:  # pragma: no cover
+        logger.warning("python-docx 解析失败 (%s)，启用 ZIP 解析: %s", exc, file_path)
+        yield from _iter_docx_via_zip(file_path)
+        return
 
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_content.append(para.text)
-
-        for table in doc.tables:
-            for row in table.rows:
-                cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
-                if cells:
-                    text_content.append(" | ".join(cells))
+    found = False
+    for para in doc.paragraphs:
+        if para.text.strip():
+            found = True
+            yield para.text
 
-        if text_content:
-            return "\n".join(text_content)
+    for table in doc.tables:
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if cells:
+                found = True
+                yield " | ".join(cells)
 
+    if not found:
         logger.warning("python-docx 未提取到文本，退回 ZIP 解析: %s", file_path)
-        return _parse_docx_via_zip(file_path)
-    except Exception as exc:  # pragma: no cover
-        logger.warning("python-docx 解析失败 (%s)，启用 ZIP 解析: %s", exc, file_path)
-        return _parse_docx_via_zip(file_path)
+        yield from _iter_docx_via_zip(file_path)
 
 
-def _parse_docx_via_zip(file_path: str) -> str:
+def parse_docx(file_path: str) -> str:
     """
-    当 python-docx 不可用或解析失败时，使用标准库解析 DOCX Zip 结构。
+    解析 DOCX (Word) 文件
+
+    Args:
+        file_path: DOCX 文件路径
+
+    Returns:
+        str: 提取的文本内容
+    """
+    return "\n".join(iter_docx(file_path))
+
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _iter_docx_via_zip(file_path: str) -> Iterator[str]:
+    """
+    当 python-docx 不可用或解析失败时，使用标准库流式解析 DOCX Zip 结构（iterparse，段落处理完即释放）
     """
     try:
-        with zipfile.ZipFile(file_path) as docx_zip:
-            xml_bytes = docx_zip.read("word/document.xml")
-    except KeyError as exc:
-        raise ValueError(f"DOCX 文件缺少 document.xml: {exc}") from exc
+        docx_zip = zipfile.ZipFile(file_path)
     except Exception as exc:
         raise ValueError(f"DOCX ZIP 解析失败: {exc}") from exc
 
-    try:
-        tree = ET.fromstring(xml_bytes)
-    except ET.ParseError as exc:
-        raise ValueError(f"DOCX XML 解析失败: {exc}") from exc
-
-    ns = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
-    paragraphs: List[str] = []
-    for para in tree.findall(".//w:p", ns):
-        texts = [node.text for node in para.findall(".//w:t", ns) if node.text]
-        if texts:
-            paragraphs.append("".join(texts))
-
-    if not paragraphs:
+    with docx_zip:
+        try:
+            stream = docx_zip.open("word/document.xml")
+        except KeyError as exc:
+            raise ValueError(f"DOCX 文件缺少 document.xml: {exc}") from exc
+
+        found = False
+        with stream:
+            try:
+                for _, elem in ET.iterparse(stream, events=("end",)):
+                    if elem.tag != f"{_W_NS}p":
+                        continue
+                    texts = [node.text for node in elem.iter(f"{_W_NS}t") if node.text]
+                    elem.clear()
+                    if texts:
+                        found = True
+                        yield "".join(texts)
+            except ET.ParseError as exc:
+                raise ValueError(f"DOCX XML 解析失败: {exc}") from exc
+
+    if not found:
         raise ValueError("DOCX 文件不包含可提取的文本内容")
 
-    return "\n".join(paragraphs)
+
+def _parse_docx_via_zip(file_path: str) -> str:
+    """
+    当 python-docx 不可用或解析失败时，使用标准库解析 DOCX Zip 结构。
+    """
+    return "\n".join(_iter_docx_via_zip(file_path))
 
 
-def parse_pptx(file_path: str) -> str:
+def iter_pptx_slides(file_path: str) -> Iterator[str]:
     """
-    解析 PPTX (PowerPoint) 文件
-    
+    逐个形状产出 PPTX (PowerPoint) 文本，按幻灯片顺序
+
     Args:
         file_path: PPTX 文件路径
-        
-    Returns:
-        str: 提取的文本内容
     """
     try:
         from pptx import Presentation
     except ImportError:
         raise ImportError("请安装 python-pptx: pip install python-pptx")
-    
+
     try:
-        text_content = []
         prs = Presentation(file_path)
-        
+
         # 遍历所有幻灯片
         for slide in prs.slides:
             # 提取形状中的文本
             for shape in slide.shapes:
                 if hasattr(shape, "text") and shape.text.strip():
-                    text_content.append(shape.text)
-        
-        full_text = "\n".join(text_content)
-        return full_text
+                    yield shape.text
     except Exception as e:
         raise ValueError(f"PPTX 解析失败: {str(e)}")
 
 
+def parse_pptx(file_path: str) -> str:
+    """
+    解析 PPTX (PowerPoint) 文件
+
+    Args:
+        file_path: PPTX 文件路径
+
+    Returns:
+        str: 提取的文本内容
+    """
+    return "\n".join(iter_pptx_slides(file_path))
+
+
 def get_file_info(file_path: str) -> dict:
     """
     获取文件信息
-    
+
     Args:
         file_path: 文件路径
-        
+
     Returns:
         dict: 文件信息（文件名、大小、类型等）
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件不存在: {file_path}")
-    
+
     file_name = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
     file_ext = os.path.splitext(file_path)[1].lower()
-    
+
     return {
         "file_name": file_name,
         "file_size": file_size,
@@ -262,3 +483,9 @@ def get_file_info(file_path: str) -> dict:
         "file_path": file_path
     }
 
+
+pdf_page_pool = PdfPagePool(
+    workers=settings.FILE_PARSE_PDF_WORKERS,
+    parallel_min_pages=settings.FILE_PARSE_PDF_PARALLEL_MIN_PAGES,
+    pages_per_task=settings.FILE_PARSE_PDF_PAGES_PER_TASK,
+)
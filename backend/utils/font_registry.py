@@ -0,0 +1,146 @@
+"""
+PDF中文字体注册表
+作者：智学伴开发团队
+目的：进程内只探测、解析并注册一次中文字体（大体积CJK字体的TTF解析是导出耗时的主要部分），
+     学习报告和试卷导出共用同一个字体；启动时预热，并提供字体健康检查
+环境变量：PDF_FONT_PATHS
+测试：pytest backend/tests/test_font_registry.py
+"""
+import os
+import platform
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.logger import logger
+
+try:
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+FALLBACK_FONT = "Helvetica"
+CID_FONT = "STSong-Light"
+# 健康检查时验证字体能显示的字符
+SAMPLE_TEXT = "智学伴学习报告"
+
+# (字体名, 路径)，优先TTF（能完整嵌入PDF），其次TTC字体集合
+_SYSTEM_FONTS: Dict[str, List[Tuple[str, str]]] = {
+    "Windows": [
+        ("SimHei", "C:/Windows/Fonts/simhei.ttf"),
+        ("SimKai", "C:/Windows/Fonts/simkai.ttf"),
+        ("STSong", "C:/Windows/Fonts/STSONG.TTF"),
+        ("STZhongsong", "C:/Windows/Fonts/STZHONGS.TTF"),
+        ("SimSun", "C:/Windows/Fonts/simsun.ttc"),
+        ("MicrosoftYaHei", "C:/Windows/Fonts/msyh.ttc"),
+    ],
+    "Darwin": [
+        ("STHeiti", "/System/Library/Fonts/STHeiti Light.ttc"),
+        ("PingFang", "/System/Library/Fonts/PingFang.ttc"),
+    ],
+    "Linux": [
+        ("WQY", "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc"),
+        ("WQY", "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc"),
+        ("WQYZenHei", "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"),
+        ("WQYZenHei", "/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc"),
+        ("ARPLUMing", "/usr/share/fonts/truetype/arphic/uming.ttc"),
+    ],
+}
+
+
+def candidate_fonts() -> List[Tuple[str, str]]:
+    """按优先级返回候选字体：PDF_FONT_PATHS 中配置的文件在前，然后是当前系统的常见中文字体"""
+    candidates = [
+        (os.path.splitext(os.path.basename(path))[0], path) for path in settings.PDF_FONT_PATHS
+    ]
+    return candidates + _SYSTEM_FONTS.get(platform.system(), [])
+
+
+class FontRegistry:
+    """
+    进程级中文字体注册表
+
+    首次调用 get_cjk_font()（或启动时 warmup()）时按候选列表加载第一个可用字体，
+    解析后的 TTFont 对象由 reportlab 全局注册并在本进程内复用，之后每次导出只返回字体名；
+    系统字体都不可用时依次回退到 ReportLab 内置 CID 字体、Helvetica
+    """
+
+    def __init__(self, candidates: Optional[List[Tuple[str, str]]] = None):
+        self._candidates = candidates
+        self._lock = threading.Lock()
+        self._info: Optional[Dict[str, Any]] = None
+
+    def get_cjk_font(self) -> str:
+        """返回可用于中文的字体名（首次调用时加载）"""
+        info = self._info
+        if info is None:
+            with self._lock:
+                if self._info is None:
+                    self._info = self._load()
+                info = self._info
+        return info["font_name"]
+
+    def warmup(self) -> None:
+        """预先加载字体（启动时/报告工作进程初始化时调用），失败只记录日志"""
+        try:
+            self.get_cjk_font()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("中文字体预加载失败: %s", exc)
+
+    def _load(self) -> Dict[str, Any]:
+        if not REPORTLAB_AVAILABLE:
+            return {"font_name": FALLBACK_FONT, "kind": "builtin", "path": None, "glyphs": 0, "load_ms": 0}
+
+        started = time.perf_counter()
+        candidates = self._candidates if self._candidates is not None else candidate_fonts()
+        for font_name, font_path in candidates:
+            if not os.path.exists(font_path):
+                continue
+            try:
+                if font_name in pdfmetrics.getRegisteredFontNames():
+                    font = pdfmetrics.getFont(font_name)
+                else:
+                    font = TTFont(font_name, font_path)
+                    pdfmetrics.registerFont(font)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("中文字体加载失败 %s (%s): %s", font_name, font_path, exc)
+                continue
+            info = {
+                "font_name": font_name,
+                "kind": "ttf",
+                "path": font_path,
+                "glyphs": len(getattr(font.face, "charToGlyph", {}) or {}),
+                "load_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            logger.info("已加载PDF中文字体: %s (%s)，耗时%sms", font_name, font_path, info["load_ms"])
+            return info
+
+        try:
+            from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+            if CID_FONT not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(UnicodeCIDFont(CID_FONT))
+            logger.info("未找到系统中文字体，使用ReportLab内置CID字体: %s", CID_FONT)
+            return {"font_name": CID_FONT, "kind": "cid", "path": None, "glyphs": 0,
+                    "load_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("无法注册任何中文字体，将使用%s（中文可能显示为乱码）: %s", FALLBACK_FONT, exc)
+            return {"font_name": FALLBACK_FONT, "kind": "builtin", "path": None, "glyphs": 0, "load_ms": 0}
+
+    def health(self) -> Dict[str, Any]:
+        """字体健康检查：是否已加载、字体来源及能否显示中文"""
+        info = self._info
+        if info is None:
+            return {"loaded": False, "reportlab": REPORTLAB_AVAILABLE}
+        if info["kind"] == "ttf":
+            font = pdfmetrics.getFont(info["font_name"])
+            char_map = getattr(font.face, "charToGlyph", {}) or {}
+            cjk_ok = all(ord(char) in char_map for char in SAMPLE_TEXT)
+        else:
+            cjk_ok = info["kind"] == "cid"
+        return {"loaded": True, "reportlab": REPORTLAB_AVAILABLE, "cjk_ok": cjk_ok, **info}
+
+
+font_registry = FontRegistry()
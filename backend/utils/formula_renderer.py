@@ -0,0 +1,235 @@
+"""
+LaTeX公式渲染
+作者：智学伴开发团队
+目的：试卷导出时把LaTeX公式渲染为PNG；按公式内容哈希缓存（内存LRU + 磁盘目录），同一公式在所有试卷中只渲染一次；
+     每个进程复用同一个 matplotlib Figure，一份试卷的全部公式一次批量渲染，可选在进程池中并行；
+     图片直接以字节返回，不再产生需要清理的临时文件
+环境变量：FORMULA_CACHE_DIR, FORMULA_CACHE_MAX_MB, FORMULA_CACHE_MAX_ENTRIES, FORMULA_RENDER_WORKERS
+测试：pytest backend/tests/test_formula_renderer.py
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.config import settings
+from core.logger import logger
+
+# 渲染参数变化时递增，使旧缓存失效
+RENDER_VERSION = 1
+RENDER_DPI = 150
+RENDER_FONTSIZE = 16
+
+# 少于该数量的未命中公式直接在当前进程渲染，进程间传输的开销不划算
+PARALLEL_MIN_FORMULAS = 8
+
+_figure = None
+_figure_lock = threading.Lock()
+
+
+def normalize_formula(formula: str) -> str:
+    """去掉首尾空白和外层的 $ / $$ 定界符"""
+    formula = formula.strip()
+    if formula.startswith("$$") and formula.endswith("$$") and len(formula) >= 4:
+        formula = formula[2:-2]
+    elif formula.startswith("$") and formula.endswith("$") and len(formula) >= 2:
+        formula = formula[1:-1]
+    return formula.strip()
+
+
+def render_png(formula: str) -> Optional[bytes]:
+    """
+    用 matplotlib 内置 mathtext（不需要系统LaTeX）把公式渲染为PNG字节
+
+    本进程内复用同一个 Figure（不经过 pyplot），matplotlib 未安装或公式无法解析时返回 None
+    """
+    global _figure
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+    except ImportError:
+        logger.warning("matplotlib未安装，无法渲染LaTeX公式为图片")
+        return None
+
+    with _figure_lock:
+        if _figure is None:
+            _figure = Figure(figsize=(8, 2))
+            FigureCanvasAgg(_figure)
+        _figure.clear()
+        _figure.text(0, 0, f"${formula}$", fontsize=RENDER_FONTSIZE)
+        buffer = io.BytesIO()
+        try:
+            _figure.savefig(buffer, format="png", dpi=RENDER_DPI, bbox_inches="tight",
+                            pad_inches=0.1, facecolor="white", edgecolor="none")
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning(f"LaTeX公式渲染失败: {exc}")
+            return None
+        finally:
+            _figure.clear()
+        return buffer.getvalue()
+
+
+class FormulaRenderer:
+    """
+    带缓存的公式渲染器
+
+    - 缓存键为 sha256(渲染版本 + 公式)，渲染失败的结果只在内存中记住，避免同一份试卷反复重试
+    - render_many() 先查内存和磁盘缓存，未命中的公式去重后一次渲染；workers > 1 且数量足够时用进程池并行
+    - 磁盘缓存超过 max_disk_mb 时按修改时间删除最旧的图片
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_entries: int = 1024,
+        max_disk_mb: int = 50,
+        workers: int = 0,
+        render_func: Callable[[str], Optional[bytes]] = render_png,
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_mb = max_disk_mb
+        self.workers = workers
+        self._render_func = render_func
+        self._memory: "OrderedDict[str, Optional[bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "rendered": 0}
+
+    @staticmethod
+    def cache_key(formula: str) -> str:
+        raw = f"{RENDER_VERSION}|{RENDER_DPI}|{RENDER_FONTSIZE}|{formula}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _remember(self, key: str, png: Optional[bytes]) -> None:
+        with self._lock:
+            self._memory[key] = png
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key: str):
+        """返回 (是否命中, PNG字节)"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return True, self._memory[key]
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    png = f.read()
+            except OSError:
+                return False, None
+            self._remember(key, png)
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            return True, png
+        return False, None
+
+    def _store_disk(self, key: str, png: bytes) -> None:
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+            with open(tmp_path, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning(f"写入公式缓存失败: {exc}")
+
+    def _render_missing(self, formulas: List[str]) -> List[Optional[bytes]]:
+        if self.workers > 1 and len(formulas) >= PARALLEL_MIN_FORMULAS:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            try:
+                return list(self._executor.map(self._render_func, formulas))
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning(f"并行渲染公式失败，改为逐个渲染: {exc}")
+                self._executor = None
+        return [self._render_func(formula) for formula in formulas]
+
+    def render_many(self, formulas: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """批量渲染，返回 {规范化后的公式: PNG字节或None}"""
+        results: Dict[str, Optional[bytes]] = {}
+        missing: Dict[str, str] = {}  # 公式 -> 缓存键
+        for formula in formulas:
+            formula = normalize_formula(formula)
+            if not formula or formula in results or formula in missing:
+                continue
+            key = self.cache_key(formula)
+            hit, png = self._lookup(key)
+            if hit:
+                results[formula] = png
+            else:
+                missing[formula] = key
+
+        if missing:
+            rendered = self._render_missing(list(missing))
+            for (formula, key), png in zip(missing.items(), rendered):
+                results[formula] = png
+                self._remember(key, png)
+                if png is not None:
+                    self._store_disk(key, png)
+            with self._lock:
+                self._stats["rendered"] += len(missing)
+            self.prune_disk()
+        return results
+
+    def render(self, formula: str) -> Optional[bytes]:
+        """渲染单个公式"""
+        return self.render_many([formula]).get(normalize_formula(formula))
+
+    def prune_disk(self) -> int:
+        """磁盘缓存超过上限时删除最旧的图片，返回删除个数"""
+        if not self.cache_dir or self.max_disk_mb <= 0 or not os.path.isdir(self.cache_dir):
+            return 0
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        limit = self.max_disk_mb * 1024 * 1024
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "memory_entries": len(self._memory)}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+formula_renderer = FormulaRenderer(
+    cache_dir=settings.FORMULA_CACHE_DIR,
+    max_entries=settings.FORMULA_CACHE_MAX_ENTRIES,
+    max_disk_mb=settings.FORMULA_CACHE_MAX_MB,
+    workers=settings.FORMULA_RENDER_WORKERS,
+)
@@ -0,0 +1,183 @@
+"""
+知识图谱序列化缓存
+作者：智学伴开发团队
+目的：知识图谱生成后不再变化，按 (用户, 会话, 响应格式) 在进程内缓存预编码的 JSON 字节（较大的同时保存 gzip 版本），
+     查看图谱时直接返回缓存字节并带 ETag；生成时预热、删除会话时失效；
+     compact 格式把节点按列存储、边改为按节点下标的邻接表，大图谱体积明显小于 full 格式
+环境变量：GRAPH_CACHE_MAX_MB, GRAPH_CACHE_GZIP, GRAPH_GZIP_MIN_BYTES
+测试：pytest backend/tests/test_graph_cache.py
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json
+    orjson = None
+
+# 响应结构变化时递增，使客户端缓存的 ETag 失效
+GRAPH_FORMAT_VERSION = 1
+GRAPH_FORMATS = ("full", "compact")
+NODE_FIELDS = ("id", "title", "description", "level", "mastery", "example", "resources")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """紧凑 JSON 编码（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def to_compact(graph: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    full 格式 -> compact 格式
+
+    {"format": "compact", "session": {...},
+     "nodes": {"id": [...], "title": [...], ...},   # 按列存储
+     "relations": ["depends_on", ...],              # 去重后的关系名
+     "adjacency": [[[目标节点下标, 关系下标], ...], ...]}  # 与节点下标对齐
+    """
+    nodes = graph["nodes"]
+    index = {node["id"]: i for i, node in enumerate(nodes)}
+    relations: List[str] = []
+    relation_index: Dict[str, int] = {}
+    adjacency: List[List[List[int]]] = [[] for _ in nodes]
+    for edge in graph["edges"]:
+        src = index.get(edge["from_node_id"])
+        tgt = index.get(edge["to_node_id"])
+        if src is None or tgt is None:
+            continue
+        relation = edge["relation"]
+        if relation not in relation_index:
+            relation_index[relation] = len(relations)
+            relations.append(relation)
+        adjacency[src].append([tgt, relation_index[relation]])
+    return {
+        "format": "compact",
+        "session": graph["session"],
+        "nodes": {field: [node[field] for node in nodes] for field in NODE_FIELDS},
+        "relations": relations,
+        "adjacency": adjacency,
+    }
+
+
+def encode_graph(graph: Dict[str, Any], fmt: str) -> bytes:
+    return dumps(to_compact(graph) if fmt == "compact" else graph)
+
+
+class CachedGraph:
+    """一份已编码的图谱响应"""
+
+    __slots__ = ("key", "body", "gzipped")
+
+    def __init__(self, key: str, body: bytes, gzipped: bool):
+        self.key = key
+        self.body = body
+        self.gzipped = gzipped
+
+    def content(self, accept_gzip: bool) -> Tuple[bytes, bool]:
+        """按客户端是否接受 gzip 返回 (响应体, 是否为 gzip 编码)"""
+        if self.gzipped and not accept_gzip:
+            return gzip.decompress(self.body), False
+        return self.body, self.gzipped
+
+
+class GraphCache:
+    """已编码图谱的进程内 LRU（按字节数限制容量）"""
+
+    def __init__(self, max_mb: int = 64, gzip_enabled: bool = True, gzip_min_bytes: int = 1024):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.gzip_enabled = gzip_enabled
+        self.gzip_min_bytes = gzip_min_bytes
+        self._entries: "OrderedDict[Tuple[int, int, str], CachedGraph]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(session_id: int, fmt: str) -> str:
+        """缓存条目的 ETag 键（图谱不可变，会话ID + 格式 + 版本即可唯一标识）"""
+        return f"graph-{session_id}-{fmt}-v{GRAPH_FORMAT_VERSION}"
+
+    @staticmethod
+    def empty(fmt: str) -> bytes:
+        """用户还没有任何图谱时的响应体（不缓存）"""
+        return encode_graph({"session": None, "nodes": [], "edges": []}, fmt)
+
+    def get(self, user_id: int, session_id: int, fmt: str) -> Optional[CachedGraph]:
+        with self._lock:
+            entry = self._entries.get((user_id, session_id, fmt))
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end((user_id, session_id, fmt))
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, user_id: int, session_id: int, fmt: str, graph: Dict[str, Any]) -> CachedGraph:
+        """编码并缓存图谱，返回缓存条目"""
+        body = encode_graph(graph, fmt)
+        gzipped = self.gzip_enabled and len(body) >= self.gzip_min_bytes
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+        entry = CachedGraph(self.key(session_id, fmt), body, gzipped)
+        cache_key = (user_id, session_id, fmt)
+        with self._lock:
+            old = self._entries.pop(cache_key, None)
+            if old is not None:
+                self._size -= len(old.body)
+            if len(body) <= self.max_bytes:
+                self._entries[cache_key] = entry
+                self._size += len(body)
+                self._stats["stores"] += 1
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+                self._stats["evictions"] += 1
+        return entry
+
+    def invalidate(self, user_id: int, session_id: int) -> int:
+        """删除某个会话全部格式的缓存，返回删除条数"""
+        removed = 0
+        with self._lock:
+            for fmt in GRAPH_FORMATS:
+                entry = self._entries.pop((user_id, session_id, fmt), None)
+                if entry is not None:
+                    self._size -= len(entry.body)
+                    removed += 1
+            self._stats["invalidations"] += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["encoder"] = "orjson" if orjson is not None else "json"
+        return stats
+
+
+graph_cache = GraphCache(
+    max_mb=settings.GRAPH_CACHE_MAX_MB,
+    gzip_enabled=settings.GRAPH_CACHE_GZIP,
+    gzip_min_bytes=settings.GRAPH_GZIP_MIN_BYTES,
+)
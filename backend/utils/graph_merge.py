@@ -0,0 +1,211 @@
+"""
+知识图谱分块与合并
+作者：智学伴开发团队
+目的：长资料生成知识图谱时的 map-reduce 工具：把全文切成带重叠的分块（超过上限时均匀抽样），
+     再把各分块抽取出的子图合并为一张图——节点按规范化标题去重并做模糊匹配，边取并集
+测试：pytest backend/tests/test_graph_merge.py
+"""
+import json
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# 标题规范化时去掉的空白和标点（中英文）
+_TITLE_STRIP = re.compile(r"[\s\-_·•、，,。.:：;；!！?？'\"“”‘’()（）\[\]【】《》<>/\\]+")
+# 分块时优先在这些位置断开（从强到弱）
+_BREAKS = ("\n\n", "\n", "。", "！", "？", ". ", "；", "，", " ")
+
+FUZZY_THRESHOLD = 0.85
+
+
+def chunk_spans(text: str, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    计算分块的 (起点, 终点)，只返回下标不复制文本
+
+    每块不超过 size 个字符，优先在段落/句子边界断开；相邻分块重叠 overlap 个字符，避免知识点被切断
+    """
+    length = len(text)
+    if length <= size:
+        return [(0, length)] if length else []
+    overlap = max(0, min(overlap, size // 2))
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            window_start = start + size // 2
+            for marker in _BREAKS:
+                pos = text.rfind(marker, window_start, end)
+                if pos != -1:
+                    end = pos + len(marker)
+                    break
+        spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def select_spans(spans: List[Tuple[int, int]], max_chunks: int) -> List[Tuple[int, int]]:
+    """分块数超过上限时在全文范围内均匀抽样，保证覆盖整本资料而不是只取开头"""
+    if max_chunks <= 0 or len(spans) <= max_chunks:
+        return spans
+    if max_chunks == 1:
+        return spans[:1]
+    step = (len(spans) - 1) / (max_chunks - 1)
+    indexes = sorted({round(i * step) for i in range(max_chunks)})
+    return [spans[i] for i in indexes]
+
+
+def iter_chunks(text: str, spans: List[Tuple[int, int]]) -> Iterator[Tuple[int, str]]:
+    """按需切出分块文本（同一时刻只有正在处理的分块被复制）"""
+    for index, (start, end) in enumerate(spans):
+        yield index, text[start:end]
+
+
+def normalize_title(title: str) -> str:
+    """全角转半角、小写并去掉空白和标点，作为节点去重的键"""
+    normalized = unicodedata.normalize("NFKC", title or "").lower()
+    return _TITLE_STRIP.sub("", normalized)
+
+
+def _bigrams(key: str) -> Set[str]:
+    if len(key) < 2:
+        return {key}
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+def _resources(node: Dict) -> List[str]:
+    resources = node.get("resources") or []
+    if isinstance(resources, str):
+        resources = [resources]
+    return [r if isinstance(r, str) else json.dumps(r, ensure_ascii=False) for r in resources]
+
+
+class GraphMerger:
+    """
+    增量合并分块子图
+
+    - 节点：规范化标题相同直接合并；否则在共享二元组的候选中做 SequenceMatcher 模糊匹配（>= threshold）
+    - 合并后保留最早出现（分块序号最小）的标题与字段，resources 取并集
+    - 边：端点映射到合并后的节点，按 (起点, 终点) 去重，去掉合并产生的自环
+    """
+
+    def __init__(self, threshold: float = FUZZY_THRESHOLD, max_resources: int = 5):
+        self.threshold = threshold
+        self.max_resources = max_resources
+        self._nodes: Dict[str, Dict] = {}
+        self._aliases: Dict[str, str] = {}  # 模糊匹配过的规范化标题 -> 合并到的节点
+        self._order: Dict[str, Tuple[int, int]] = {}
+        self._occurrences: Dict[str, int] = defaultdict(int)
+        self._index: Dict[str, Set[str]] = defaultdict(set)
+        self._edges: Dict[Tuple[str, str], str] = {}
+        self._edge_order: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+    def _match(self, key: str) -> Optional[str]:
+        if key in self._nodes:
+            return key
+        if key in self._aliases:
+            return self._aliases[key]
+        grams = _bigrams(key)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._index.get(gram, ()):
+                shared[candidate] += 1
+        best, best_ratio = None, self.threshold
+        for candidate, count in shared.items():
+            # 共享二元组太少的不可能达到阈值，跳过昂贵的比较
+            if count * 2 < min(len(grams), len(_bigrams(candidate))):
+                continue
+            matcher = SequenceMatcher(None, key, candidate)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        if best is not None:
+            self._aliases[key] = best
+        return best
+
+    def _add_node(self, node: Dict, order: Tuple[int, int]) -> Optional[str]:
+        title = str(node.get("title") or "").strip()
+        key = normalize_title(title)
+        if not key:
+            return None
+        matched = self._match(key)
+        if matched is None:
+            self._nodes[key] = dict(node, title=title, resources=_resources(node)[:self.max_resources])
+            self._order[key] = order
+            for gram in _bigrams(key):
+                self._index[gram].add(key)
+            matched = key
+        else:
+            existing = self._nodes[matched]
+            if order < self._order[matched]:
+                primary, secondary = dict(node, title=title), existing
+                resources = _resources(node) + existing["resources"]
+                self._order[matched] = order
+            else:
+                primary, secondary = existing, node
+                resources = existing["resources"] + _resources(node)
+            for field in ("description", "level", "mastery", "example"):
+                if not primary.get(field) and secondary.get(field):
+                    primary[field] = secondary[field]
+            primary["resources"] = list(dict.fromkeys(resources))[:self.max_resources]
+            self._nodes[matched] = primary
+        self._occurrences[matched] += 1
+        return matched
+
+    def add(self, chunk_index: int, subgraph: Dict) -> None:
+        """合并一个分块的子图：{"nodes": [{title, ...}], "edges": [{from, to, relation}]}"""
+        local: Dict[str, str] = {}
+        for position, node in enumerate(subgraph.get("nodes") or []):
+            if not isinstance(node, dict):
+                continue
+            key = self._add_node(node, (chunk_index, position))
+            if key is not None:
+                local[normalize_title(str(node.get("title") or ""))] = key
+        for position, edge in enumerate(subgraph.get("edges") or []):
+            if not isinstance(edge, dict):
+                continue
+            src = self._resolve(local, edge.get("from"))
+            tgt = self._resolve(local, edge.get("to"))
+            if src is None or tgt is None or src == tgt:
+                continue
+            order = (chunk_index, position)
+            pair = (src, tgt)
+            if pair not in self._edges or order < self._edge_order[pair]:
+                self._edges[pair] = edge.get("relation") or "depends_on"
+                self._edge_order[pair] = order
+
+    def _resolve(self, local: Dict[str, str], title: Optional[str]) -> Optional[str]:
+        key = normalize_title(str(title or ""))
+        if not key:
+            return None
+        return local.get(key) or self._match(key)
+
+    def result(self, max_nodes: int = 0) -> Tuple[List[Dict], List[Dict]]:
+        """
+        返回合并后的 (节点列表, 边列表)，节点按首次出现顺序排列，边的端点为节点标题
+
+        max_nodes > 0 时只保留出现次数多、连接多的节点
+        """
+        keys = sorted(self._nodes, key=lambda k: self._order[k])
+        if max_nodes > 0 and len(keys) > max_nodes:
+            degree: Dict[str, int] = defaultdict(int)
+            for src, tgt in self._edges:
+                degree[src] += 1
+                degree[tgt] += 1
+            ranked = sorted(keys, key=lambda k: (-self._occurrences[k], -degree[k], self._order[k]))
+            kept = set(ranked[:max_nodes])
+            keys = [k for k in keys if k in kept]
+        kept_keys = set(keys)
+        nodes = [self._nodes[k] for k in keys]
+        edges = [
+            {"from": self._nodes[src]["title"], "to": self._nodes[tgt]["title"], "relation": relation}
+            for (src, tgt), relation in sorted(self._edges.items(), key=lambda item: self._edge_order[item[0]])
+            if src in kept_keys and tgt in kept_keys
+        ]
+        return nodes, edges
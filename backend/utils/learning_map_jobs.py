@@ -0,0 +1,214 @@
+"""
+知识图谱生成后台任务
+作者：智学伴开发团队
+目的：长资料分块抽取可能需要数分钟，超过前端请求超时；生成改为在事件循环中作为后台任务运行，
+     请求只负责提交任务和查询状态（含已完成分块数），同一份资料的相同请求在生成期间复用同一任务
+环境变量：LEARNING_MAP_MAX_JOBS, LEARNING_MAP_JOB_TTL, LEARNING_MAP_WAIT_TIMEOUT
+测试：pytest backend/tests/test_learning_map_jobs.py
+"""
+import asyncio
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.config import settings
+from core.logger import logger
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# generate(user_id, file_id, course_topic, provider, progress) -> generate_graph 的返回值
+Generator = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+async def generate_learning_map(
+    user_id: int,
+    file_id: Optional[int],
+    course_topic: Optional[str],
+    provider: Optional[str],
+    progress: Callable[[int, int], None],
+) -> Dict[str, Any]:
+    """在任务自己的数据库会话中生成图谱（请求结束后请求的会话已关闭）"""
+    from database import SessionLocal
+    from services.learning_map_service import LearningMapService
+
+    db = SessionLocal()
+    try:
+        return await LearningMapService.generate_graph(
+            db,
+            user_id=user_id,
+            file_id=file_id,
+            course_topic=course_topic,
+            provider=provider,
+            progress=progress,
+        )
+    finally:
+        db.close()
+
+
+def _now_iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class LearningMapJobManager:
+    """
+    知识图谱生成任务管理器
+
+    - submit() 创建 asyncio 任务后立即返回；相同 (用户, 资料, 主题, 模型) 的任务未结束时直接返回该任务
+    - 同时运行的任务数不超过 max_jobs，其余排队，避免多个长资料同时占满AI并发
+    - 生成中的进度为 已完成分块数 / 总分块数；参数错误（ValueError）的失败记为 error_code=400
+    - 已结束的任务记录保留 job_ttl 秒
+    """
+
+    def __init__(self, max_jobs: int = 2, job_ttl: int = 3600, generate: Generator = generate_learning_map):
+        self.max_jobs = max_jobs
+        self.job_ttl = job_ttl
+        self._generate = generate
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[Tuple, str] = {}  # 请求参数 -> job_id
+        self._lock = threading.RLock()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, self.max_jobs))
+        return self._semaphore
+
+    def submit(
+        self,
+        user_id: int,
+        file_id: Optional[int],
+        course_topic: Optional[str],
+        provider: Optional[str],
+    ) -> Dict[str, Any]:
+        """提交生成任务（需在事件循环中调用），返回任务状态"""
+        key = (user_id, file_id, course_topic or None, provider or None)
+        with self._lock:
+            self._prune_jobs()
+            inflight_id = self._inflight.get(key)
+            if inflight_id is not None:
+                return self._view(self._jobs[inflight_id])
+
+            job_id = uuid.uuid4().hex
+            job: Dict[str, Any] = {
+                "job_id": job_id,
+                "user_id": user_id,
+                "key": key,
+                "status": STATUS_QUEUED,
+                "chunks_done": 0,
+                "chunks_total": 0,
+                "result": None,
+                "error": None,
+                "error_code": None,
+                "created_at": time.time(),
+                "finished_at": None,
+                "task": None,
+            }
+            self._jobs[job_id] = job
+            self._inflight[key] = job_id
+            job["task"] = asyncio.get_running_loop().create_task(self._run(job))
+            return self._view(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        user_id, file_id, course_topic, provider = job["key"]
+
+        def progress(done: int, total: int) -> None:
+            job["chunks_done"], job["chunks_total"] = done, total
+
+        try:
+            async with self._get_semaphore():
+                job["status"] = STATUS_RUNNING
+                result = await self._generate(user_id, file_id, course_topic, provider, progress)
+            self._finish(job, STATUS_DONE, result=result)
+            logger.info(
+                "知识图谱生成完成: user_id=%s, 耗时%.2fs", user_id, job["finished_at"] - job["created_at"]
+            )
+        except asyncio.CancelledError:
+            self._finish(job, STATUS_FAILED, error="任务已取消", error_code=500)
+            raise
+        except ValueError as exc:
+            self._finish(job, STATUS_FAILED, error=str(exc), error_code=400)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("知识图谱生成失败: user_id=%s, %s", user_id, exc, exc_info=True)
+            self._finish(job, STATUS_FAILED, error=str(exc), error_code=500)
+
+    def _finish(self, job: Dict[str, Any], status: str, **fields: Any) -> None:
+        with self._lock:
+            if self._inflight.get(job["key"]) == job["job_id"]:
+                del self._inflight[job["key"]]
+            job.update(status=status, finished_at=time.time(), **fields)
+
+    @staticmethod
+    def _progress(job: Dict[str, Any]) -> int:
+        if job["status"] in (STATUS_DONE, STATUS_FAILED):
+            return 100
+        if not job["chunks_total"]:
+            return 0
+        # 分块全部完成后还要合并、写库，最多显示 95
+        return int(95 * job["chunks_done"] / job["chunks_total"])
+
+    def _view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": job["job_id"],
+            "user_id": job["user_id"],
+            "status": job["status"],
+            "progress": self._progress(job),
+            "chunks_done": job["chunks_done"],
+            "chunks_total": job["chunks_total"],
+            "result": job["result"],
+            "error": job["error"],
+            "error_code": job["error_code"],
+            "created_at": _now_iso(job["created_at"]),
+            "finished_at": _now_iso(job["finished_at"]),
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态，任务不存在（或已过期）时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job is not None else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待任务结束（最多 timeout 秒），返回最新状态"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        task: asyncio.Task = job["task"]
+        if not task.done():
+            try:
+                # shield：等待超时只放弃等待，生成继续进行，完成后可在历史记录中查看
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except Exception:  # pylint: disable=broad-except
+                pass  # 失败原因记录在任务状态中
+        return self.get(job_id)
+
+    def _prune_jobs(self) -> None:
+        """删除过期的已结束任务记录（调用方持有锁）"""
+        cutoff = time.time() - self.job_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self) -> None:
+        """应用关闭时取消未结束的任务"""
+        with self._lock:
+            tasks = [job["task"] for job in self._jobs.values() if job["task"] is not None]
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+learning_map_job_manager = LearningMapJobManager(
+    max_jobs=settings.LEARNING_MAP_MAX_JOBS,
+    job_ttl=settings.LEARNING_MAP_JOB_TTL,
+)
@@ -6,14 +6,17 @@
 测试：pytest backend/tests/test_model_registry.py
 """
 import time
+import json
+import asyncio
 import httpx
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
 from abc import ABC, abstractmethod
 from core.logger import logger
 from core.config import settings
 from core.security import decrypt_api_key
 from sqlalchemy.orm import Session
 from repositories.model_config_repo import ModelConfigRepository
+from utils.openai_client import invalidate_clients
 
 
 class AIProvider(ABC):
@@ -24,56 +27,175 @@ class AIProvider(ABC):
         """调用AI模型"""
         pass
 
+    async def acall(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """异步调用AI模型（默认放到线程池执行同步实现，避免阻塞事件循环）"""
+        return await asyncio.to_thread(self.call, messages, **kwargs)
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """流式调用AI模型，逐块产出文本（默认一次性返回完整结果）"""
+        result = await self.acall(messages, **kwargs)
+        if result.get("text"):
+            yield result["text"]
+
+
+def _http2_available() -> bool:
+    """HTTP/2 依赖 h2 包，未安装时退回 HTTP/1.1"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AsyncClientPool:
+    """
+    按提供商复用的 httpx.AsyncClient 连接池
+    - 同一提供商（名称 + base_url）共享一个长连接客户端，启用 keep-alive
+    - 客户端与事件循环绑定，事件循环变化（如测试中多次 asyncio.run）时自动重建
+    """
+    _clients: Dict[str, Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+
+    @classmethod
+    def get(cls, key: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        cached = cls._clients.get(key)
+        if cached:
+            client, client_loop = cached
+            if client_loop is loop and not client.is_closed:
+                return client
+        client = httpx.AsyncClient(
+            timeout=settings.AI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            http2=settings.AI_HTTP2 and _http2_available(),
+        )
+        cls._clients[key] = (client, loop)
+        return client
+
+    @classmethod
+    async def aclose_all(cls):
+        """关闭所有客户端（应用关闭时调用）"""
+        clients = list(cls._clients.values())
+        cls._clients.clear()
+        loop = asyncio.get_running_loop()
+        for client, client_loop in clients:
+            if client_loop is not loop or client.is_closed:
+                continue
+            try:
+                await client.aclose()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("关闭AI HTTP客户端失败: %s", e)
+
+
+class HTTPChatProvider(AIProvider):
+    """
+    基于 HTTP JSON 接口的提供商基类
+    子类只需声明默认地址，并实现请求体构造与响应解析
+    """
+    default_base_url: str = ""
+    supports_streaming: bool = True  # 是否支持 OpenAI 兼容的 SSE 流式输出
 
-class DeepSeekProvider(AIProvider):
-    """DeepSeek提供商"""
-    
     def __init__(self, api_key: str, base_url: Optional[str] = None):
         self.api_key = api_key
-        self.base_url = base_url or "https://api.deepseek.com/v1/chat/completions"
-    
-    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """调用DeepSeek API"""
-        headers = {
+        self.base_url = base_url or self.default_base_url
+
+    def _build_headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
-        payload = {
+
+    @abstractmethod
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """构造请求体"""
+
+    @abstractmethod
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """解析响应为 {text, usage, model}"""
+
+    def _pool_key(self) -> str:
+        return f"{type(self).__name__}:{self.base_url}"
+
+    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """同步调用（保留给脚本及同步代码路径）"""
+        headers = self._build_headers()
+        payload = self._build_payload(messages, **kwargs)
+        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
+            response = client.post(self.base_url, json=payload, headers=headers)
+            response.raise_for_status()
+            return self._parse_result(response.json(), payload)
+
+    async def acall(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """异步调用，使用按提供商复用的长连接客户端"""
+        headers = self._build_headers()
+        payload = self._build_payload(messages, **kwargs)
+        client = AsyncClientPool.get(self._pool_key())
+        response = await client.post(self.base_url, json=payload, headers=headers)
+        response.raise_for_status()
+        return self._parse_result(response.json(), payload)
+
+    def _parse_stream_delta(self, chunk: Dict[str, Any]) -> str:
+        """解析流式响应中的一个数据块（OpenAI 兼容格式）"""
+        choices = chunk.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or ""
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """流式调用，逐块产出模型输出的文本"""
+        if not self.supports_streaming:
+            async for text in super().astream(messages, **kwargs):
+                yield text
+            return
+        headers = self._build_headers()
+        payload = {**self._build_payload(messages, **kwargs), "stream": True}
+        client = AsyncClientPool.get(self._pool_key())
+        async with client.stream("POST", self.base_url, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except (json.JSONDecodeError, ValueError):
+                    continue
+                delta = self._parse_stream_delta(chunk)
+                if delta:
+                    yield delta
+
+
+class DeepSeekProvider(HTTPChatProvider):
+    """DeepSeek提供商"""
+    default_base_url = "https://api.deepseek.com/v1/chat/completions"
+    
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        return {
             "model": kwargs.get("model", "deepseek-chat"),
             "messages": messages,
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
-        
-        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
-            response = client.post(self.base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            return {
-                "text": result["choices"][0]["message"]["content"],
-                "usage": result.get("usage", {}),
-                "model": result.get("model", "deepseek-chat")
-            }
+    
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "text": result["choices"][0]["message"]["content"],
+            "usage": result.get("usage", {}),
+            "model": result.get("model", "deepseek-chat")
+        }
 
 
-class QwenProvider(AIProvider):
+class QwenProvider(HTTPChatProvider):
     """通义千问提供商"""
+    default_base_url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+    supports_streaming = False  # DashScope 原生接口的流式格式与 OpenAI 不同，退回一次性返回
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
-        self.api_key = api_key
-        self.base_url = base_url or "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
-    
-    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """调用Qwen API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
         qwen_messages = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
-        
-        payload = {
+        return {
             "model": kwargs.get("model", "qwen-turbo"),
             "input": {
                 "messages": qwen_messages
@@ -83,139 +205,97 @@ class QwenProvider(AIProvider):
                 "max_tokens": kwargs.get("max_tokens", 2000)
             }
         }
-        
-        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
-            response = client.post(self.base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            return {
-                "text": result["output"]["choices"][0]["message"]["content"],
-                "usage": result.get("usage", {}),
-                "model": result.get("model", payload["model"])
-            }
+    
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "text": result["output"]["choices"][0]["message"]["content"],
+            "usage": result.get("usage", {}),
+            "model": result.get("model", payload["model"])
+        }
 
 
-class ChatGLMProvider(AIProvider):
+class ChatGLMProvider(HTTPChatProvider):
     """ChatGLM提供商"""
+    default_base_url = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
-        self.api_key = api_key
-        self.base_url = base_url or "https://open.bigmodel.cn/api/paas/v4/chat/completions"
-    
-    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """调用ChatGLM API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        return {
             "model": kwargs.get("model", "glm-4"),
             "messages": messages,
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
-        
-        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
-            response = client.post(self.base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            return {
-                "text": result["choices"][0]["message"]["content"],
-                "usage": result.get("usage", {}),
-                "model": result.get("model", "glm-4")
-            }
+    
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "text": result["choices"][0]["message"]["content"],
+            "usage": result.get("usage", {}),
+            "model": result.get("model", "glm-4")
+        }
 
 
-class WenxinProvider(AIProvider):
+class WenxinProvider(HTTPChatProvider):
     """文心一言提供商"""
+    default_base_url = "https://qianfan.baidubce.com/v2/chat/completions"
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
-        self.api_key = api_key
-        self.base_url = base_url or "https://qianfan.baidubce.com/v2/chat/completions"
-    
-    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        return {
             "model": kwargs.get("model", "ernie-lite-8k"),
             "messages": messages,
             "temperature": kwargs.get("temperature", 0.7),
             "max_output_tokens": kwargs.get("max_tokens", 2000)
         }
-        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
-            response = client.post(self.base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            text = result.get("result")
-            if not text and "choices" in result:
-                text = result["choices"][0]["message"]["content"]
-            return {
-                "text": text,
-                "usage": result.get("usage", {}),
-                "model": result.get("model", payload["model"])
-            }
+    
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        text = result.get("result")
+        if not text and "choices" in result:
+            text = result["choices"][0]["message"]["content"]
+        return {
+            "text": text,
+            "usage": result.get("usage", {}),
+            "model": result.get("model", payload["model"])
+        }
 
 
-class XinghuoProvider(AIProvider):
+class XinghuoProvider(HTTPChatProvider):
     """讯飞星火提供商"""
+    default_base_url = "https://spark-api.xf-yun.com/v1/chat/completions"
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
-        self.api_key = api_key
-        self.base_url = base_url or "https://spark-api.xf-yun.com/v1/chat/completions"
-    
-    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        return {
             "model": kwargs.get("model", "general"),
             "messages": messages,
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
-        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
-            response = client.post(self.base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            return {
-                "text": text,
-                "usage": result.get("usage", {}),
-                "model": result.get("model", payload["model"])
-            }
+    
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        return {
+            "text": text,
+            "usage": result.get("usage", {}),
+            "model": result.get("model", payload["model"])
+        }
 
 
-class MoonshotProvider(AIProvider):
+class MoonshotProvider(HTTPChatProvider):
     """Moonshot(Kimi)提供商"""
+    default_base_url = "https://api.moonshot.cn/v1/chat/completions"
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
-        self.api_key = api_key
-        self.base_url = base_url or "https://api.moonshot.cn/v1/chat/completions"
-    
-    def call(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
+    def _build_payload(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        return {
             "model": kwargs.get("model", "moonshot-v1-32k"),
             "messages": messages,
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
-        with httpx.Client(timeout=settings.AI_TIMEOUT) as client:
-            response = client.post(self.base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            return {
-                "text": result["choices"][0]["message"]["content"],
-                "usage": result.get("usage", {}),
-                "model": result.get("model", payload["model"])
-            }
+    
+    def _parse_result(self, result: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "text": result["choices"][0]["message"]["content"],
+            "usage": result.get("usage", {}),
+            "model": result.get("model", payload["model"])
+        }
 
 
 PROVIDER_CLASS_MAP = {
@@ -279,6 +359,8 @@ class ModelRegistry:
         configs = ModelConfigRepository.get_all_enabled(db)
         self._providers.clear()
         self._provider_params.clear()
+        # 模型配置变更后丢弃旧的 OpenAI SDK 客户端
+        invalidate_clients()
         
         for config in configs:
             try:
@@ -290,14 +372,12 @@ class ModelRegistry:
             except Exception as e:  # pylint: disable=broad-except
                 logger.error("加载提供商 %s 失败: %s", config.provider_name, e)
     
-    def call_with_fallback(
+    def _resolve_provider_order(
         self,
-        messages: List[Dict[str, str]],
-        preferred_provider: Optional[str] = None,
-        allow_fallback: bool = True,
-        **kwargs,
-    ) -> Dict[str, Any]:
-        """调用AI，支持fallback"""
+        preferred_provider: Optional[str],
+        allow_fallback: bool,
+    ) -> List[str]:
+        """确定调用顺序：首选提供商在前，其余按注册顺序兜底"""
         # 获取启用的提供商列表（按优先级排序）
         providers = list(self._providers.keys())
         
@@ -309,6 +389,25 @@ class ModelRegistry:
                 providers = [preferred_provider]
         elif not providers:
             raise ValueError("未配置任何可用模型")
+        return providers
+
+    def resolve_target(self, preferred_provider: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """返回本次调用将首先尝试的 (提供商, 模型)，没有可用提供商时返回 None"""
+        try:
+            provider_name = self._resolve_provider_order(preferred_provider, allow_fallback=True)[0]
+        except (ValueError, IndexError):
+            return None
+        return provider_name, str(self._provider_params.get(provider_name, {}).get("model", ""))
+
+    def call_with_fallback(
+        self,
+        messages: List[Dict[str, str]],
+        preferred_provider: Optional[str] = None,
+        allow_fallback: bool = True,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """调用AI，支持fallback"""
+        providers = self._resolve_provider_order(preferred_provider, allow_fallback)
         
         last_error = None
         for provider_name in providers:
@@ -332,6 +431,80 @@ class ModelRegistry:
         # 所有提供商都失败
         raise Exception(f"所有AI提供商调用失败，最后错误: {last_error}")
 
+    async def acall_with_fallback(
+        self,
+        messages: List[Dict[str, str]],
+        preferred_provider: Optional[str] = None,
+        allow_fallback: bool = True,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """异步调用AI，支持fallback（不阻塞事件循环）"""
+        providers = self._resolve_provider_order(preferred_provider, allow_fallback)
+        
+        last_error = None
+        for provider_name in providers:
+            try:
+                provider = self._providers[provider_name]
+                default_params = self._provider_params.get(provider_name, {})
+                call_kwargs = {**default_params, **kwargs}
+                start_time = time.time()
+                result = await provider.acall(messages, **call_kwargs)
+                latency = (time.time() - start_time) * 1000
+                
+                result["provider"] = provider_name
+                result["latency_ms"] = latency
+                logger.info(f"AI异步调用成功: {provider_name}, 延迟: {latency:.2f}ms")
+                return result
+            except Exception as e:
+                last_error = e
+                logger.warning(f"AI异步调用失败: {provider_name}, 错误: {e}")
+                continue
+        
+        # 所有提供商都失败
+        raise Exception(f"所有AI提供商调用失败，最后错误: {last_error}")
+
+    async def astream_with_fallback(
+        self,
+        messages: List[Dict[str, str]],
+        preferred_provider: Optional[str] = None,
+        allow_fallback: bool = True,
+        **kwargs,
+    ) -> AsyncIterator[Dict[str, str]]:
+        """
+        流式调用AI，逐块产出 {"provider", "delta"}
+        只有在尚未输出任何内容时才会切换到下一个提供商
+        """
+        providers = self._resolve_provider_order(preferred_provider, allow_fallback)
+        
+        last_error = None
+        for provider_name in providers:
+            started = False
+            try:
+                provider = self._providers[provider_name]
+                default_params = self._provider_params.get(provider_name, {})
+                call_kwargs = {**default_params, **kwargs}
+                start_time = time.time()
+                async for delta in provider.astream(messages, **call_kwargs):
+                    started = True
+                    yield {"provider": provider_name, "delta": delta}
+                latency = (time.time() - start_time) * 1000
+                logger.info(f"AI流式调用成功: {provider_name}, 耗时: {latency:.2f}ms")
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                logger.warning(f"AI流式调用失败: {provider_name}, 错误: {e}")
+                continue
+        
+        # 所有提供商都失败
+        raise Exception(f"所有AI提供商调用失败，最后错误: {last_error}")
+
+    @staticmethod
+    async def aclose():
+        """释放所有提供商的长连接（应用关闭时调用）"""
+        await AsyncClientPool.aclose_all()
+
     def build_provider_from_config(
         self, config
     ) -> Optional[Tuple[AIProvider, Dict[str, Any]]]:
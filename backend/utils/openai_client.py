@@ -3,14 +3,21 @@ AI API 客户端封装
 支持多家中国大模型API：DeepSeek、文心、星火、ChatGLM、Moonshot等
 统一AI人设和返回格式
 """
-from openai import OpenAI
-from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from dotenv import load_dotenv, find_dotenv
+import asyncio
+import httpx
 import os
 import re
-from typing import Optional, AsyncIterator
+import threading
+from typing import Optional, AsyncIterator, Dict, Tuple
+from core.config import settings
+from core.logger import logger
 
 # 加载 .env 文件中的环境变量
-load_dotenv()
+_DOTENV_PATH = find_dotenv(usecwd=True)
+load_dotenv(_DOTENV_PATH)
+_dotenv_mtime: Optional[float] = os.path.getmtime(_DOTENV_PATH) if _DOTENV_PATH else None
 
 # 统一的System Prompt
 SYSTEM_PROMPT = "你是智学伴，一个AI个性化学习与测评助手，由智学伴项目团队开发。你应该以专业、温和的语气回答问题。"
@@ -35,6 +42,129 @@ MODEL_SIGNATURES = [
 ]
 
 
+# ---------- 客户端工厂 ----------
+# 按 (provider, base_url, api_key) 复用 OpenAI SDK 客户端，避免每次请求重新建立 TLS 连接
+# 同一提供商的 base_url / api_key 变化（.env 或模型配置更新）时，旧客户端会被替换并关闭
+_ClientKey = Tuple[str, str, str]
+_sync_clients: Dict[_ClientKey, OpenAI] = {}
+_async_clients: Dict[_ClientKey, Tuple[AsyncOpenAI, asyncio.AbstractEventLoop]] = {}
+_clients_lock = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _refresh_env_if_changed():
+    """.env 文件被修改后重新加载环境变量，并丢弃旧客户端"""
+    global _dotenv_mtime
+    if not _DOTENV_PATH:
+        return
+    try:
+        mtime = os.path.getmtime(_DOTENV_PATH)
+    except OSError:
+        return
+    if mtime != _dotenv_mtime:
+        _dotenv_mtime = mtime
+        load_dotenv(_DOTENV_PATH, override=True)
+        invalidate_clients()
+
+
+def _discard_stale(provider: str, key: _ClientKey):
+    """同一提供商只保留当前配置对应的客户端（调用方需持有 _clients_lock）"""
+    for stale_key in [k for k in _sync_clients if k[0] == provider and k != key]:
+        _close_sync(_sync_clients.pop(stale_key))
+    for stale_key in [k for k in _async_clients if k[0] == provider and k != key]:
+        _close_async(*_async_clients.pop(stale_key))
+
+
+def _close_sync(client: OpenAI):
+    try:
+        client.close()
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+
+def _close_async(client: AsyncOpenAI, client_loop: asyncio.AbstractEventLoop):
+    """在客户端所属的事件循环中异步关闭；事件循环已结束时直接丢弃"""
+    if client_loop.is_closed():
+        return
+    try:
+        if asyncio.get_running_loop() is client_loop:
+            client_loop.create_task(client.close())
+            return
+    except RuntimeError:
+        pass
+    if client_loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.close(), client_loop)
+
+
+def get_openai_client(provider: str, base_url: Optional[str], api_key: str) -> OpenAI:
+    """获取共享的同步 OpenAI 客户端"""
+    _refresh_env_if_changed()
+    key = (provider, base_url or "", api_key)
+    with _clients_lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            _discard_stale(provider, key)
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=settings.AI_TIMEOUT,
+                http_client=DefaultHttpxClient(limits=_http_limits()),
+            )
+            _sync_clients[key] = client
+        return client
+
+
+def get_async_openai_client(provider: str, base_url: Optional[str], api_key: str) -> AsyncOpenAI:
+    """获取共享的 AsyncOpenAI 客户端（与当前事件循环绑定，事件循环变化时重建）"""
+    _refresh_env_if_changed()
+    key = (provider, base_url or "", api_key)
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        cached = _async_clients.get(key)
+        if cached and cached[1] is loop and not cached[0].is_closed():
+            return cached[0]
+        _discard_stale(provider, key)
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=settings.AI_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(limits=_http_limits()),
+        )
+        _async_clients[key] = (client, loop)
+        return client
+
+
+def invalidate_clients(provider: Optional[str] = None):
+    """丢弃并关闭缓存的客户端（provider 为空时全部清除），配置变更后调用"""
+    with _clients_lock:
+        for key in [k for k in _sync_clients if provider is None or k[0] == provider]:
+            _close_sync(_sync_clients.pop(key))
+        for key in [k for k in _async_clients if provider is None or k[0] == provider]:
+            _close_async(*_async_clients.pop(key))
+
+
+async def aclose_clients():
+    """关闭全部客户端（应用关闭时调用）"""
+    with _clients_lock:
+        sync_clients = list(_sync_clients.values())
+        async_clients = list(_async_clients.values())
+        _sync_clients.clear()
+        _async_clients.clear()
+    for client in sync_clients:
+        _close_sync(client)
+    loop = asyncio.get_running_loop()
+    for client, client_loop in async_clients:
+        if client_loop is loop:
+            await client.close()
+
+
 def get_provider_config():
     """获取当前配置的模型提供商（默认：DeepSeek）"""
     # 优先使用环境变量，如果没有则默认使用 deepseek
@@ -167,11 +297,8 @@ def ask_gpt(prompt: str, provider: Optional[str] = None) -> tuple[bool, str, str
         print(f"[DEBUG] Base URL: {base_url}")
         print(f"[DEBUG] Model: {model}")
         
-        # 创建 OpenAI 客户端（兼容OpenAI格式的API）
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        # 获取共享的 OpenAI 客户端（兼容OpenAI格式的API）
+        client = get_openai_client(provider, base_url, api_key)
         
         # 调用 AI 模型
         response = client.chat.completions.create(
@@ -215,27 +342,18 @@ async def ask_gpt_stream(prompt: str, provider: Optional[str] = None, history: O
     """
     try:
         # 如果未指定provider，使用配置文件中的默认值
-        import sys
-        sys.stdout.write(f"\n[AI调用] ========== ask_gpt_stream 开始 ==========\n")
-        sys.stdout.write(f"[AI调用] provider参数: {provider}\n")
-        sys.stdout.write(f"[AI调用] history参数: {len(history) if history else 0}条消息\n")
-        sys.stdout.flush()
         if provider is None:
             provider = get_provider_config()
-            print(f"[DEBUG] 未指定provider，使用默认值: {provider}", flush=True)
         elif provider not in SUPPORTED_PROVIDERS:
-            print(f"[WARNING] 不支持的模型提供商: {provider}，使用默认值", flush=True)
+            logger.warning(f"不支持的模型提供商: {provider}，使用默认值")
             provider = get_provider_config()
         
-        sys.stdout.write(f"[AI调用] 最终使用的provider: {provider}\n")
-        sys.stdout.flush()
         config = get_api_config(provider)
         
         api_key = config.get("api_key")
         if not api_key:
             error_msg = f"错误：未配置 {provider.upper()}_API_KEY，请在 .env 文件中设置。当前尝试使用的模型: {provider}"
-            print(f"[ERROR] {error_msg}", flush=True)
-            print(f"[ERROR] 检查的环境变量: {provider.upper()}_API_KEY = {os.getenv(f'{provider.upper()}_API_KEY')}", flush=True)
+            logger.error(error_msg)
             yield {
                 "type": "error",
                 "content": error_msg,
@@ -247,13 +365,8 @@ async def ask_gpt_stream(prompt: str, provider: Optional[str] = None, history: O
         model = config.get("model")
         provider_name = config.get("provider_name", provider)
         
-        print(f"[DEBUG] 调用模型 - Provider: {provider_name}, Base URL: {base_url}, Model: {model}", flush=True)
-        
-        # 创建 OpenAI 客户端
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        # 获取共享的 AsyncOpenAI 客户端
+        client = get_async_openai_client(provider, base_url, api_key)
         
         # 构建消息列表（包含对话历史）
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -286,79 +399,21 @@ async def ask_gpt_stream(prompt: str, provider: Optional[str] = None, history: O
         # 添加当前用户消息
         messages.append({"role": "user", "content": prompt})
         
-        sys.stdout.write(f"\n[消息构建] ========== 构建消息列表 ==========\n")
-        sys.stdout.write(f"[消息构建] Provider: {provider_name}, Model: {model}\n")
-        sys.stdout.write(f"[消息构建] 消息列表长度: {len(messages)} (包含{len(history) if history else 0}条历史消息)\n")
-        
-        if history:
-            sys.stdout.write(f"[消息构建] 收到的历史消息详情:\n")
-            for i, msg in enumerate(history[:5]):  # 只打印前5条
-                if isinstance(msg, dict):
-                    role = msg.get('role', 'unknown')
-                    content = str(msg.get('content', ''))[:50]
-                else:
-                    role = getattr(msg, 'role', 'unknown')
-                    content = str(getattr(msg, 'content', ''))[:50]
-                sys.stdout.write(f"  [{i+1}] {role}: {content}...\n")
-        
-        sys.stdout.write(f"[消息构建] 完整消息列表（将发送给AI）:\n")
-        for i, msg in enumerate(messages):
-            role_icon = "👤" if msg['role'] == 'user' else "🤖" if msg['role'] == 'assistant' else "⚙️"
-            sys.stdout.write(f"  {role_icon} [{i+1}] {msg['role']}: {msg['content'][:80]}...\n")
-        sys.stdout.write(f"[消息构建] ====================================\n\n")
-        sys.stdout.flush()
-        
-        # 写入日志文件（记录消息构建详情）
-        try:
-            import logging
-            app_logger = logging.getLogger("zhixueban")
-            if app_logger.handlers:
-                app_logger.info(f"[消息构建] Provider: {provider_name}, Model: {model}, 消息列表长度: {len(messages)} (包含{len(history) if history else 0}条历史消息)")
-                # 记录前3条历史消息的摘要
-                if history and len(history) > 0:
-                    history_summary = []
-                    for i, msg in enumerate(history[:3]):
-                        if isinstance(msg, dict):
-                            role = msg.get('role', 'unknown')
-                            content = str(msg.get('content', ''))[:50]
-                        else:
-                            role = getattr(msg, 'role', 'unknown')
-                            content = str(getattr(msg, 'content', ''))[:50]
-                        history_summary.append(f"{role}:{content}...")
-                    app_logger.info(f"[消息构建] 历史消息摘要: {', '.join(history_summary)}")
-                # 强制刷新文件
-                for handler in app_logger.handlers:
-                    if isinstance(handler, logging.FileHandler):
-                        handler.flush()
-        except Exception as log_err:
-            sys.stdout.write(f"[WARNING] 写入日志失败: {log_err}\n")
-            sys.stdout.flush()
+        logger.debug(
+            "[消息构建] Provider: %s, Model: %s, 消息列表长度: %s (包含%s条历史消息)",
+            provider_name, model, len(messages), len(history) if history else 0
+        )
         
         try:
-            stream = client.chat.completions.create(
+            stream = await client.chat.completions.create(
                 model=model,
                 messages=messages,  # 确保这里使用的是包含历史的完整消息列表
                 max_tokens=2000,
                 temperature=0.7,
                 stream=True
             )
-            sys.stdout.write(f"[AI调用] ✅ API调用成功，开始流式返回（消息数: {len(messages)}）\n")
-            sys.stdout.flush()
-            
-            # 记录API调用成功
-            try:
-                import logging
-                app_logger = logging.getLogger("zhixueban")
-                if app_logger.handlers:
-                    app_logger.info(f"[AI调用] ✅ API调用成功 - Provider: {provider_name}, Model: {model}, 消息数: {len(messages)}")
-                    for handler in app_logger.handlers:
-                        if isinstance(handler, logging.FileHandler):
-                            handler.flush()
-            except:
-                pass
         except Exception as e:
-            error_msg = f"API调用失败 - Provider: {provider_name}, Error: {str(e)}"
-            print(f"[ERROR] {error_msg}", flush=True)
+            logger.error(f"API调用失败 - Provider: {provider_name}, Error: {str(e)}")
             yield {
                 "type": "error",
                 "content": f"调用{provider_name} API失败: {str(e)}",
@@ -366,28 +421,22 @@ async def ask_gpt_stream(prompt: str, provider: Optional[str] = None, history: O
             }
             return
         
-        # 用于累积完整文本以便清理签名
-        full_content = ""
-        
-        # 逐块返回内容
-        for chunk in stream:
+        # 逐块返回内容（异步迭代，等待下一块时不阻塞事件循环）
+        async for chunk in stream:
             if chunk.choices and len(chunk.choices) > 0:
                 delta = chunk.choices[0].delta
                 if delta and delta.content:
-                    content = delta.content
-                    full_content += content
                     yield {
                         "type": "content",
-                        "content": content,
+                        "content": delta.content,
                         "provider": provider_name
                     }
         
-        # 流式输出完成后，清理完整内容的签名（可选，因为已经逐块发送）
-        # 这里我们主要依赖system prompt来避免模型自报家门
+        # 这里主要依赖system prompt来避免模型自报家门，流式内容不再做签名清理
         
     except Exception as e:
         error_msg = f"调用 AI 接口失败：{str(e)}"
-        print(f"[DEBUG] AI Stream Error: {type(e).__name__}: {e}")
+        logger.error(f"AI Stream Error: {type(e).__name__}: {e}")
         provider = get_provider_config()
         config = get_api_config(provider)
         provider_name = config.get("provider_name", provider)
@@ -4,13 +4,16 @@
 目的：支持试卷导出为PDF/Word格式
 """
 import os
-import platform
 import re
-import tempfile
-import base64
+import io
 from typing import Dict, List, Any, Tuple, Optional
 from datetime import datetime
 from core.logger import logger
+from utils.font_registry import font_registry
+from utils.formula_renderer import formula_renderer, normalize_formula
+
+# 导出版式变化时递增，使已缓存的导出文件失效
+EXPORTER_VERSION = 1
 
 # 尝试导入reportlab（PDF导出）
 try:
@@ -19,8 +22,6 @@ try:
     from reportlab.lib.units import cm
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
     from reportlab.lib import colors
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
     REPORTLAB_AVAILABLE = True
 except ImportError:
     REPORTLAB_AVAILABLE = False
@@ -57,142 +58,123 @@ except Exception as e:
         DOCX_ERROR_MSG = f"python-docx导入失败: {e}。如果安装了错误的docx包，请运行: pip uninstall docx && pip install python-docx"
     logger.warning(DOCX_ERROR_MSG)
 
-# 全局字体注册标志
-_registered_font_name = None
-
 
 class PaperExporter:
     """试卷导出类"""
     
     @staticmethod
-    def _render_latex_to_image(latex_formula: str, output_path: Optional[str] = None) -> Optional[str]:
+    def _render_latex_to_image(latex_formula: str) -> Optional[bytes]:
         """
-        将LaTeX公式渲染为图片
+        将LaTeX公式渲染为PNG图片（按公式内容缓存，同一公式只渲染一次）
         
         Args:
             latex_formula: LaTeX公式字符串
-            output_path: 输出图片路径（可选，如果不提供则创建临时文件）
             
         Returns:
-            str: 图片文件路径，如果渲染失败返回None
+            bytes: PNG图片内容，如果渲染失败返回None
         """
-        try:
-            import matplotlib
-            matplotlib.use('Agg')  # 使用非交互式后端
-            import matplotlib.pyplot as plt
-            from matplotlib import mathtext
-            
-            # 清理LaTeX公式
-            latex_formula = latex_formula.strip()
-            # 移除可能存在的$符号
-            if latex_formula.startswith('$') and latex_formula.endswith('$'):
-                latex_formula = latex_formula[1:-1]
-            elif latex_formula.startswith('$$') and latex_formula.endswith('$$'):
-                latex_formula = latex_formula[2:-2]
-            
-            # 创建临时文件（如果没有提供路径）
-            if not output_path:
-                temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-                output_path = temp_file.name
-                temp_file.close()
-            
-            # 创建图形
-            fig, ax = plt.subplots(figsize=(8, 2))
-            ax.axis('off')
-            
-            # 渲染LaTeX公式
+        return formula_renderer.render(latex_formula)
+    
+    @staticmethod
+    def _find_latex_spans(text: str) -> List[Tuple[int, int, str]]:
+        """
+        找出文本中的LaTeX公式：$...$、$$...$$、\\(...\\)、\\[...\\]
+        
+        Returns:
+            List[Tuple[int, int, str]]: [(起始位置, 结束位置, 公式内容)]，按位置排序且互不重叠
+        """
+        patterns = [
+            (r'\$\$([^$]+)\$\$', True),  # 块级公式 $$...$$
+            (r'\$([^$]+)\$', True),      # 行内公式 $...$
+            (r'\\\[([^\]]+)\\\]', True), # 块级公式 \[...\]
+            (r'\\\(([^\)]+)\\\)', True), # 行内公式 \(...\)
+        ]
+        
+        # 找到所有匹配的LaTeX公式
+        matches = []
+        for pattern, is_math in patterns:
+            for match in re.finditer(pattern, text):
+                matches.append((match.start(), match.end(), match.group(1), is_math))
+        
+        # 按位置排序
+        matches.sort(key=lambda x: x[0])
+        
+        # 处理重叠的匹配（保留最长的）
+        filtered_matches = []
+        for i, (start, end, content, is_math) in enumerate(matches):
+            # 检查是否与已有匹配重叠
+            overlap = False
+            for prev_start, prev_end, _, _ in filtered_matches:
+                if not (end <= prev_start or start >= prev_end):
+                    overlap = True
+                    # 如果当前匹配更长，替换之前的
+                    if end - start > prev_end - prev_start:
+                        filtered_matches = [(s, e, c, m) for s, e, c, m in filtered_matches 
+                                          if not (s == prev_start and e == prev_end)]
+                        overlap = False
+                    break
+            if not overlap:
+                filtered_matches.append((start, end, content, is_math))
+        
+        # 按位置重新排序
+        filtered_matches.sort(key=lambda x: x[0])
+        return [(start, end, content) for start, end, content, _ in filtered_matches]
+    
+    @staticmethod
+    def _collect_formulas(paper_data: Dict[str, Any]) -> List[str]:
+        """收集试卷题目、选项和答案中的全部公式，用于一次批量渲染"""
+        texts = []
+        for q in paper_data.get("questions", []) or []:
+            texts.append(str(q.get('question', '') or ''))
+            if q.get('type') == 'choice':
+                texts.extend(str(opt) for opt in q.get('options', []) or [] if opt is not None)
+        for entry in (paper_data.get("answer_key") or {}).values():
+            if isinstance(entry, dict) and entry.get("answer") is not None:
+                texts.append(str(entry["answer"]))
+        formulas = []
+        for text in texts:
             try:
-                # 尝试使用matplotlib的数学文本渲染器（不需要系统LaTeX）
-                ax.text(0.5, 0.5, f'${latex_formula}$', 
-                       fontsize=16, ha='center', va='center',
-                       transform=ax.transAxes,
-                       usetex=False)  # 不使用系统LaTeX，使用matplotlib内置渲染器
-            except Exception as e:
-                logger.warning(f"LaTeX渲染失败，尝试使用文本模式: {e}")
-                # 如果LaTeX渲染失败，使用文本模式
-                ax.text(0.5, 0.5, latex_formula,
-                       fontsize=16, ha='center', va='center',
-                       transform=ax.transAxes)
-            
-            # 保存图片
-            plt.savefig(output_path, bbox_inches='tight', dpi=150, 
-                       facecolor='white', edgecolor='none', pad_inches=0.1)
-            plt.close(fig)
-            
-            return output_path
-        except ImportError:
-            logger.warning("matplotlib未安装，无法渲染LaTeX公式为图片")
-            return None
-        except Exception as e:
-            logger.warning(f"LaTeX公式渲染失败: {e}")
-            return None
+                formulas.extend(content for _, _, content in PaperExporter._find_latex_spans(text))
+            except Exception:  # pylint: disable=broad-except
+                continue
+        return formulas
     
     @staticmethod
-    def _convert_latex_to_word_math(text: str) -> List[Tuple[str, bool, Optional[str]]]:
+    def _convert_latex_to_word_math(
+        text: str, images: Optional[Dict[str, Optional[bytes]]] = None
+    ) -> List[Tuple[str, bool, Optional[bytes]]]:
         """
         将包含LaTeX公式的文本转换为Word可用的格式
-        返回一个列表，每个元素是(文本片段, 是否为LaTeX公式)
+        返回一个列表，每个元素是(文本片段, 是否为LaTeX公式, 公式图片)
         
         Args:
             text: 包含LaTeX公式的文本
+            images: 已批量渲染的公式图片 {公式: PNG字节}，未包含的公式单独渲染
             
         Returns:
-            List[Tuple[str, bool, Optional[str]]]: [(文本片段, 是否为LaTeX, 图片路径)]
+            List[Tuple[str, bool, Optional[bytes]]]: [(文本片段, 是否为LaTeX, PNG图片)]
         """
         if not text:
             return [("", False, None)]
         
         try:
-            # 匹配LaTeX公式的模式：$...$、\(...\)、\[...\]
-            patterns = [
-                (r'\$\$([^$]+)\$\$', True),  # 块级公式 $$...$$
-                (r'\$([^$]+)\$', True),      # 行内公式 $...$
-                (r'\\\[([^\]]+)\\\]', True), # 块级公式 \[...\]
-                (r'\\\(([^\)]+)\\\)', True), # 行内公式 \(...\)
-            ]
-            
             result = []
             last_pos = 0
             
-            # 找到所有匹配的LaTeX公式
-            matches = []
-            for pattern, is_math in patterns:
-                for match in re.finditer(pattern, text):
-                    matches.append((match.start(), match.end(), match.group(1), is_math))
-            
-            # 按位置排序
-            matches.sort(key=lambda x: x[0])
-            
-            # 处理重叠的匹配（保留最长的）
-            filtered_matches = []
-            for i, (start, end, content, is_math) in enumerate(matches):
-                # 检查是否与已有匹配重叠
-                overlap = False
-                for prev_start, prev_end, _, _ in filtered_matches:
-                    if not (end <= prev_start or start >= prev_end):
-                        overlap = True
-                        # 如果当前匹配更长，替换之前的
-                        if end - start > prev_end - prev_start:
-                            filtered_matches = [(s, e, c, m) for s, e, c, m in filtered_matches 
-                                              if not (s == prev_start and e == prev_end)]
-                            overlap = False
-                        break
-                if not overlap:
-                    filtered_matches.append((start, end, content, is_math))
-            
-            # 按位置重新排序
-            filtered_matches.sort(key=lambda x: x[0])
-            
             # 构建结果列表
-            for start, end, content, is_math in filtered_matches:
+            for start, end, content in PaperExporter._find_latex_spans(text):
                 # 添加公式前的普通文本
                 if start > last_pos:
                     result.append((text[last_pos:start], False, None))
                 # 尝试将LaTeX公式渲染为图片
-                image_path = PaperExporter._render_latex_to_image(content.strip())
-                if image_path:
+                formula = normalize_formula(content)
+                if images is not None and formula in images:
+                    image = images[formula]
+                else:
+                    image = PaperExporter._render_latex_to_image(formula)
+                if image:
                     # 如果渲染成功，使用图片
-                    result.append((content.strip(), True, image_path))
+                    result.append((content.strip(), True, image))
                 else:
                     # 如果渲染失败，转换为简单的数学表示
                     math_text = content.strip()
@@ -223,74 +205,32 @@ class PaperExporter:
             return [(text, False, None)]
     
     @staticmethod
-    def _register_chinese_font():
-        """注册中文字体"""
-        global _registered_font_name
-        
-        if _registered_font_name and _registered_font_name in pdfmetrics.getRegisteredFontNames():
-            return _registered_font_name
-        
-        system = platform.system()
-        font_paths = []
-        
-        if system == "Windows":
-            font_paths = [
-                ("SimHei", "C:/Windows/Fonts/simhei.ttf"),  # 黑体
-                ("SimSun", "C:/Windows/Fonts/simsun.ttc"),  # 宋体
-                ("SimKai", "C:/Windows/Fonts/simkai.ttf"),  # 楷体
-                ("Microsoft YaHei", "C:/Windows/Fonts/msyh.ttc"),  # 微软雅黑
-            ]
-        elif system == "Darwin":  # macOS
-            font_paths = [
-                ("STHeiti", "/System/Library/Fonts/STHeiti Light.ttc"),
-                ("PingFang SC", "/System/Library/Fonts/PingFang.ttc"),
-            ]
-        else:  # Linux
-            font_paths = [
-                ("WenQuanYi Micro Hei", "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc"),
-                ("WenQuanYi Zen Hei", "/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc"),
-            ]
-        
-        registered_font = None
-        
-        # 尝试注册系统字体
-        for font_name, font_path in font_paths:
-            if os.path.exists(font_path):
+    def _add_text_with_math(paragraph, text: str, images: Dict[str, Optional[bytes]], width_inches: float) -> None:
+        """向Word段落写入文本，公式插入渲染好的图片，渲染失败时用斜体文本"""
+        from docx.shared import Inches
+        for part_text, is_math, image in PaperExporter._convert_latex_to_word_math(text, images):
+            if is_math and image:
+                # LaTeX公式：插入渲染的图片（内存中的PNG，不产生临时文件）
                 try:
-                    if font_path.lower().endswith('.ttc'):
-                        # TTC文件是字体集合，尝试直接加载
-                        font = TTFont(font_name, font_path)
-                        pdfmetrics.registerFont(font)
-                        registered_font = font_name
-                        logger.info(f"✅ 成功注册中文字体: {font_name}")
-                        break
-                    else:
-                        # TTF文件直接注册
-                        font = TTFont(font_name, font_path)
-                        pdfmetrics.registerFont(font)
-                        registered_font = font_name
-                        logger.info(f"✅ 成功注册中文字体: {font_name}")
-                        break
+                    paragraph.add_run(" ")  # 添加空格
+                    run = paragraph.add_run()
+                    run.add_picture(io.BytesIO(image), width=Inches(width_inches))
+                    paragraph.add_run(" ")  # 添加空格
                 except Exception as e:
-                    logger.debug(f"注册字体失败 {font_name}: {e}")
-                    continue
-        
-        # 如果没有找到系统字体，尝试使用reportlab内置的CID字体
-        if not registered_font:
-            try:
-                from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-                pdfmetrics.registerFont(UnicodeCIDFont("STSong-Light"))
-                registered_font = "STSong-Light"
-                logger.info("✅ 使用ReportLab内置中文字体: STSong-Light")
-            except Exception as e:
-                logger.warning(f"无法注册CID字体: {e}")
-                registered_font = "Helvetica"  # 回退到默认字体
-        
-        if not registered_font:
-            registered_font = "Helvetica"
-        
-        _registered_font_name = registered_font
-        return registered_font
+                    logger.warning(f"插入公式图片失败，使用文本: {e}")
+                    run = paragraph.add_run(f" {part_text} ")
+                    run.italic = True
+            elif is_math:
+                # LaTeX公式：使用斜体显示
+                run = paragraph.add_run(f" {part_text} ")
+                run.italic = True
+            else:
+                paragraph.add_run(part_text)
+    
+    @staticmethod
+    def _register_chinese_font():
+        """注册中文字体（由进程级字体注册表加载一次后复用）"""
+        return font_registry.get_cjk_font()
     
     @staticmethod
     def export_to_pdf(paper_data: Dict[str, Any], output_path: str) -> str:
@@ -444,6 +384,9 @@ class PaperExporter:
             except ImportError as e:
                 raise ValueError(f"python-docx库导入失败: {e}。请运行: pip uninstall docx && pip install python-docx")
             
+            # 一次批量渲染整份试卷的公式（重复公式只渲染一次，已缓存的直接复用）
+            formula_images = formula_renderer.render_many(PaperExporter._collect_formulas(paper_data))
+            
             # 创建Word文档
             doc = Document()
             
@@ -480,31 +423,7 @@ class PaperExporter:
                 
                 # 处理题目文本，支持LaTeX公式
                 question_text = q.get('question', '') or ''
-                text_parts = PaperExporter._convert_latex_to_word_math(str(question_text))
-                for part_text, is_math, image_path in text_parts:
-                    if is_math and image_path:
-                        # LaTeX公式：插入渲染的图片
-                        try:
-                            from docx.shared import Inches
-                            question_para.add_run(" ")  # 添加空格
-                            run = question_para.add_run()
-                            run.add_picture(image_path, width=Inches(2))
-                            question_para.add_run(" ")  # 添加空格
-                            # 删除临时图片文件
-                            try:
-                                os.unlink(image_path)
-                            except:
-                                pass
-                        except Exception as e:
-                            logger.warning(f"插入公式图片失败，使用文本: {e}")
-                            run = question_para.add_run(f" {part_text} ")
-                            run.italic = True
-                    elif is_math:
-                        # LaTeX公式：使用斜体显示
-                        run = question_para.add_run(f" {part_text} ")
-                        run.italic = True
-                    else:
-                        question_para.add_run(part_text)
+                PaperExporter._add_text_with_math(question_para, str(question_text), formula_images, 2)
                 
                 if q.get('type') == 'choice':
                     question_para.add_run(f"（{q.get('points', 5)}分）").italic = True
@@ -515,30 +434,7 @@ class PaperExporter:
                         opt_para = doc.add_paragraph(style='List Bullet')
                         # 处理选项文本，支持LaTeX公式
                         opt_text = str(opt) if opt is not None else ''
-                        opt_parts = PaperExporter._convert_latex_to_word_math(opt_text)
-                        for part_text, is_math, image_path in opt_parts:
-                            if is_math and image_path:
-                                # LaTeX公式：插入渲染的图片
-                                try:
-                                    from docx.shared import Inches
-                                    opt_para.add_run(" ")
-                                    run = opt_para.add_run()
-                                    run.add_picture(image_path, width=Inches(1.5))
-                                    opt_para.add_run(" ")
-                                    # 删除临时图片文件
-                                    try:
-                                        os.unlink(image_path)
-                                    except:
-                                        pass
-                                except Exception as e:
-                                    logger.warning(f"插入公式图片失败，使用文本: {e}")
-                                    run = opt_para.add_run(f" {part_text} ")
-                                    run.italic = True
-                            elif is_math:
-                                run = opt_para.add_run(f" {part_text} ")
-                                run.italic = True
-                            else:
-                                opt_para.add_run(part_text)
+                        PaperExporter._add_text_with_math(opt_para, opt_text, formula_images, 1.5)
                 
                 doc.add_paragraph()  # 空行
             
@@ -554,30 +450,7 @@ class PaperExporter:
                     answer_para = doc.add_paragraph()
                     answer_para.add_run(f"{i}. ").bold = True
                     # 处理答案文本，支持LaTeX公式
-                    answer_parts = PaperExporter._convert_latex_to_word_math(answer)
-                    for part_text, is_math, image_path in answer_parts:
-                        if is_math and image_path:
-                            # LaTeX公式：插入渲染的图片
-                            try:
-                                from docx.shared import Inches
-                                answer_para.add_run(" ")
-                                run = answer_para.add_run()
-                                run.add_picture(image_path, width=Inches(1.5))
-                                answer_para.add_run(" ")
-                                # 删除临时图片文件
-                                try:
-                                    os.unlink(image_path)
-                                except:
-                                    pass
-                            except Exception as e:
-                                logger.warning(f"插入公式图片失败，使用文本: {e}")
-                                run = answer_para.add_run(f" {part_text} ")
-                                run.italic = True
-                        elif is_math:
-                            run = answer_para.add_run(f" {part_text} ")
-                            run.italic = True
-                        else:
-                            answer_para.add_run(part_text)
+                    PaperExporter._add_text_with_math(answer_para, answer, formula_images, 1.5)
             
             # 保存文档
             doc.save(output_path)
@@ -5,8 +5,7 @@ AI学习计划生成器
 import json
 import re
 from typing import Optional, List, Dict
-from utils.openai_client import get_provider_config, get_api_config
-from openai import OpenAI
+from utils.openai_client import get_provider_config, get_api_config, get_openai_client
 import os
 from dotenv import load_dotenv
 
@@ -84,11 +83,8 @@ def generate_study_plan(user_id: int, goals: str = "", file_text: Optional[str]
         model = config.get("model")
         provider_name = config.get("provider_name", provider)
         
-        # 创建 OpenAI 客户端
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        # 获取共享的 OpenAI 客户端
+        client = get_openai_client(provider, base_url, api_key)
         
         # 调用 AI 模型（使用自定义system prompt）
         response = client.chat.completions.create(
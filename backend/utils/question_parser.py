@@ -0,0 +1,290 @@
+"""
+题目增量解析器
+作者：智学伴开发团队
+目的：单遍扫描AI输出（完整文本或流式token），每个题目对象的右花括号一到即产出题目
+     容错：代码块标记、说明文字、截断、字符串内未转义的控制字符、字符串数组格式
+测试：pytest backend/tests/test_question_parser.py
+"""
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+# 字符串外需要关注的结构字符
+_STRUCT_SPECIAL = re.compile(r'[{}\[\]",:]')
+# 字符串内需要关注的字符：结束引号、转义符、控制字符
+_STRING_SPECIAL = re.compile(r'["\\\x00-\x1f]')
+# 修复 {"a": 1,} / [1, 2,] 这类多余逗号
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+# 修复 LaTeX 等内容中的非法转义（如 \d、\s）
+_ESCAPE_PAIR = re.compile(r'\\(.)', re.DOTALL)
+
+# 字符串内出现裸换行且其后紧跟 "key": 或右括号时，视为字符串未闭合（如 "difficulty": "med 被截断）
+_UNCLOSED_STRING_END = re.compile(r'\s*(?:"[A-Za-z_]\w*"\s*:|[}\]])')
+# 换行后的内容还不足以判断（流式输入时需要等待下一块）
+_UNDECIDED_TAIL = re.compile(r'\s*(?:"[A-Za-z_]?\w*"?\s*)?')
+
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_VALID_DIFFICULTIES = ("easy", "medium", "hard")
+
+
+def _fix_escape(match: re.Match) -> str:
+    pair = match.group(0)
+    return pair if match.group(1) in '\\/"bfnrtu' else "\\" + pair
+
+
+def normalize_question(obj: Any) -> Optional[Dict[str, Any]]:
+    """校验并补全题目字段，不是题目时返回 None"""
+    if not isinstance(obj, dict) or "question" not in obj or "answer" not in obj:
+        return None
+    # 确保有type字段
+    if "type" not in obj:
+        obj["type"] = "choice" if "options" in obj else "fill"
+    # 确保difficulty是有效值（兼容被截断的 "ea" / "med" 等写法）
+    difficulty = str(obj.get("difficulty") or "").strip().lower()
+    if difficulty not in _VALID_DIFFICULTIES:
+        for valid in _VALID_DIFFICULTIES:
+            if difficulty and valid.startswith(difficulty[:2]):
+                difficulty = valid
+                break
+        else:
+            difficulty = "medium"
+    obj["difficulty"] = difficulty
+    return obj
+
+
+class _Frame:
+    """解析栈中的一个容器（对象或数组）"""
+    __slots__ = ("kind", "start", "expect_key", "has_question")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.expect_key = kind == "{"
+        self.has_question = False
+
+
+class IncrementalQuestionParser:
+    """
+    增量题目解析器（小型状态机）
+
+    用法：
+        parser = IncrementalQuestionParser()
+        for chunk in chunks:
+            for question in parser.feed(chunk):
+                ...
+        parser.close()
+
+    只有直接包含 "question" 键的对象才会被 json.loads，外层 {"questions": [...]} 不会被整体解析，
+    因此每个字符只扫描一次、每道题只解析一次
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []  # 规范化后的文本片段（字符串内控制字符已转义）
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_parts: List[str] = []  # 当前字符串（含引号）的片段
+        self._pending = ""  # 等待下一块才能判断的尾部文本
+        self.questions: List[Dict[str, Any]] = []
+
+    def _append(self, text: str):
+        self._buffer.append(text)
+        if self._in_string:
+            self._string_parts.append(text)
+
+    def feed(self, chunk: str, final: bool = False) -> List[Dict[str, Any]]:
+        """输入一段文本，返回本次新解析出的题目（final=True 表示这是最后一块）"""
+        emitted: List[Dict[str, Any]] = []
+        if self._pending:
+            chunk = self._pending + (chunk or "")
+            self._pending = ""
+        if not chunk:
+            return emitted
+        pos = 0
+        length = len(chunk)
+        while pos < length:
+            if self._in_string:
+                if self._escape:
+                    self._append(chunk[pos])
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if not match:
+                    self._append(chunk[pos:])
+                    break
+                idx = match.start()
+                if idx > pos:
+                    self._append(chunk[pos:idx])
+                char = chunk[idx]
+                pos = idx + 1
+                if char == "\\":
+                    self._append(char)
+                    self._escape = True
+                elif char == '"':
+                    self._append(char)
+                    self._in_string = False
+                    self._on_string_end("".join(self._string_parts), emitted)
+                elif char == "\n" and _UNCLOSED_STRING_END.match(chunk, pos):
+                    # 字符串未闭合：补上引号（下一个是键时再补逗号），换行之后按结构继续解析
+                    self._append('"')
+                    self._in_string = False
+                    self._on_string_end("".join(self._string_parts), emitted)
+                    if _UNCLOSED_STRING_END.match(chunk, pos).group(0).rstrip().endswith(":"):
+                        self._on_struct_char(",", emitted)
+                    pos = idx
+                elif char == "\n" and not final and _UNDECIDED_TAIL.fullmatch(chunk, pos):
+                    self._pending = chunk[idx:]
+                    break
+                else:
+                    # 字符串内未转义的控制字符
+                    self._append(_CONTROL_ESCAPES.get(char, "\\u%04x" % ord(char)))
+                continue
+
+            if not self._stack:
+                # 容器外：跳过说明文字和代码块标记，直到第一个 { 或 [
+                brace = chunk.find("{", pos)
+                bracket = chunk.find("[", pos)
+                candidates = [i for i in (brace, bracket) if i != -1]
+                if not candidates:
+                    break
+                pos = min(candidates)
+                self._buffer = []
+
+            match = _STRUCT_SPECIAL.search(chunk, pos)
+            if not match:
+                self._append(chunk[pos:])
+                break
+            idx = match.start()
+            if idx > pos:
+                self._append(chunk[pos:idx])
+            char = chunk[idx]
+            pos = idx + 1
+            self._on_struct_char(char, emitted)
+        self.questions.extend(emitted)
+        return emitted
+
+    def _on_struct_char(self, char: str, emitted: List[Dict[str, Any]]):
+        offset = len(self._buffer)
+        top = self._stack[-1] if self._stack else None
+        if char == '"':
+            self._in_string = True
+            self._string_parts = []
+        self._append(char)
+        if char in "{[":
+            self._stack.append(_Frame(char, offset))
+        if char == "}":
+            if top is None or top.kind != "{":
+                return  # 多余的右括号，忽略
+            self._stack.pop()
+            if top.has_question:
+                question = self._load_object("".join(self._buffer[top.start:]))
+                if question is not None:
+                    emitted.append(question)
+        elif char == "]":
+            if top is not None and top.kind == "[":
+                self._stack.pop()
+        elif char == ":":
+            if top is not None and top.kind == "{":
+                top.expect_key = False
+        elif char == ",":
+            if top is not None and top.kind == "{":
+                top.expect_key = True
+
+    def _on_string_end(self, raw: str, emitted: List[Dict[str, Any]]):
+        top = self._stack[-1] if self._stack else None
+        if top is None:
+            return
+        if top.kind == "{":
+            if top.expect_key and raw == '"question"':
+                top.has_question = True
+            return
+        # 字符串数组格式：["{\"question\": ...}", ...]
+        if raw[1:].lstrip().startswith("{"):
+            try:
+                inner = json.loads(raw)
+            except (json.JSONDecodeError, ValueError):
+                return
+            emitted.extend(parse_questions(inner))
+
+    @staticmethod
+    def _load_object(obj_str: str) -> Optional[Dict[str, Any]]:
+        try:
+            obj = json.loads(obj_str)
+        except (json.JSONDecodeError, ValueError):
+            repaired = _ESCAPE_PAIR.sub(_fix_escape, _TRAILING_COMMA.sub(r"\1", obj_str))
+            try:
+                obj = json.loads(repaired)
+            except (json.JSONDecodeError, ValueError):
+                return None
+        return normalize_question(obj)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """输入结束：丢弃被截断的不完整对象，返回全部已解析题目"""
+        if self._pending:
+            self.feed("", final=True)
+        self._stack.clear()
+        self._buffer = []
+        self._string_parts = []
+        self._in_string = False
+        self._escape = False
+        return self.questions
+
+
+def _parse_well_formed(text: str) -> List[Dict[str, Any]]:
+    """快速路径：格式正确时直接整体 json.loads（C实现，远快于逐字符扫描）"""
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    end = max(text.rfind("}"), text.rfind("]"))
+    if start == -1 or end <= start:
+        return []
+    try:
+        data = json.loads(text[start:end + 1])
+    except (json.JSONDecodeError, ValueError):
+        return []
+    if isinstance(data, dict):
+        items = [data] if "question" in data else data.get("questions")
+    else:
+        items = data
+    if not isinstance(items, list):
+        return []
+    questions = []
+    for item in items:
+        if isinstance(item, str):
+            questions.extend(parse_questions(item))
+            continue
+        question = normalize_question(item)
+        if question is not None:
+            questions.append(question)
+    return questions
+
+
+def parse_questions(text: str) -> List[Dict[str, Any]]:
+    """解析完整文本中的所有题目"""
+    if not text:
+        return []
+    questions = _parse_well_formed(text)
+    if questions:
+        return questions
+    parser = IncrementalQuestionParser()
+    parser.feed(text, final=True)
+    return parser.close()
+
+
+def iter_questions(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """从同步token流中逐题产出"""
+    parser = IncrementalQuestionParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.feed("", final=True)
+    parser.close()
+
+
+async def aiter_questions(chunks: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """从异步token流中逐题产出"""
+    parser = IncrementalQuestionParser()
+    async for chunk in chunks:
+        for question in parser.feed(chunk):
+            yield question
+    for question in parser.feed("", final=True):
+        yield question
+    parser.close()
@@ -8,8 +8,7 @@ from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 from services.ai_service import AIService
 from core.logger import logger
-from utils.openai_client import get_provider_config, get_api_config
-from openai import OpenAI
+from utils.openai_client import get_provider_config, get_api_config, get_openai_client
 
 # 系统提示词
 QUIZ_GENERATION_PROMPT = """你是智学伴，一个AI个性化学习与测评助手，由智学伴项目团队开发。
@@ -178,7 +177,8 @@ def generate_quiz(
             system_prompt_name="quiz_generator_prompt",
             provider=provider,
             temperature=0.7,
-            max_tokens=3000
+            max_tokens=3000,
+            source="quiz"
         )
         
         # 提取返回内容
@@ -276,11 +276,8 @@ def generate_quiz_legacy(
         base_url = config.get("base_url")
         model = config.get("model")
         
-        # 创建 OpenAI 客户端
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        # 获取共享的 OpenAI 客户端
+        client = get_openai_client(provider, base_url, api_key)
         
         # 调用 AI 模型生成题目
         response = client.chat.completions.create(
@@ -366,11 +363,8 @@ def evaluate_quiz(questions: List[Dict], user_answers: List[str], provider: Opti
         model = config.get("model")
         provider_name = config.get("provider_name", provider)
         
-        # 创建 OpenAI 客户端
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        # 获取共享的 OpenAI 客户端
+        client = get_openai_client(provider, base_url, api_key)
         
         # 调用 AI 模型批改
         response = client.chat.completions.create(
@@ -0,0 +1,311 @@
+"""
+PDF学习报告后台任务
+作者：智学伴开发团队
+目的：报告在独立的工作进程池中生成，请求只负责提交任务和查询状态；输出文件以用户数据指纹
+     （测评/学习计划的条数与最新ID）为键缓存，数据未变时直接返回上次生成的PDF；
+     报告目录按最后使用时间和总大小定期清理
+环境变量：REPORT_DIR, REPORT_MAX_WORKERS, REPORT_JOB_TTL, REPORT_MAX_AGE_DAYS, REPORT_MAX_TOTAL_MB
+测试：pytest backend/tests/test_report_jobs.py
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.logger import logger
+from repositories.learner_stats_repo import LearnerStatsRepository
+
+# 报告版式变化时递增，使旧缓存失效
+REPORT_FORMAT_VERSION = 1
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_PROGRESS = {STATUS_QUEUED: 0, STATUS_RUNNING: 50, STATUS_DONE: 100, STATUS_FAILED: 100}
+
+
+def render_report(user_id: int, output_path: str) -> str:
+    """在工作进程中生成报告：先写临时文件再原子替换，其他请求不会读到写了一半的PDF"""
+    from utils.report_generator import generate_pdf_report
+
+    tmp_path = f"{output_path}.{os.getpid()}.part"
+    try:
+        generate_pdf_report(user_id, tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def _init_worker() -> None:
+    """工作进程启动时预加载中文字体，每个进程只解析一次字体文件"""
+    from utils.font_registry import font_registry
+
+    font_registry.warmup()
+
+
+def _now_iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class ReportJobManager:
+    """
+    报告任务管理器
+
+    - submit() 计算数据指纹：已有同指纹的文件时直接返回完成状态；同指纹的任务正在生成时复用该任务
+    - 生成在 spawn 方式的进程池中执行（首次提交时才创建），不占用事件循环和请求线程
+    - 任务结束后触发一次报告目录清理；已结束的任务记录保留 job_ttl 秒
+    """
+
+    def __init__(
+        self,
+        report_dir: str = "reports",
+        max_workers: int = 2,
+        job_ttl: int = 3600,
+        max_age_days: int = 7,
+        max_total_mb: int = 200,
+        executor_factory: Optional[Callable[[], Executor]] = None,
+        render: Callable[[int, str], str] = render_report,
+    ):
+        self.report_dir = report_dir
+        self.max_workers = max_workers
+        self.job_ttl = job_ttl
+        self.max_age_days = max_age_days
+        self.max_total_mb = max_total_mb
+        self._executor_factory = executor_factory
+        self._render = render
+        self._executor: Optional[Executor] = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, str] = {}  # cache_key -> job_id
+        # 已完成的 Future 添加回调时会在当前线程立即执行，需要可重入锁
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def cache_key(user_id: int, fingerprint: Dict[str, int]) -> str:
+        raw = json.dumps({"version": REPORT_FORMAT_VERSION, "user_id": user_id, **fingerprint}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    def report_path(self, user_id: int, cache_key: str) -> str:
+        return os.path.join(self.report_dir, f"report_{user_id}_{cache_key}.pdf")
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self._executor_factory is not None:
+                self._executor = self._executor_factory()
+            else:
+                # spawn：子进程不继承父进程的数据库连接、日志线程等状态
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+        return self._executor
+
+    def submit(self, db: Session, user_id: int) -> Dict[str, Any]:
+        """提交报告任务，返回任务状态"""
+        fingerprint = LearnerStatsRepository.get_report_fingerprint(db, user_id)
+        key = self.cache_key(user_id, fingerprint)
+        path = self.report_path(user_id, key)
+
+        with self._lock:
+            self._prune_jobs()
+            inflight_id = self._inflight.get(key)
+            if inflight_id is not None and not self._jobs[inflight_id]["future"].done():
+                return self._view(self._jobs[inflight_id])
+
+            job_id = uuid.uuid4().hex
+            job: Dict[str, Any] = {
+                "job_id": job_id,
+                "user_id": user_id,
+                "cache_key": key,
+                "path": path,
+                "status": STATUS_QUEUED,
+                "cached": False,
+                "error": None,
+                "created_at": time.time(),
+                "finished_at": None,
+                "future": None,
+            }
+            self._jobs[job_id] = job
+
+            if os.path.exists(path):
+                # 命中缓存：刷新修改时间，清理时按最后使用时间计算
+                os.utime(path)
+                job.update(status=STATUS_DONE, cached=True, finished_at=time.time())
+                return self._view(job)
+
+            os.makedirs(self.report_dir, exist_ok=True)
+            self._inflight[key] = job_id
+            try:
+                future = self._get_executor().submit(self._render, user_id, path)
+            except BrokenExecutor:
+                # 工作进程异常退出后进程池不可再用，重建一次
+                logger.warning("报告进程池已损坏，重新创建")
+                self._executor = None
+                future = self._get_executor().submit(self._render, user_id, path)
+            job["future"] = future
+            future.add_done_callback(lambda done, jid=job_id: self._on_done(jid, done))
+            return self._view(job)
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if self._inflight.get(job["cache_key"]) == job_id:
+                del self._inflight[job["cache_key"]]
+            job["finished_at"] = time.time()
+            job["status"] = self._status(job)
+            if job["status"] == STATUS_FAILED:
+                job["error"] = self._error(future)
+        if job["status"] == STATUS_FAILED:
+            logger.error("PDF报告生成失败: user_id=%s, %s", job["user_id"], job["error"])
+        else:
+            logger.info(
+                "PDF报告生成完成: user_id=%s, 耗时%.2fs", job["user_id"], job["finished_at"] - job["created_at"]
+            )
+        try:
+            self.collect_garbage()
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("清理报告目录失败: %s", exc)
+
+    @staticmethod
+    def _status(job: Dict[str, Any]) -> str:
+        future: Optional[Future] = job["future"]
+        if future is None:
+            return job["status"]
+        if not future.done():
+            return STATUS_RUNNING if future.running() else STATUS_QUEUED
+        if future.cancelled() or future.exception() is not None:
+            return STATUS_FAILED
+        return STATUS_DONE
+
+    @staticmethod
+    def _error(future: Future) -> str:
+        error = None if future.cancelled() else future.exception()
+        return str(error) if error else "任务已取消"
+
+    def _view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        status = self._status(job)
+        error = job["error"]
+        if status == STATUS_FAILED and error is None:
+            # 完成回调可能尚未执行
+            error = self._error(job["future"])
+        return {
+            "job_id": job["job_id"],
+            "user_id": job["user_id"],
+            "status": status,
+            "progress": _PROGRESS[status],
+            "cached": job["cached"],
+            "error": error,
+            "created_at": _now_iso(job["created_at"]),
+            "finished_at": _now_iso(job["finished_at"]),
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态，任务不存在（或已过期）时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job is not None else None
+
+    def get_file(self, job_id: str) -> Optional[str]:
+        """已完成任务的报告文件路径；未完成、失败或文件已被清理时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or self._status(job) != STATUS_DONE or not os.path.exists(job["path"]):
+            return None
+        return job["path"]
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """在事件循环中等待任务结束（最多 timeout 秒），返回最新状态"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future: Optional[Future] = job["future"]
+        if future is not None and not future.done():
+            try:
+                # shield：等待超时只放弃等待，不取消进程池中的任务
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            except Exception:  # pylint: disable=broad-except
+                pass  # 失败原因记录在任务状态中
+        return self.get(job_id)
+
+    def _prune_jobs(self) -> None:
+        """删除过期的已结束任务记录（调用方持有锁）"""
+        cutoff = time.time() - self.job_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def collect_garbage(self) -> int:
+        """
+        清理报告目录，返回删除的文件数
+
+        先删除超过 max_age_days 天未使用的报告，总大小仍超过 max_total_mb 时再按最久未用依次删除；
+        正在生成的报告不删除，<= 0 的阈值表示不按该条件清理
+        """
+        if not os.path.isdir(self.report_dir):
+            return 0
+        with self._lock:
+            protected = {self._jobs[job_id]["path"] for job_id in self._inflight.values()}
+
+        files = []
+        for entry in os.scandir(self.report_dir):
+            if not entry.is_file() or not entry.name.endswith(".pdf"):
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        limit = self.max_total_mb * 1024 * 1024
+        cutoff = time.time() - self.max_age_days * 86400
+        removed = 0
+        for mtime, size, path in files:
+            expired = self.max_age_days > 0 and mtime < cutoff
+            oversize = self.max_total_mb > 0 and total > limit
+            if not (expired or oversize) or path in protected:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("已清理%s个PDF报告文件，剩余%.1fMB", removed, total / 1024 / 1024)
+        return removed
+
+    def shutdown(self) -> None:
+        """应用关闭时停止进程池，排队中的任务直接取消"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+report_job_manager = ReportJobManager(
+    report_dir=settings.REPORT_DIR,
+    max_workers=settings.REPORT_MAX_WORKERS,
+    job_ttl=settings.REPORT_JOB_TTL,
+    max_age_days=settings.REPORT_MAX_AGE_DAYS,
+    max_total_mb=settings.REPORT_MAX_TOTAL_MB,
+)
@@ -0,0 +1,32 @@
+"""
+SQL字符串函数工具
+作者：智学伴开发团队
+目的：跨数据库的字符串截取表达式；SQLite / MySQL / PostgreSQL 使用 substr，SQL Server 没有 substr，
+     编译时改为 SUBSTRING，查询语句无需知道当前连接的数据库类型（同步/异步会话共用同一条语句）
+"""
+from sqlalchemy import literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import String
+
+
+class text_prefix(FunctionElement):  # pylint: disable=invalid-name
+    """text_prefix(列, 长度)：取字符串列的前若干个字符"""
+
+    type = String()
+    name = "text_prefix"
+    inherit_cache = True
+
+    def __init__(self, column, length: int):
+        # 起点和长度内联为常量：用于 GROUP BY 时 SELECT 与 GROUP BY 中的表达式需完全一致
+        super().__init__(column, literal_column("1"), literal_column(str(int(length))))
+
+
+@compiles(text_prefix)
+def _text_prefix_default(element, compiler, **kwargs):
+    return f"substr({compiler.process(element.clauses, **kwargs)})"
+
+
+@compiles(text_prefix, "mssql")
+def _text_prefix_mssql(element, compiler, **kwargs):
+    return f"SUBSTRING({compiler.process(element.clauses, **kwargs)})"
@@ -0,0 +1,83 @@
+"""
+SQL时间分桶工具
+作者：智学伴开发团队
+目的：生成按小时/天/月截断时间列的SQL表达式，兼容 SQLite / MySQL / SQL Server / PostgreSQL，
+     用于在数据库内 GROUP BY 统计，而不是把整表读入Python再分组；
+     其他数据库退回到把时间转为字符串（ISO 格式 YYYY-MM-DD HH:MI:SS）后截取前缀；
+     comparable_time 供 keyset 分页比较时间（SQLite 上统一文本格式）
+"""
+from sqlalchemy import DateTime, String, cast, func, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from core.logger import logger
+from utils.sql_text import text_prefix
+
+# 分桶单位 -> (strftime/DATE_FORMAT 格式, 字符串前缀长度（SQL Server CONVERT / 通用方式）, PostgreSQL to_char 格式)
+_UNIT_FORMATS = {
+    "hour": ("%Y-%m-%d %H", 13, "YYYY-MM-DD HH24"),
+    "day": ("%Y-%m-%d", 10, "YYYY-MM-DD"),
+    "month": ("%Y-%m", 7, "YYYY-MM"),
+}
+
+# 已提示过不支持时区平移的数据库类型
+_warned_dialects = set()
+
+
+def time_bucket(db: Session, column, unit: str = "day", offset_hours: int = 0):
+    """
+    把时间列平移 offset_hours 后格式化为分桶键字符串
+
+    Args:
+        column: 时间列（按UTC存储）
+        unit: hour（YYYY-MM-DD HH）/ day（YYYY-MM-DD）/ month（YYYY-MM）
+        offset_hours: 统计时区相对UTC的小时数
+    """
+    strftime_format, prefix_length, pg_format = _UNIT_FORMATS[unit]
+    offset_hours = int(offset_hours)
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        if offset_hours:
+            return func.strftime(strftime_format, column, f"{offset_hours:+d} hours")
+        return func.strftime(strftime_format, column)
+    if dialect in ("mysql", "mariadb"):
+        shifted = func.date_add(column, literal_column(f"INTERVAL {offset_hours} HOUR"))
+        return func.date_format(shifted, strftime_format)
+    if dialect == "mssql":
+        # 参数全部内联：SQL Server 要求 GROUP BY 与 SELECT 中的表达式（含参数）完全一致
+        shifted = func.dateadd(literal_column("hour"), literal_column(str(offset_hours)), column)
+        # CONVERT 样式 120 为 yyyy-mm-dd hh:mi:ss，按单位截取前缀
+        return func.convert(literal_column(f"VARCHAR({prefix_length})"), shifted, literal_column("120"))
+    if dialect == "postgresql":
+        shifted = column + literal_column(f"INTERVAL '{offset_hours} hours'")
+        return func.to_char(shifted, pg_format)
+    # 通用方式无法在库内平移时区，按UTC分桶
+    if offset_hours and dialect not in _warned_dialects:
+        _warned_dialects.add(dialect)
+        logger.warning("数据库类型 %s 不支持时区平移，统计按UTC时间分桶", dialect)
+    return text_prefix(cast(column, String), prefix_length)
+
+
+class comparable_time(FunctionElement):  # pylint: disable=invalid-name
+    """
+    可直接比较大小的时间表达式（用于 keyset 分页的 ORDER BY 与游标条件）
+
+    SQLite 以文本保存时间：server_default / func.now() 写入 'YYYY-MM-DD HH:MM:SS'，
+    Python 绑定参数为 'YYYY-MM-DD HH:MM:SS.ffffff'，按文本比较会出错；
+    SQLite 上两侧统一格式化为毫秒精度的字符串，其他数据库按原生时间类型比较
+    """
+
+    type = DateTime()
+    name = "comparable_time"
+    inherit_cache = True
+
+
+@compiles(comparable_time)
+def _comparable_time_default(element, compiler, **kwargs):
+    return compiler.process(element.clauses, **kwargs)
+
+
+@compiles(comparable_time, "sqlite")
+def _comparable_time_sqlite(element, compiler, **kwargs):
+    return f"strftime('%Y-%m-%d %H:%M:%f', {compiler.process(element.clauses, **kwargs)})"
@@ -0,0 +1,105 @@
+"""
+SQL插入或累加（upsert）工具
+作者：智学伴开发团队
+目的：计数类汇总表的“有则累加、无则插入”在数据库端一次完成，多个进程/线程同时写同一行时不丢增量、
+     也不会因唯一约束冲突而失败；SQLite / PostgreSQL 使用 ON CONFLICT DO UPDATE，MySQL 使用 ON DUPLICATE KEY UPDATE，
+     其他数据库（SQL Server）先 UPDATE，不存在时在保存点中 INSERT，遇到并发插入的唯一约束冲突再 UPDATE
+测试：pytest backend/tests/test_sql_upsert.py
+"""
+from typing import Any, Callable, Dict, List, Sequence
+
+from sqlalchemy import and_, case, insert, literal, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# 冲突时的合并规则：f(当前列, 新值) -> 更新后的值
+Merge = Callable[[Any, Any], Any]
+
+
+def add(current, new):
+    """累加"""
+    return current + new
+
+
+def greatest(current, new):
+    """取较大值（当前为 NULL 时取新值）"""
+    return case((current.is_(None), new), (new > current, new), else_=current)
+
+
+def least(current, new):
+    """取较小值（当前为 NULL 时取新值）"""
+    return case((current.is_(None), new), (new < current, new), else_=current)
+
+
+def upsert(
+    db: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    keys: Sequence[str],
+    merge: Dict[str, Merge],
+) -> None:
+    """
+    按唯一键插入行，已存在时按 merge 规则更新（调用方负责提交）
+
+    Args:
+        model: ORM 模型，keys 必须是它的主键或唯一约束
+        rows: 待写入的行（列名 -> 值），每行需包含 keys 与 merge 中的全部列
+        keys: 唯一键列名
+        merge: 冲突时需要更新的列及合并规则，如 {"call_count": add}
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: rule(table.c[name], stmt.excluded[name]) for name, rule in merge.items()},
+        )
+        db.execute(stmt, rows)
+        return
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            {name: rule(table.c[name], stmt.inserted[name]) for name, rule in merge.items()}
+        )
+        db.execute(stmt, rows)
+        return
+
+    for row in rows:
+        if merge_update(db, model, row, keys, merge):
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(table), [row])
+        except IntegrityError:
+            # 其他事务刚插入了同一行，改为累加
+            merge_update(db, model, row, keys, merge)
+
+
+def merge_update(
+    db: Session,
+    model,
+    row: Dict[str, Any],
+    keys: Sequence[str],
+    merge: Dict[str, Merge],
+) -> int:
+    """
+    按唯一键对已有行执行一条 UPDATE，在数据库端按 merge 规则合并（如 count = count + 1），返回更新的行数
+
+    不读取当前值，并发的累加不会相互覆盖；行不存在时返回 0，不插入
+    """
+    table = model.__table__
+    update_stmt = (
+        update(table)
+        .where(and_(*(table.c[name] == row[name] for name in keys)))
+        .values({name: rule(table.c[name], literal(row[name], table.c[name].type)) for name, rule in merge.items()})
+    )
+    return db.execute(update_stmt).rowcount
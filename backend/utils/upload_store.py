@@ -0,0 +1,208 @@
+"""
+按内容寻址的上传文件存储
+作者：智学伴开发团队
+目的：上传文件边写入边计算 SHA-256，相同内容只在磁盘保存一份（objects/ab/<sha256>.<扩展名>）；
+     解析出的文本按 (内容哈希, 截断长度, 解析版本) 缓存为 JSON，同一份教材被反复上传时直接返回缓存结果，不再重新解析
+环境变量：UPLOAD_STORE_DIR
+测试：pytest backend/tests/test_upload_store.py
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import settings
+from core.logger import logger
+from utils.file_parser import parse_file
+
+# 解析逻辑变化时递增，使旧的解析缓存失效
+PARSE_CACHE_VERSION = 1
+# 流式写入时每次读取的字节数
+CHUNK_BYTES = 1024 * 1024
+
+_OBJECT_NAME = re.compile(r"^([0-9a-f]{64})(\.[0-9a-z]+)$")
+
+
+class UploadTooLarge(ValueError):
+    """上传文件超过大小上限"""
+
+    def __init__(self, size: int, max_bytes: int):
+        super().__init__(f"文件过大: 超过 {max_bytes / 1024 / 1024:.0f}MB")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+class StoredUpload:
+    """一次上传在存储中的位置"""
+
+    __slots__ = ("sha256", "path", "size", "ext", "existed")
+
+    def __init__(self, sha256: str, path: str, size: int, ext: str, existed: bool):
+        self.sha256 = sha256
+        self.path = path
+        self.size = size
+        self.ext = ext
+        self.existed = existed  # 相同内容此前已经上传过
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+class UploadStore:
+    """
+    内容寻址的上传存储
+
+    - save() 从 UploadFile 分块读取，写入临时文件的同时计算哈希（超过 max_bytes 立即停止并删除），
+      目标文件已存在时丢弃临时文件，否则原子重命名
+    - parse() 先查 <sha256>.parse-<截断长度>-v<版本>.json，未命中时调用 parse_file 并写入缓存；
+      新上传的文件解析失败时删除该文件
+    """
+
+    def __init__(self, root_dir: str = "uploads/store"):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        self._stats = {"uploads": 0, "deduplicated": 0, "parse_hits": 0, "parse_misses": 0}
+
+    def _object_dir(self, sha256: str) -> str:
+        return os.path.join(self.root_dir, "objects", sha256[:2])
+
+    def object_path(self, sha256: str, ext: str) -> str:
+        return os.path.join(self._object_dir(sha256), f"{sha256}{ext}")
+
+    def resolve(self, name: str) -> Optional[str]:
+        """按存储文件名（<sha256>.<扩展名>）查找文件路径，不存在时返回 None"""
+        match = _OBJECT_NAME.match(name or "")
+        if not match:
+            return None
+        path = self.object_path(match.group(1), match.group(2))
+        return path if os.path.exists(path) else None
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    async def save(self, file: Any, ext: str, max_bytes: Optional[int] = None) -> StoredUpload:
+        """
+        流式保存上传文件（file 为 FastAPI UploadFile）
+
+        Raises:
+            UploadTooLarge: 超过 max_bytes
+        """
+        ext = ext.lower()
+        tmp_dir = os.path.join(self.root_dir, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as buffer:
+                while True:
+                    chunk = await file.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadTooLarge(size, max_bytes)
+                    digest.update(chunk)
+                    buffer.write(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.object_path(sha256, ext)
+            existed = os.path.exists(path)
+            if existed:
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.makedirs(self._object_dir(sha256), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._count("uploads")
+        if existed:
+            self._count("deduplicated")
+        return StoredUpload(sha256, path, size, ext, existed)
+
+    def _parse_cache_path(self, stored: StoredUpload, max_length: Optional[int]) -> str:
+        budget = "default" if max_length is None else str(max_length)
+        return os.path.join(
+            self._object_dir(stored.sha256),
+            f"{stored.sha256}.parse-{budget}-v{PARSE_CACHE_VERSION}.json",
+        )
+
+    def _read_parse_cache(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            logger.warning(f"解析缓存损坏，重新解析: {path} ({exc})")
+            return None
+
+    def _write_parse_cache(self, path: str, data: Dict[str, Any]) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning(f"写入解析缓存失败: {exc}")
+
+    def parse(self, stored: StoredUpload, max_length: Optional[int] = None) -> Tuple[str, int, bool]:
+        """
+        提取文本（参数同 parse_file），返回 (文本, 文本长度, 是否命中缓存)
+
+        Raises:
+            ValueError: 解析失败或内容为空（新上传的文件会被删除）
+        """
+        cache_path = self._parse_cache_path(stored, max_length)
+        cached = self._read_parse_cache(cache_path)
+        if cached is not None:
+            self._count("parse_hits")
+            return cached["text"], cached["text_length"], True
+
+        self._count("parse_misses")
+        try:
+            text, text_length = parse_file(stored.path, max_length=max_length)
+        except Exception:
+            if not stored.existed:
+                self.discard(stored)
+            raise
+        self._write_parse_cache(cache_path, {
+            "sha256": stored.sha256,
+            "file_size": stored.size,
+            "file_type": stored.ext,
+            "max_length": max_length,
+            "text_length": text_length,
+            "parsed_at": datetime.now().isoformat(),
+            "text": text,
+        })
+        return text, text_length, False
+
+    def discard(self, stored: StoredUpload) -> None:
+        """删除文件及其解析缓存"""
+        directory = self._object_dir(stored.sha256)
+        try:
+            for name in os.listdir(directory):
+                if name.startswith(stored.sha256):
+                    os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["parse_hits"] + stats["parse_misses"]
+        stats["parse_hit_rate"] = round(stats["parse_hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+upload_store = UploadStore(settings.UPLOAD_STORE_DIR)
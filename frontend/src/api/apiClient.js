@@ -189,6 +189,21 @@ export const downloadReport = async (userId) => {
   window.open(`${api.defaults.baseURL}/api/v1/analytics/report/${userId}`, '_blank');
 };
 
+// PDF报告任务：提交 -> 轮询状态 -> 下载
+export const submitReportJob = async (userId) => {
+  return api.post(`/api/v1/analytics/report/${userId}`);
+};
+
+export const getReportJob = async (jobId) => {
+  return api.get(`/api/v1/analytics/report/jobs/${jobId}`);
+};
+
+export const downloadReportJob = async (jobId) => {
+  return api.get(`/api/v1/analytics/report/jobs/${jobId}/download`, {
+    responseType: 'blob'
+  });
+};
+
 // 管理后台API
 export const getDashboardStats = async () => {
   return api.get('/api/v1/admin/dashboard');
@@ -294,16 +309,62 @@ export const uploadLearningMapFile = async (formData) => {
   });
 };
 
-export const generateLearningMap = async (data) => {
-  // 知识图谱生成需要较长时间，设置超时时间为180秒
-  return api.post('/api/v1/learning-map/generate', data, {
-    timeout: 180000  // 180秒超时（3分钟）
+// 知识图谱生成任务：长资料需要数分钟，提交后轮询状态，完成时返回与同步接口相同的 { data }
+export const submitLearningMapJob = async (data) => {
+  return api.post('/api/v1/learning-map/generate/jobs', data);
+};
+
+export const getLearningMapJob = async (jobId) => {
+  return api.get(`/api/v1/learning-map/generate/jobs/${jobId}`);
+};
+
+export const generateLearningMap = async (data, onProgress) => {
+  let { data: job } = await submitLearningMapJob(data);
+  while (job.status === 'queued' || job.status === 'running') {
+    onProgress?.(job);
+    await new Promise((resolve) => setTimeout(resolve, 2000));
+    ({ data: job } = await getLearningMapJob(job.job_id));
+  }
+  if (job.status !== 'done') {
+    // 与请求失败时的结构一致，调用方统一读取 error.response.data.detail
+    const error = new Error(job.error || '生成知识图谱失败');
+    error.response = { status: job.error_code || 500, data: { detail: job.error } };
+    throw error;
+  }
+  return { data: job.result };
+};
+
+// 紧凑格式（节点按列存储 + 邻接表）还原为 { session, nodes, edges }
+const expandCompactGraph = (data) => {
+  if (data?.format !== 'compact') return data;
+  const columns = data.nodes;
+  const nodes = columns.id.map((id, i) => ({
+    id,
+    title: columns.title[i],
+    description: columns.description[i],
+    level: columns.level[i],
+    mastery: columns.mastery[i],
+    example: columns.example[i],
+    resources: columns.resources[i],
+  }));
+  const edges = [];
+  data.adjacency.forEach((targets, i) => {
+    targets.forEach(([j, relation]) => {
+      edges.push({
+        from_node_id: nodes[i].id,
+        to_node_id: nodes[j].id,
+        relation: data.relations[relation],
+      });
+    });
   });
+  return { session: data.session, nodes, edges };
 };
 
 export const getLearningMapGraph = async (userId, sessionId) => {
-  const query = sessionId ? `?session_id=${sessionId}` : '';
-  return api.get(`/api/v1/learning-map/${userId}/graph${query}`);
+  const params = new URLSearchParams({ format: 'compact' });
+  if (sessionId) params.set('session_id', sessionId);
+  const response = await api.get(`/api/v1/learning-map/${userId}/graph?${params}`);
+  return { ...response, data: expandCompactGraph(response.data) };
 };
 
 export const getLearningMapHistory = async (userId, limit = 20) => {
@@ -446,24 +446,22 @@ function AIChat() {
       });
       
       if (response.data?.sessions) {
-        // 转换后端格式到前端格式
+        // 转换后端格式到前端格式（列表只含摘要，消息在选中会话时再加载）
         const convertedSessions = response.data.sessions.map(session => ({
           id: `backend_${session.id}`, // 使用backend_前缀区分
           backendId: session.id, // 保存后端ID
           title: session.title,
           createdAt: session.createdAt,
-          messages: session.messages.map(msg => ({
-            role: msg.role === 'assistant' ? 'ai' : msg.role,
-            content: msg.content,
-            provider: msg.provider
-          }))
+          messageCount: session.messageCount || 0,
+          messages: [],
+          messagesLoaded: !session.messageCount
         }));
         
         if (convertedSessions.length > 0) {
           setSessions(convertedSessions);
           setCurrentSessionId(convertedSessions[0].id);
-          const lastAiMsg = convertedSessions[0].messages?.filter((m) => m.role === 'ai').pop();
-          aiContentRef.current = lastAiMsg?.content || '';
+          aiContentRef.current = '';
+          await loadSessionMessages(convertedSessions[0]);
         } else {
           // 如果没有会话，创建一个新的
           await handleNewSession();
@@ -486,11 +484,48 @@ function AIChat() {
     }
   };
 
+  // 加载单个会话的消息（会话列表不再返回消息）
+  const loadSessionMessages = async (session) => {
+    if (!session?.backendId || session.messagesLoaded) {
+      return;
+    }
+    try {
+      const response = await api.get(`/api/v1/chat/sessions/${session.backendId}`);
+      const messages = (response.data?.session?.messages || []).map(msg => ({
+        role: msg.role === 'assistant' ? 'ai' : msg.role,
+        content: msg.content,
+        provider: msg.provider
+      }));
+      // 记录已同步到后端的位置，之后只追加新消息
+      const syncState = {
+        syncedCount: messages.length,
+        lastSyncedSeq: response.data?.last_seq ?? -1,
+        syncedTitle: response.data?.session?.title ?? session.title
+      };
+      setSessions((prev) =>
+        prev.map((item) =>
+          item.id === session.id ? { ...item, messages, messagesLoaded: true, ...syncState } : item
+        )
+      );
+      const lastAiMsg = messages.filter((m) => m.role === 'ai').pop();
+      aiContentRef.current = lastAiMsg?.content || '';
+    } catch (error) {
+      console.error('Failed to load session messages:', error);
+    }
+  };
+
   // 保存会话到后端（使用ref避免重复保存）
   const savingRef = useRef(new Set());
+
+  // 更新会话的同步位置（按会话ID合并，不覆盖期间新增的消息）
+  const markSessionSynced = (sessionId, syncState) => {
+    setSessions(prev => prev.map(s => (s.id === sessionId ? { ...s, ...syncState } : s)));
+  };
   
   const saveSessionToBackend = async (session, force = false) => {
     if (!userInfo?.id) return;
+    // 消息尚未加载的会话不保存，避免用空列表覆盖后端消息
+    if (session.messagesLoaded === false) return;
     
     // 防止重复保存
     const sessionKey = session.backendId || session.id;
@@ -515,10 +550,32 @@ function AIChat() {
       }));
       
       if (backendId) {
-        // 更新现有会话
-        await api.put(`/api/v1/chat/sessions/${backendId}`, {
-          title: session.title,
-          messages: messages
+        // 现有会话只追加尚未同步的消息（seq 由前端按顺序分配，重复提交由后端忽略）
+        const syncedCount = session.syncedCount ?? 0;
+        const lastSyncedSeq = session.lastSyncedSeq ?? -1;
+        let pending = session.messages.slice(syncedCount);
+        // 流式回复尚未结束时，最后一条AI消息还不完整，留到下次保存
+        if (loading && pending.length > 0 && pending[pending.length - 1].role === 'ai') {
+          pending = pending.slice(0, -1);
+        }
+        const titleChanged = session.title !== session.syncedTitle;
+        if (pending.length === 0 && !titleChanged) {
+          return;
+        }
+
+        const response = await api.post(`/api/v1/chat/sessions/${backendId}/messages`, {
+          title: titleChanged ? session.title : undefined,
+          messages: pending.map((msg, index) => ({
+            seq: lastSyncedSeq + 1 + index,
+            role: msg.role === 'ai' ? 'assistant' : msg.role,
+            content: msg.content,
+            provider: msg.provider
+          }))
+        });
+        markSessionSynced(session.id, {
+          syncedCount: syncedCount + pending.length,
+          lastSyncedSeq: response.data?.last_seq ?? lastSyncedSeq + pending.length,
+          syncedTitle: session.title
         });
       } else {
         // 创建新会话
@@ -532,14 +589,19 @@ function AIChat() {
           const updatedSession = {
             ...session,
             id: `backend_${newBackendId}`,
-            backendId: newBackendId
+            backendId: newBackendId,
+            syncedCount: 0,
+            lastSyncedSeq: -1,
+            syncedTitle: session.title
           };
           
-          // 如果有消息，更新会话
+          // 如果有消息，一次性写入已有消息，之后走追加
           if (messages.length > 0) {
-            await api.put(`/api/v1/chat/sessions/${newBackendId}`, {
+            const putResponse = await api.put(`/api/v1/chat/sessions/${newBackendId}`, {
               messages: messages
             });
+            updatedSession.syncedCount = session.messages.length;
+            updatedSession.lastSyncedSeq = putResponse.data?.last_seq ?? messages.length - 1;
           }
           
           // 更新本地状态
@@ -571,10 +633,15 @@ function AIChat() {
           
           if (session.backendId) {
             try {
-              await api.put(`/api/v1/chat/sessions/${session.backendId}`, {
+              const response = await api.put(`/api/v1/chat/sessions/${session.backendId}`, {
                 title: session.title,
                 messages: reducedMessages
               });
+              markSessionSynced(session.id, {
+                syncedCount: session.messages.length,
+                lastSyncedSeq: response.data?.last_seq ?? reducedMessages.length - 1,
+                syncedTitle: session.title
+              });
             } catch (retryError) {
               console.error('Failed to save with reduced messages:', retryError);
             }
@@ -647,6 +714,7 @@ function AIChat() {
     const session = sessions.find((item) => item.id === sessionId);
     const lastAiMsg = session?.messages?.filter((m) => m.role === 'ai').pop();
     aiContentRef.current = lastAiMsg?.content || '';
+    loadSessionMessages(session);
   };
 
   const handleDeleteSession = async (sessionId) => {
@@ -153,6 +153,7 @@ const APICallLogs = () => {
                     {source === 'user' ? '用户对话' : 
                      source === 'admin_test' ? '管理员测试' :
                      source === 'quiz' ? 'AI测评' :
+                     source === 'quiz_paper' ? '智能组卷' :
                      source === 'learning_map' ? '知识图谱' :
                      source === 'study_plan' ? '学习计划' : source}
                   </option>
@@ -218,6 +219,7 @@ const APICallLogs = () => {
                           {log.source === 'user' ? '用户对话' : 
                            log.source === 'admin_test' ? '管理员测试' :
                            log.source === 'quiz' ? 'AI测评' :
+                           log.source === 'quiz_paper' ? '智能组卷' :
                            log.source === 'learning_map' ? '知识图谱' :
                            log.source === 'study_plan' ? '学习计划' : log.source}
                         </td>
@@ -1,7 +1,7 @@
 import { Link } from 'react-router-dom';
 import { useEffect, useState, useMemo } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell, BarChart, Bar } from 'recharts';
-import api from '../api/apiClient';
+import api, { submitReportJob, getReportJob, downloadReportJob } from '../api/apiClient';
 import { useThemeStore } from '../store/themeStore';
 
 function Dashboard() {
@@ -102,23 +102,26 @@ function Dashboard() {
       return;
     }
     try {
-      // 使用fetch先触发请求，确保后端日志能记录
-      const response = await fetch(`${api.defaults.baseURL}/api/v1/analytics/report/${userId}`);
-      
-      if (response.ok) {
-        // 创建blob并下载
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `智学伴_学习报告_${userId}_${new Date().getTime()}.pdf`;
-        document.body.appendChild(a);
-        a.click();
-        window.URL.revokeObjectURL(url);
-        document.body.removeChild(a);
-      } else {
-        alert('PDF下载失败，请稍后重试');
+      // 提交报告任务，数据未变化时后端直接返回已生成的报告
+      let { data: job } = await submitReportJob(userId);
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        ({ data: job } = await getReportJob(job.job_id));
       }
+      if (job.status !== 'done') {
+        alert('PDF生成失败: ' + (job.error || '请稍后重试'));
+        return;
+      }
+      const response = await downloadReportJob(job.job_id);
+      // 创建blob并下载
+      const url = window.URL.createObjectURL(response.data);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `智学伴_学习报告_${userId}_${new Date().getTime()}.pdf`;
+      document.body.appendChild(a);
+      a.click();
+      window.URL.revokeObjectURL(url);
+      document.body.removeChild(a);
     } catch (error) {
       alert('PDF下载失败: ' + error.message);
     }
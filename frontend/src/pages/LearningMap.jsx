@@ -205,6 +205,10 @@ const LearningMap = () => {
         file_id: fileInfo?.file_id,
         course_topic: courseTopic,
         provider: provider || undefined,
+      }, (job) => {
+        if (job.chunks_total > 1) {
+          setStatus(`AI 正在生成知识图谱（已处理 ${job.chunks_done}/${job.chunks_total} 部分）...`);
+        }
       });
       await fetchHistory();
       await fetchGraph(data.session_id);
@@ -258,6 +258,10 @@ function Quiz() {
       link.remove();
       window.URL.revokeObjectURL(url);
     } catch (err) {
+      if (err.response?.status === 429) {
+        setError('当前导出任务较多，请稍后重试');
+        return;
+      }
       setError('导出失败：' + (err.response?.data?.detail || err.message));
     }
   };